@@ -1,13 +1,17 @@
 
 import logging
 from pathlib import Path
+from typing import Literal
 
-from fastapi import APIRouter, Body, HTTPException
+from fastapi import APIRouter, Body, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field
 from skellycam.core.camera.config.camera_config import CameraConfigs, CameraConfig
 from skellycam.core.camera_group.camera_group import CameraGroup
 from skellycam.core.types.type_overloads import CameraGroupIdString, CameraIdString
 
+from freemocap.core.pipelines.frame_scheduler import ReadTypes, format_prometheus_frame_counters
+from freemocap.core.pipelines.pipeline_latency_histograms import format_prometheus_metrics
 from freemocap.freemocap_app.freemocap_application import get_freemocap_app
 
 logger = logging.getLogger(__name__)
@@ -18,6 +22,10 @@ pipeline_router = APIRouter(prefix=f"/pipeline",
 
 class PipelineConnectRequest(BaseModel):
     camera_ids: list[CameraIdString] = Field(..., description="List of camera IDs comprising the CameraGroup we're attaching a pipeline to")
+    read_type: ReadTypes = Field(default=ReadTypes.LATEST,
+                                 description="`latest` drops frames to keep up in realtime, `next` processes every frame (for offline processing)")
+    batch_camera_nodes: bool = Field(default=False,
+                                     description="Run every camera's tracking in one worker with one copy of each model (less RAM, lower throughput)")
 
 
 class PipelineCreateResponse(BaseModel):
@@ -36,7 +44,9 @@ def pipeline_connect_post_endpoint(
     try:
 
         camera_group = get_freemocap_app().skellycam_app.camera_group_manager.camera_group_from_camera_ids(camera_ids=request.camera_ids)
-        camera_group_id, pipeline_id = get_freemocap_app().connect_pipeline(camera_group=camera_group)
+        camera_group_id, pipeline_id = get_freemocap_app().connect_pipeline(camera_group=camera_group,
+                                                                            read_type=request.read_type,
+                                                                            batch_camera_nodes=request.batch_camera_nodes)
         response = PipelineCreateResponse(camera_group_id=camera_group_id,
                                            pipeline_id=pipeline_id)
         logger.api(
@@ -62,4 +72,55 @@ def pipeline_disconnect_post_endpoint( ):
         logger.error(f"Error when processing `pipeline/disconnect` request: {type(e).__name__} - {e}")
         logger.exception(e)
         raise HTTPException(status_code=500,
-                            detail=f"Error when processing `pipeline/disconnect` request: {type(e).__name__} - {e}")
\ No newline at end of file
+                            detail=f"Error when processing `pipeline/disconnect` request: {type(e).__name__} - {e}")
+
+@pipeline_router.get("/metrics",
+                     summary="Per-stage latency percentiles for all processing pipelines"
+                     )
+def pipeline_metrics_get_endpoint(
+        format: Literal["json", "prometheus"] = Query("json",
+                                                      description="`json`, or `prometheus` for Prometheus text exposition format")):
+    logger.api(f"Received `pipeline/metrics` GET request")
+    try:
+        pipeline_manager = get_freemocap_app().pipeline_manager
+        latency_metrics = pipeline_manager.get_latency_metrics()
+        frame_counters = pipeline_manager.get_frame_counters()
+        if format == "prometheus":
+            return PlainTextResponse(format_prometheus_metrics(latency_metrics) +
+                                     format_prometheus_frame_counters(frame_counters))
+        return {pipeline_id: {"frame_counters": frame_counters[pipeline_id],
+                              "latency": latency_metrics[pipeline_id]}
+                for pipeline_id in latency_metrics.keys()}
+    except Exception as e:
+        logger.error(f"Error when processing `pipeline/metrics` request: {type(e).__name__} - {e}")
+        logger.exception(e)
+        raise HTTPException(status_code=500,
+                            detail=f"Error when processing `pipeline/metrics` request: {type(e).__name__} - {e}")
+
+
+@pipeline_router.get("/pubsub",
+                     summary="Queue depth, publish rate and drops for every topic of every processing pipeline"
+                     )
+def pipeline_pubsub_stats_get_endpoint():
+    logger.api(f"Received `pipeline/pubsub` GET request")
+    try:
+        return get_freemocap_app().pipeline_manager.get_pubsub_stats()
+    except Exception as e:
+        logger.error(f"Error when processing `pipeline/pubsub` request: {type(e).__name__} - {e}")
+        logger.exception(e)
+        raise HTTPException(status_code=500,
+                            detail=f"Error when processing `pipeline/pubsub` request: {type(e).__name__} - {e}")
+
+
+@pipeline_router.get("/status",
+                     summary="State, heartbeat age and last processed frame of every node in every processing pipeline"
+                     )
+def pipeline_status_get_endpoint():
+    logger.api(f"Received `pipeline/status` GET request")
+    try:
+        return get_freemocap_app().pipeline_manager.get_pipeline_status()
+    except Exception as e:
+        logger.error(f"Error when processing `pipeline/status` request: {type(e).__name__} - {e}")
+        logger.exception(e)
+        raise HTTPException(status_code=500,
+                            detail=f"Error when processing `pipeline/status` request: {type(e).__name__} - {e}")
@@ -105,7 +105,10 @@ class WebsocketServer:
                         for camera_group_id, (frame_number,
                                               multiframe_timestamp,
                                               payload_bytes) in new_frontend_payloads.items():
+                            send_start_ns = time.perf_counter_ns()
                             await self.websocket.send_bytes(payload_bytes)
+                            self._app.pipeline_manager.record_websocket_send(camera_group_id=camera_group_id,
+                                                                             duration_ns=time.perf_counter_ns() - send_start_ns)
                             self.last_sent_frame_number = frame_number
                             if camera_group_id not in self._frontend_framerate_trackers:
                                 self._frontend_framerate_trackers[camera_group_id] = FramerateTracker.create(
@@ -0,0 +1,156 @@
+import numpy as np
+
+MINIMUM_CAMERAS_FOR_TRIANGULATION = 2
+
+
+def triangulate_batched(points2d: np.ndarray,
+                        projection_matrices: np.ndarray,
+                        visibility: np.ndarray | None = None,
+                        minimum_cameras: int = MINIMUM_CAMERAS_FOR_TRIANGULATION,
+                        use_svd: bool = False) -> np.ndarray:
+    """
+    Triangulate every point in a frame at once with the Direct Linear Transform (DLT).
+
+    Builds one (2 * number_of_cameras, 4) DLT system per point, stacked into a (number_of_points, 2 * number_of_cameras, 4)
+    array. Cameras that can't see a point have their two rows zeroed out, which leaves that point's solution unchanged,
+    so every point can share the same system shape and be solved in one shot.
+
+    By default the systems are solved through their 4x4 normal matrices (fixing the homogeneous coordinate to 1 and
+    solving the remaining 3x3 systems with Cramer's rule), which is pure array arithmetic and several times faster than
+    numpy's batched SVD for hundreds of tiny matrices. Rows are normalized first to keep that well conditioned.
+    Set `use_svd=True` to take the null space from stacked `np.linalg.svd` calls instead (slower, but also handles
+    points at infinity) - one call per camera-visibility pattern, so each SVD only carries the rows of the cameras that
+    actually saw its points.
+
+    :param points2d: (number_of_cameras, number_of_points, 2) image points. These must be in the same coordinate frame as
+        `projection_matrices` (i.e. undistorted normalized coordinates if using [R|t] extrinsics matrices)
+    :param projection_matrices: (number_of_cameras, 3, 4) camera projection matrices
+    :param visibility: (number_of_cameras, number_of_points) bool mask, defaults to "every non-NaN point"
+    :param minimum_cameras: points seen by fewer cameras than this are returned as NaN
+    :param use_svd: solve with a stacked SVD rather than the normal equations
+    :return: (number_of_points, 3) triangulated points
+    """
+    dlt_systems, visibility = build_dlt_systems(points2d=points2d,
+                                                projection_matrices=projection_matrices,
+                                                visibility=visibility)
+    number_of_points = dlt_systems.shape[0]
+    points3d = np.full((number_of_points, 3), np.nan)
+    enough_views = visibility.sum(axis=0) >= minimum_cameras
+    if not enough_views.any():
+        return points3d
+    dlt_systems = dlt_systems[enough_views]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if use_svd:
+            points3d[enough_views] = _solve_svd_by_visibility_pattern(dlt_systems=dlt_systems,
+                                                                      visibility=visibility[:, enough_views])
+        else:
+            points3d[enough_views] = _solve_normal_equations(dlt_systems)
+    return points3d
+
+
+def triangulate_with_reprojection_errors(points2d: np.ndarray,
+                                         projection_matrices: np.ndarray,
+                                         visibility: np.ndarray | None = None,
+                                         minimum_cameras: int = MINIMUM_CAMERAS_FOR_TRIANGULATION,
+                                         use_svd: bool = False) -> tuple[np.ndarray, np.ndarray]:
+    """
+    `triangulate_batched`, plus how far each camera's observation lands from the triangulated point's reprojection.
+
+    :return: (number_of_points, 3) triangulated points, and (number_of_cameras, number_of_points) reprojection errors -
+        in the units of `points2d`, NaN wherever a camera didn't see a point or the point couldn't be triangulated
+    """
+    points3d = triangulate_batched(points2d=points2d,
+                                   projection_matrices=projection_matrices,
+                                   visibility=visibility,
+                                   minimum_cameras=minimum_cameras,
+                                   use_svd=use_svd)
+    return points3d, calculate_reprojection_errors(points3d=points3d,
+                                                   points2d=points2d,
+                                                   projection_matrices=projection_matrices,
+                                                   visibility=visibility)
+
+
+def calculate_reprojection_errors(points3d: np.ndarray,
+                                  points2d: np.ndarray,
+                                  projection_matrices: np.ndarray,
+                                  visibility: np.ndarray | None = None) -> np.ndarray:
+    """
+    (number_of_cameras, number_of_points) distances between each observation and its point's reprojection through
+    `projection_matrices`, NaN where the camera didn't see the point (see `build_dlt_systems` for the shapes)
+    """
+    homogeneous_points3d = np.hstack([points3d, np.ones((points3d.shape[0], 1))])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # (cams, 3, 4) @ (4, points) -> (cams, 3, points)
+        projected = projection_matrices @ homogeneous_points3d.T
+        projected_points2d = (projected[:, :2] / projected[:, 2:3]).transpose(0, 2, 1)
+    reprojection_errors = np.linalg.norm(projected_points2d - points2d, axis=2)
+    if visibility is not None:
+        reprojection_errors[~visibility] = np.nan
+    return reprojection_errors
+
+
+def build_dlt_systems(points2d: np.ndarray,
+                      projection_matrices: np.ndarray,
+                      visibility: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Build the (number_of_points, 2 * number_of_cameras, 4) stack of DLT systems, with the rows of cameras that can't see
+    a point zeroed out. Returns the systems and the (number_of_cameras, number_of_points) visibility mask actually used.
+    """
+    number_of_cameras, number_of_points, point_dimensions = points2d.shape
+    if point_dimensions != 2:
+        raise ValueError(f"Expected points2d to be of shape (num_cams, num_points, 2), got {points2d.shape}")
+    if projection_matrices.shape != (number_of_cameras, 3, 4):
+        raise ValueError(f"Expected projection matrices to be of shape ({number_of_cameras}, 3, 4), "
+                         f"got {projection_matrices.shape}")
+    if visibility is None:
+        visibility = ~np.isnan(points2d).any(axis=2)
+    elif visibility.shape != (number_of_cameras, number_of_points):
+        raise ValueError(f"Expected visibility to be of shape ({number_of_cameras}, {number_of_points}), "
+                         f"got {visibility.shape}")
+    visibility = visibility & ~np.isnan(points2d).any(axis=2)
+
+    # (cams, points, 1) * (cams, 1, 4) - (cams, 1, 4) -> (cams, points, 4)
+    points2d = np.where(visibility[..., np.newaxis], points2d, 0.0)
+    x_rows = points2d[..., 0:1] * projection_matrices[:, np.newaxis, 2] - projection_matrices[:, np.newaxis, 0]
+    y_rows = points2d[..., 1:2] * projection_matrices[:, np.newaxis, 2] - projection_matrices[:, np.newaxis, 1]
+
+    # Interleave to (points, 2 * cams, 4), then normalize each row (and zero out the rows of cameras that can't see the point)
+    dlt_systems = np.stack([x_rows, y_rows], axis=2).transpose(1, 0, 2, 3).reshape(number_of_points,
+                                                                                   2 * number_of_cameras,
+                                                                                   4)
+    row_weights = np.repeat(visibility.T, 2, axis=1) / np.sqrt(np.einsum("nki,nki->nk", dlt_systems, dlt_systems))
+    dlt_systems *= row_weights[..., np.newaxis]
+    return dlt_systems, visibility
+
+
+def _solve_normal_equations(dlt_systems: np.ndarray) -> np.ndarray:
+    # With w = 1, minimizing |A[:, :3] @ X + A[:, 3]| gives the symmetric 3x3 system N @ X = b
+    normal_matrices = dlt_systems.transpose(0, 2, 1) @ dlt_systems
+    n = normal_matrices[:, :3, :3]
+    b = -normal_matrices[:, :3, 3]
+    # Cramer's rule via cofactors (N is symmetric, so its cofactor rows are the rows of its adjugate)
+    cofactor0 = np.cross(n[:, 1], n[:, 2])
+    cofactor1 = np.cross(n[:, 2], n[:, 0])
+    cofactor2 = np.cross(n[:, 0], n[:, 1])
+    determinant = np.einsum("ni,ni->n", n[:, 0], cofactor0)
+    return (cofactor0 * b[:, 0:1] + cofactor1 * b[:, 1:2] + cofactor2 * b[:, 2:3]) / determinant[:, np.newaxis]
+
+
+def _solve_svd_by_visibility_pattern(dlt_systems: np.ndarray, visibility: np.ndarray) -> np.ndarray:
+    """
+    Null spaces of a (number_of_points, 2 * number_of_cameras, 4) stack of DLT systems, with one stacked SVD per
+    distinct column of the (number_of_cameras, number_of_points) visibility mask, each dropping the zeroed rows of the
+    cameras that pattern leaves out
+    """
+    # Each pattern as a bitmask integer, then sorted so every pattern's points are one contiguous run of `order`
+    pattern_codes = (1 << np.arange(visibility.shape[0])) @ visibility
+    order = np.argsort(pattern_codes, kind="stable")
+    pattern_starts = np.flatnonzero(np.diff(pattern_codes[order])) + 1
+    points3d = np.empty((dlt_systems.shape[0], 3))
+    for point_indices in np.split(order, pattern_starts):
+        visible_rows = np.repeat(visibility[:, point_indices[0]], 2)
+        _, _, vh = np.linalg.svd(dlt_systems[point_indices][:, visible_rows], full_matrices=False)
+        homogeneous_points = vh[:, -1, :]
+        points3d[point_indices] = homogeneous_points[:, :3] / homogeneous_points[:, 3:4]
+    return points3d
@@ -1 +1,10 @@
-from .__calibration_pipeline import CalibrationPipeline, CalibrationPipelineConfig
\ No newline at end of file
+# (imported lazily - the pipeline pulls in the camera/aggregation nodes, and the math kernels in this package
+# shouldn't have to import them just to be used on their own)
+__all__ = ["CalibrationPipeline", "CalibrationPipelineConfig"]
+
+
+def __getattr__(name: str):
+    if name in __all__:
+        from . import __calibration_pipeline
+        return getattr(__calibration_pipeline, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,151 @@
+from dataclasses import dataclass
+
+import numpy as np
+from scipy import optimize
+
+from freemocap.core.pipelines.batched_triangulation import triangulate_batched
+from freemocap.core.pipelines.calibration_pipeline.calculate_sparse_jacobian import calculate_jacobian_sparsity
+from freemocap.core.pipelines.calibration_pipeline.se3_operations import rotation_vectors_to_matrices, \
+    rotation_matrices_to_vectors
+
+CAMERA_PARAMETERS: int = 6  # rotation vector, translation vector
+# Object point errors are in board units (mm), reprojection errors in pixels
+OBJECT_POINT_ERROR_WEIGHT: float = 2.0
+
+
+@dataclass
+class BundleAdjustmentProblem:
+    """
+    Joint optimization of camera extrinsics, 3d points and calibration board poses, laid out to match
+    `calculate_jacobian_sparsity`:
+
+        parameters: [camera rvec, tvec] * cameras | [x, y, z] * points | board rvecs * boards | board tvecs * boards
+        residuals: one reprojection error (pixels) per observation, camera-major | 3 object point errors per point
+
+    The object point errors tie every point to the board it was seen on (the board's pose applied to the point's
+    position on the board), which fixes the scale and keeps the points rigid.
+
+    Image points are undistorted once, up front, so every residual evaluation is a pinhole projection of all the points
+    into all the cameras at once (scaled by each camera's focal length to get pixel errors).
+    """
+    undistorted_points2d: np.ndarray  # (cameras, points, 2) normalized image coordinates, NaN where a camera missed a point
+    focal_lengths: np.ndarray  # (cameras,)
+    board_ids: np.ndarray  # (points,) index of the board pose (i.e. view) each point was seen in
+    board_object_points: np.ndarray  # (points, 3) each point's position on the board
+
+    def __post_init__(self):
+        self.observed = ~np.isnan(self.undistorted_points2d).any(axis=2)
+        self.number_of_boards = int(self.board_ids.max()) + 1
+
+    @property
+    def number_of_cameras(self) -> int:
+        return self.undistorted_points2d.shape[0]
+
+    @property
+    def number_of_points(self) -> int:
+        return self.undistorted_points2d.shape[1]
+
+    def pack(self,
+             camera_rotation_vectors: np.ndarray,
+             camera_translation_vectors: np.ndarray,
+             points3d: np.ndarray,
+             board_rotation_vectors: np.ndarray,
+             board_translation_vectors: np.ndarray) -> np.ndarray:
+        return np.concatenate([np.hstack([camera_rotation_vectors, camera_translation_vectors]).ravel(),
+                               points3d.ravel(),
+                               board_rotation_vectors.ravel(),
+                               board_translation_vectors.ravel()])
+
+    def unpack(self, parameters: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """ (camera rvecs, camera tvecs, points3d, board rvecs, board tvecs) """
+        camera_parameters_end = self.number_of_cameras * CAMERA_PARAMETERS
+        points_end = camera_parameters_end + self.number_of_points * 3
+        board_rotations_end = points_end + self.number_of_boards * 3
+        camera_parameters = parameters[:camera_parameters_end].reshape(self.number_of_cameras, CAMERA_PARAMETERS)
+        return (camera_parameters[:, :3],
+                camera_parameters[:, 3:],
+                parameters[camera_parameters_end:points_end].reshape(self.number_of_points, 3),
+                parameters[points_end:board_rotations_end].reshape(self.number_of_boards, 3),
+                parameters[board_rotations_end:].reshape(self.number_of_boards, 3))
+
+    def initial_parameters(self, camera_extrinsics: np.ndarray) -> np.ndarray:
+        """
+        Starting guess from (cameras, 3, 4) [R|t] extrinsics - points are triangulated, and each board's pose is the
+        rigid fit of its object points onto its triangulated points
+        """
+        camera_rotation_vectors = rotation_matrices_to_vectors(camera_extrinsics[:, :, :3])
+        points3d = triangulate_batched(points2d=self.undistorted_points2d,
+                                       projection_matrices=camera_extrinsics)
+        board_rotations = np.tile(np.eye(3), (self.number_of_boards, 1, 1))
+        board_translation_vectors = np.zeros((self.number_of_boards, 3))
+        for board_id in range(self.number_of_boards):
+            on_board = (self.board_ids == board_id) & ~np.isnan(points3d).any(axis=1)
+            if on_board.sum() < 3:
+                continue
+            rotation, translation = _fit_rigid_transform(source=self.board_object_points[on_board],
+                                                         target=points3d[on_board])
+            board_rotations[board_id] = rotation
+            board_translation_vectors[board_id] = translation
+        board_rotation_vectors = rotation_matrices_to_vectors(board_rotations)
+        # Points that couldn't be triangulated start where their board says they are
+        untriangulated = np.isnan(points3d).any(axis=1)
+        points3d[untriangulated] = self._board_points(board_rotation_vectors, board_translation_vectors)[untriangulated]
+        return self.pack(camera_rotation_vectors=camera_rotation_vectors,
+                         camera_translation_vectors=camera_extrinsics[:, :, 3],
+                         points3d=points3d,
+                         board_rotation_vectors=board_rotation_vectors,
+                         board_translation_vectors=board_translation_vectors)
+
+    def residuals(self, parameters: np.ndarray) -> np.ndarray:
+        (camera_rotation_vectors, camera_translation_vectors, points3d,
+         board_rotation_vectors, board_translation_vectors) = self.unpack(parameters)
+        # (cameras, points, 3) - every point in every camera's coordinates
+        points_in_cameras = (np.einsum("cij,nj->cni", rotation_vectors_to_matrices(camera_rotation_vectors), points3d) +
+                             camera_translation_vectors[:, np.newaxis, :])
+        projected_points2d = points_in_cameras[..., :2] / points_in_cameras[..., 2:3]
+        reprojection_errors = (self.focal_lengths[:, np.newaxis] *
+                               np.linalg.norm(projected_points2d - self.undistorted_points2d, axis=2))
+        object_point_errors = OBJECT_POINT_ERROR_WEIGHT * (
+                points3d - self._board_points(board_rotation_vectors, board_translation_vectors))
+        return np.concatenate([reprojection_errors[self.observed], object_point_errors.ravel()])
+
+    def jacobian_sparsity(self):
+        return calculate_jacobian_sparsity(pixel_points2d=self.undistorted_points2d,
+                                           ids=self.board_ids,
+                                           num_camera_params=CAMERA_PARAMETERS)
+
+    def solve(self, initial_parameters: np.ndarray, **least_squares_kwargs) -> optimize.OptimizeResult:
+        return optimize.least_squares(fun=self.residuals,
+                                      x0=initial_parameters,
+                                      jac_sparsity=self.jacobian_sparsity(),
+                                      method="trf",
+                                      **least_squares_kwargs)
+
+    def _board_points(self, board_rotation_vectors: np.ndarray, board_translation_vectors: np.ndarray) -> np.ndarray:
+        """ Every point's position according to its board's pose """
+        board_rotations = rotation_vectors_to_matrices(board_rotation_vectors)
+        return (np.einsum("nij,nj->ni", board_rotations[self.board_ids], self.board_object_points) +
+                board_translation_vectors[self.board_ids])
+
+
+def anchor_to_camera(camera_rotation_vectors: np.ndarray,
+                     camera_translation_vectors: np.ndarray,
+                     camera_index: int) -> np.ndarray:
+    """
+    (cameras, 3, 4) [R|t] extrinsics re-expressed with the world origin at `camera_index`'s camera (the solve itself
+    leaves the world frame free)
+    """
+    rotations = rotation_vectors_to_matrices(camera_rotation_vectors)
+    anchored_rotations = rotations @ rotations[camera_index].T
+    anchored_translations = camera_translation_vectors - anchored_rotations @ camera_translation_vectors[camera_index]
+    return np.concatenate([anchored_rotations, anchored_translations[..., np.newaxis]], axis=2)
+
+
+def _fit_rigid_transform(source: np.ndarray, target: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """ Kabsch - the rotation and translation that best map `source` points onto `target` points """
+    source_centroid = source.mean(axis=0)
+    target_centroid = target.mean(axis=0)
+    u, _, vh = np.linalg.svd((source - source_centroid).T @ (target - target_centroid))
+    correction = np.diag([1.0, 1.0, np.sign(np.linalg.det(vh.T @ u.T))])
+    rotation = vh.T @ correction @ u.T
+    return rotation, target_centroid - rotation @ source_centroid
@@ -1,80 +1,155 @@
 import numpy as np
-from scipy.sparse import dok_matrix, csr_matrix
+from scipy.sparse import csr_matrix
+
+XYZ = np.arange(3, dtype=np.int32)
+
+
+def _index_dtype(shape: tuple[int, int]) -> type:
+    return np.int32 if max(shape) < np.iinfo(np.int32).max else np.int64
+
+
+def build_sparsity_pattern(shape: tuple[int, int], blocks: list[tuple[np.ndarray, np.ndarray]]) -> csr_matrix:
+    """
+    Assemble a boolean Jacobian sparsity pattern straight from index arrays, with no per-entry Python loops.
+
+    Each block is a (rows, columns) pair of index arrays that get broadcast against each other, so e.g.
+    `(residual_indices[:, np.newaxis], point_indices[:, np.newaxis] * 3 + XYZ)` marks the three coordinates of each
+    residual's point. The blocks are written into one preallocated COO index list (int32 where the shape allows it)
+    and converted to a `csr_matrix` in one go - duplicate entries are fine, they merge.
+    """
+    index_dtype = _index_dtype(shape)
+    block_shapes = [np.broadcast_shapes(np.shape(block_rows), np.shape(block_columns))
+                    for block_rows, block_columns in blocks]
+    number_of_entries = sum(int(np.prod(block_shape)) for block_shape in block_shapes)
+    # (filled block by block rather than concatenated, so hour-long problems don't hold two copies of the indices)
+    rows = np.empty(number_of_entries, dtype=index_dtype)
+    columns = np.empty(number_of_entries, dtype=index_dtype)
+    start = 0
+    for (block_rows, block_columns), block_shape in zip(blocks, block_shapes):
+        end = start + int(np.prod(block_shape))
+        rows[start:end].reshape(block_shape)[...] = block_rows
+        columns[start:end].reshape(block_shape)[...] = block_columns
+        start = end
+    return csr_matrix((np.ones(number_of_entries, dtype=bool), (rows, columns)), shape=shape)
+
 
 def calculate_jacobian_sparsity(
     pixel_points2d: np.ndarray,
-    ids: np.ndarray,
-    num_camera_params: int
+    ids: np.ndarray | None,
+    num_camera_params: int,
+    per_coordinate_residuals: bool = False,
 ) -> csr_matrix:
     """
     Calculate the sparsity pattern of the Jacobian matrix for bundle adjustment.
 
     Parameters:
     - pixel_points2d (np.ndarray): CxNx2 array of 2D points where C is the number of cameras and N is the number of points.
-    - ids (np.ndarray): Unique identifiers for each set of 3D points (or boards? not sure what this referred to in the og code).
+    - ids (np.ndarray | None): The board (i.e. view) each point was seen on. With `None` there are no board parameters
+      and no object point errors.
     - num_camera_params (int): Number of parameters per camera.
+    - per_coordinate_residuals (bool): One reprojection residual per observation (False, e.g. the pixel distance) or one
+      per non-NaN x/y coordinate (True, anipose's layout).
 
     Returns:
     - csr_matrix: Sparse matrix representing the Jacobian sparsity pattern.
     """
     num_cameras, num_points, _ = pixel_points2d.shape
 
-    # Initialize indices for points and cameras
-    point_indices = np.arange(num_points)
-    camera_indices = np.arange(num_cameras)[:, np.newaxis]
+    # Mask valid (non-NaN) 2D points - residuals are ordered camera-major (the order of `residuals[valid_points_mask]`)
+    if per_coordinate_residuals:
+        valid_points_mask = ~np.isnan(pixel_points2d)
+    else:
+        valid_points_mask = ~np.isnan(pixel_points2d).any(axis=2)
+    valid_camera_indices = np.broadcast_to(
+        np.arange(num_cameras).reshape((-1,) + (1,) * (valid_points_mask.ndim - 1)), valid_points_mask.shape)[valid_points_mask]
+    valid_point_indices = np.broadcast_to(
+        np.arange(num_points).reshape((1, -1) + (1,) * (valid_points_mask.ndim - 2)), valid_points_mask.shape)[valid_points_mask]
+    num_valid_points = len(valid_camera_indices)
+    reprojection_rows = np.arange(num_valid_points)[:, np.newaxis]
+    point_params_start = num_cameras * num_camera_params
 
-    # Mask valid (non-NaN) 2D points
-    valid_points_mask = ~np.isnan(pixel_points2d).any(axis=2)
+    blocks = [
+        # camera parameters based on reprojection error
+        (reprojection_rows, valid_camera_indices[:, np.newaxis] * num_camera_params + np.arange(num_camera_params)),
+        # point positions based on reprojection error
+        (reprojection_rows, point_params_start + valid_point_indices[:, np.newaxis] * 3 + XYZ),
+    ]
 
-    # Remap unique IDs to a consecutive range
-    def remap_ids(original_ids: np.ndarray) -> np.ndarray:
-        unique_ids, remapped_ids = np.unique(original_ids, return_inverse=True)
-        return remapped_ids
+    # Calculate total parameters for reprojection and errors
+    total_reprojection_params = point_params_start + num_points * 3
+    if ids is None:
+        return build_sparsity_pattern(shape=(num_valid_points, total_reprojection_params), blocks=blocks)
 
-    remapped_ids = remap_ids(ids)
+    # Remap unique IDs to a consecutive range
+    remapped_ids = np.unique(ids, return_inverse=True)[1].ravel()
     num_boards = int(np.max(remapped_ids)) + 1
-    board_params_per_board = 6  # 3 for rotation and 3 for translation
-    total_board_params = num_boards * board_params_per_board
-
-    # Calculate total parameters for reprojection and errors
-    total_reprojection_params = num_cameras * num_camera_params + num_points * 3
-    total_params = total_reprojection_params + total_board_params
-    num_valid_points = valid_points_mask.sum()
+    total_board_params = num_boards * 6  # 3 for rotation and 3 for translation
     total_errors = num_valid_points + num_points * 3
 
-    # Initialize sparse matrix for Jacobian
-    jacobian_sparsity = dok_matrix((total_errors, total_params), dtype=bool)
-
-    # Populate sparse matrix based on valid points
-    valid_camera_indices = camera_indices[valid_points_mask]
-    valid_point_indices = point_indices[valid_points_mask]
-
-    # Update camera parameters based on reprojection error
-    for param_index in range(num_camera_params):
-        jacobian_sparsity[np.arange(num_valid_points), valid_camera_indices * num_camera_params + param_index] = True
-
-    # Update point positions based on reprojection error
-    for coord_index in range(3):
-        jacobian_sparsity[np.arange(num_valid_points), num_cameras * num_camera_params + valid_point_indices * 3 + coord_index] = True
-
-    # Update board parameters based on object points error
-    for coord_index in range(3):
-        for board_param_index in range(3):
-            jacobian_sparsity[
-                num_valid_points + point_indices * 3 + coord_index,
-                total_reprojection_params + remapped_ids * 3 + board_param_index
-            ] = True
-            jacobian_sparsity[
-                num_valid_points + point_indices * 3 + coord_index,
-                total_reprojection_params + num_boards * 3 + remapped_ids * 3 + board_param_index
-            ] = True
-
-    # Update point positions based on object points error
-    for coord_index in range(3):
-        jacobian_sparsity[
-            num_valid_points + point_indices * 3 + coord_index,
-            num_cameras * num_camera_params + point_indices * 3 + coord_index
-        ] = True
-
-    # Convert to csr_matrix for efficiency in future operations
-    return jacobian_sparsity.tocsr()
\ No newline at end of file
+    # (points, 3, 1) - the three object point error rows of each point
+    object_point_rows = (num_valid_points + np.arange(num_points)[:, np.newaxis] * 3 + XYZ)[:, :, np.newaxis]
+    board_columns = (remapped_ids[:, np.newaxis] * 3 + XYZ)[:, np.newaxis, :]
+    blocks += [
+        # board rotation and translation based on object points error
+        (object_point_rows, total_reprojection_params + board_columns),
+        (object_point_rows, total_reprojection_params + num_boards * 3 + board_columns),
+        # point positions based on object points error
+        (object_point_rows[:, :, 0], point_params_start + np.arange(num_points)[:, np.newaxis] * 3 + XYZ),
+    ]
+    return build_sparsity_pattern(shape=(total_errors, total_reprojection_params + total_board_params), blocks=blocks)
+
+
+def calculate_triangulation_jacobian_sparsity(
+    points2d: np.ndarray,
+    constraints: list[tuple[int, int]] = (),
+    constraints_weak: list[tuple[int, int]] = (),
+    n_deriv_smooth: int = 1,
+) -> csr_matrix:
+    """
+    Sparsity pattern of the Jacobian for triangulation refinement (anipose's `optim_points`).
+
+    Parameters:
+    - points2d (np.ndarray): (cameras, frames, joints, 2) image points, NaN where a camera missed a joint.
+    - constraints / constraints_weak: (joint a, joint b) pairs whose length is held constant over time.
+    - n_deriv_smooth (int): Order of the temporal smoothness term.
+
+    Layout (matching `CameraGroup._error_fun_triangulation`):
+        parameters: [x, y, z] * (frames * joints) | one length per strong constraint | one length per weak constraint
+        residuals: one per non-NaN image coordinate | smoothness per (frame, joint, xyz) | constraint * frame (strong,
+                   then weak)
+    """
+    n_cams, n_frames, n_joints, _ = points2d.shape
+    n_3d = n_frames * n_joints * 3
+    # (long recordings have hundreds of millions of entries, so the index arrays are built in the pattern's index dtype)
+    index_dtype = _index_dtype((points2d.size + n_3d + (len(constraints) + len(constraints_weak)) * n_frames,
+                                n_3d + len(constraints) + len(constraints_weak)))
+
+    # -- reprojection errors: each non-NaN coordinate depends on its 3d point --
+    good = ~np.isnan(points2d.reshape((n_cams, -1, 2)))
+    point_indices_good = np.broadcast_to(np.arange(n_frames * n_joints, dtype=index_dtype)[np.newaxis, :, np.newaxis],
+                                         good.shape)[good]
+    n_errors_reproj = len(point_indices_good)
+    blocks = [(np.arange(n_errors_reproj, dtype=index_dtype)[:, np.newaxis], point_indices_good[:, np.newaxis] * 3 + XYZ)]
+
+    # -- smoothness in time: point (f, j) depends on points (f, j) ... (f + n_deriv_smooth, j) --
+    smooth_points = np.arange(max(n_frames - n_deriv_smooth, 0) * n_joints, dtype=index_dtype)[:, np.newaxis]
+    for n in range(n_deriv_smooth + 1):
+        blocks.append((n_errors_reproj + smooth_points * 3 + XYZ, (smooth_points + n * n_joints) * 3 + XYZ))
+    n_errors_smooth = len(smooth_points) * 3
+
+    # -- joint length constraints: each (constraint, frame) depends on its length and both its joints' points --
+    start = n_errors_reproj + n_errors_smooth
+    frames = np.arange(n_frames)
+    for length_params_start, constraint_pairs in [(n_3d, constraints),
+                                                  (n_3d + len(constraints), constraints_weak)]:
+        constraint_pairs = np.asarray(constraint_pairs, dtype=np.int64).reshape(-1, 2)
+        constraint_indices = np.arange(len(constraint_pairs))[:, np.newaxis]
+        rows = start + constraint_indices * n_frames + frames  # (constraints, frames)
+        # (constraints, frames, 2 joints, 3)
+        point_columns = ((frames[np.newaxis, :, np.newaxis] * n_joints + constraint_pairs[:, np.newaxis, :])[..., np.newaxis] * 3
+                         + XYZ)
+        blocks += [(rows, length_params_start + constraint_indices),
+                   (rows[:, :, np.newaxis, np.newaxis], point_columns)]
+        start += len(constraint_pairs) * n_frames
+
+    return build_sparsity_pattern(shape=(start, n_3d + len(constraints) + len(constraints_weak)), blocks=blocks)
@@ -10,13 +10,19 @@ import numpy as np
 from skellycam import CameraId
 
 from freemocap.core.pipelines.calibration_pipeline.calibration_camera_node_output_data import CalibrationCameraNodeOutputData
+from freemocap.core.pipelines.calibration_pipeline.calibration_solver_worker import CalibrationSolverWorker, \
+    CalibrationEstimateTopic, CalibrationEstimateMessage, CalibrationSolveScheduler
 from freemocap.core.pipelines.calibration_pipeline.multi_camera_calibrator import MultiCameraCalibrator, \
     MultiCameraCalibrationEstimate
 from freemocap.core.pipelines.processing_pipeline import BaseAggregationLayerOutputData, BasePipelineStageConfig, \
     AggregationNode, BasePipelineOutputData
+from freemocap.core.pubsub.pubsub_topics import LatestValueSubscription
 
 logger = logging.getLogger(__name__)
 
+# Keyframe information (see `KeyframeSelector`) to gain after a solve before the calibration is solved again
+DEFAULT_RESOLVE_INFORMATION_GAIN: float = 25.0
+
 
 class CalibrationAggregationLayerOutputData(BaseAggregationLayerOutputData):
     multi_camera_calibration_estimate: MultiCameraCalibrationEstimate | None = None
@@ -29,11 +35,13 @@ class CalibrationPipelineOutputData(BasePipelineOutputData):
 
 
 class CalibrationAggregationNodeConfig(BasePipelineStageConfig):
-    pass
+    resolve_information_gain: float = DEFAULT_RESOLVE_INFORMATION_GAIN
 
 
 @dataclass
 class CalibrationAggregationProcessNode(AggregationNode):
+    calibration_estimate_topic: CalibrationEstimateTopic
+
     @classmethod
     def create(cls,
                config: CalibrationAggregationNodeConfig,
@@ -42,35 +50,42 @@ class CalibrationAggregationProcessNode(AggregationNode):
                all_ready_events: dict[CameraId | str, multiprocessing.Event],
                shutdown_event: multiprocessing.Event,
                use_thread: bool = False):
-
+        calibration_estimate_topic = CalibrationEstimateTopic()
+        worker_kwargs = dict(config=config,
+                             input_queues=input_queues,
+                             output_queue=output_queue,
+                             all_ready_events=all_ready_events,
+                             shutdown_event=shutdown_event,
+                             calibration_estimate_topic=calibration_estimate_topic,
+                             calibration_estimate_subscription=calibration_estimate_topic.get_subscription(),
+                             use_thread=use_thread)
         if use_thread:
-            worker = Thread(target=cls._run,
-                            kwargs=dict(config=config,
-                                        input_queues=input_queues,
-                                        output_queue=output_queue,
-                                        all_ready_events=all_ready_events,
-                                        shutdown_event=shutdown_event)
-                            )
+            worker = Thread(target=cls._run, kwargs=worker_kwargs)
         else:
-            worker = Process(target=cls._run,
-                             kwargs=dict(config=config,
-                                         input_queues=input_queues,
-                                         output_queue=output_queue,
-                                         all_ready_events=all_ready_events,
-                                         shutdown_event=shutdown_event)
-                             )
+            worker = Process(target=cls._run, kwargs=worker_kwargs)
         return cls(config=config,
                    process=worker,
                    input_queues=input_queues,
                    output_queue=output_queue,
-                   shutdown_event=shutdown_event)
+                   shutdown_event=shutdown_event,
+                   calibration_estimate_topic=calibration_estimate_topic)
 
     @staticmethod
     def _run(config: CalibrationAggregationNodeConfig,
              input_queues: Dict[CameraId, Queue],
              output_queue: Queue,
              all_ready_events: dict[CameraId | str, multiprocessing.Event],
-             shutdown_event: multiprocessing.Event):
+             shutdown_event: multiprocessing.Event,
+             calibration_estimate_topic: CalibrationEstimateTopic,
+             calibration_estimate_subscription: LatestValueSubscription,
+             use_thread: bool):
+        # Solves run on their own worker - views keep accumulating while they do, and each published estimate is
+        # picked up as it lands. A new solve is submitted once the previous one has finished and the keyframes have
+        # gained `config.resolve_information_gain` since the last one was submitted.
+        solver_worker = CalibrationSolverWorker.create(calibration_estimate_topic=calibration_estimate_topic,
+                                                       shutdown_event=shutdown_event,
+                                                       use_thread=use_thread)
+        solver_worker.start()
         all_ready_events[-1].set()
         logger.trace(f"Aggregation processing node ready!")
         while not all([value.is_set() for value in all_ready_events.values()]):
@@ -81,6 +96,8 @@ class CalibrationAggregationProcessNode(AggregationNode):
                                                                                              input_queues.keys()}
 
         multi_camera_calibrator = MultiCameraCalibrator.from_camera_ids(camera_ids=list(input_queues.keys()))
+        keyframe_selector = multi_camera_calibrator.shared_view_accumulator.keyframe_selector
+        solve_scheduler = CalibrationSolveScheduler(resolve_information_gain=config.resolve_information_gain)
         try:
 
             while not shutdown_event.is_set():
@@ -103,16 +120,27 @@ class CalibrationAggregationProcessNode(AggregationNode):
                     raise ValueError(f"Frame numbers from camera nodes do not match! got {frame_numbers}")
                 multi_frame_number = frame_numbers.pop()
 
-                if not multi_camera_calibrator.has_calibration:
+                # Accumulate shared views (every frame is offered - the keyframe selector keeps the informative ones)
+                multi_camera_calibrator.receive_camera_node_output(multi_frame_number=multi_frame_number,
+                                                                   camera_node_output_by_camera=camera_node_incoming_data)
+
+                if not calibration_estimate_subscription.empty():
+                    calibration_estimate_message: CalibrationEstimateMessage = calibration_estimate_subscription.get()
+                    solve_scheduler.receive_result(calibration_estimate_message=calibration_estimate_message)
+                    if calibration_estimate_message.multi_camera_calibration_estimate is not None:
+                        logger.info(f"Calibration solve #{calibration_estimate_message.solve_number} "
+                                    f"({calibration_estimate_message.number_of_keyframes} keyframes) finished in "
+                                    f"{calibration_estimate_message.solve_duration_seconds:.3f}s")
+                        multi_camera_calibrator.multi_camera_calibration_estimate = calibration_estimate_message.multi_camera_calibration_estimate
+
+                if (solve_scheduler.should_submit(total_information_gain=keyframe_selector.total_information_gain)
+                        and multi_camera_calibrator.all_cameras_have_min_shared_views()):
+                    if not solver_worker.is_alive():
+                        raise RuntimeError("Calibration solver worker died")
+                    solver_worker.submit(multi_camera_calibrator=multi_camera_calibrator,
+                                         solve_number=solve_scheduler.mark_submitted(
+                                             total_information_gain=keyframe_selector.total_information_gain))
 
-                    if multi_frame_number % 5 == 0:
-                        # Accumulate shared views
-                        multi_camera_calibrator.receive_camera_node_output(multi_frame_number=multi_frame_number,
-                                                                           camera_node_output_by_camera=camera_node_incoming_data)
-                        if multi_camera_calibrator.all_cameras_have_min_shared_views() and not multi_camera_calibrator.has_calibration:
-                            multi_camera_calibrator.calibrate()
-                else:
-                    logger.info("Do triangulation and stuff with the calibration data")
                 radius = 1
                 frequency = 0.1
 
@@ -124,7 +152,7 @@ class CalibrationAggregationProcessNode(AggregationNode):
                     )
                     for camera_id in input_queues.keys()
                 }
-                if multi_camera_calibrator.has_calibration:
+                if multi_camera_calibrator.multi_camera_calibration_estimate is not None:
                     for camera_id, transform in multi_camera_calibrator.multi_camera_calibration_estimate.camera_transforms_by_camera_id.items():
                         points3d[f"camera-{camera_id}"] = transform.translation_vector.vector
 
@@ -144,3 +172,11 @@ class CalibrationAggregationProcessNode(AggregationNode):
         finally:
             logger.trace(f"Shutting down aggregation processing node")
             shutdown_event.set()
+            solver_worker.join()
+
+    def stop(self):
+        logger.debug(f"Stopping {self.__class__.__name__}")
+        self.shutdown_event.set()
+        self.process.join()
+        # (the worker only exits once its solver has, so nothing publishes to the topic anymore)
+        self.calibration_estimate_topic.close()
@@ -0,0 +1,157 @@
+import logging
+import multiprocessing
+import queue
+import time
+from dataclasses import dataclass
+from multiprocessing import Queue, Process
+from threading import Thread
+from typing import Type
+
+from pydantic import Field
+from skellycam.core.ipc.pubsub.pubsub_abcs import TopicMessageABC
+
+from freemocap.core.pipelines.calibration_pipeline.multi_camera_calibrator import MultiCameraCalibrator, \
+    MultiCameraCalibrationEstimate
+from freemocap.core.pubsub.pubsub_topics import ConflatingPubSubTopic
+
+logger = logging.getLogger(__name__)
+
+SOLVER_SNAPSHOT_POLL_TIMEOUT_SECONDS: float = 0.1
+
+
+class CalibrationEstimateMessage(TopicMessageABC):
+    """
+    The result of one background calibration solve.
+    """
+    solve_number: int = Field(
+        description="Which submitted snapshot this solve ran on (they're numbered from 1, in submission order).")
+    number_of_keyframes: int = Field(
+        description="How many multi-camera keyframes the snapshot held.")
+    solve_duration_seconds: float = Field(
+        description="Wall time the solve took.")
+    multi_camera_calibration_estimate: MultiCameraCalibrationEstimate | None = Field(
+        default=None,
+        description="The solved camera transforms, or None if the solve failed.")
+
+
+class CalibrationEstimateTopic(ConflatingPubSubTopic):
+    """
+    Topic for publishing the newest multi-camera calibration estimate - only the latest solve matters.
+    """
+    message_type: Type[CalibrationEstimateMessage] = CalibrationEstimateMessage
+
+
+@dataclass
+class CalibrationSolveScheduler:
+    """
+    Decides when the aggregation node submits the next solve: once the previous one has finished (i.e. its result has
+    come back on the topic), and the keyframes have gained `resolve_information_gain` since the last submission.
+    """
+    resolve_information_gain: float
+    submitted_solve_number: int = 0
+    finished_solve_number: int = 0
+    information_gain_at_last_solve: float = 0.0
+
+    @property
+    def solve_in_progress(self) -> bool:
+        return self.finished_solve_number != self.submitted_solve_number
+
+    def receive_result(self, calibration_estimate_message: CalibrationEstimateMessage) -> None:
+        self.finished_solve_number = calibration_estimate_message.solve_number
+
+    def should_submit(self, total_information_gain: float) -> bool:
+        return (not self.solve_in_progress
+                and total_information_gain - self.information_gain_at_last_solve >= self.resolve_information_gain)
+
+    def mark_submitted(self, total_information_gain: float) -> int:
+        """ Record a submission, returns its solve number """
+        self.submitted_solve_number += 1
+        self.information_gain_at_last_solve = total_information_gain
+        return self.submitted_solve_number
+
+
+@dataclass
+class CalibrationSolverWorker:
+    """
+    Runs the multi-camera calibration solves (intrinsics, camera pair transforms and bundle adjustment) off the
+    aggregation node's loop, so frame ingestion never waits on a solve.
+
+    The aggregation node submits a snapshot of its `MultiCameraCalibrator` (a deep copy, so it can keep accumulating
+    views into the original while the solve runs), and the worker publishes a `CalibrationEstimateMessage` on the
+    `CalibrationEstimateTopic` when the solve finishes - whether or not it succeeded, so the submitter knows it can
+    send the next one. Snapshots go through a single-slot queue: the submitter is expected to wait for each solve's
+    result before submitting another.
+    """
+    snapshot_queue: Queue
+    calibration_estimate_topic: CalibrationEstimateTopic
+    shutdown_event: multiprocessing.Event
+    worker: Thread | Process
+
+    @classmethod
+    def create(cls,
+               calibration_estimate_topic: CalibrationEstimateTopic,
+               shutdown_event: multiprocessing.Event,
+               use_thread: bool = False):
+        snapshot_queue = Queue(maxsize=1)
+        worker_kwargs = dict(snapshot_queue=snapshot_queue,
+                             calibration_estimate_topic=calibration_estimate_topic,
+                             shutdown_event=shutdown_event)
+        if use_thread:
+            worker = Thread(target=cls._run, name="CalibrationSolverWorker", kwargs=worker_kwargs, daemon=True)
+        else:
+            worker = Process(target=cls._run, name="CalibrationSolverWorker", kwargs=worker_kwargs, daemon=True)
+        return cls(snapshot_queue=snapshot_queue,
+                   calibration_estimate_topic=calibration_estimate_topic,
+                   shutdown_event=shutdown_event,
+                   worker=worker)
+
+    def start(self):
+        self.worker.start()
+
+    def is_alive(self) -> bool:
+        return self.worker.is_alive()
+
+    def join(self, timeout: float | None = None):
+        """ Wait for the worker to exit - set the shutdown event first """
+        self.worker.join(timeout=timeout)
+
+    def submit(self, multi_camera_calibrator: MultiCameraCalibrator, solve_number: int):
+        snapshot = multi_camera_calibrator.model_copy(deep=True,
+                                                      update={"multi_camera_calibration_estimate": None,
+                                                              "sparse_bundle_optimizer": None})
+        self.snapshot_queue.put_nowait((solve_number, snapshot))
+
+    @staticmethod
+    def _run(snapshot_queue: Queue,
+             calibration_estimate_topic: CalibrationEstimateTopic,
+             shutdown_event: multiprocessing.Event):
+        logger.trace("Calibration solver worker ready!")
+        try:
+            while not shutdown_event.is_set():
+                try:
+                    solve_number, multi_camera_calibrator = snapshot_queue.get(
+                        timeout=SOLVER_SNAPSHOT_POLL_TIMEOUT_SECONDS)
+                except queue.Empty:
+                    continue
+                calibration_estimate_topic.publish(CalibrationSolverWorker._solve(
+                    solve_number=solve_number,
+                    multi_camera_calibrator=multi_camera_calibrator))
+        finally:
+            logger.trace("Shutting down calibration solver worker")
+
+    @staticmethod
+    def _solve(solve_number: int, multi_camera_calibrator: MultiCameraCalibrator) -> CalibrationEstimateMessage:
+        number_of_keyframes = len(multi_camera_calibrator.shared_view_accumulator.multi_camera_target_views)
+        logger.debug(f"Starting calibration solve #{solve_number} on {number_of_keyframes} keyframes")
+        tik = time.perf_counter()
+        try:
+            multi_camera_calibrator.calibrate()
+        except Exception as e:
+            logger.exception(f"Calibration solve #{solve_number} failed", exc_info=e)
+        solve_duration_seconds = time.perf_counter() - tik
+        logger.debug(f"Calibration solve #{solve_number} finished in {solve_duration_seconds:.3f}s")
+        return CalibrationEstimateMessage(
+            solve_number=solve_number,
+            number_of_keyframes=number_of_keyframes,
+            solve_duration_seconds=solve_duration_seconds,
+            multi_camera_calibration_estimate=multi_camera_calibrator.multi_camera_calibration_estimate)
@@ -1,39 +1,21 @@
-import cv2
 import numpy as np
 from numpydantic import NDArray, Shape
 from pydantic import BaseModel, model_validator
-from scipy.spatial.transform import Rotation as R
 
 from freemocap.core.pipelines.calibration_pipeline.calibration_numpy_types import QuaternionArray, RotationVectorArray, \
     RotationMatrixArray, TranslationVectorArray, CameraExtrinsicsMatrix, CameraDistortionCoefficientsArray, \
     CameraMatrixArray
+from freemocap.core.pipelines.calibration_pipeline.se3_operations import invert_transforms, karcher_mean_rotation, \
+    mean_transform, quaternions_to_rotation_matrices, rotation_matrices_to_quaternions, rotation_matrices_to_vectors, \
+    rotation_vectors_to_matrices, rotation_vectors_to_quaternions, transforms_from_rotation_vectors
 
 
 def karcher_mean_quaternions(quaternions: list[QuaternionArray], tol=1e-9, max_iterations=100):
-    # Normalize the quaternions to ensure they are unit quaternions
-
-    quaternions = np.array([q / np.linalg.norm(q) for q in quaternions])
-
-    # Start with an initial guess (the first quaternion)
-    mean_quat = quaternions[0]
-
-    for _ in range(max_iterations):
-        # Compute the tangent vectors (logarithm map)
-        errors = [R.from_quat(q).inv() * R.from_quat(mean_quat) for q in quaternions]
-        errors = [e.as_rotvec() for e in errors]
-
-        # Compute the average error vector
-        mean_error = np.mean(errors, axis=0)
-
-        # Check for convergence
-        if np.linalg.norm(mean_error) < tol:
-            break
-
-        # Update the mean (exponential map)
-        mean_rot = R.from_rotvec(mean_error) * R.from_quat(mean_quat)
-        mean_quat = mean_rot.as_quat(canonical=False)
-
-    return mean_quat
+    mean_rotation = karcher_mean_rotation(
+        quaternions_to_rotation_matrices(np.array(quaternions)),
+        tolerance=tol,
+        max_iterations=max_iterations)
+    return rotation_matrices_to_quaternions(mean_rotation)[0]
 
 
 class RotationVector(BaseModel):
@@ -42,30 +24,20 @@ class RotationVector(BaseModel):
 
     @property
     def as_rotation_matrix(self) -> RotationMatrixArray:
-        return cv2.Rodrigues(self.vector)[0]
+        return rotation_vectors_to_matrices(self.vector)[0]
 
     @property
     def as_quaternion(self) -> QuaternionArray:
-        return R.from_matrix(self.as_rotation_matrix).as_quat(canonical=False)
+        return rotation_vectors_to_quaternions(self.vector)[0]
 
     @classmethod
     def mean_from_rotation_vectors(cls, rotation_vectors: list["RotationVector"]) -> "RotationVector":
         if not all([rv.reference_frame == rotation_vectors[0].reference_frame for rv in rotation_vectors]):
             raise ValueError("All rotation vectors must have the same reference frame!")
-        quaternions = [rv.as_quaternion for rv in rotation_vectors]
-
-        # Compute the Karcher mean of the quaternions
-        mean_quat = karcher_mean_quaternions(quaternions)
-
-        # Convert the mean quaternion back to a rotation vector
-        mean_rotation = R.from_quat(mean_quat)
-        mean_rotation_vector = mean_rotation.as_rotvec()
-
-        # Assuming all rotation vectors have the same reference frame
-        reference_frame = rotation_vectors[0].reference_frame
-
-        return cls(vector=mean_rotation_vector,
-                   reference_frame=reference_frame)
+        mean_rotation = karcher_mean_rotation(
+            rotation_vectors_to_matrices(np.array([rv.vector for rv in rotation_vectors])))
+        return cls(vector=rotation_matrices_to_vectors(mean_rotation)[0],
+                   reference_frame=rotation_vectors[0].reference_frame)
 
 
 class TranslationVector(BaseModel):
@@ -86,17 +58,18 @@ class TranslationVector(BaseModel):
 
 
 class TransformationMatrix(BaseModel):
+    """
+    A single rigid transform - a thin wrapper over a (4, 4) matrix, whose math lives in `se3_operations`
+    (use those directly for stacks of transforms).
+    """
     matrix: NDArray[Shape["4, 4"], np.float64]
     reference_frame: str
 
     @classmethod
     def from_extrinsics(cls, extrinsics_matrix: CameraExtrinsicsMatrix, reference_frame: str):
-        rotation_matrix = np.squeeze(extrinsics_matrix[:3, :3])
-        translation_vector = np.squeeze(extrinsics_matrix[:3, 3])
-        return cls.from_rotation_translation(rotation_vector=RotationVector(vector=np.squeeze(cv2.Rodrigues(rotation_matrix)[0]),
-                                                                            reference_frame=reference_frame),
-                                                 translation_vector=TranslationVector(vector=translation_vector,
-                                                                                    reference_frame=reference_frame))
+        transformation_matrix = np.eye(4)
+        transformation_matrix[:3, :] = np.squeeze(extrinsics_matrix)[:3, :]
+        return cls(matrix=transformation_matrix, reference_frame=reference_frame)
 
     @classmethod
     def from_rotation_translation(cls,
@@ -104,11 +77,9 @@ class TransformationMatrix(BaseModel):
                                   translation_vector: TranslationVector):
         if rotation_vector.reference_frame != translation_vector.reference_frame:
             raise ValueError("Rotation and translation vectors must be in the same reference frame")
-        rotation_matrix = rotation_vector.as_rotation_matrix
-        transformation_matrix = np.eye(4)
-        transformation_matrix[:3, :3] = rotation_matrix
-        transformation_matrix[:3, 3] = translation_vector.vector
-        return cls(matrix=transformation_matrix, reference_frame=translation_vector.reference_frame)
+        return cls(matrix=transforms_from_rotation_vectors(rotation_vectors=rotation_vector.vector,
+                                                                          translation_vectors=translation_vector.vector)[0],
+                   reference_frame=translation_vector.reference_frame)
 
     @classmethod
     def mean_from_transformation_matrices(cls, transformation_matrices: list[
@@ -116,15 +87,8 @@ class TransformationMatrix(BaseModel):
         if not all(
                 [tm.reference_frame == transformation_matrices[0].reference_frame for tm in transformation_matrices]):
             raise ValueError("All transformation matrices must have the same reference frame!")
-
-        rotation_vectors = [tm.rotation_vector for tm in transformation_matrices]
-        translation_vectors = [tm.translation_vector for tm in transformation_matrices]
-
-        mean_rotation_vector = RotationVector.mean_from_rotation_vectors(rotation_vectors)
-        mean_translation_vector = TranslationVector.mean_from_translation_vectors(translation_vectors)
-
-        return cls.from_rotation_translation(rotation_vector=mean_rotation_vector,
-                                             translation_vector=mean_translation_vector)
+        return cls(matrix=mean_transform(np.array([tm.matrix for tm in transformation_matrices])),
+                   reference_frame=transformation_matrices[0].reference_frame)
 
     @property
     def rotation_matrix(self) -> NDArray[Shape["3, 3"], np.float32]:
@@ -136,7 +100,8 @@ class TransformationMatrix(BaseModel):
 
     @property
     def rotation_vector(self) -> RotationVector:
-        return RotationVector(vector=np.squeeze(cv2.Rodrigues(self.rotation_matrix)[0]), reference_frame=self.reference_frame)
+        return RotationVector(vector=rotation_matrices_to_vectors(self.rotation_matrix)[0],
+                              reference_frame=self.reference_frame)
 
     @property
     def extrinsics_matrix(self) -> CameraExtrinsicsMatrix:
@@ -144,14 +109,8 @@ class TransformationMatrix(BaseModel):
 
 
     def get_inverse(self):
-        inverse_rotation_matrix = self.rotation_matrix.T
-        inverse_translation_vector = -inverse_rotation_matrix @ self.translation_vector.vector
-
-        inverse_matrix = np.eye(4)
-        inverse_matrix[:3, :3] = inverse_rotation_matrix
-        inverse_matrix[:3, 3] = inverse_translation_vector
-
-        return TransformationMatrix(matrix=inverse_matrix, reference_frame=self.reference_frame)
+        return TransformationMatrix(matrix=invert_transforms(self.matrix)[0],
+                                    reference_frame=self.reference_frame)
 
     def __matmul__(self, other: "TransformationMatrix") -> "TransformationMatrix":
         if not isinstance(other, TransformationMatrix):
@@ -0,0 +1,154 @@
+from typing import Hashable
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field
+
+KeyframeKey = int
+# feature -> weight, e.g. {("coverage", camera_id, row, column): 1.0} - features are counted across keyframes
+KeyframeFeatures = dict[Hashable, float]
+
+DEFAULT_MAX_KEYFRAMES: int = 100
+DEFAULT_MIN_INFORMATION_GAIN: float = 1.0
+
+# Image-plane coverage: one feature per grid cell the board's corners land in
+COVERAGE_GRID_SHAPE: tuple[int, int] = (6, 8)  # rows, columns
+COVERAGE_WEIGHT: float = 1.0
+# Board pose: one feature per (apparent size, tilt, tilt direction) bin
+APPARENT_SIZE_BIN_EDGES: tuple[float, ...] = (0.15, 0.3, 0.5)  # board diagonal / image diagonal
+TILT_BIN_EDGES_DEGREES: tuple[float, ...] = (15.0, 35.0)
+TILT_DIRECTION_BINS: int = 4
+POSE_WEIGHT: float = 4.0
+# Multi-camera views: one feature per pair of cameras that saw the board together
+CAMERA_PAIR_WEIGHT: float = 4.0
+MIN_CORNERS_FOR_POSE: int = 4
+
+
+class KeyframeDecision(BaseModel):
+    accepted: bool
+    evicted_key: KeyframeKey | None = None
+
+
+class KeyframeSelector(BaseModel):
+    """
+    Keeps a bounded set of the most informative calibration views, so the calibration solves cost the same however long
+    the board gets waved around.
+
+    Each candidate view is described by a set of weighted features (see `board_view_features` and
+    `camera_pair_features`), and scored by what it would add to the features the kept keyframes already have: a feature
+    with weight `w` that `n` keyframes already have is worth `w / (1 + n)**2`, so the first view of an image region,
+    board pose or camera pair scores high and the hundredth scores next to nothing.
+
+    A candidate is accepted if it scores at least `min_information_gain`. Once `max_keyframes` are kept, it must also
+    beat the least valuable keyframe (scored the same way, against everything but itself), which it replaces.
+
+    `total_information_gain` sums the scores of every accepted candidate - it only ever grows, so the calibration can
+    tell how much has been learned since its last solve.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    max_keyframes: int = DEFAULT_MAX_KEYFRAMES
+    min_information_gain: float = DEFAULT_MIN_INFORMATION_GAIN
+    feature_counts: dict[Hashable, int] = Field(default_factory=dict)
+    keyframe_features: dict[KeyframeKey, KeyframeFeatures] = Field(default_factory=dict)
+    total_information_gain: float = 0.0
+
+    @property
+    def number_of_keyframes(self) -> int:
+        return len(self.keyframe_features)
+
+    def score(self, features: KeyframeFeatures) -> float:
+        return sum(weight / (1 + self.feature_counts.get(feature, 0)) ** 2 for feature, weight in features.items())
+
+    def offer(self, key: KeyframeKey, features: KeyframeFeatures) -> KeyframeDecision:
+        if key in self.keyframe_features:
+            return KeyframeDecision(accepted=False)
+        score = self.score(features)
+        if score < self.min_information_gain:
+            return KeyframeDecision(accepted=False)
+
+        evicted_key = None
+        if self.number_of_keyframes >= self.max_keyframes:
+            evicted_key, evicted_value = min(((kept_key, self._keyframe_value(kept_features))
+                                              for kept_key, kept_features in self.keyframe_features.items()),
+                                             key=lambda key_value: key_value[1])
+            if score <= evicted_value:
+                return KeyframeDecision(accepted=False)
+            self.remove(evicted_key)
+
+        self.keyframe_features[key] = features
+        self.total_information_gain += score
+        for feature in features:
+            self.feature_counts[feature] = self.feature_counts.get(feature, 0) + 1
+        return KeyframeDecision(accepted=True, evicted_key=evicted_key)
+
+    def remove(self, key: KeyframeKey) -> None:
+        for feature in self.keyframe_features.pop(key):
+            self.feature_counts[feature] -= 1
+            if self.feature_counts[feature] == 0:
+                del self.feature_counts[feature]
+
+    def _keyframe_value(self, features: KeyframeFeatures) -> float:
+        # (what this keyframe would score if it were offered now, i.e. against every other keyframe's features)
+        return sum(weight / self.feature_counts[feature] ** 2 for feature, weight in features.items())
+
+
+def board_view_features(camera_id: Hashable,
+                        image_points: np.ndarray,
+                        object_points: np.ndarray,
+                        image_size: tuple[int, ...]) -> KeyframeFeatures:
+    """
+    Features of one camera's view of the board: the image-plane grid cells its corners cover, and a coarse bin of the
+    board's pose.
+
+    The pose is estimated without intrinsics, from the affine map between the board plane and the image - its
+    singular values give the board's apparent size (a proxy for distance) and foreshortening (the ratio of the singular
+    values is roughly the cosine of the board's tilt), and the direction of the foreshortened axis gives the tilt's
+    direction in the image.
+
+    :param image_points: (corners, 2) pixel coordinates, NaN for corners that weren't detected
+    :param object_points: (corners, 3) the same corners in board coordinates (the board is the z=0 plane)
+    :param image_size: (width, height)
+    """
+    image_points = np.asarray(image_points, dtype=np.float64).reshape(-1, 2)
+    detected = ~np.isnan(image_points).any(axis=1)
+    image_points = image_points[detected]
+    features: KeyframeFeatures = {}
+    if len(image_points) == 0:
+        return features
+
+    width, height = image_size[0], image_size[1]
+    rows = np.clip((image_points[:, 1] / height * COVERAGE_GRID_SHAPE[0]).astype(int), 0, COVERAGE_GRID_SHAPE[0] - 1)
+    columns = np.clip((image_points[:, 0] / width * COVERAGE_GRID_SHAPE[1]).astype(int), 0, COVERAGE_GRID_SHAPE[1] - 1)
+    for row, column in set(zip(rows.tolist(), columns.tolist())):
+        features[("coverage", camera_id, row, column)] = COVERAGE_WEIGHT
+
+    if len(image_points) < MIN_CORNERS_FOR_POSE:
+        return features
+    board_points = np.asarray(object_points, dtype=np.float64).reshape(-1, 3)[detected, :2]
+    # image = board @ affine[:2] + affine[2]
+    affine = np.linalg.lstsq(np.hstack([board_points, np.ones((len(board_points), 1))]), image_points, rcond=None)[0]
+    left_singular_vectors, singular_values, _ = np.linalg.svd(affine[:2].T)
+    if singular_values[0] <= 0:
+        return features
+    board_diagonal = np.linalg.norm(np.ptp(board_points, axis=0))
+    apparent_size = np.sqrt(singular_values[0] * singular_values[1]) * board_diagonal / np.hypot(width, height)
+    tilt_degrees = np.degrees(np.arccos(np.clip(singular_values[1] / singular_values[0], 0.0, 1.0)))
+    tilt_bin = int(np.searchsorted(TILT_BIN_EDGES_DEGREES, tilt_degrees))
+    tilt_direction_bin = 0
+    if tilt_bin > 0:
+        # (the foreshortened axis is an undirected line in the image, so its angle is taken mod 180 degrees)
+        foreshortened_axis = left_singular_vectors[:, 1]
+        tilt_direction = np.arctan2(foreshortened_axis[1], foreshortened_axis[0]) % np.pi
+        tilt_direction_bin = int(tilt_direction / np.pi * TILT_DIRECTION_BINS) % TILT_DIRECTION_BINS
+    features[("pose",
+              camera_id,
+              int(np.searchsorted(APPARENT_SIZE_BIN_EDGES, apparent_size)),
+              tilt_bin,
+              tilt_direction_bin)] = POSE_WEIGHT
+    return features
+
+
+def camera_pair_features(camera_ids: list[Hashable]) -> KeyframeFeatures:
+    """ One feature per pair of cameras that saw the board together """
+    return {("camera_pair", base_camera_id, other_camera_id): CAMERA_PAIR_WEIGHT
+            for index, base_camera_id in enumerate(camera_ids)
+            for other_camera_id in camera_ids[index + 1:]}
@@ -6,15 +6,17 @@ from numba import jit
 from pydantic import BaseModel
 from scipy import optimize
 from scipy.linalg import inv as inverse
-from scipy.sparse import dok_matrix
+from scipy.sparse import csr_matrix
 from skellycam import CameraId
-from tqdm import trange
 
 from freemocap.old.core_processes.capture_volume_calibration.anipose_camera_calibration.run_anipose_calibration_algorithm import \
-    anipose_triangulate_simple, remap_ids
+    remap_ids
+from freemocap.core.pipelines.batched_triangulation import triangulate_batched
+from freemocap.core.pipelines.calibration_pipeline.calculate_sparse_jacobian import calculate_jacobian_sparsity
 from freemocap.core.pipelines.calibration_pipeline.calibration_numpy_types import ImagePoints2D, \
     ObjectPoints3D, ExtrinsicsParameters, IntrinsicsParameters, ReprojectionErrorByPoint, ImagePoints2DByCamera, PointIds, \
     RotationVectorsByCamera, TranslationVectorsByCamera
+from freemocap.core.pipelines.calibration_pipeline.reprojection_error import calculate_reprojection_errors
 from freemocap.core.pipelines.calibration_pipeline.multi_camera_calibration.calibration_utilities import \
     calculate_error_bounds, transform_points, construct_camera_extrinsics_matrix, \
     get_rotation_and_translation_vector_from_extrinsics_matrix, get_error_dict
@@ -268,10 +270,15 @@ class MultiCameraCalibrationOptimizer(BaseModel):
             raise ValueError("shapes of 2D and 3D points are not consistent: " "2D={}, 3D={}".format(points_2d.shape,
                                                                                                      points_3d.shape))
 
-        errors = np.empty((n_cams, n_points, 2))
-
-        for camera_number, cam in enumerate(self.camera_calibration_estimates.values()):
-            errors[camera_number] = cam.single_camera_reprojection_error(points_3d, points_2d[camera_number])
+        cameras = list(self.camera_calibration_estimates.values())
+        # (the kernel's errors are observed - projected, same as `single_camera_reprojection_error`)
+        errors = calculate_reprojection_errors(
+            image_points=points_2d,
+            object_points=points_3d,
+            rotation_vectors=np.array([camera.rotation_vector for camera in cameras]),
+            translation_vectors=np.array([camera.translation_vector for camera in cameras]),
+            camera_matrices=np.array([camera.camera_matrix for camera in cameras]),
+            distortion_coefficients=[camera.distortion_coefficients for camera in cameras])
 
         if mean:
             errors_norm = np.linalg.norm(errors, axis=2)
@@ -329,24 +336,10 @@ class MultiCameraCalibrationOptimizer(BaseModel):
                 new_points[camera_number] = camera.undistort_points(sub)
             points2d = new_points
 
-        n_cams, n_points, _ = points2d.shape
-
-        triangulated_points3d = np.empty((n_points, 3))
-        triangulated_points3d[:] = np.nan
-
-        camera_matricies = np.array([camera.extrinsics_matrix for camera in self.camera_calibration_estimates.values()])
-
-        if progress:
-            points_iterator = trange(n_points, ncols=70)
-        else:
-            points_iterator = range(n_points)
-
-        for point_index in points_iterator:
-            point_xy = points2d[:, point_index, :]
-            point_xy_no_nans = ~np.isnan(point_xy[:, 0])
-            if np.sum(point_xy_no_nans) >= 2:
-                triangulated_points3d[point_index] = anipose_triangulate_simple(point_xy[point_xy_no_nans],
-                                                                                camera_matricies[point_xy_no_nans])
+        # ([R|t; 0 0 0 1] - the DLT only uses the projection rows)
+        camera_matricies = np.array([camera.extrinsics_matrix for camera in self.camera_calibration_estimates.values()])[:, :3]
+        # (every point at once - `progress` is a no-op now there's no per-point loop to report on)
+        triangulated_points3d = triangulate_batched(points2d=points2d, projection_matrices=camera_matricies)
 
         if one_point:
             triangulated_points3d = triangulated_points3d[0]
@@ -477,94 +470,14 @@ class MultiCameraCalibrationOptimizer(BaseModel):
 
     def _calculate_bundle_adjustment_jacobian_sparsity(self,
                                                        calibration_input_data: MultiCameraCalibrationInputData,
-                                                       number_of_camear_parameters: int) -> dok_matrix:
+                                                       number_of_camear_parameters: int) -> csr_matrix:
         """Given an CxNx2 array of 2D points,
         where N is the number of points and C is the number of cameras,
         compute the sparsity structure of the jacobian for bundle adjustment"""
-
-        points2d = calibration_input_data.pixel_points2d
-        point_indices = np.zeros(points2d.shape, dtype="int32")
-        cam_indices = np.zeros(points2d.shape, dtype="int32")
-
-        for i in range(points2d.shape[1]):
-            point_indices[:, i] = i
-
-        for j in range(points2d.shape[0]):
-            cam_indices[j] = j
-
-        good = ~np.isnan(points2d)
-
-        def remap_ids(ids: np.ndarray | list[int]) -> np.ndarray:
-            """
-            Remap the unique identifiers in the input array to a consecutive range starting from zero.
-
-            :param ids: An array-like structure containing the original identifiers.
-            :return: A NumPy array with the identifiers remapped to a consecutive range.
-            """
-            ids_array = np.asarray(ids)
-            unique_ids, remapped_ids = np.unique(ids_array, return_inverse=True)
-            return remapped_ids
-
-        ids = remap_ids(calibration_input_data.ids)
-
-
-
-        n_boards = int(np.max(ids)) + 1
-        total_board_params = n_boards * (3 + 3)  # rotation_vectors + translation_vectors
-
-        n_cams = points2d.shape[0]
-        n_points = points2d.shape[1]
-        total_params_reproj = n_cams * number_of_camear_parameters + n_points * 3
-        n_params = total_params_reproj + total_board_params
-
-        n_good_values = np.sum(good)
-
-        n_errors = n_good_values + n_points * 3
-
-        A_sparse = dok_matrix((n_errors, n_params), dtype="int16")
-
-        cam_indices_good = cam_indices[good]
-        point_indices_good = point_indices[good]
-
-        # -- reprojection error --
-        ix = np.arange(n_good_values)
-
-        ## update camera params based on point error
-        for i in range(number_of_camear_parameters):
-            A_sparse[ix, cam_indices_good * number_of_camear_parameters + i] = 1
-
-        ## update point position based on point error
-        for i in range(3):
-            A_sparse[ix, n_cams * number_of_camear_parameters + point_indices_good * 3 + i] = 1
-
-        # -- match for the object points--
-
-        point_ix = np.arange(n_points)
-
-        ## update all the camera parameters
-        # A_sparse[n_good_values:n_good_values+n_points*3,
-        #          0:n_cams*n_cam_params] = 1
-
-        ## update board rotation and translation based on error from expected
-        for i in range(3):
-            for j in range(3):
-                A_sparse[
-                    n_good_values + point_ix * 3 + i,
-                    total_params_reproj + ids * 3 + j,
-                ] = 1
-                A_sparse[
-                    n_good_values + point_ix * 3 + i,
-                    total_params_reproj + n_boards * 3 + ids * 3 + j,
-                ] = 1
-
-        ## update point position based on error from expected
-        for i in range(3):
-            A_sparse[
-                n_good_values + point_ix * 3 + i,
-                n_cams * number_of_camear_parameters + point_ix * 3 + i,
-            ] = 1
-
-        return A_sparse
+        return calculate_jacobian_sparsity(pixel_points2d=calibration_input_data.pixel_points2d,
+                                           ids=calibration_input_data.ids,
+                                           num_camera_params=number_of_camear_parameters,
+                                           per_coordinate_residuals=True)
 
     def _initalize_bundle_adjust_parameters(self, calibration_input_data: MultiCameraCalibrationInputData):
         """Given an CxNx2 array of 2D points,
@@ -1,4 +1,7 @@
 import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 from pydantic import BaseModel
@@ -8,7 +11,8 @@ from freemocap.core.pipelines.calibration_pipeline.calibration_camera_node_outpu
     CalibrationCameraNodeOutputData
 from freemocap.core.pipelines.calibration_pipeline.camera_math_models import TransformationMatrix
 from freemocap.core.pipelines.calibration_pipeline.least_squares_optimizer import SparseBundleOptimizer
-from freemocap.core.pipelines.calibration_pipeline.shared_view_accumulator import SharedViewAccumulator
+from freemocap.core.pipelines.calibration_pipeline.se3_operations import mean_transform, relative_transforms
+from freemocap.core.pipelines.calibration_pipeline.shared_view_accumulator import SharedViewAccumulator, CameraPair
 from freemocap.core.pipelines.calibration_pipeline.single_camera_calibrator import CameraIntrinsicsEstimate, \
     SingleCameraCalibrator
 
@@ -85,23 +89,43 @@ class MultiCameraCalibrator(BaseModel):
             f" with principal camera: {self.principal_camera_id} and "
             f"{self.shared_view_accumulator.get_shared_view_count_per_camera()} shared views")
 
-        for camera_pair, shared_views in self.shared_view_accumulator.target_views_by_camera_pair.items():
-            logger.trace(f"Camera pair ({camera_pair}) has {len(shared_views)} shared views")
-            for view in shared_views:
-                camera_id = view.camera_pair.base_camera_id
-                other_camera_id = view.camera_pair.other_camera_id
-                self.single_camera_calibrators[camera_id].add_observation(
-                    observation=view.camera_node_output_by_camera[camera_id].charuco_observation)
-                self.single_camera_calibrators[other_camera_id].add_observation(
-                    observation=view.camera_node_output_by_camera[other_camera_id].charuco_observation)
+        for camera_pair in self.shared_view_accumulator.camera_pairs:
+            logger.trace(f"Camera pair ({camera_pair}) has "
+                         f"{self.shared_view_accumulator.get_camera_pair_view_count(camera_pair)} shared views")
+        for camera_id, charuco_observations in self.shared_view_accumulator.charuco_observations_by_camera.items():
+            for charuco_observation in charuco_observations:
+                self.single_camera_calibrators[camera_id].add_observation(observation=charuco_observation)
 
-        [calibrator.update_calibration_estimate() for calibrator in self.single_camera_calibrators.values()]
+        self._update_single_camera_calibration_estimates()
 
         return self.run_multi_camera_optimization()
         # logger.success(
         #     f"Multi-camera calibration complete! \n {self.multi_camera_calibration_estimate.model_dump_json(indent=2)}")
         # return self.multi_camera_calibration_estimate
 
+    def _update_single_camera_calibration_estimates(self):
+        """
+        Solve each camera's intrinsics (and the reprojection errors that follow) concurrently. Every solve only touches
+        its own `SingleCameraCalibrator`, and `cv2.calibrateCamera`/`cv2.projectPoints` release the GIL, so a thread
+        pool gets the cores without copying the calibrators into other processes. `map` hands results (and the first
+        failure, if any) back in camera order, so the outcome doesn't depend on which solve finishes first.
+        """
+
+        def update_calibration_estimate(calibrator: SingleCameraCalibrator) -> float:
+            tik = time.perf_counter()
+            calibrator.update_calibration_estimate()
+            return time.perf_counter() - tik
+
+        calibrators = list(self.single_camera_calibrators.values())
+        tik = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, min(len(calibrators), os.cpu_count() or 1)),
+                                thread_name_prefix="SingleCameraCalibrator") as executor:
+            solve_durations = list(executor.map(update_calibration_estimate, calibrators))
+        wall_clock_duration = time.perf_counter() - tik
+        logger.info(f"Estimated intrinsics for {len(calibrators)} cameras in {wall_clock_duration:.3f}s "
+                    f"({sum(solve_durations):.3f}s of per-camera solves, "
+                    f"{sum(solve_durations) / max(wall_clock_duration, 1e-9):.1f}x speedup)")
+
     def run_multi_camera_optimization(self) -> MultiCameraCalibrationEstimate:
         # Step 1: Calculate secondary camera transforms for each camera pair
         camera_pair_secondary_camera_transform_estimates = self._calculate_camera_pair_transforms()
@@ -121,17 +145,15 @@ class MultiCameraCalibrator(BaseModel):
                                                                    multi_camera_target_views=self.shared_view_accumulator.multi_camera_target_views,
                                                                    image_sizes={camera_id: calibrator.image_size for
                                                                                 camera_id, calibrator in
-                                                                                self.single_camera_calibrators.items()}
+                                                                                self.single_camera_calibrators.items()},
+                                                                   charuco_corners_in_object_coordinates=self.single_camera_calibrators[
+                                                                       self.principal_camera_id].all_charuco_corners_in_object_coordinates,
                                                                    )
-        optimization_result = self.sparse_bundle_optimizer.optimize()
-        camera_transforms = {}
-        for camera_index, camera_id in enumerate(self.single_camera_calibrators.keys()):
-            # split the 1d vector by camera based on `self.number_of_parameters_per_camera`
-            starting_index = camera_index * self.sparse_bundle_optimizer.number_of_parameters_per_camera
-            ending_index = (camera_index + 1) * self.number_of_parameters_per_camera
-            camera_transforms[camera_id] = TransformationMatrix.from_extrinsics(
-                extrinsics_matrix=np.array(optimization_result[starting_index:ending_index]).reshape(3, 4),
-                reference_frame=f"camera-{self.principal_camera_id}")
+        camera_extrinsics_by_camera_id = self.sparse_bundle_optimizer.optimize()
+        camera_transforms = {camera_id: TransformationMatrix.from_extrinsics(
+            extrinsics_matrix=extrinsics_matrix,
+            reference_frame=f"camera-{self.principal_camera_id}")
+            for camera_id, extrinsics_matrix in camera_extrinsics_by_camera_id.items()}
         self.multi_camera_calibration_estimate = MultiCameraCalibrationEstimate(
             principal_camera_id=self.principal_camera_id,
             camera_transforms_by_camera_id=camera_transforms
@@ -139,61 +161,58 @@ class MultiCameraCalibrator(BaseModel):
 
     def _calculate_camera_to_principal_camera_transforms(self, camera_pair_secondary_camera_transform_estimates) -> \
             dict[CameraIdString, TransformationMatrix]:
+        """
+        Chain the camera pair transforms (base camera frame -> other camera frame) out from the principal camera, to
+        get each camera's extrinsics (principal camera frame -> that camera's frame)
+        """
         transform_to_principal_camera_by_camera = {self.principal_camera_id: TransformationMatrix(matrix=np.eye(4),
-                                                                                                  reference_frame=f"camera {self.principal_camera_id}")}
+                                                                                                  reference_frame=f"camera-{self.principal_camera_id}")}
         transform_to_principal_camera_by_camera.update(
             {camera_id: None for camera_id in self.single_camera_calibrators.keys()
              if camera_id != self.principal_camera_id})
         # Use the camera pairs to determine other camera transforms relative to the principal camera
         while any([transform is None for transform in transform_to_principal_camera_by_camera.values()]):
-            logger.debug(
-                f"Calculating camera transforms for cameras: {[camera_id for camera_id, transform in transform_to_principal_camera_by_camera.items() if transform is None]}")
+            unresolved_camera_ids = [camera_id for camera_id, transform in transform_to_principal_camera_by_camera.items()
+                                     if transform is None]
+            logger.debug(f"Calculating camera transforms for cameras: {unresolved_camera_ids}")
             for camera_pair, transform in camera_pair_secondary_camera_transform_estimates.items():
-                if transform_to_principal_camera_by_camera[camera_pair.other_camera_id] is not None:
-                    continue
-                if camera_pair.base_camera_id == self.principal_camera_id:
-                    # Directly use the transform if base is principal camera
-                    transform_to_principal_camera_by_camera[camera_pair.other_camera_id] = transform
-                elif camera_pair.other_camera_id == self.principal_camera_id:
-                    # Transform is inverse if other is principal camera
-                    transform_to_principal_camera_by_camera[camera_pair.base_camera_id] = transform.get_inverse()
-                else:
-                    # If neither camera in the pair is the principal camera, we need to transform the other camera's transform
-                    if camera_pair.base_camera_id in transform_to_principal_camera_by_camera:
-                        base_to_principal = transform_to_principal_camera_by_camera[camera_pair.base_camera_id]
-                        transform_to_principal_camera_by_camera[
-                            camera_pair.other_camera_id] = base_to_principal @ transform
-                    elif camera_pair.other_camera_id in transform_to_principal_camera_by_camera:
-                        other_to_principal = transform_to_principal_camera_by_camera[camera_pair.other_camera_id]
-                        transform_to_principal_camera_by_camera[
-                            camera_pair.base_camera_id] = other_to_principal @ transform.get_inverse()
+                base_to_principal = transform_to_principal_camera_by_camera[camera_pair.base_camera_id]
+                other_to_principal = transform_to_principal_camera_by_camera[camera_pair.other_camera_id]
+                if base_to_principal is not None and other_to_principal is None:
+                    transform_to_principal_camera_by_camera[camera_pair.other_camera_id] = transform @ base_to_principal
+                elif other_to_principal is not None and base_to_principal is None:
+                    transform_to_principal_camera_by_camera[
+                        camera_pair.base_camera_id] = transform.get_inverse() @ other_to_principal
+            if all(transform_to_principal_camera_by_camera[camera_id] is None for camera_id in unresolved_camera_ids):
+                raise ValueError(f"Cameras {unresolved_camera_ids} share no calibrated views with the cameras "
+                                 f"connected to the principal camera ({self.principal_camera_id})")
         logger.debug(
             f"Camera ID to principal camera transform estimates: {transform_to_principal_camera_by_camera}")
         return transform_to_principal_camera_by_camera
 
-    def _calculate_camera_pair_transforms(self):
+    def _calculate_camera_pair_transforms(self) -> dict[CameraPair, TransformationMatrix]:
+        """
+        Each camera pair's relative pose (the transform from the base camera's frame to the other camera's), as the
+        mean over the views both cameras calibrated with of other board pose @ base board pose^-1 - views are matched
+        up by frame number, and each pair is one batched call into `se3_operations`.
+        """
+        charuco_transforms_by_camera = {camera_id: calibrator.charuco_transforms
+                                        for camera_id, calibrator in self.single_camera_calibrators.items()}
         camera_pair_secondary_camera_transform_estimates = {}
         for camera_pair in self.shared_view_accumulator.camera_pairs:
-            base_camera_id = camera_pair.base_camera_id
-            other_camera_id = camera_pair.other_camera_id
-
-            charuco_transforms_in_base_camera_coordinates = self.single_camera_calibrators[
-                base_camera_id].charuco_transformation_matrices
-            charuco_transforms_in_other_camera_coordinates = self.single_camera_calibrators[
-                other_camera_id].charuco_transformation_matrices
-
-            other_camera_to_base_camera_transforms = []
-            for base_camera_transform, other_camera_transform in zip(charuco_transforms_in_base_camera_coordinates,
-                                                                     charuco_transforms_in_other_camera_coordinates):
-                base_camera_to_board_transform = base_camera_transform.get_inverse()
-                other_camera_to_base_camera_transforms.append(base_camera_to_board_transform @ other_camera_transform)
-
-            mean_transform = TransformationMatrix.mean_from_transformation_matrices(
-                other_camera_to_base_camera_transforms)
-            camera_pair_secondary_camera_transform_estimates[camera_pair] = mean_transform
+            base_frame_numbers, base_charuco_transforms = charuco_transforms_by_camera[camera_pair.base_camera_id]
+            other_frame_numbers, other_charuco_transforms = charuco_transforms_by_camera[camera_pair.other_camera_id]
+            _, base_view_indices, other_view_indices = np.intersect1d(base_frame_numbers, other_frame_numbers,
+                                                                      assume_unique=True, return_indices=True)
+            if len(base_view_indices) == 0:
+                logger.warning(f"Camera pair ({camera_pair}) has no calibrated views in common - skipping")
+                continue
+            camera_pair_secondary_camera_transform_estimates[camera_pair] = TransformationMatrix(
+                matrix=mean_transform(relative_transforms(base_transforms=base_charuco_transforms[base_view_indices],
+                                                          other_transforms=other_charuco_transforms[other_view_indices])),
+                reference_frame=f"camera-{camera_pair.base_camera_id}")
         return camera_pair_secondary_camera_transform_estimates
 
-
 if __name__ == "__main__":
     import pickle
     from pathlib import Path
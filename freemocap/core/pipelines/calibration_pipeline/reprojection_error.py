@@ -0,0 +1,121 @@
+import warnings
+
+import numpy as np
+
+from freemocap.core.pipelines.calibration_pipeline.se3_operations import rotation_vectors_to_matrices
+
+# k1, k2, p1, p2, k3, k4, k5, k6, s1, s2, s3, s4, tau_x, tau_y - OpenCV's longest distortion model, every shorter one
+# is the same model with the remaining coefficients at zero
+NUMBER_OF_DISTORTION_COEFFICIENTS: int = 14
+
+
+def project_points(object_points: np.ndarray,
+                   rotation_vectors: np.ndarray,
+                   translation_vectors: np.ndarray,
+                   camera_matrices: np.ndarray,
+                   distortion_coefficients: np.ndarray) -> np.ndarray:
+    """
+    `cv2.projectPoints` for a whole stack of poses at once - every camera of a rig, or every view of one camera.
+
+    :param object_points: (poses, points, 3), or (points, 3) to project the same points with every pose
+    :param rotation_vectors: (poses, 3) world -> camera rotations
+    :param translation_vectors: (poses, 3) world -> camera translations
+    :param camera_matrices: (poses, 3, 3), or (3, 3) for one camera
+    :param distortion_coefficients: (poses, 4|5|8|12|14), a list of each pose's coefficients (which may differ in
+                                    length), or a single set of coefficients for one camera
+    :return: (poses, points, 2) pixel coordinates, NaN wherever the object point was NaN
+    """
+    rotation_vectors = np.asarray(rotation_vectors, dtype=np.float64).reshape(-1, 3)
+    # (poses, points, 3) - points @ R.T broadcasts a single set of points against every pose
+    points_in_cameras = (np.asarray(object_points, dtype=np.float64) @
+                         np.swapaxes(rotation_vectors_to_matrices(rotation_vectors), 1, 2) +
+                         np.asarray(translation_vectors, dtype=np.float64).reshape(-1, 1, 3))
+    x = points_in_cameras[..., 0] / points_in_cameras[..., 2]
+    y = points_in_cameras[..., 1] / points_in_cameras[..., 2]
+
+    (k1, k2, p1, p2, k3, k4, k5, k6,
+     s1, s2, s3, s4, tau_x, tau_y) = _pad_distortion_coefficients(distortion_coefficients)[..., np.newaxis]
+    r2 = x * x + y * y
+    r4 = r2 * r2
+    r6 = r4 * r2
+    radial = (1 + k1 * r2 + k2 * r4 + k3 * r6) / (1 + k4 * r2 + k5 * r4 + k6 * r6)
+    distorted_x = x * radial + 2 * p1 * x * y + p2 * (r2 + 2 * x * x) + s1 * r2 + s2 * r4
+    distorted_y = y * radial + p1 * (r2 + 2 * y * y) + 2 * p2 * x * y + s3 * r2 + s4 * r4
+    if np.any(tau_x) or np.any(tau_y):
+        distorted_x, distorted_y = _tilt_sensor(distorted_x, distorted_y, tau_x, tau_y)
+
+    camera_matrices = np.asarray(camera_matrices, dtype=np.float64).reshape(-1, 3, 3)
+    return np.stack([camera_matrices[:, 0, 0, np.newaxis] * distorted_x + camera_matrices[:, 0, 2, np.newaxis],
+                     camera_matrices[:, 1, 1, np.newaxis] * distorted_y + camera_matrices[:, 1, 2, np.newaxis]],
+                    axis=-1)
+
+
+def calculate_reprojection_errors(image_points: np.ndarray,
+                                  object_points: np.ndarray,
+                                  rotation_vectors: np.ndarray,
+                                  translation_vectors: np.ndarray,
+                                  camera_matrices: np.ndarray,
+                                  distortion_coefficients: np.ndarray) -> np.ndarray:
+    """
+    Observed minus projected pixel coordinates, for a stack of poses (see `project_points` for the shapes).
+
+    :param image_points: (poses, points, 2) observed pixel coordinates, NaN where a point wasn't seen
+    :return: (poses, points, 2) signed errors - NaN wherever the image point or object point was NaN, so ragged views
+             (see `pad_points`) and missed points drop out of the `nan_mean` reductions
+    """
+    return np.asarray(image_points, dtype=np.float64) - project_points(object_points=object_points,
+                                                                       rotation_vectors=rotation_vectors,
+                                                                       translation_vectors=translation_vectors,
+                                                                       camera_matrices=camera_matrices,
+                                                                       distortion_coefficients=distortion_coefficients)
+
+
+def nan_mean(values: np.ndarray, axis: int | tuple[int, ...] | None = None) -> np.ndarray:
+    """ `np.nanmean`, without the warning for slices that are all NaN (they just come out NaN) """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        return np.nanmean(values, axis=axis)
+
+
+def pad_points(points: list[np.ndarray], number_of_points: int | None = None) -> np.ndarray:
+    """
+    Stack a ragged list of (n_i, dims) point arrays into one (len(points), max n_i, dims) array, NaN padded
+    """
+    points = [np.asarray(view_points, dtype=np.float64).reshape(len(view_points), -1) for view_points in points]
+    if number_of_points is None:
+        number_of_points = max([len(view_points) for view_points in points], default=0)
+    dims = points[0].shape[1] if points else 0
+    padded = np.full((len(points), number_of_points, dims), np.nan)
+    for index, view_points in enumerate(points):
+        padded[index, :len(view_points)] = view_points
+    return padded
+
+
+def _pad_distortion_coefficients(distortion_coefficients: np.ndarray | list[np.ndarray]) -> np.ndarray:
+    """ (poses, D), (D,) or a list of (D_i,) -> (14, poses), zero padded """
+    if isinstance(distortion_coefficients, np.ndarray) and distortion_coefficients.ndim == 1:
+        distortion_coefficients = [distortion_coefficients]
+    padded = np.zeros((len(distortion_coefficients), NUMBER_OF_DISTORTION_COEFFICIENTS))
+    for index, coefficients in enumerate(distortion_coefficients):
+        coefficients = np.ravel(coefficients)
+        padded[index, :len(coefficients)] = coefficients
+    return padded.T
+
+
+def _tilt_sensor(x: np.ndarray, y: np.ndarray, tau_x: np.ndarray, tau_y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """ OpenCV's tilted sensor model (`computeTiltProjectionMatrix`), for (poses, 1) tilt angles """
+    cos_x, sin_x, cos_y, sin_y = np.cos(tau_x), np.sin(tau_x), np.cos(tau_y), np.sin(tau_y)
+    # rotation about y @ rotation about x, then the projection back onto the z=1 plane
+    rotation = np.stack([np.stack([cos_y, sin_y * sin_x, -sin_y * cos_x], axis=-1),
+                         np.stack([np.zeros_like(cos_x), cos_x, sin_x], axis=-1),
+                         np.stack([sin_y, -cos_y * sin_x, cos_y * cos_x], axis=-1)], axis=-2)
+    projection = np.zeros_like(rotation)
+    projection[..., 0, 0] = rotation[..., 2, 2]
+    projection[..., 1, 1] = rotation[..., 2, 2]
+    projection[..., 0, 2] = -rotation[..., 0, 2]
+    projection[..., 1, 2] = -rotation[..., 1, 2]
+    projection[..., 2, 2] = 1
+    tilt = projection @ rotation  # (poses, 1, 3, 3)
+    tilted = tilt @ np.stack([x, y, np.ones_like(x)], axis=-1)[..., np.newaxis]
+    inverse_z = np.where(tilted[..., 2, 0] != 0, 1 / tilted[..., 2, 0], 1.0)
+    return tilted[..., 0, 0] * inverse_z, tilted[..., 1, 0] * inverse_z
@@ -0,0 +1,186 @@
+"""
+Array-native rotation and rigid transform (SE(3)) math, on stacks of rotations/transforms:
+
+    rotation vectors  (N, 3)     axis * angle (radians), as `cv2.Rodrigues` uses
+    quaternions       (N, 4)     scalar-last (x, y, z, w), as `scipy.spatial.transform.Rotation` uses
+    rotation matrices (N, 3, 3)
+    transforms        (N, 4, 4)  homogeneous [R | t] matrices
+
+Every function takes and returns whole stacks (a single rotation/transform is a stack of one), so loops over views or
+cameras become a handful of array operations - the pydantic models in `camera_math_models` are thin views over these.
+"""
+import numpy as np
+
+SMALL_ANGLE_RADIANS: float = 1e-8
+
+
+def rotation_vectors_to_matrices(rotation_vectors: np.ndarray) -> np.ndarray:
+    """
+    Rodrigues' formula for a (N, 3) stack of rotation vectors -> (N, 3, 3) rotation matrices
+    """
+    rotation_vectors = np.asarray(rotation_vectors, dtype=np.float64).reshape(-1, 3)
+    angles = np.linalg.norm(rotation_vectors, axis=1)
+    axes = rotation_vectors / np.where(angles > 1e-12, angles, 1.0)[:, np.newaxis]
+    cross_product_matrices = np.zeros((len(rotation_vectors), 3, 3))
+    cross_product_matrices[:, 0, 1] = -axes[:, 2]
+    cross_product_matrices[:, 0, 2] = axes[:, 1]
+    cross_product_matrices[:, 1, 0] = axes[:, 2]
+    cross_product_matrices[:, 1, 2] = -axes[:, 0]
+    cross_product_matrices[:, 2, 0] = -axes[:, 1]
+    cross_product_matrices[:, 2, 1] = axes[:, 0]
+    return (np.eye(3) +
+            np.sin(angles)[:, np.newaxis, np.newaxis] * cross_product_matrices +
+            (1 - np.cos(angles))[:, np.newaxis, np.newaxis] * cross_product_matrices @ cross_product_matrices)
+
+
+def rotation_matrices_to_quaternions(rotation_matrices: np.ndarray) -> np.ndarray:
+    """
+    (N, 3, 3) rotation matrices -> (N, 4) unit quaternions, with a non-negative scalar part.
+
+    Shepperd's method - each quaternion is built from whichever of (x, y, z, w) is largest, which keeps it accurate for
+    every rotation (including those near 180 degrees, where the trace-only formula breaks down).
+    """
+    rotation_matrices = np.asarray(rotation_matrices, dtype=np.float64).reshape(-1, 3, 3)
+    diagonals = np.diagonal(rotation_matrices, axis1=1, axis2=2)
+    traces = diagonals.sum(axis=1)
+    largest_components = np.argmax(np.column_stack([diagonals, traces]), axis=1)
+
+    quaternions = np.empty((len(rotation_matrices), 4))
+    scalar_largest = largest_components == 3
+    matrices = rotation_matrices[scalar_largest]
+    quaternions[scalar_largest] = np.column_stack([matrices[:, 2, 1] - matrices[:, 1, 2],
+                                                   matrices[:, 0, 2] - matrices[:, 2, 0],
+                                                   matrices[:, 1, 0] - matrices[:, 0, 1],
+                                                   1 + traces[scalar_largest]])
+    for i in range(3):
+        j, k = (i + 1) % 3, (i + 2) % 3
+        component_largest = largest_components == i
+        matrices = rotation_matrices[component_largest]
+        quaternions[component_largest, i] = 1 - traces[component_largest] + 2 * matrices[:, i, i]
+        quaternions[component_largest, j] = matrices[:, j, i] + matrices[:, i, j]
+        quaternions[component_largest, k] = matrices[:, k, i] + matrices[:, i, k]
+        quaternions[component_largest, 3] = matrices[:, k, j] - matrices[:, j, k]
+
+    quaternions /= np.linalg.norm(quaternions, axis=1, keepdims=True)
+    return np.where(quaternions[:, 3:] < 0, -quaternions, quaternions)
+
+
+def quaternions_to_rotation_matrices(quaternions: np.ndarray) -> np.ndarray:
+    """ (N, 4) scalar-last quaternions (normalized here) -> (N, 3, 3) rotation matrices """
+    quaternions = np.asarray(quaternions, dtype=np.float64).reshape(-1, 4)
+    x, y, z, w = (quaternions / np.linalg.norm(quaternions, axis=1, keepdims=True)).T
+    return np.stack([np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)], axis=1),
+                     np.stack([2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)], axis=1),
+                     np.stack([2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], axis=1)],
+                    axis=1)
+
+
+def rotation_vectors_to_quaternions(rotation_vectors: np.ndarray) -> np.ndarray:
+    """ (N, 3) rotation vectors -> (N, 4) scalar-last unit quaternions """
+    rotation_vectors = np.asarray(rotation_vectors, dtype=np.float64).reshape(-1, 3)
+    angles = np.linalg.norm(rotation_vectors, axis=1)
+    # sin(angle / 2) / angle, by its Taylor series for small angles
+    small = angles < SMALL_ANGLE_RADIANS
+    scales = np.where(small, 0.5 - angles ** 2 / 48, np.sin(angles / 2) / np.where(small, 1.0, angles))
+    return np.column_stack([rotation_vectors * scales[:, np.newaxis], np.cos(angles / 2)])
+
+
+def quaternions_to_rotation_vectors(quaternions: np.ndarray) -> np.ndarray:
+    """ (N, 4) scalar-last quaternions (normalized here) -> (N, 3) rotation vectors, with angles in [0, pi] """
+    quaternions = np.asarray(quaternions, dtype=np.float64).reshape(-1, 4)
+    quaternions = quaternions / np.linalg.norm(quaternions, axis=1, keepdims=True)
+    # (q and -q are the same rotation - take the one that rotates by at most 180 degrees)
+    quaternions = np.where(quaternions[:, 3:] < 0, -quaternions, quaternions)
+    vector_norms = np.linalg.norm(quaternions[:, :3], axis=1)
+    angles = 2 * np.arctan2(vector_norms, quaternions[:, 3])
+    # angle / sin(angle / 2), by its Taylor series for small angles
+    small = angles < SMALL_ANGLE_RADIANS
+    scales = np.where(small, 2 + angles ** 2 / 12, angles / np.where(small, 1.0, vector_norms))
+    return quaternions[:, :3] * scales[:, np.newaxis]
+
+
+def rotation_matrices_to_vectors(rotation_matrices: np.ndarray) -> np.ndarray:
+    """ (N, 3, 3) rotation matrices -> (N, 3) rotation vectors (the inverse of `rotation_vectors_to_matrices`) """
+    return quaternions_to_rotation_vectors(rotation_matrices_to_quaternions(rotation_matrices))
+
+
+def chordal_mean_rotation(rotation_matrices: np.ndarray, weights: np.ndarray | None = None) -> np.ndarray:
+    """
+    The rotation closest (in Frobenius norm) to the weighted sum of a (N, 3, 3) stack of rotations -> (3, 3).
+    Closed form, so it's the starting point for `karcher_mean_rotation`.
+    """
+    rotation_matrices = np.asarray(rotation_matrices, dtype=np.float64).reshape(-1, 3, 3)
+    if weights is None:
+        weights = np.ones(len(rotation_matrices))
+    left_singular_vectors, _, right_singular_vectors = np.linalg.svd(
+        np.einsum("n,nij->ij", weights, rotation_matrices))
+    # (flip the last axis if needed, so the result is a rotation rather than a reflection)
+    reflection_fix = np.diag([1.0, 1.0, np.sign(np.linalg.det(left_singular_vectors @ right_singular_vectors))])
+    return left_singular_vectors @ reflection_fix @ right_singular_vectors
+
+
+def karcher_mean_rotation(rotation_matrices: np.ndarray,
+                          tolerance: float = 1e-9,
+                          max_iterations: int = 100) -> np.ndarray:
+    """
+    The Karcher (geodesic L2) mean of a (N, 3, 3) stack of rotations -> (3, 3).
+
+    Starting from the chordal mean, repeatedly averages the rotations' offsets from the current mean in its tangent
+    space (log map) and steps the mean by that average (exp map), until the step is below `tolerance` radians.
+    """
+    rotation_matrices = np.asarray(rotation_matrices, dtype=np.float64).reshape(-1, 3, 3)
+    mean_rotation = chordal_mean_rotation(rotation_matrices)
+    for _ in range(max_iterations):
+        mean_offset = rotation_matrices_to_vectors(mean_rotation.T @ rotation_matrices).mean(axis=0)
+        mean_rotation = mean_rotation @ rotation_vectors_to_matrices(mean_offset)[0]
+        if np.linalg.norm(mean_offset) < tolerance:
+            break
+    return mean_rotation
+
+
+def transforms_from_rotation_vectors(rotation_vectors: np.ndarray, translation_vectors: np.ndarray) -> np.ndarray:
+    """ (N, 3) rotation vectors and (N, 3) translation vectors -> (N, 4, 4) transforms """
+    translation_vectors = np.asarray(translation_vectors, dtype=np.float64).reshape(-1, 3)
+    transforms = np.tile(np.eye(4), (len(translation_vectors), 1, 1))
+    transforms[:, :3, :3] = rotation_vectors_to_matrices(rotation_vectors)
+    transforms[:, :3, 3] = translation_vectors
+    return transforms
+
+
+def transforms_to_rotation_vectors(transforms: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """ (N, 4, 4) transforms -> ((N, 3) rotation vectors, (N, 3) translation vectors) """
+    transforms = np.asarray(transforms, dtype=np.float64).reshape(-1, 4, 4)
+    return rotation_matrices_to_vectors(transforms[:, :3, :3]), transforms[:, :3, 3].copy()
+
+
+def invert_transforms(transforms: np.ndarray) -> np.ndarray:
+    """ (N, 4, 4) rigid transforms -> their inverses, [R.T | -R.T @ t] """
+    transforms = np.asarray(transforms, dtype=np.float64).reshape(-1, 4, 4)
+    inverse_rotations = np.swapaxes(transforms[:, :3, :3], 1, 2)
+    inverses = np.tile(np.eye(4), (len(transforms), 1, 1))
+    inverses[:, :3, :3] = inverse_rotations
+    inverses[:, :3, 3] = -np.einsum("nij,nj->ni", inverse_rotations, transforms[:, :3, 3])
+    return inverses
+
+
+def compose_transforms(first_transforms: np.ndarray, second_transforms: np.ndarray) -> np.ndarray:
+    """ first @ second for each pair in two stacks of (N, 4, 4) transforms (either stack may be a single transform) """
+    return np.asarray(first_transforms, dtype=np.float64) @ np.asarray(second_transforms, dtype=np.float64)
+
+
+def relative_transforms(base_transforms: np.ndarray, other_transforms: np.ndarray) -> np.ndarray:
+    """
+    other @ inverse(base) for each pair in two stacks of (N, 4, 4) transforms - given the pose of the same thing in two
+    frames (e.g. a board seen by two cameras, as `cv2.calibrateCamera` reports it), the transform taking points from
+    the base frame to the other frame, once per pair
+    """
+    return compose_transforms(other_transforms, invert_transforms(base_transforms))
+
+
+def mean_transform(transforms: np.ndarray) -> np.ndarray:
+    """ (N, 4, 4) transforms -> (4, 4): the Karcher mean of their rotations, and the mean of their translations """
+    transforms = np.asarray(transforms, dtype=np.float64).reshape(-1, 4, 4)
+    mean = np.eye(4)
+    mean[:3, :3] = karcher_mean_rotation(transforms[:, :3, :3])
+    mean[:3, 3] = transforms[:, :3, 3].mean(axis=0)
+    return mean
@@ -1,11 +1,20 @@
 import numpy as np
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from skellycam import CameraId
 from pydantic import model_validator
+from skellytracker.trackers.charuco_tracker.charuco_observation import CharucoObservation
+
 from freemocap.core.pipelines.calibration_pipeline.calibration_camera_node_output_data import CalibrationCameraNodeOutputData
 from freemocap.core.pipelines.calibration_pipeline.calibration_numpy_types import ImagePoint2D
+from freemocap.core.pipelines.calibration_pipeline.keyframe_selector import KeyframeSelector, board_view_features, \
+    camera_pair_features, KeyframeFeatures
 
 MultiFrameNumber = int
+# Cameras are bits in a uint64 visibility mask
+MAX_SHARED_VIEW_CAMERAS: int = 64
+INITIAL_SHARED_VIEW_FRAME_CAPACITY: int = 256
+
+
 class CameraPair(BaseModel):
     base_camera_id: CameraId
     other_camera_id: CameraId
@@ -22,114 +31,151 @@ class CameraPair(BaseModel):
             raise ValueError("base_camera_id must be less than other_camera_id")
         return self
 
-
     def __eq__(self, other):
         if isinstance(other, CameraPair):
-            return self.model_dump() == other.model_dump()
+            return (self.base_camera_id, self.other_camera_id) == (other.base_camera_id, other.other_camera_id)
         return False
 
     def __hash__(self):
-        # Use a frozenset to ensure hashability and use this model as a key in a dictionary
-        return hash(frozenset(self.model_dump().items()))
-
-class CameraPairTargetView(BaseModel):
-    multi_frame_number: MultiFrameNumber
-    camera_pair: CameraPair
-    camera_node_output_by_camera: dict[CameraId, CalibrationCameraNodeOutputData]
-
-    @model_validator(mode='after')
-    def validate(self):
-        if not self.camera_pair.base_camera_id in self.camera_node_output_by_camera:
-            raise ValueError(f"base_camera_id {self.camera_pair.base_camera_id} not in camera_node_output_by_camera keys {self.camera_node_output_by_camera.keys()}")
-        if not self.camera_pair.other_camera_id in self.camera_node_output_by_camera:
-            raise ValueError(f"other_camera_id {self.camera_pair.other_camera_id} not in camera_node_output_by_camera keys {self.camera_node_output_by_camera.keys()}")
-        return self
+        return hash((self.base_camera_id, self.other_camera_id))
 
 
 PointIndex = int
 class MultiCameraTargetView(BaseModel):
+    """
+    The cameras that could see the calibration target on one multi-frame, with their charuco corners (in the full corner
+    array layout, NaN where a corner wasn't detected) - a view into the `SharedViewAccumulator`'s store
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
     multi_frame_number: MultiFrameNumber
-    camera_node_output_by_camera: dict[CameraId, CalibrationCameraNodeOutputData]
+    camera_ids: list[CameraId]  # the cameras that could see the target
+    camera_indices: list[int]  # ...and their rows in `image_points`
+    image_points: np.ndarray  # (all cameras, corners, 2) float32
 
     @model_validator(mode='after')
     def validate(self):
-        if len(self.camera_node_output_by_camera) < 2:
-            raise ValueError(f"camera_node_output_by_camera must have at least 2 cameras, got {len(self.camera_node_output_by_camera)}")
-        if not all([output.frame_number == self.multi_frame_number for output in self.camera_node_output_by_camera.values()]):
-            raise ValueError(f"multi_frame_number {self.multi_frame_number} does not match all camera_node_output_by_camera multi_frame_numbers")
+        if len(self.camera_ids) < 2:
+            raise ValueError(f"A multi-camera view must have at least 2 cameras, got {len(self.camera_ids)}")
+        if len(self.camera_indices) != len(self.camera_ids):
+            raise ValueError(f"Got {len(self.camera_indices)} camera indices for {len(self.camera_ids)} camera ids")
         return self
 
     @property
     def image_points_by_camera(self) -> dict[CameraId, list[ImagePoint2D]]:
-        image_points_by_camera = {camera_id: [] for camera_id in self.camera_node_output_by_camera.keys()}
-        for camera_id, camera_node_output in self.camera_node_output_by_camera.items():
-            image_points_by_camera[camera_id].extend(list(camera_node_output.charuco_observation.detected_charuco_corners_in_full_array))
+        return {camera_id: list(self.image_points[camera_index].astype(np.float64))
+                for camera_id, camera_index in zip(self.camera_ids, self.camera_indices)}
 
-        return image_points_by_camera
 
 class SharedViewAccumulator(BaseModel):
     """
     Keeps track of the data feeds from each camera, and keeps track of the frames where each can see the calibration target,
     and counts the number of shared views each camera has with each other camera (i.e. frames where both cameras can see the target)
-    """
-    camera_ids: list[CameraId]
-    target_views_by_camera_pair: dict[CameraPair, list[CameraPairTargetView]] = Field(default_factory=dict)
 
-    @property
-    def camera_pairs(self) -> list[CameraPair]:
-        return list(self.target_views_by_camera_pair.keys())
+    Frames that at least two cameras can see the target in are offered to a `KeyframeSelector`, which keeps a bounded
+    set of the most informative ones (image coverage and board poses in each camera, and links between camera pairs) -
+    so the store, and the calibration solves that run over it, stay the same size however long the board is waved
+    around.
 
-    @property
-    def multi_camera_target_views(self) -> dict[MultiFrameNumber, MultiCameraTargetView]:
-        mc_views = {}
-        for camera_pair, shared_views in self.target_views_by_camera_pair.items():
-            for shared_view in shared_views:
-                if not shared_view.multi_frame_number in mc_views:
-                    mc_views[shared_view.multi_frame_number] = MultiCameraTargetView(multi_frame_number=shared_view.multi_frame_number,
-                                                                                    camera_node_output_by_camera=shared_view.camera_node_output_by_camera)
-
-                else:
-                    mc_views[shared_view.multi_frame_number].camera_node_output_by_camera.update(shared_view.camera_node_output_by_camera)
-        return mc_views
+    Each kept frame is stored once - its charuco corners go in a preallocated (frames, cameras, corners, 2) float32
+    array, alongside a bitmask of the cameras that could see the target. Each kept frame's mask is added to a
+    (cameras, cameras) matrix counting the frames each pair of cameras shared (and subtracted again if the frame is
+    evicted, its slot going to the frame that replaced it), so pair and per-camera counts are lookups rather than scans,
+    and the multi-camera views are built as frames come in.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    camera_ids: list[CameraId]
+    camera_pairs: list[CameraPair]
+    image_points: np.ndarray | None = None  # (frame capacity, cameras, corners, 2) float32, allocated on the first view
+    frame_numbers: np.ndarray = Field(default_factory=lambda: np.zeros(INITIAL_SHARED_VIEW_FRAME_CAPACITY, dtype=np.int64))
+    visibility_masks: np.ndarray = Field(default_factory=lambda: np.zeros(INITIAL_SHARED_VIEW_FRAME_CAPACITY, dtype=np.uint64))
+    pair_view_counts: np.ndarray  # (cameras, cameras) int64 - the diagonal counts each camera's stored views
+    number_of_frames: int = 0
+    frame_index_by_number: dict[MultiFrameNumber, int] = Field(default_factory=dict)
+    multi_camera_target_views: dict[MultiFrameNumber, MultiCameraTargetView] = Field(default_factory=dict)
+    # The observations of the cameras that saw the target, per stored frame
+    charuco_observations_by_frame: dict[MultiFrameNumber, dict[CameraId, CharucoObservation]] = Field(default_factory=dict)
+    keyframe_selector: KeyframeSelector = Field(default_factory=KeyframeSelector)
 
     @classmethod
-    def create(cls, camera_ids: list[CameraId]):
+    def create(cls, camera_ids: list[CameraId], keyframe_selector: KeyframeSelector | None = None):
+        if len(camera_ids) > MAX_SHARED_VIEW_CAMERAS:
+            raise ValueError(f"SharedViewAccumulator supports up to {MAX_SHARED_VIEW_CAMERAS} cameras, "
+                             f"got {len(camera_ids)}")
         camera_pairs = []
         for i, camera_id in enumerate(camera_ids):
             for other_camera_id in camera_ids[i+1:]:
                 camera_pairs.append(CameraPair.from_ids(camera_id, other_camera_id))
-        return cls(camera_ids=camera_ids, target_views_by_camera_pair={camera_pair: [] for camera_pair in camera_pairs})
+        return cls(camera_ids=camera_ids,
+                   camera_pairs=camera_pairs,
+                   pair_view_counts=np.zeros((len(camera_ids), len(camera_ids)), dtype=np.int64),
+                   keyframe_selector=keyframe_selector if keyframe_selector is not None else KeyframeSelector())
 
+    @property
+    def charuco_observations_by_camera(self) -> dict[CameraId, list[CharucoObservation]]:
+        """
+        One observation per (stored frame, camera that saw the target), for the single camera calibrators
+        """
+        observations_by_camera = {camera_id: [] for camera_id in self.camera_ids}
+        for observations in self.charuco_observations_by_frame.values():
+            for camera_id, observation in observations.items():
+                observations_by_camera[camera_id].append(observation)
+        return observations_by_camera
 
     def receive_camera_node_output(self, multi_frame_number: int,
                                    camera_node_output_by_camera: dict[CameraId, CalibrationCameraNodeOutputData]):
-
-        for camera_id, camera_node_output in camera_node_output_by_camera.items():
-            if camera_node_output.can_see_target:
-                for other_camera_id in self.camera_ids:
-                    if other_camera_id == camera_id:
-                        continue
-                    if camera_node_output_by_camera[other_camera_id].can_see_target:
-                        camera_pair = CameraPair.from_ids(camera_id, other_camera_id)
-                        if camera_pair not in self.target_views_by_camera_pair:
-                            raise ValueError(f"camera_pair {camera_pair} not in target_views_by_camera_pair keys {self.target_views_by_camera_pair.keys()}")
-                        if any([shared_view.multi_frame_number == multi_frame_number for shared_view in self.target_views_by_camera_pair[camera_pair]]):
-                            continue
-                        self.target_views_by_camera_pair[camera_pair].append(CameraPairTargetView(multi_frame_number=multi_frame_number,
-                                                                                                  camera_pair=camera_pair,
-                                                                                                  camera_node_output_by_camera={camera_id: camera_node_output,
-                                                                                                                            other_camera_id: camera_node_output_by_camera[other_camera_id]}))
-
+        if multi_frame_number in self.frame_index_by_number:
+            return
+        visible_camera_indices = [camera_index for camera_index, camera_id in enumerate(self.camera_ids)
+                                  if camera_id in camera_node_output_by_camera
+                                  and camera_node_output_by_camera[camera_id].can_see_target]
+        if len(visible_camera_indices) < 2:
+            return
+
+        keyframe_decision = self.keyframe_selector.offer(
+            key=multi_frame_number,
+            features=self._keyframe_features(visible_camera_indices, camera_node_output_by_camera))
+        if not keyframe_decision.accepted:
+            return
+
+        if self.image_points is None:
+            number_of_corners = len(camera_node_output_by_camera[
+                                        self.camera_ids[visible_camera_indices[0]]].target_pixel_points)
+            self.image_points = np.full((len(self.frame_numbers), len(self.camera_ids), number_of_corners, 2),
+                                        np.nan, dtype=np.float32)
+        if keyframe_decision.evicted_key is not None:
+            frame_index = self._evict(keyframe_decision.evicted_key)
+        else:
+            if self.number_of_frames == len(self.frame_numbers):
+                self._grow()
+            frame_index = self.number_of_frames
+            self.number_of_frames += 1
+
+        visibility_mask = 0
+        observations = {}
+        for camera_index in visible_camera_indices:
+            camera_id = self.camera_ids[camera_index]
+            camera_node_output = camera_node_output_by_camera[camera_id]
+            self.image_points[frame_index, camera_index] = camera_node_output.target_pixel_points
+            observations[camera_id] = camera_node_output.charuco_observation
+            visibility_mask |= 1 << camera_index
+        self.frame_numbers[frame_index] = multi_frame_number
+        self.visibility_masks[frame_index] = visibility_mask
+        self.pair_view_counts[np.ix_(visible_camera_indices, visible_camera_indices)] += 1
+        self.frame_index_by_number[multi_frame_number] = frame_index
+        self.charuco_observations_by_frame[multi_frame_number] = observations
+        self.multi_camera_target_views[multi_frame_number] = self._create_multi_camera_target_view(frame_index)
+
+    def get_camera_pair_view_count(self, camera_pair: CameraPair) -> int:
+        return int(self.pair_view_counts[self.camera_ids.index(camera_pair.base_camera_id),
+                                         self.camera_ids.index(camera_pair.other_camera_id)])
 
     def get_shared_view_count_per_camera(self) -> dict[CameraId, int]:
         """
         Get the number of shared views for each camera id, i.e. the number of frames where the camera can see the target and at least one other camera can also see the target
+        (counted once per other camera, like the per-pair counts it sums)
         """
-        camera_shared_view_count = {camera_id: 0 for camera_id in self.camera_ids}
-        for camera_pair, shared_views in self.target_views_by_camera_pair.items():
-            camera_shared_view_count[camera_pair.base_camera_id] += len(shared_views)
-            camera_shared_view_count[camera_pair.other_camera_id] += len(shared_views)
-        return camera_shared_view_count
+        shared_view_counts = self.pair_view_counts.sum(axis=1) - np.diag(self.pair_view_counts)
+        return {camera_id: int(count) for camera_id, count in zip(self.camera_ids, shared_view_counts)}
 
     def all_cameras_have_min_shared_views(self, min_shared_views: int = 10) -> bool:
         """
@@ -139,3 +185,50 @@ class SharedViewAccumulator(BaseModel):
 
         return all([count >= min_shared_views for count in self.get_shared_view_count_per_camera().values()])
 
+    def _keyframe_features(self,
+                           visible_camera_indices: list[int],
+                           camera_node_output_by_camera: dict[CameraId, CalibrationCameraNodeOutputData]) -> KeyframeFeatures:
+        visible_camera_ids = [self.camera_ids[camera_index] for camera_index in visible_camera_indices]
+        features = camera_pair_features(visible_camera_ids)
+        for camera_id in visible_camera_ids:
+            charuco_observation = camera_node_output_by_camera[camera_id].charuco_observation
+            features.update(board_view_features(
+                camera_id=camera_id,
+                image_points=camera_node_output_by_camera[camera_id].target_pixel_points,
+                object_points=charuco_observation.all_charuco_corners_in_object_coordinates,
+                image_size=charuco_observation.image_size))
+        return features
+
+    def _evict(self, multi_frame_number: MultiFrameNumber) -> int:
+        """
+        Drop a stored frame, returning its (now empty) slot in the store
+        """
+        frame_index = self.frame_index_by_number.pop(multi_frame_number)
+        visible_camera_indices = [camera_index for camera_index in range(len(self.camera_ids))
+                                  if int(self.visibility_masks[frame_index]) >> camera_index & 1]
+        self.pair_view_counts[np.ix_(visible_camera_indices, visible_camera_indices)] -= 1
+        self.image_points[frame_index] = np.nan
+        del self.multi_camera_target_views[multi_frame_number]
+        del self.charuco_observations_by_frame[multi_frame_number]
+        return frame_index
+
+    def _create_multi_camera_target_view(self, frame_index: int) -> MultiCameraTargetView:
+        visibility_mask = int(self.visibility_masks[frame_index])
+        camera_indices = [camera_index for camera_index in range(len(self.camera_ids))
+                          if visibility_mask >> camera_index & 1]
+        return MultiCameraTargetView.model_construct(
+            multi_frame_number=int(self.frame_numbers[frame_index]),
+            camera_ids=[self.camera_ids[camera_index] for camera_index in camera_indices],
+            camera_indices=camera_indices,
+            image_points=self.image_points[frame_index])
+
+    def _grow(self):
+        capacity = 2 * len(self.frame_numbers)
+        image_points = np.full((capacity, *self.image_points.shape[1:]), np.nan, dtype=np.float32)
+        image_points[:self.number_of_frames] = self.image_points[:self.number_of_frames]
+        self.image_points = image_points
+        # (re-point the views at the new store, so they don't keep the old one alive)
+        for multi_frame_number, target_view in self.multi_camera_target_views.items():
+            target_view.image_points = image_points[self.frame_index_by_number[multi_frame_number]]
+        self.frame_numbers = np.concatenate([self.frame_numbers, np.zeros_like(self.frame_numbers)])
+        self.visibility_masks = np.concatenate([self.visibility_masks, np.zeros_like(self.visibility_masks)])
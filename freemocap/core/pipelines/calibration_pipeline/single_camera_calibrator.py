@@ -11,6 +11,11 @@ from freemocap.core.pipelines.calibration_pipeline.calibration_numpy_types impor
     ImagePoints2D
 from freemocap.core.pipelines.calibration_pipeline.camera_math_models import RotationVector, TranslationVector, \
     TransformationMatrix, CameraDistortionCoefficients, CameraMatrix
+from freemocap.core.pipelines.calibration_pipeline.keyframe_selector import KeyframeSelector, board_view_features, \
+    DEFAULT_MAX_KEYFRAMES
+from freemocap.core.pipelines.calibration_pipeline.reprojection_error import calculate_reprojection_errors, \
+    nan_mean, pad_points
+from freemocap.core.pipelines.calibration_pipeline.se3_operations import transforms_from_rotation_vectors
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +33,9 @@ class SingleCameraCalibrator(BaseModel):
     """
     SingleCameraCalibrator class for estimating camera calibration parameters.
 
+    Observations go through a `KeyframeSelector`, so `cv2.calibrateCamera` runs over a bounded set of the views that
+    best cover the image and the range of board poses, rather than every view ever added.
+
     cv2.calibrateCamera docs: https://docs.opencv.org/4.10.0/d9/d0c/group__calib3d.html#ga687a1ab946686f0d85ae0363b5af1d7b
     """
 
@@ -43,6 +51,7 @@ class SingleCameraCalibrator(BaseModel):
     distortion_coefficients: CameraDistortionCoefficients
     camera_matrix: CameraMatrix
 
+    keyframe_selector: KeyframeSelector = Field(default_factory=KeyframeSelector)
     charuco_observations: CharucoObservations = Field(default_factory=CharucoObservations)
     object_points_views: list[ObjectPoints3D] = []
     image_points_views: list[ImagePoints2D] = []
@@ -72,6 +81,18 @@ class SingleCameraCalibrator(BaseModel):
                                                                translation_vector=translation_vector)
                 for rotation_vector, translation_vector in zip(self.rotation_vectors, self.translation_vectors)]
 
+    @property
+    def charuco_transforms(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The board's pose in each calibrated view, as a stack - ((views,) frame numbers, (views, 4, 4) transforms)
+        """
+        frame_numbers = np.array([observation.frame_number for observation in self.charuco_observations],
+                                 dtype=np.int64)
+        transforms = transforms_from_rotation_vectors(
+            rotation_vectors=np.array([rotation_vector.vector for rotation_vector in self.rotation_vectors]),
+            translation_vectors=np.array([translation_vector.vector for translation_vector in self.translation_vectors]))
+        return frame_numbers[:len(transforms)], transforms
+
     @classmethod
     def create_initial(cls,
                        camera_id: CameraId,
@@ -80,7 +101,8 @@ class SingleCameraCalibrator(BaseModel):
                        all_aruco_corners_in_object_coordinates: list[np.ndarray[..., 3]],
                        all_charuco_corner_ids: list[int],
                        all_charuco_corners_in_object_coordinates: np.ndarray[..., 3],
-                       number_of_distortion_coefficients: int = DEFAULT_INTRINSICS_COEFFICIENTS_COUNT):
+                       number_of_distortion_coefficients: int = DEFAULT_INTRINSICS_COEFFICIENTS_COUNT,
+                       max_keyframes: int = DEFAULT_MAX_KEYFRAMES):
 
         if len(all_charuco_corner_ids) != all_charuco_corners_in_object_coordinates.shape[0]:
             raise ValueError("Number of charuco corner IDs must match the number of charuco corners.")
@@ -95,7 +117,9 @@ class SingleCameraCalibrator(BaseModel):
                    all_aruco_corners_in_object_coordinates=all_aruco_corners_in_object_coordinates,
                    camera_matrix=CameraMatrix.from_image_size(image_size=image_size),
                    distortion_coefficients=CameraDistortionCoefficients(
-                       coefficients=np.zeros(number_of_distortion_coefficients))
+                       coefficients=np.zeros(number_of_distortion_coefficients)),
+                   # (`update_calibration_estimate` needs at least as many views as there are charuco corners)
+                   keyframe_selector=KeyframeSelector(max_keyframes=max(max_keyframes, len(all_charuco_corner_ids))),
                    )
 
     def add_observation(self, observation: CharucoObservation):
@@ -105,6 +129,19 @@ class SingleCameraCalibrator(BaseModel):
             return
         self._validate_observation(observation)
 
+        keyframe_decision = self.keyframe_selector.offer(
+            key=observation.frame_number,
+            features=board_view_features(
+                camera_id=self.camera_id,
+                image_points=np.squeeze(observation.detected_charuco_corners_image_coordinates),
+                object_points=self.all_charuco_corners_in_object_coordinates[
+                    np.squeeze(observation.detected_charuco_corner_ids), :],
+                image_size=self.image_size))
+        if not keyframe_decision.accepted:
+            return
+        if keyframe_decision.evicted_key is not None:
+            self._remove_view([obs.frame_number for obs in self.charuco_observations].index(keyframe_decision.evicted_key))
+
         self.charuco_observations.append(observation)
         self.image_points_views.append(np.squeeze(observation.detected_charuco_corners_image_coordinates))
         self.object_points_views.append(
@@ -187,11 +224,25 @@ class SingleCameraCalibrator(BaseModel):
             raise ValueError(
                 f"Invalid charuco corner ID detected: {observation.detected_charuco_corner_ids} not all in {self.all_charuco_corner_ids}")
 
+    def _remove_view(self, view_index: int):
+        del self.charuco_observations[view_index]
+        del self.image_points_views[view_index]
+        del self.object_points_views[view_index]
+        # (pose and error estimates are per view, and only valid for the views they were computed with)
+        for per_view_estimates in [self.rotation_vectors,
+                                   self.translation_vectors,
+                                   self.reprojection_error_per_point_by_view,
+                                   self.reprojection_error_by_view]:
+            if len(per_view_estimates) > view_index:
+                del per_view_estimates[view_index]
+
     def _drop_suboptimal_views(self, ratio_to_keep: float = 0.5):
         if len(self.reprojection_error_by_view) < 2:
             return
         sorted_indices = np.argsort(self.reprojection_error_by_view)
         number_of_views_to_keep = int(len(sorted_indices) * ratio_to_keep)
+        for i in sorted_indices[number_of_views_to_keep:]:
+            self.keyframe_selector.remove(self.charuco_observations[i].frame_number)
         self.object_points_views = [self.object_points_views[i] for i in sorted_indices[:number_of_views_to_keep]]
         self.image_points_views = [self.image_points_views[i] for i in sorted_indices[:number_of_views_to_keep]]
         self.rotation_vectors = [self.rotation_vectors[i] for i in sorted_indices[:number_of_views_to_keep]]
@@ -201,28 +252,23 @@ class SingleCameraCalibrator(BaseModel):
         self.charuco_observations = [self.charuco_observations[i] for i in sorted_indices[:number_of_views_to_keep]]
 
     def _update_reprojection_error(self):
-        # https://docs.opencv.org/4.10.0/d9/d0c/group__calib3d.html#ga1019495a2c8d1743ed5cc23fa0daff8c
+        # All views at once - the ragged views are NaN padded, and the padding drops out of the NaN-aware means
         if len(self.image_points_views) != len(self.object_points_views):
             raise ValueError("The number of image and object points must be the same")
         if len(self.image_points_views) == 0:
             raise ValueError("No image points provided")
-        self.reprojection_error_per_point_by_view = []
-        self.reprojection_error_by_view = []
-        for view_index in range(len(self.image_points_views)):
-            projected_image_points, jacobian = cv2.projectPoints(objectPoints=self.object_points_views[view_index],
-                                                                 rvec=self.rotation_vectors[view_index].vector,
-                                                                 tvec=self.translation_vectors[view_index].vector,
-                                                                 cameraMatrix=self.camera_matrix.matrix,
-                                                                 distCoeffs=self.distortion_coefficients.coefficients,
-                                                                 aspectRatio=self.image_size[0] / self.image_size[1]
-                                                                 )
-
-            self.reprojection_error_per_point_by_view.append(
-                np.abs(self.image_points_views[view_index] - np.squeeze(projected_image_points)))
-
-            self.reprojection_error_by_view.append(float(np.nanmean(self.reprojection_error_per_point_by_view[-1])))
-
-        self.mean_reprojection_error = float(np.nanmean(self.reprojection_error_by_view))
+        absolute_errors = np.abs(calculate_reprojection_errors(
+            image_points=pad_points(self.image_points_views),
+            object_points=pad_points(self.object_points_views),
+            rotation_vectors=np.array([rotation_vector.vector for rotation_vector in self.rotation_vectors]),
+            translation_vectors=np.array([translation_vector.vector for translation_vector in self.translation_vectors]),
+            camera_matrices=self.camera_matrix.matrix,
+            distortion_coefficients=self.distortion_coefficients.coefficients))
+        self.reprojection_error_per_point_by_view = [view_errors[:len(image_points)]
+                                                     for view_errors, image_points in
+                                                     zip(absolute_errors, self.image_points_views)]
+        self.reprojection_error_by_view = nan_mean(absolute_errors, axis=(1, 2)).tolist()
+        self.mean_reprojection_error = float(nan_mean(self.reprojection_error_by_view))
 
         logger.debug(
             f"Camera {self.camera_id} -  Mean reprojection error: {self.mean_reprojection_error:.3f} pixels, reprojection error by view: {self.reprojection_error_by_view}")
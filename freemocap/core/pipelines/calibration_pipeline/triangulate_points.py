@@ -2,9 +2,12 @@ import cv2
 import numpy as np
 from skellycam import CameraId
 
+from freemocap.core.pipelines.batched_triangulation import triangulate_batched
 from freemocap.core.pipelines.calibration_pipeline.calibration_numpy_types import ObjectPoint3D, \
     ImagePoints2D, ObjectPoints3D, ReprojectionError, CameraExtrinsicsMatrix, ImagePoint2D
 from freemocap.core.pipelines.calibration_pipeline.camera_math_models import TransformationMatrix
+from freemocap.core.pipelines.calibration_pipeline.reprojection_error import calculate_reprojection_errors, nan_mean
+from freemocap.core.pipelines.calibration_pipeline.se3_operations import transforms_to_rotation_vectors
 from freemocap.core.pipelines.calibration_pipeline.single_camera_calibrator import CameraIntrinsicsEstimate
 
 
@@ -31,24 +34,17 @@ def undistort_points(points2d: ImagePoints2D,
     return np.squeeze(undistorted_points2d)
 
 
-# @jit(nopython=True, parallel=False)
 def triangulate_point(image_point_by_camera: dict[CameraId, ImagePoint2D],
                        camera_extrinsics: dict[CameraId, CameraExtrinsicsMatrix]) -> ObjectPoint3D:
     _validate_triangulation_input(camera_extrinsics=camera_extrinsics,
                                   image_point_by_camera=image_point_by_camera)
     camera_ids = list(camera_extrinsics.keys())
-    number_of_cameras = len(camera_ids)
-    A = np.zeros((number_of_cameras * 2, 4)) #SVD needs this to be a 2d array of shape (2n, 4), where n is the number of cameras
-    for camera_number, camera_id in enumerate(camera_ids):
-        image_points_x = image_point_by_camera[camera_id][0]
-        image_points_y = image_point_by_camera[camera_id][1]
-        camera_matrix = camera_extrinsics[camera_id]
-        A[(camera_number * 2): (camera_number * 2 + 1)] = image_points_x * camera_matrix[2] - camera_matrix[0]
-        A[(camera_number * 2 + 1): (camera_number * 2 + 2)] = image_points_y * camera_matrix[2] - camera_matrix[1]
-    u, s, vh = np.linalg.svd(A, full_matrices=True) #SVD returns the singular values in descending order, so the last row of vh is the solution (i.e. the 3D point represented in homogeneous coordinates)
-    points_3d = vh[-1]
-    points_3d = points_3d[:3] / points_3d[3]
-    return points_3d
+    # (a batch of one point, solved by SVD like this function always has been)
+    points3d = triangulate_batched(
+        points2d=np.array([[image_point_by_camera[camera_id]] for camera_id in camera_ids]),
+        projection_matrices=np.array([camera_extrinsics[camera_id] for camera_id in camera_ids]),
+        use_svd=True)
+    return points3d[0]
 
 
 def _validate_triangulation_input(camera_extrinsics: dict[CameraId, CameraExtrinsicsMatrix],
@@ -80,38 +76,33 @@ def _validate_reprojection_error_input(object_points: ObjectPoints3D,
 
 
 
-# @jit(nopython=True, parallel=False)
 def calculate_reprojection_error(object_points: ObjectPoints3D,
                                  image_points_by_camera: dict[CameraId, ImagePoints2D],
                                  camera_intrinsics: dict[CameraId, CameraIntrinsicsEstimate],
                                  camera_transforms: dict[CameraId, TransformationMatrix],
                                  image_sizes: dict[CameraId, tuple[int, int]]) -> tuple[list[ReprojectionError], dict[CameraId, list[ReprojectionError]]]:
-    # https://docs.opencv.org/4.10.0/d9/d0c/group__calib3d.html#ga1019495a2c8d1743ed5cc23fa0daff8c
+    """
+    Per point (averaged over cameras) and per camera absolute reprojection errors, with every camera projected at once
+    by `calculate_reprojection_errors`
+    """
     _validate_reprojection_error_input(object_points=object_points,
                                         image_points_by_camera=image_points_by_camera,
                                         camera_intrinsics=camera_intrinsics,
                                         camera_transforms=camera_transforms,
                                         image_sizes=image_sizes)
-    reprojection_error_per_point_by_camera: dict[CameraId, list[ReprojectionError]] = {}
-    for camera_id in camera_intrinsics.keys():
-        projected_image_points, jacobian = cv2.projectPoints(objectPoints=object_points,
-                                                             rvec=camera_transforms[camera_id].rotation_vector.vector,
-                                                             tvec=camera_transforms[
-                                                                 camera_id].translation_vector.vector,
-                                                             cameraMatrix=camera_intrinsics[
-                                                                 camera_id].camera_matrix.matrix,
-                                                             distCoeffs=camera_intrinsics[
-                                                                 camera_id].distortion_coefficients.coefficients,
-                                                             aspectRatio=image_sizes[camera_id][0] / image_sizes[camera_id][1]
-                                                             )
-
-        reprojection_error_per_point_by_camera[camera_id]= np.abs(image_points_by_camera[camera_id] - np.squeeze(projected_image_points))
-
-    mean_reprojection_error_per_point = []
-    for point_index in range(len(object_points)):
-        point_reprojection_error = []
-        for camera_id in camera_intrinsics.keys():
-            point_reprojection_error.append(reprojection_error_per_point_by_camera[camera_id][point_index])
-        mean_reprojection_error_per_point.append(float(np.nanmean(point_reprojection_error)))
-
+    camera_ids = list(camera_intrinsics.keys())
+    rotation_vectors, translation_vectors = transforms_to_rotation_vectors(
+        np.array([camera_transforms[camera_id].matrix for camera_id in camera_ids]))
+    absolute_errors = np.abs(calculate_reprojection_errors(
+        image_points=np.array([image_points_by_camera[camera_id] for camera_id in camera_ids]),
+        object_points=object_points,
+        rotation_vectors=rotation_vectors,
+        translation_vectors=translation_vectors,
+        camera_matrices=np.array([camera_intrinsics[camera_id].camera_matrix.matrix for camera_id in camera_ids]),
+        distortion_coefficients=[camera_intrinsics[camera_id].distortion_coefficients.coefficients
+                                 for camera_id in camera_ids]))
+
+    reprojection_error_per_point_by_camera = {camera_id: absolute_errors[camera_index]
+                                              for camera_index, camera_id in enumerate(camera_ids)}
+    mean_reprojection_error_per_point = nan_mean(absolute_errors, axis=(0, 2)).tolist()
     return mean_reprojection_error_per_point, reprojection_error_per_point_by_camera
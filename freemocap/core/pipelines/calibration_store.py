@@ -0,0 +1,205 @@
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+
+import cv2
+import numpy as np
+import toml
+
+from freemocap.system.paths_and_filenames.path_getters import get_last_successful_calibration_toml_path
+
+logger = logging.getLogger(__name__)
+
+# How often (at most) the store checks the calibration file's mtime - checking is a `stat` call, so keep it off the per-frame path
+CALIBRATION_RELOAD_CHECK_INTERVAL_SECONDS: float = 1.0
+
+
+@dataclass
+class CameraCalibrationData:
+    name: str
+    size: tuple[int, int]
+    matrix: np.ndarray # 3x3•
+    distortion: np.ndarray # 1x5
+    rotation_vector: np.ndarray # 3x1 rodriques rotation vector
+    translation: np.ndarray # 3x1 XYZ translation vector
+
+    @classmethod
+    def from_tuple(cls, data: tuple):
+        camera_id, data = data
+        matrix = np.array(data["matrix"])
+        distortion = np.array(data["distortions"])
+        rotation_vector = np.array(data["rotation"])
+        translation = np.array(data["translation"])
+        return cls(
+            name=camera_id,
+            size=data["size"],
+            matrix=matrix,
+            distortion=distortion,
+            rotation_vector=rotation_vector,
+            translation=translation,
+        )
+
+    def __post_init__(self):
+        if self.matrix.shape != (3, 3):
+            raise ValueError(f"Expected matrix to be of shape (3, 3), got {self.matrix.shape}")
+        if self.distortion.shape != ( 5,):
+            raise ValueError(f"Expected distortion to be of shape (1, 5), got {self.distortion.shape}")
+        if self.rotation_vector.shape != (3,):
+            raise ValueError(f"Expected rotation vector to be of shape (3, 1), got {self.rotation_vector.shape}")
+        if self.translation.shape != (3, ):
+            raise ValueError(f"Expected translation to be of shape (3, 1), got {self.translation.shape}")
+
+    @property
+    def rotation_matrix(self):
+        if self.rotation_vector is None:
+            return np.eye(3)
+        return cv2.Rodrigues(self.rotation_vector)[0]
+
+    @property
+    def extrinsics_matrix(self):
+        extrinsics_matrix = np.zeros((3, 4))
+        extrinsics_matrix[:, :3] = self.rotation_matrix
+        extrinsics_matrix[:, 3] = self.translation
+        if extrinsics_matrix.shape != (3, 4):
+            raise ValueError(f"Expected extrinsic matrix to be of shape (3, 4), got {extrinsics_matrix.shape}")
+        return extrinsics_matrix
+
+    def undistort_2d_points(self, points: np.ndarray):
+        shape = points.shape
+        points = points.reshape(-1, 1, 2)
+        out = cv2.undistortPoints(points, self.matrix.astype("float64"), self.distortion.astype("float64"))
+        return out.reshape(shape)
+
+    def project_3d_to_2d(self, points):
+        points = points.reshape(-1, 1, 3)
+        projected_points_2d, _ = cv2.projectPoints(
+            points,
+            self.rotation_vector,
+            self.translation,
+            self.matrix,
+            self.distortion
+        )
+        projected_points_2d = np.squeeze(projected_points_2d)
+        if projected_points_2d.shape[1] != 2:
+            raise ValueError(f"Expected projected points to be of shape (n, 2), got {projected_points_2d.shape}")
+        return projected_points_2d
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array = np.ascontiguousarray(array, dtype=np.float64)
+    array.flags.writeable = False
+    return array
+
+
+@dataclass(frozen=True)
+class CalibrationSnapshot:
+    """
+    Immutable, precomputed view of one calibration file.
+    All arrays are C-contiguous float64, stacked in camera order (the order of `camera_calibrations`), and read-only,
+    so a snapshot can be shared freely between threads.
+    """
+    camera_calibrations: dict[str, CameraCalibrationData]
+    projection_matrices: np.ndarray  # (num_cams, 3, 4) [R|t] extrinsics, for undistorted normalized image points
+    camera_matrices: np.ndarray  # (num_cams, 3, 3)
+    distortions: np.ndarray  # (num_cams, 5)
+    rotation_matrices: np.ndarray  # (num_cams, 3, 3)
+    translations: np.ndarray  # (num_cams, 3)
+    source_path: str
+    source_mtime_ns: int
+
+    @classmethod
+    def from_toml(cls, calibration_toml_path: str):
+        # Grab the mtime *before* parsing, so a write that lands mid-parse still triggers another reload
+        source_mtime_ns = os.stat(calibration_toml_path).st_mtime_ns
+        calibration_data = toml.load(calibration_toml_path)
+        calibration_data.pop("metadata", None)
+        # hacky use of enumerate to get camera id from (old style anipose) camera names
+        camera_calibrations = {str(camera_index): CameraCalibrationData.from_tuple(data)
+                               for camera_index, data in enumerate(calibration_data.items())}
+        if not camera_calibrations:
+            raise ValueError(f"No cameras found in calibration file {calibration_toml_path}")
+        calibrations = list(camera_calibrations.values())
+        return cls(camera_calibrations=camera_calibrations,
+                   projection_matrices=_read_only([calibration.extrinsics_matrix for calibration in calibrations]),
+                   camera_matrices=_read_only([calibration.matrix for calibration in calibrations]),
+                   distortions=_read_only([calibration.distortion for calibration in calibrations]),
+                   rotation_matrices=_read_only([calibration.rotation_matrix for calibration in calibrations]),
+                   translations=_read_only([calibration.translation for calibration in calibrations]),
+                   source_path=str(calibration_toml_path),
+                   source_mtime_ns=source_mtime_ns)
+
+    @property
+    def number_of_cameras(self) -> int:
+        return len(self.camera_calibrations)
+
+    def undistort_points(self, points2d: np.ndarray) -> np.ndarray:
+        """
+        Undistort a (num_cams, num_points, 2) array of pixel coordinates into normalized image coordinates
+        """
+        if points2d.shape[0] != self.number_of_cameras:
+            raise ValueError(f"Expected points from {self.number_of_cameras} cameras, got {points2d.shape[0]}")
+        undistorted_points2d = np.empty(points2d.shape, dtype=np.float64)
+        for camera_index in range(self.number_of_cameras):
+            undistorted_points2d[camera_index] = cv2.undistortPoints(
+                np.ascontiguousarray(points2d[camera_index], dtype=np.float64).reshape(-1, 1, 2),
+                self.camera_matrices[camera_index],
+                self.distortions[camera_index]).reshape(-1, 2)
+        return undistorted_points2d
+
+
+@dataclass
+class CalibrationStore:
+    """
+    Holds the current `CalibrationSnapshot` and swaps in a new one when the calibration file changes on disk,
+    so a recalibration gets picked up without restarting the pipeline.
+
+    Reloads are atomic - the new snapshot is fully built before it replaces the old one, and a file that fails to
+    parse (e.g. one that is still being written) is skipped, keeping the old snapshot until the next check.
+    If there's no calibration file yet, `snapshot` is None until one is written.
+    Callers should grab `snapshot` once per frame and use that same snapshot for the whole frame.
+    """
+    calibration_toml_path: str
+    check_interval_seconds: float = CALIBRATION_RELOAD_CHECK_INTERVAL_SECONDS
+    _snapshot: CalibrationSnapshot | None = None
+    _last_check_time: float = field(default_factory=time.perf_counter)
+
+    @classmethod
+    def create(cls,
+               calibration_toml_path: str | None = None,
+               check_interval_seconds: float = CALIBRATION_RELOAD_CHECK_INTERVAL_SECONDS):
+        if calibration_toml_path is None:
+            calibration_toml_path = get_last_successful_calibration_toml_path()
+        return cls(calibration_toml_path=str(calibration_toml_path),
+                   check_interval_seconds=check_interval_seconds,
+                   _snapshot=CalibrationSnapshot.from_toml(str(calibration_toml_path))
+                   if os.path.exists(calibration_toml_path) else None)
+
+    @property
+    def snapshot(self) -> CalibrationSnapshot | None:
+        if time.perf_counter() - self._last_check_time >= self.check_interval_seconds:
+            self.reload_if_changed()
+        return self._snapshot
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reload the calibration if the file's mtime has changed since the current snapshot was loaded.
+        Returns True if a new snapshot was swapped in.
+        """
+        self._last_check_time = time.perf_counter()
+        try:
+            mtime_ns = os.stat(self.calibration_toml_path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if self._snapshot is not None and mtime_ns == self._snapshot.source_mtime_ns:
+            return False
+        try:
+            new_snapshot = CalibrationSnapshot.from_toml(self.calibration_toml_path)
+        except (OSError, toml.TomlDecodeError, KeyError, ValueError, TypeError) as e:
+            logger.warning(f"Failed to reload calibration from {self.calibration_toml_path}, "
+                           f"keeping the previous calibration - {type(e).__name__}: {e}")
+            return False
+        self._snapshot = new_snapshot
+        logger.info(f"Reloaded calibration from {self.calibration_toml_path} "
+                    f"({new_snapshot.number_of_cameras} cameras)")
+        return True
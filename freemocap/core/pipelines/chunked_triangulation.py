@@ -0,0 +1,197 @@
+"""
+Offline triangulation of a whole recording, split into chunks of frames across a process pool.
+
+The (cameras, frames, points, 2) input and every output live in shared memory, so workers read their frames and write
+their results in place - nothing but chunk bounds crosses the process boundary. Each chunk is undistorted, triangulated
+(`triangulate_batched`) and reprojected through the full distortion model (`calculate_reprojection_errors`) in one pass,
+giving the 3d points, the mean reprojection error per point, and the per-camera reprojection errors together.
+"""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+
+import cv2
+import numpy as np
+
+from freemocap.core.pipelines.batched_triangulation import triangulate_batched, MINIMUM_CAMERAS_FOR_TRIANGULATION
+from freemocap.core.pipelines.calibration_pipeline.reprojection_error import calculate_reprojection_errors, nan_mean
+from freemocap.core.pipelines.calibration_pipeline.se3_operations import transforms_from_rotation_vectors
+
+logger = logging.getLogger(__name__)
+
+# ~70k points per chunk for a mediapipe holistic recording, which keeps each worker's DLT systems to a few tens of MB
+DEFAULT_FRAMES_PER_CHUNK: int = 128
+
+# (name, shape) of each shared array - everything is float64
+SharedArrayDescriptors = dict[str, tuple[str, tuple[int, ...]]]
+
+
+@dataclass
+class TriangulationCameras:
+    """ Everything the workers need to know about the cameras, as plain (picklable) arrays """
+    camera_matrices: np.ndarray  # (cameras, 3, 3)
+    distortion_coefficients: list[np.ndarray]  # one (4|5|8|12|14,) array per camera
+    rotation_vectors: np.ndarray  # (cameras, 3)
+    translation_vectors: np.ndarray  # (cameras, 3)
+
+    @classmethod
+    def from_anipose_camera_group(cls, camera_group) -> "TriangulationCameras":
+        cameras = camera_group.cameras
+        return cls(camera_matrices=np.array([camera.get_camera_matrix() for camera in cameras], dtype=np.float64),
+                   distortion_coefficients=[np.asarray(camera.get_distortions(), dtype=np.float64).ravel()
+                                            for camera in cameras],
+                   rotation_vectors=np.array([np.ravel(camera.get_rotation()) for camera in cameras], dtype=np.float64),
+                   translation_vectors=np.array([np.ravel(camera.get_translation()) for camera in cameras],
+                                                dtype=np.float64))
+
+    @property
+    def number_of_cameras(self) -> int:
+        return len(self.camera_matrices)
+
+    @property
+    def extrinsics_matrices(self) -> np.ndarray:
+        """ (cameras, 3, 4) [R|t] - the projection matrices of undistorted, normalized image points """
+        return transforms_from_rotation_vectors(self.rotation_vectors, self.translation_vectors)[:, :3]
+
+
+def triangulate_recording(image_2d_data: np.ndarray,
+                          cameras: TriangulationCameras,
+                          number_of_workers: int | None = None,
+                          frames_per_chunk: int = DEFAULT_FRAMES_PER_CHUNK,
+                          kill_event: multiprocessing.Event = None,
+                          progress: bool = True) -> tuple[np.ndarray, np.ndarray, np.ndarray] | None:
+    """
+    Triangulate a (cameras, frames, points, 2) array of distorted pixel coordinates (NaN where a camera missed a point).
+
+    :param number_of_workers: worker processes, defaults to one per core - with 1 (or a single chunk) everything runs
+        in this process
+    :param progress: log progress every ~10% of the chunks
+    :param kill_event: checked after every chunk - once it's set, the remaining chunks are cancelled and this returns
+        None (like the anipose `triangulate` methods)
+    :return: (frames, points, 3) points, (frames, points) mean reprojection error (px, NaN unless at least two cameras
+        saw the point), and (cameras, frames, points) reprojection error (px, NaN where the camera missed the point)
+    """
+    number_of_cameras, number_of_frames, number_of_points, point_dimensions = image_2d_data.shape
+    if point_dimensions != 2:
+        raise ValueError(f"Expected image_2d_data to be of shape (cameras, frames, points, 2), got {image_2d_data.shape}")
+    if number_of_cameras != cameras.number_of_cameras:
+        raise ValueError(f"Got 2d data from {number_of_cameras} cameras, but {cameras.number_of_cameras} calibrations")
+    number_of_workers = number_of_workers or os.cpu_count() or 1
+    chunks = [(start_frame, min(start_frame + frames_per_chunk, number_of_frames))
+              for start_frame in range(0, number_of_frames, frames_per_chunk)]
+    shapes = {"points2d": image_2d_data.shape,
+              "points3d": (number_of_frames, number_of_points, 3),
+              "mean_reprojection_error": (number_of_frames, number_of_points),
+              "camera_reprojection_error": (number_of_cameras, number_of_frames, number_of_points)}
+    logger.info(f"Triangulating {number_of_frames} frames x {number_of_points} points from {number_of_cameras} cameras "
+                f"in {len(chunks)} chunks, on {min(number_of_workers, len(chunks))} worker(s)")
+
+    if number_of_workers == 1 or len(chunks) <= 1:
+        arrays = {name: np.full(shape, np.nan) for name, shape in shapes.items() if name != "points2d"}
+        arrays["points2d"] = np.asarray(image_2d_data, dtype=np.float64)
+        for chunk_number, (start_frame, stop_frame) in enumerate(chunks):
+            _triangulate_chunk(arrays=arrays, cameras=cameras, start_frame=start_frame, stop_frame=stop_frame)
+            if progress:
+                _log_progress(chunks_done=chunk_number + 1, number_of_chunks=len(chunks))
+            if kill_event is not None and kill_event.is_set():
+                logger.info("Triangulation cancelled")
+                return None
+        return arrays["points3d"], arrays["mean_reprojection_error"], arrays["camera_reprojection_error"]
+
+    shared_memories: dict[str, SharedMemory] = {}
+    try:
+        arrays = {}
+        for name, shape in shapes.items():
+            shared_memories[name] = SharedMemory(create=True, size=max(int(np.prod(shape)) * 8, 1))
+            arrays[name] = np.ndarray(shape, dtype=np.float64, buffer=shared_memories[name].buf)
+            arrays[name][:] = np.nan
+        arrays["points2d"][:] = image_2d_data
+        descriptors = {name: (shared_memory.name, shapes[name]) for name, shared_memory in shared_memories.items()}
+
+        with ProcessPoolExecutor(max_workers=min(number_of_workers, len(chunks)),
+                                 initializer=_initialize_worker,
+                                 initargs=(descriptors, cameras)) as executor:
+            futures = [executor.submit(_triangulate_chunk_in_worker, start_frame, stop_frame)
+                       for start_frame, stop_frame in chunks]
+            for chunks_done, future in enumerate(as_completed(futures), start=1):
+                future.result()
+                if progress:
+                    _log_progress(chunks_done=chunks_done, number_of_chunks=len(chunks))
+                if kill_event is not None and kill_event.is_set():
+                    logger.info("Triangulation cancelled")
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    return None
+        # (copy out of shared memory before it's unlinked)
+        return (arrays["points3d"].copy(),
+                arrays["mean_reprojection_error"].copy(),
+                arrays["camera_reprojection_error"].copy())
+    finally:
+        arrays = None
+        for shared_memory in shared_memories.values():
+            shared_memory.close()
+            shared_memory.unlink()
+
+
+def _triangulate_chunk(arrays: dict[str, np.ndarray],
+                       cameras: TriangulationCameras,
+                       start_frame: int,
+                       stop_frame: int) -> None:
+    """ Triangulate frames [start_frame, stop_frame) of `arrays["points2d"]`, writing the results into the other arrays """
+    number_of_cameras = cameras.number_of_cameras
+    points2d = arrays["points2d"][:, start_frame:stop_frame].reshape(number_of_cameras, -1, 2)
+    undistorted_points2d = np.stack([
+        cv2.undistortPoints(np.ascontiguousarray(points2d[camera_index]).reshape(-1, 1, 2),
+                            cameras.camera_matrices[camera_index],
+                            cameras.distortion_coefficients[camera_index]).reshape(-1, 2)
+        for camera_index in range(number_of_cameras)])
+    points3d = triangulate_batched(points2d=undistorted_points2d,
+                                   projection_matrices=cameras.extrinsics_matrices)
+    camera_reprojection_errors = np.linalg.norm(
+        calculate_reprojection_errors(image_points=points2d,
+                                      object_points=points3d,
+                                      rotation_vectors=cameras.rotation_vectors,
+                                      translation_vectors=cameras.translation_vectors,
+                                      camera_matrices=cameras.camera_matrices,
+                                      distortion_coefficients=cameras.distortion_coefficients),
+        axis=2)
+    mean_reprojection_errors = nan_mean(camera_reprojection_errors, axis=0)
+    seen_by = (~np.isnan(camera_reprojection_errors)).sum(axis=0)
+    mean_reprojection_errors[seen_by < MINIMUM_CAMERAS_FOR_TRIANGULATION] = np.nan
+
+    chunk_shape = arrays["points3d"][start_frame:stop_frame].shape[:2]
+    arrays["points3d"][start_frame:stop_frame] = points3d.reshape(*chunk_shape, 3)
+    arrays["mean_reprojection_error"][start_frame:stop_frame] = mean_reprojection_errors.reshape(chunk_shape)
+    arrays["camera_reprojection_error"][:, start_frame:stop_frame] = camera_reprojection_errors.reshape(
+        number_of_cameras, *chunk_shape)
+
+
+def _log_progress(chunks_done: int, number_of_chunks: int) -> None:
+    if chunks_done == number_of_chunks or chunks_done % max(number_of_chunks // 10, 1) == 0:
+        logger.info(f"Triangulated {chunks_done}/{number_of_chunks} chunks ({100 * chunks_done / number_of_chunks:.0f}%)")
+
+
+# Per worker process - set once by `_initialize_worker`, so each task only carries its chunk bounds
+_worker_shared_memories: list[SharedMemory] = []
+_worker_arrays: dict[str, np.ndarray] = {}
+_worker_cameras: TriangulationCameras | None = None
+
+
+def _initialize_worker(descriptors: SharedArrayDescriptors, cameras: TriangulationCameras) -> None:
+    global _worker_cameras
+    # (the pool already runs one worker per core)
+    cv2.setNumThreads(1)
+    for array_name, (shared_memory_name, shape) in descriptors.items():
+        # (pool workers share the parent's resource tracker, so attaching here doesn't take ownership - the parent
+        # still unlinks these when it's done)
+        shared_memory = SharedMemory(name=shared_memory_name)
+        _worker_shared_memories.append(shared_memory)
+        _worker_arrays[array_name] = np.ndarray(shape, dtype=np.float64, buffer=shared_memory.buf)
+    _worker_cameras = cameras
+
+
+def _triangulate_chunk_in_worker(start_frame: int, stop_frame: int) -> int:
+    _triangulate_chunk(arrays=_worker_arrays, cameras=_worker_cameras, start_frame=start_frame, stop_frame=stop_frame)
+    return stop_frame - start_frame
@@ -0,0 +1,126 @@
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_FRAMES_IN_FLIGHT: int = 1
+DEFAULT_STALE_FRAME_TIMEOUT_SECONDS: float = 1.0
+# NEXT mode shouldn't drop frames just because the pipeline is slow, but a frame a camera node will never report
+# (e.g. the node died) still can't be allowed to stall the pipeline forever
+NEXT_READ_STALE_FRAME_TIMEOUT_SECONDS: float = 30.0
+
+
+@dataclass
+class PendingFrame:
+    frame_number: int
+    requested_at: float
+    # tracker_type -> camera_id -> camera node output (None until that camera reports)
+    tracker_results: dict[str, dict[str, Any | None]] = field(default_factory=dict)
+    # cameras that won't report anything more for this frame (their missing outputs stay None)
+    finished_camera_ids: set[str] = field(default_factory=set)
+    # True if a camera node couldn't read this frame at all (its camera's ring buffer had already overwritten it)
+    lost: bool = False
+
+    def is_complete(self, camera_ids: list[str], tracker_types: set[str]) -> bool:
+        if not tracker_types:
+            return self.finished_camera_ids.issuperset(camera_ids)
+        for tracker_type in tracker_types:
+            results = self.tracker_results.get(tracker_type, {})
+            if any(results.get(camera_id) is None and camera_id not in self.finished_camera_ids
+                   for camera_id in camera_ids):
+                return False
+        return True
+
+
+@dataclass
+class FrameReorderBuffer:
+    """
+    Keeps track of the frames the aggregation node has asked the camera nodes to process, so more than one frame
+    can be in flight at a time.
+
+    Camera nodes report back out of order (camera A may finish frame N+1 before camera B finishes frame N), so outputs
+    are buffered by frame number and completed frames are released strictly in frame number order.
+    A frame is complete once every camera has reported for every tracker type we have seen so far (or said it has
+    nothing more to report, see `finish_camera`).
+    Frames that are still incomplete `stale_timeout_seconds` after they were requested are dropped, so one lost
+    observation can't stall the pipeline.
+    """
+    camera_ids: list[str]
+    max_frames_in_flight: int = DEFAULT_MAX_FRAMES_IN_FLIGHT
+    stale_timeout_seconds: float = DEFAULT_STALE_FRAME_TIMEOUT_SECONDS
+    pending_frames: dict[int, PendingFrame] = field(default_factory=dict)
+    tracker_types: set[str] = field(default_factory=set)
+    latest_released_frame: int = -1
+    dropped_frame_count: int = 0
+
+    def __post_init__(self):
+        if self.max_frames_in_flight < 1:
+            raise ValueError(f"max_frames_in_flight must be at least 1, got {self.max_frames_in_flight}")
+
+    @property
+    def frames_in_flight(self) -> int:
+        return len(self.pending_frames)
+
+    @property
+    def has_capacity(self) -> bool:
+        return self.frames_in_flight < self.max_frames_in_flight
+
+    def add_request(self, frame_number: int, requested_at: float | None = None) -> None:
+        if frame_number in self.pending_frames or frame_number <= self.latest_released_frame:
+            raise ValueError(f"Frame {frame_number} has already been requested")
+        if not self.has_capacity:
+            raise ValueError(f"Cannot request frame {frame_number} - "
+                             f"already have {self.frames_in_flight} frames in flight (max {self.max_frames_in_flight})")
+        self.pending_frames[frame_number] = PendingFrame(frame_number=frame_number,
+                                                         requested_at=requested_at if requested_at is not None
+                                                         else time.perf_counter())
+
+    def add_output(self, frame_number: int, tracker_type: str, camera_id: str, output: Any) -> None:
+        if camera_id not in self.camera_ids:
+            raise ValueError(f"Camera ID {camera_id} not in camera IDs {self.camera_ids}")
+        pending_frame = self.pending_frames.get(frame_number)
+        if pending_frame is None:
+            # Late arrival for a frame we already released or dropped
+            logger.trace(f"Ignoring output from camera {camera_id} for frame {frame_number} - frame is not in flight")
+            return
+        self.tracker_types.add(tracker_type)
+        if tracker_type not in pending_frame.tracker_results:
+            pending_frame.tracker_results[tracker_type] = {camera_id: None for camera_id in self.camera_ids}
+        pending_frame.tracker_results[tracker_type][camera_id] = output
+
+    def finish_camera(self, frame_number: int, camera_id: str, lost: bool = False) -> None:
+        """
+        A camera won't report any more outputs for this frame (a tracker found nothing, or with `lost`, the frame
+        couldn't be read at all) - the frame completes without them, instead of waiting to go stale
+        """
+        if camera_id not in self.camera_ids:
+            raise ValueError(f"Camera ID {camera_id} not in camera IDs {self.camera_ids}")
+        pending_frame = self.pending_frames.get(frame_number)
+        if pending_frame is None:
+            logger.trace(f"Ignoring finish from camera {camera_id} for frame {frame_number} - frame is not in flight")
+            return
+        pending_frame.finished_camera_ids.add(camera_id)
+        pending_frame.lost |= lost
+
+    def pop_ready(self, now: float | None = None) -> list[PendingFrame]:
+        """
+        Release completed frames in frame number order, dropping stale frames at the head of the buffer.
+        Stops at the first frame that is neither complete nor stale, so output order is always preserved.
+        """
+        now = now if now is not None else time.perf_counter()
+        ready_frames = []
+        for frame_number in sorted(self.pending_frames.keys()):
+            pending_frame = self.pending_frames[frame_number]
+            if pending_frame.is_complete(camera_ids=self.camera_ids, tracker_types=self.tracker_types):
+                ready_frames.append(self.pending_frames.pop(frame_number))
+            elif now - pending_frame.requested_at > self.stale_timeout_seconds:
+                self.pending_frames.pop(frame_number)
+                self.dropped_frame_count += 1
+                logger.warning(f"Dropping frame {frame_number} - not all camera nodes reported back within "
+                               f"{self.stale_timeout_seconds}s (dropped {self.dropped_frame_count} frames so far)")
+            else:
+                break
+            self.latest_released_frame = frame_number
+        return ready_frames
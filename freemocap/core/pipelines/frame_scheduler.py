@@ -0,0 +1,95 @@
+import logging
+import multiprocessing
+from dataclasses import dataclass, field
+from enum import Enum
+
+logger = logging.getLogger(__name__)
+
+
+class ReadTypes(str, Enum):
+    LATEST = "latest"  # For realtime processing, i.e. drop frames to keep up to date
+    NEXT = "next"  # For offline processing, i.e. make sure to process every frame
+
+
+class FrameCounterTypes(Enum):
+    REQUESTED = 0  # frames the aggregation node asked the camera nodes to process
+    AGGREGATED = 1  # frames that made it all the way through aggregation
+    SKIPPED = 2  # (LATEST only) frames never requested because newer frames were already available
+    DROPPED_STALE = 3  # requested frames dropped because a camera node didn't report back in time (NEXT waits longer)
+    LOST = 4  # requested frames a camera node couldn't read - skellycam's ring buffer had already overwritten them
+
+
+@dataclass
+class FrameCounters:
+    """
+    Frame accounting for one pipeline, in shared memory so the main process can report it.
+    Only the aggregation node writes to it, so no lock is needed.
+    """
+    values: multiprocessing.Array = field(default_factory=lambda: multiprocessing.Array('q', len(FrameCounterTypes),
+                                                                                       lock=False))
+
+    def increment(self, counter_type: FrameCounterTypes, amount: int = 1) -> None:
+        self.values[counter_type.value] += amount
+
+    def set(self, counter_type: FrameCounterTypes, value: int) -> None:
+        self.values[counter_type.value] = value
+
+    def to_dict(self) -> dict[str, int]:
+        return {counter_type.name.lower(): int(self.values[counter_type.value]) for counter_type in FrameCounterTypes}
+
+
+@dataclass
+class FrameScheduler:
+    """
+    Decides which frame the aggregation node should request next.
+
+    LATEST always jumps to the newest frame the camera group has published, so a slow pipeline skips frames instead of
+    falling behind (frames also get dropped if a camera node doesn't report back in time).
+    NEXT requests every frame in order and doesn't drop frames for being slow, so a slow pipeline falls behind instead
+    (until it falls a whole ring buffer behind skellycam, and frames get lost).
+    Either way, a frame is only requested when the in-flight window has room, which is what applies the backpressure.
+    """
+    read_type: ReadTypes
+    frame_counters: FrameCounters
+    latest_requested_frame: int = -1
+
+    @property
+    def allows_dropping_frames(self) -> bool:
+        return self.read_type == ReadTypes.LATEST
+
+    def next_frame_to_request(self, latest_available_frame: int) -> int | None:
+        """
+        The frame number to request given the newest frame the camera group has published, or None if there's nothing
+        new to request. Updates the read cursor (`latest_requested_frame`) and counters, so only call this when the
+        returned frame is actually going to be requested.
+        """
+        if latest_available_frame <= self.latest_requested_frame or latest_available_frame < 0:
+            return None
+
+        if self.read_type == ReadTypes.LATEST or self.latest_requested_frame < 0:
+            # (NEXT mode starts from whatever frame is newest when the pipeline attaches)
+            frame_number = latest_available_frame
+            if self.latest_requested_frame >= 0:
+                self.frame_counters.increment(FrameCounterTypes.SKIPPED,
+                                              latest_available_frame - self.latest_requested_frame - 1)
+        elif self.read_type == ReadTypes.NEXT:
+            frame_number = self.latest_requested_frame + 1
+        else:
+            raise ValueError(f"Unknown read type: {self.read_type}")
+
+        self.latest_requested_frame = frame_number
+        self.frame_counters.increment(FrameCounterTypes.REQUESTED)
+        return frame_number
+
+
+def format_prometheus_frame_counters(frame_counters_by_pipeline: dict[str, dict[str, int]]) -> str:
+    """
+    Render `FrameCounters.to_dict()` outputs (keyed by pipeline id) as Prometheus text exposition format
+    """
+    metric_name = "freemocap_pipeline_frames_total"
+    lines = [f"# HELP {metric_name} Frames requested, aggregated and dropped by each processing pipeline",
+             f"# TYPE {metric_name} counter"]
+    for pipeline_id, frame_counters in frame_counters_by_pipeline.items():
+        for counter_name, value in frame_counters.items():
+            lines.append(f'{metric_name}{{pipeline_id="{pipeline_id}",counter="{counter_name}"}} {value}')
+    return "\n".join(lines) + "\n"
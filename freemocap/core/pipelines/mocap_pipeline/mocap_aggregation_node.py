@@ -8,7 +8,7 @@ from typing import Dict
 from skellycam import CameraId
 
 from freemocap.core.pipelines.mocap_pipeline.mocap_camera_node import MocapCameraNodeOutputData
-from freemocap.core.pipelines.mocap_pipeline.point_trangulator import PointTriangulator
+from freemocap.core.pipelines.point_triangulator import PointTriangulator
 from freemocap.core.pipelines.processing_pipeline import BaseAggregationLayerOutputData, BasePipelineStageConfig, \
     AggregationNode, BasePipelineOutputData
 
@@ -91,20 +91,10 @@ class MocapAggregationProcessNode(AggregationNode):
                     raise ValueError(f"Frame numbers from camera nodes do not match! got {frame_numbers}")
                 latest_frame_number = frame_numbers.pop()
 
-                # TODO: Fix triangulation, until then just return the single camera 3d estimates
-                # points2d_by_camera = {camera_id: camera_node_output.mediapipe_observation.all_points(dimensions=2) for
-                #                       camera_id, camera_node_output in camera_node_incoming_data.items()}
-                # points3d: dict[str, tuple] = point_triangulator.triangulate(points2d_by_camera=points2d_by_camera,
-                #                                                             scale_by=0.001)
-
-                points3d = {}
-                for camera_id, camera_node_output in camera_node_incoming_data.items():
-                    if camera_node_output is None:
-                        raise ValueError(f"Camera {camera_id} did not send any data!")
-
-                    points3d.update({f"Cam{camera_id}.{name}": tuple(point_xyz) for name, point_xyz in
-                                     camera_node_output.mediapipe_observation.all_points(dimensions=3,
-                                                                                         scale_by=0.001).items()})
+                points2d_by_camera = {camera_id: camera_node_output.mediapipe_observation.all_points(dimensions=2) for
+                                      camera_id, camera_node_output in camera_node_incoming_data.items()}
+                points3d: dict[str, tuple] = point_triangulator.triangulate(points2d_by_camera=points2d_by_camera,
+                                                                            scale_by=0.001)
 
                 output = MocapPipelineOutputData(camera_node_output=camera_node_incoming_data,  # type: ignore
                                                  aggregation_layer_output=MocapAggregationLayerOutputData(
@@ -0,0 +1,140 @@
+import logging
+import uuid
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OBSERVATION_RING_LENGTH: int = 64
+
+
+def create_observation_dtype(number_of_points: int, point_dimensions: int) -> np.dtype:
+    """
+    Fixed-size record for one tracker observation from one camera.
+    `points` that were not detected are NaN and have `visibility == False`.
+    """
+    return np.dtype([
+        ("frame_number", np.int64),
+        ("points", np.float64, (number_of_points, point_dimensions)),
+        ("visibility", np.bool_, (number_of_points,)),
+        ("time_to_retrieve_frame_ns", np.int64),
+        ("time_to_process_frame_ns", np.int64),
+    ], align=True)
+
+
+def observation_to_points_array(observation) -> tuple[np.ndarray, list[str]]:
+    """
+    Pull the points out of a skellytracker observation as a (number_of_points, dimensions) array (NaN = not detected)
+    """
+    if hasattr(observation, "detected_charuco_corners_in_full_array"):
+        points = np.asarray(observation.detected_charuco_corners_in_full_array, dtype=np.float64)
+        return points, [str(index) for index in range(points.shape[0])]
+    points_by_name = observation.all_points(dimensions=3)
+    return np.asarray(list(points_by_name.values()), dtype=np.float64), list(points_by_name.keys())
+
+
+class ObservationRingBufferDTO(BaseModel):
+    shm_name: str
+    ring_length: int
+    point_names: list[str]
+    point_dimensions: int
+
+
+@dataclass
+class ObservationRingBuffer:
+    """
+    Shared memory ring buffer of fixed-dtype observation records, so camera nodes only have to send a slot index over
+    the pubsub instead of pickling the whole observation.
+
+    Each ring has exactly one writer (one ring per camera per tracker type), so slots can be claimed without locking.
+    Readers get a view straight into shared memory - copy anything that needs to outlive `ring_length` more writes.
+    """
+    dto: ObservationRingBufferDTO
+    shm: shared_memory.SharedMemory
+    records: np.ndarray
+    owner: bool
+    write_count: int = 0
+
+    @classmethod
+    def create(cls,
+               point_names: list[str],
+               point_dimensions: int,
+               ring_length: int = DEFAULT_OBSERVATION_RING_LENGTH):
+        dtype = create_observation_dtype(number_of_points=len(point_names), point_dimensions=point_dimensions)
+        shm = shared_memory.SharedMemory(name=f"fmc_obs_{uuid.uuid4().hex[:12]}",
+                                         create=True,
+                                         size=dtype.itemsize * ring_length)
+        records = np.ndarray((ring_length,), dtype=dtype, buffer=shm.buf)
+        records["frame_number"] = -1
+        return cls(dto=ObservationRingBufferDTO(shm_name=shm.name,
+                                                ring_length=ring_length,
+                                                point_names=list(point_names),
+                                                point_dimensions=point_dimensions),
+                   shm=shm,
+                   records=records,
+                   owner=True)
+
+    @classmethod
+    def recreate(cls, dto: ObservationRingBufferDTO):
+        dtype = create_observation_dtype(number_of_points=len(dto.point_names), point_dimensions=dto.point_dimensions)
+        shm = shared_memory.SharedMemory(name=dto.shm_name)
+        records = np.ndarray((dto.ring_length,), dtype=dtype, buffer=shm.buf)
+        return cls(dto=dto,
+                   shm=shm,
+                   records=records,
+                   owner=False)
+
+    @property
+    def number_of_points(self) -> int:
+        return len(self.dto.point_names)
+
+    def to_dto(self) -> ObservationRingBufferDTO:
+        return self.dto
+
+    def fits(self, points: np.ndarray) -> bool:
+        return points.shape == (self.number_of_points, self.dto.point_dimensions)
+
+    def write(self,
+              frame_number: int,
+              points: np.ndarray,
+              time_to_retrieve_frame_ns: int = 0,
+              time_to_process_frame_ns: int = 0) -> int:
+        """
+        Write an observation into the next slot and return that slot's index.
+        """
+        if not self.owner:
+            raise ValueError(f"Only the process that created observation ring {self.dto.shm_name} can write to it")
+        if not self.fits(points):
+            raise ValueError(f"Expected points with shape {(self.number_of_points, self.dto.point_dimensions)}, "
+                             f"got {points.shape}")
+        slot_index = self.write_count % self.dto.ring_length
+        record = self.records[slot_index]
+        record["frame_number"] = -1  # mark the slot as mid-write
+        record["points"] = points
+        record["visibility"] = ~np.isnan(points).any(axis=1)
+        record["time_to_retrieve_frame_ns"] = time_to_retrieve_frame_ns
+        record["time_to_process_frame_ns"] = time_to_process_frame_ns
+        record["frame_number"] = frame_number
+        self.write_count += 1
+        return slot_index
+
+    def read(self, slot_index: int, frame_number: int) -> np.void | None:
+        """
+        Zero-copy view of the record in `slot_index`.
+        Returns None if the slot has since been overwritten (i.e. the reader fell more than `ring_length` writes behind)
+        """
+        record = self.records[slot_index]
+        if record["frame_number"] != frame_number:
+            logger.warning(f"Observation ring {self.dto.shm_name} slot {slot_index} was overwritten before it was "
+                           f"read (expected frame {frame_number}, found {record['frame_number']})")
+            return None
+        return record
+
+    def close(self):
+        self.records = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,147 @@
+import time
+import uuid
+from dataclasses import dataclass
+from enum import Enum
+from multiprocessing import shared_memory
+
+import numpy as np
+from pydantic import BaseModel
+
+HEADER_LENGTH: int = 1  # (pipeline kill flag,) int64
+
+
+class NodeState(Enum):
+    CREATED = 0
+    RUNNING = 1
+    STOPPING = 2
+    STOPPED = 3
+    FAILED = 4
+
+
+class NodeErrorCode(Enum):
+    NONE = 0
+    UNHANDLED_EXCEPTION = 1  # the node's loop raised - see the node's log for the traceback
+
+
+class NodeControlField(Enum):
+    SHUTDOWN = 0  # written by the main process
+    STATE = 1  # every other field is written by the node itself
+    HEARTBEAT_NS = 2  # `time.perf_counter_ns()` at the top of the node's latest loop iteration
+    LAST_FRAME_NUMBER = 3  # -1 until the node has handled a frame
+    ERROR_CODE = 4
+
+
+class PipelineControlBlockDTO(BaseModel):
+    shm_name: str
+    node_names: list[str]
+
+
+@dataclass
+class PipelineControlBlock:
+    """
+    One shared memory block per pipeline holding its control and liveness state: the pipeline kill flag, plus each
+    node's shutdown flag, state, heartbeat, last processed frame number and error code.
+
+    Every field is an aligned int64 with exactly one writer (the main process writes the kill/shutdown flags, each node
+    writes the rest of its own row), so nothing takes a lock - hot loops read their flags for the cost of a memory
+    load, and the API can poll every node's liveness and progress without touching the nodes.
+
+    Pickles as its DTO, so it can ride along inside `PipelineIPC` to thread and process workers alike.
+    """
+    node_names: list[str]
+    shm: shared_memory.SharedMemory
+    header: np.ndarray  # (HEADER_LENGTH,) int64
+    nodes: np.ndarray  # (nodes, fields) int64
+    owner: bool
+
+    @classmethod
+    def create(cls, node_names: list[str]):
+        shm = shared_memory.SharedMemory(name=f"fmc_ctl_{uuid.uuid4().hex[:12]}",
+                                         create=True,
+                                         size=(HEADER_LENGTH + len(node_names) * len(NodeControlField)) *
+                                              np.dtype(np.int64).itemsize)
+        control_block = cls._attach(node_names=list(node_names), shm=shm, owner=True)
+        control_block.header[:] = 0
+        control_block.nodes[:] = 0
+        control_block.nodes[:, NodeControlField.LAST_FRAME_NUMBER.value] = -1
+        return control_block
+
+    @classmethod
+    def recreate(cls, dto: PipelineControlBlockDTO):
+        return cls._attach(node_names=dto.node_names,
+                           shm=shared_memory.SharedMemory(name=dto.shm_name),
+                           owner=False)
+
+    @classmethod
+    def _attach(cls, node_names: list[str], shm: shared_memory.SharedMemory, owner: bool):
+        header = np.ndarray((HEADER_LENGTH,), dtype=np.int64, buffer=shm.buf)
+        nodes = np.ndarray((len(node_names), len(NodeControlField)), dtype=np.int64, buffer=shm.buf,
+                           offset=header.nbytes)
+        return cls(node_names=node_names, shm=shm, header=header, nodes=nodes, owner=owner)
+
+    def to_dto(self) -> PipelineControlBlockDTO:
+        return PipelineControlBlockDTO(shm_name=self.shm.name, node_names=self.node_names)
+
+    def __getstate__(self):
+        return self.to_dto()
+
+    def __setstate__(self, dto: PipelineControlBlockDTO):
+        attached = self._attach(node_names=dto.node_names, shm=shared_memory.SharedMemory(name=dto.shm_name),
+                                owner=False)
+        self.__dict__.update(attached.__dict__)
+
+    def node_index(self, node_name: str) -> int:
+        return self.node_names.index(node_name)
+
+    @property
+    def pipeline_killed(self) -> bool:
+        return bool(self.header[0])
+
+    def kill_pipeline(self) -> None:
+        self.header[0] = 1
+
+    def should_continue(self, node_index: int) -> bool:
+        """ Whether the pipeline is alive and this node hasn't been told to shut down """
+        return not self.header[0] and not self.nodes[node_index, NodeControlField.SHUTDOWN.value]
+
+    def request_shutdown(self, node_index: int) -> None:
+        self.nodes[node_index, NodeControlField.SHUTDOWN.value] = 1
+
+    def set_state(self, node_index: int, state: NodeState) -> None:
+        self.nodes[node_index, NodeControlField.STATE.value] = state.value
+
+    def heartbeat(self, node_index: int) -> None:
+        self.nodes[node_index, NodeControlField.HEARTBEAT_NS.value] = time.perf_counter_ns()
+
+    def set_last_frame_number(self, node_index: int, frame_number: int) -> None:
+        self.nodes[node_index, NodeControlField.LAST_FRAME_NUMBER.value] = frame_number
+
+    def set_error(self, node_index: int, error_code: NodeErrorCode) -> None:
+        self.nodes[node_index, NodeControlField.ERROR_CODE.value] = error_code.value
+        self.nodes[node_index, NodeControlField.STATE.value] = NodeState.FAILED.value
+
+    def summarize(self) -> dict:
+        """
+        {pipeline_killed, nodes: {node name: {state, shutdown_requested, heartbeat_age_ms, last_frame_number, error}}}.
+        `heartbeat_age_ms` is None for nodes that haven't started their loop yet.
+        """
+        now_ns = time.perf_counter_ns()
+        nodes = self.nodes.copy()
+        summary = {"pipeline_killed": self.pipeline_killed, "nodes": {}}
+        for node_name, node_row in zip(self.node_names, nodes):
+            heartbeat_ns = int(node_row[NodeControlField.HEARTBEAT_NS.value])
+            summary["nodes"][node_name] = {
+                "state": NodeState(int(node_row[NodeControlField.STATE.value])).name.lower(),
+                "shutdown_requested": bool(node_row[NodeControlField.SHUTDOWN.value]),
+                "heartbeat_age_ms": (now_ns - heartbeat_ns) / 1e6 if heartbeat_ns else None,
+                "last_frame_number": int(node_row[NodeControlField.LAST_FRAME_NUMBER.value]),
+                "error": NodeErrorCode(int(node_row[NodeControlField.ERROR_CODE.value])).name.lower(),
+            }
+        return summary
+
+    def close(self) -> None:
+        self.header = None
+        self.nodes = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
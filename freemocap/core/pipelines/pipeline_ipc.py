@@ -1,8 +1,11 @@
 import multiprocessing
 import uuid
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 
-from freemocap.core.pubsub.pubsub_manager import PubSubTopicManager, create_pipeline_pubsub_manager
+from freemocap.core.pipelines.pipeline_control_block import PipelineControlBlock
+from freemocap.core.pipelines.pipeline_latency_histograms import PipelineLatencyHistograms
+from freemocap.core.pubsub.pubsub_manager import PubSubTopicManager, create_pipeline_pubsub_manager, \
+    close_pipeline_pubsub_manager
 from freemocap.core.types.type_overloads import PipelineIdString
 
 from skellycam.core.ipc.shared_memory.camera_group_shared_memory import CameraGroupSharedMemoryDTO
@@ -12,11 +15,14 @@ class PipelineIPC:
     pubsub: PubSubTopicManager
     pipeline_id: PipelineIdString
     global_kill_flag: multiprocessing.Value
-    pipeline_kill_flag: multiprocessing.Value = field(default_factory=lambda: multiprocessing.Value('b', False))
+    latency_histograms: PipelineLatencyHistograms
+    control_block: PipelineControlBlock
 
     @classmethod
     def create(cls,
                global_kill_flag: multiprocessing.Value,
+               camera_ids: list[str],
+               node_names: list[str],
                pipeline_id: PipelineIdString | None = None):
         if pipeline_id is None:
             pipeline_id = str(uuid.uuid4())[:6]
@@ -25,15 +31,34 @@ class PipelineIPC:
             pipeline_id=pipeline_id,
             pubsub=pubsub,
             global_kill_flag=global_kill_flag,
+            latency_histograms=PipelineLatencyHistograms.create(camera_ids=camera_ids),
+            control_block=PipelineControlBlock.create(node_names=node_names),
         )
 
+    @property
+    def global_kill(self) -> bool:
+        # The global kill flag is shared with skellycam, so it stays a `multiprocessing.Value` - but it only ever flips
+        # from False to True, so read the raw value without taking its lock
+        return bool(self.global_kill_flag.get_obj().value)
+
+    @property
     def should_continue(self) -> bool:
-        return not self.global_kill_flag.value and not self.pipeline_kill_flag.value
+        return not self.global_kill and not self.control_block.pipeline_killed
+
+    def node_should_continue(self, node_index: int) -> bool:
+        return not self.global_kill and self.control_block.should_continue(node_index=node_index)
 
     def kill_pipeline(self):
-        self.pipeline_kill_flag.value = True
+        self.control_block.kill_pipeline()
         self.pubsub.close()
 
     def kill_everything(self):
         self.kill_pipeline()
         self.global_kill_flag.value = True
+
+    def close(self):
+        """ Release the pipeline's shared memory - call after every node has exited """
+        close_pipeline_pubsub_manager(pipeline_id=self.pipeline_id)
+        self.pubsub.close()
+        self.latency_histograms.close()
+        self.control_block.close()
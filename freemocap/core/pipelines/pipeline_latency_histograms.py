@@ -0,0 +1,162 @@
+import math
+import uuid
+from dataclasses import dataclass
+from enum import Enum
+from multiprocessing import shared_memory
+
+import numpy as np
+from pydantic import BaseModel
+
+# Log-spaced latency bins - BINS_PER_OCTAVE bins per doubling, starting at MINIMUM_BIN_NS (i.e. ~19% bin width)
+MINIMUM_BIN_NS: int = 1_000
+BINS_PER_OCTAVE: int = 4
+NUMBER_OF_BINS: int = 26 * BINS_PER_OCTAVE  # 1us -> ~67s
+REPORTED_QUANTILES: tuple[float, ...] = (0.5, 0.95, 0.99)
+PIPELINE_ROW_NAME: str = "pipeline"
+
+
+class PipelineTraceStage(Enum):
+    REQUEST_QUEUE = 0  # aggregation node requests a frame -> camera node picks up the request
+    FRAME_RETRIEVAL = 1  # camera node copies the frame out of the camera group's shared memory
+    TRACKER_INFERENCE = 2  # one tracker's `process_image` call
+    CAMERA_OUTPUT_QUEUE = 3  # camera node publishes an observation -> aggregation node receives it
+    AGGREGATION = 4  # aggregation calculations (triangulation etc.) for one completed frame
+    END_TO_END = 5  # aggregation node requests a frame -> aggregation output for that frame is published
+    WEBSOCKET_SEND = 6  # sending one frontend payload over the websocket
+
+
+class PipelineLatencyHistogramsDTO(BaseModel):
+    shm_name: str
+    camera_ids: list[str]
+
+
+@dataclass
+class PipelineLatencyHistograms:
+    """
+    Per-camera, per-stage latency histograms in shared memory, shared by every node in a pipeline.
+
+    Rows are cameras (in `camera_ids` order) plus one final `pipeline` row for the camera-group-wide stages.
+    Every (row, stage) cell has exactly one writer (e.g. camera node N owns its row's retrieval/inference cells, the
+    aggregation node owns the CAMERA_OUTPUT_QUEUE cells), so recording a span is a lock-free increment.
+    Readers may see a cell mid-update, which is fine for metrics.
+
+    Pickles as its DTO, so it can ride along inside `PipelineIPC` to thread and process workers alike.
+    """
+    camera_ids: list[str]
+    shm: shared_memory.SharedMemory
+    counts: np.ndarray  # (rows, stages, bins) uint64
+    sums_ns: np.ndarray  # (rows, stages) uint64
+    owner: bool
+
+    @classmethod
+    def create(cls, camera_ids: list[str]):
+        shm = shared_memory.SharedMemory(name=f"fmc_lat_{uuid.uuid4().hex[:12]}",
+                                         create=True,
+                                         size=cls._buffer_size(number_of_rows=len(camera_ids) + 1))
+        histograms = cls._attach(camera_ids=list(camera_ids), shm=shm, owner=True)
+        histograms.reset()
+        return histograms
+
+    @classmethod
+    def recreate(cls, dto: PipelineLatencyHistogramsDTO):
+        return cls._attach(camera_ids=dto.camera_ids,
+                           shm=shared_memory.SharedMemory(name=dto.shm_name),
+                           owner=False)
+
+    @classmethod
+    def _attach(cls, camera_ids: list[str], shm: shared_memory.SharedMemory, owner: bool):
+        number_of_rows = len(camera_ids) + 1
+        number_of_stages = len(PipelineTraceStage)
+        counts = np.ndarray((number_of_rows, number_of_stages, NUMBER_OF_BINS), dtype=np.uint64, buffer=shm.buf)
+        sums_ns = np.ndarray((number_of_rows, number_of_stages), dtype=np.uint64, buffer=shm.buf, offset=counts.nbytes)
+        return cls(camera_ids=camera_ids, shm=shm, counts=counts, sums_ns=sums_ns, owner=owner)
+
+    @staticmethod
+    def _buffer_size(number_of_rows: int) -> int:
+        return number_of_rows * len(PipelineTraceStage) * (NUMBER_OF_BINS + 1) * np.dtype(np.uint64).itemsize
+
+    def to_dto(self) -> PipelineLatencyHistogramsDTO:
+        return PipelineLatencyHistogramsDTO(shm_name=self.shm.name, camera_ids=self.camera_ids)
+
+    def __getstate__(self):
+        return self.to_dto()
+
+    def __setstate__(self, dto: PipelineLatencyHistogramsDTO):
+        attached = self._attach(camera_ids=dto.camera_ids, shm=shared_memory.SharedMemory(name=dto.shm_name), owner=False)
+        self.__dict__.update(attached.__dict__)
+
+    @property
+    def row_names(self) -> list[str]:
+        return self.camera_ids + [PIPELINE_ROW_NAME]
+
+    def row_for(self, camera_id: str | None) -> int:
+        """ Row index for a camera, or the pipeline-wide row if `camera_id` is None """
+        if camera_id is None:
+            return len(self.camera_ids)
+        return self.camera_ids.index(camera_id)
+
+    def record(self, row: int, stage: PipelineTraceStage, duration_ns: int) -> None:
+        duration_ns = max(int(duration_ns), 0)
+        bin_index = 0
+        if duration_ns > MINIMUM_BIN_NS:
+            bin_index = min(int(BINS_PER_OCTAVE * math.log2(duration_ns / MINIMUM_BIN_NS)), NUMBER_OF_BINS - 1)
+        self.counts[row, stage.value, bin_index] += 1
+        self.sums_ns[row, stage.value] += duration_ns
+
+    def reset(self) -> None:
+        self.counts[:] = 0
+        self.sums_ns[:] = 0
+
+    def summarize(self) -> dict[str, dict[str, dict[str, float]]]:
+        """
+        {stage name: {camera id (or "pipeline"): {count, mean_ms, p50_ms, p95_ms, p99_ms}}}, skipping empty cells.
+        Quantiles are reported at the geometric center of the bin they land in.
+        """
+        counts = self.counts.copy()
+        sums_ns = self.sums_ns.copy()
+        bin_centers_ms = MINIMUM_BIN_NS * 2 ** ((np.arange(NUMBER_OF_BINS) + 0.5) / BINS_PER_OCTAVE) / 1e6
+        summary = {}
+        for stage in PipelineTraceStage:
+            stage_summary = {}
+            for row, row_name in enumerate(self.row_names):
+                cell_counts = counts[row, stage.value]
+                total = int(cell_counts.sum())
+                if total == 0:
+                    continue
+                cumulative_counts = np.cumsum(cell_counts)
+                cell_summary = {"count": total,
+                                "mean_ms": float(sums_ns[row, stage.value]) / total / 1e6}
+                for quantile in REPORTED_QUANTILES:
+                    bin_index = int(np.searchsorted(cumulative_counts, quantile * total))
+                    cell_summary[f"p{int(quantile * 100)}_ms"] = float(bin_centers_ms[bin_index])
+                stage_summary[row_name] = cell_summary
+            if stage_summary:
+                summary[stage.name.lower()] = stage_summary
+        return summary
+
+    def close(self) -> None:
+        self.counts = None
+        self.sums_ns = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def format_prometheus_metrics(summaries_by_pipeline: dict[str, dict[str, dict[str, dict[str, float]]]]) -> str:
+    """
+    Render `PipelineLatencyHistograms.summarize()` outputs (keyed by pipeline id) as Prometheus text exposition format
+    """
+    metric_name = "freemocap_pipeline_stage_latency_seconds"
+    lines = [f"# HELP {metric_name} Per-frame latency of each processing pipeline stage",
+             f"# TYPE {metric_name} summary"]
+    for pipeline_id, summary in summaries_by_pipeline.items():
+        for stage_name, stage_summary in summary.items():
+            for row_name, cell_summary in stage_summary.items():
+                labels = f'pipeline_id="{pipeline_id}",stage="{stage_name}",camera_id="{row_name}"'
+                for quantile in REPORTED_QUANTILES:
+                    lines.append(f'{metric_name}{{{labels},quantile="{quantile}"}} '
+                                 f'{cell_summary[f"p{int(quantile * 100)}_ms"] / 1e3:.9f}')
+                lines.append(f"{metric_name}_sum{{{labels}}} "
+                             f"{cell_summary['mean_ms'] * cell_summary['count'] / 1e3:.9f}")
+                lines.append(f"{metric_name}_count{{{labels}}} {cell_summary['count']}")
+    return "\n".join(lines) + "\n"
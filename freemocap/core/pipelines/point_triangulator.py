@@ -0,0 +1,64 @@
+from dataclasses import dataclass
+
+import numpy as np
+from skellycam.core.types.type_overloads import CameraIdString
+
+from freemocap.core.pipelines.batched_triangulation import triangulate_batched, MINIMUM_CAMERAS_FOR_TRIANGULATION
+from freemocap.core.pipelines.calibration_store import CalibrationStore, CameraCalibrationData, CalibrationSnapshot
+
+MINIUMUM_CAMERAS_FOR_TRIANGULATION = MINIMUM_CAMERAS_FOR_TRIANGULATION
+
+@dataclass
+class PointTriangulator:
+    calibration_store: CalibrationStore
+
+    @classmethod
+    def create(cls, calibration_toml_path: str | None = None):
+        return cls(calibration_store=CalibrationStore.create(calibration_toml_path=calibration_toml_path))
+
+    @property
+    def camera_calibrations(self) -> dict[CameraIdString, CameraCalibrationData]:
+        calibration = self.calibration_store.snapshot
+        return calibration.camera_calibrations if calibration is not None else {}
+
+    @property
+    def camera_calibrations_array(self) -> np.ndarray:
+        return self.calibration_store.snapshot.projection_matrices
+
+    def triangulate_array(self,
+                          points2d: np.ndarray,
+                          visibility: np.ndarray | None = None,
+                          calibration: CalibrationSnapshot | None = None) -> np.ndarray:
+        """
+        Triangulate a (num_cams, num_points, 2) array of distorted pixel coordinates (cameras in the same order as
+        `camera_calibrations`, NaN where a camera didn't see a point) into a (num_points, 3) array.
+        Pass `calibration` to triangulate with a snapshot you've already checked, rather than the store's current one.
+        """
+        if calibration is None:
+            calibration = self.calibration_store.snapshot
+        if calibration is None:
+            raise ValueError(f"No calibration found at {self.calibration_store.calibration_toml_path}")
+        return triangulate_batched(points2d=calibration.undistort_points(points2d),
+                                   projection_matrices=calibration.projection_matrices,
+                                   visibility=visibility,
+                                   minimum_cameras=MINIUMUM_CAMERAS_FOR_TRIANGULATION)
+
+    def triangulate(self, points2d_by_camera: dict[CameraIdString, dict[str, tuple]], scale_by: float) -> dict[str, tuple]:
+        point_names: list[str] = []
+        for camera_id, points2d in points2d_by_camera.items():
+            if not point_names:
+                point_names = list(points2d.keys())
+                continue
+            if point_names != list(points2d.keys()):
+                raise ValueError(f"Expected point names to match, got {point_names} and {list(points2d.keys())}")
+
+        points2d_array = np.array([[points2d[point_name][:2] for point_name in point_names]
+                                   for points2d in points2d_by_camera.values()], dtype=np.float64)
+        points3d_array = self.triangulate_array(points2d=points2d_array) * scale_by
+        return {point_name: tuple(point3d) for point_name, point3d in zip(point_names, points3d_array)}
+
+
+if __name__ == "__main__":
+    _point_triangulator = PointTriangulator.create()
+    _points2d = np.random.rand(len(_point_triangulator.camera_calibrations), 10, 2) * 100
+    print(_point_triangulator.triangulate_array(_points2d))
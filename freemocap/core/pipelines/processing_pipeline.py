@@ -1,11 +1,11 @@
 import logging
 import logging
 import multiprocessing
+import time
 import uuid
 from abc import ABC
 from copy import deepcopy
 from dataclasses import dataclass
-from enum import Enum, auto
 from typing import Hashable
 
 import numpy as np
@@ -17,23 +17,32 @@ from skellycam.core.ipc.shared_memory.shared_memory_number import SharedMemoryNu
 from skellycam.core.ipc.shared_memory.shared_memory_element import SharedMemoryElementDTO
 from skellycam.core.types.type_overloads import CameraIdString, WorkerType, WorkerStrategy, TopicSubscriptionQueue, \
     CameraGroupIdString
-from skellycam.utilities.wait_functions import wait_1ms
 from skellytracker.trackers.base_tracker.base_tracker_abcs import BaseTracker, BaseImageAnnotator, \
-    BaseImageAnnotatorConfig
+    BaseImageAnnotatorConfig, BaseTrackerConfig
 from skellytracker.trackers.base_tracker.base_tracker_abcs import TrackerTypeString
 
+from freemocap.core.pipelines.frame_scheduler import ReadTypes, FrameScheduler, FrameCounters, FrameCounterTypes
+from freemocap.core.pipelines.frame_reorder_buffer import FrameReorderBuffer, DEFAULT_MAX_FRAMES_IN_FLIGHT, \
+    DEFAULT_STALE_FRAME_TIMEOUT_SECONDS, NEXT_READ_STALE_FRAME_TIMEOUT_SECONDS
+from freemocap.core.pipelines.observation_ring_buffer import ObservationRingBuffer, observation_to_points_array
+from freemocap.core.pipelines.pipeline_control_block import PipelineControlBlock, NodeState, NodeErrorCode
 from freemocap.core.pipelines.pipeline_ipc import PipelineIPC
+from freemocap.core.pipelines.pipeline_latency_histograms import PipelineTraceStage
+from freemocap.core.pipelines.point_triangulator import PointTriangulator
+from freemocap.core.pubsub.pubsub_codecs import create_message
 from freemocap.core.pubsub.pubsub_manager import TopicTypes
+from freemocap.core.pubsub.pubsub_wakeup import NodeWakeup, NODE_WAKEUP_TIMEOUT_SECONDS
 from freemocap.core.pubsub.pubsub_topics import SkellyTrackerConfigsMessage, ProcessFrameNumberMessage, \
-    CameraNodeOutputMessage, AggregationNodeOutputMessage
+    CameraNodeOutputMessage, AggregationNodeOutputMessage, BroadcastSubscription, NO_OBSERVATION_SLOT_INDEX, \
+    LOST_FRAME_SLOT_INDEX
 from freemocap.core.types.type_overloads import PipelineIdString
+from freemocap.system.paths_and_filenames.path_getters import get_last_successful_calibration_toml_path
 
 logger = logging.getLogger(__name__)
 
-
-class ReadTypes(str, Enum):
-    LATEST = auto()  # For realtime processing, i.e. drop frames to keep up to date
-    NEXT = auto()  # For offline processing, i.e. make sure to process every frame
+# The camera group's shared memory is written by skellycam, which can't notify our nodes,
+# so the aggregation node checks for new frames at this interval while it has nothing in flight
+NEW_FRAME_POLL_INTERVAL_SECONDS: float = 0.001
 
 
 class BasePipelineData(BaseModel, ABC):
@@ -69,149 +78,284 @@ class BasePipelineOutputData(BasePipelineData):
 
 @dataclass
 class CameraNode:
-    camera_id: CameraIdString
-    shutdown_self_flag: multiprocessing.Value
+    """
+    Runs the trackers on the frames of one or more cameras.
+
+    The default is one node per camera. A batched node serves every camera in the group from a single worker with a
+    single set of trackers (i.e. one copy of each model), pulling the requested frame number from every camera's ring
+    buffer in turn - far less RAM on CPU-only machines, at the cost of running the cameras' inference one after another.
+    NOTE - trackers that carry state from frame to frame (e.g. tracking mode) see interleaved cameras in batched mode.
+    """
+    camera_ids: list[CameraIdString]
+    node_index: int
+    control_block: PipelineControlBlock
+    wakeup: NodeWakeup
     worker: WorkerType
 
+    @staticmethod
+    def node_name(camera_ids: list[CameraIdString]) -> str:
+        return f"camera_node-{'-'.join(camera_ids)}"
+
     @classmethod
     def create(cls,
-               camera_id: CameraIdString,
-               camera_shm_dto: SharedMemoryRingBufferDTO,
+               camera_shm_dtos: dict[CameraIdString, SharedMemoryRingBufferDTO],
                worker_strategy: WorkerStrategy,
                ipc: PipelineIPC):
-        shutdown_self_flag = multiprocessing.Value('b', False)
-        return cls(camera_id=camera_id,
-                   shutdown_self_flag=shutdown_self_flag,
+        camera_ids = list(camera_shm_dtos.keys())
+        node_index = ipc.control_block.node_index(cls.node_name(camera_ids))
+        wakeup = NodeWakeup()
+        return cls(camera_ids=camera_ids,
+                   node_index=node_index,
+                   control_block=ipc.control_block,
+                   wakeup=wakeup,
                    worker=worker_strategy.value(target=cls._run,
-                                                name=f"CameraProcessingNode-{camera_id}",
-                                                kwargs=dict(camera_id=camera_id,
-                                                            camera_shm_dto=camera_shm_dto,
+                                                name=f"CameraProcessingNode-{'-'.join(camera_ids)}",
+                                                kwargs=dict(camera_shm_dtos=camera_shm_dtos,
                                                             ipc=ipc,
-                                                            shutdown_self_flag=shutdown_self_flag,
+                                                            node_index=node_index,
+                                                            wakeup=wakeup,
                                                             process_frame_number_subscription=ipc.pubsub.get_subscription(
-                                                                TopicTypes.PROCESS_FRAME_NUMBER),
+                                                                TopicTypes.PROCESS_FRAME_NUMBER,
+                                                                wakeup=wakeup),
                                                             skelly_tracker_configs_subscription=ipc.pubsub.get_subscription(
-                                                                TopicTypes.SKELLY_TRACKER_CONFIGS)
+                                                                TopicTypes.SKELLY_TRACKER_CONFIGS,
+                                                                wakeup=wakeup)
                                                             ),
                                                 daemon=True
                                                 ),
                    )
 
     @staticmethod
-    def _run(camera_id: CameraIdString,
-             mf_ring_shm_dto: SharedMemoryRingBufferDTO,
+    def _run(camera_shm_dtos: dict[CameraIdString, SharedMemoryRingBufferDTO],
              ipc: PipelineIPC,
              process_frame_number_subscription: TopicSubscriptionQueue,
              skelly_tracker_configs_subscription: TopicSubscriptionQueue,
-             shutdown_self_flag: multiprocessing.Value,
+             node_index: int,
+             wakeup: NodeWakeup,
              ):
         if multiprocessing.parent_process():
             # Configure logging if multiprocessing (i.e. if there is a parent process)
             from freemocap.system.logging_configuration.configure_logging import configure_logging
             from freemocap import LOG_LEVEL
             configure_logging(LOG_LEVEL, ws_queue=ipc.pubsub.topics[TopicTypes.LOGS].publication)
-        logger.trace(f"Starting camera processing node for camera {camera_id}")
-        camera_shm = FramePayloadSharedMemoryRingBuffer.recreate(dto=mf_ring_shm_dto,
-                                                                 read_only=False)
+        camera_ids = list(camera_shm_dtos.keys())
+        logger.trace(f"Starting camera processing node for cameras {camera_ids}")
+        camera_shms = {camera_id: FramePayloadSharedMemoryRingBuffer.recreate(dto=camera_shm_dto,
+                                                                              read_only=False)
+                       for camera_id, camera_shm_dto in camera_shm_dtos.items()}
         trackers: list[BaseTracker] = []
-        frame_rec_array: np.recarray | None = None
-        while ipc.should_continue and not shutdown_self_flag.value:
-            wait_1ms()
-
-            # Check trackers config updates
-            if not skelly_tracker_configs_subscription.empty():
-                skelly_tracker_configs_message = skelly_tracker_configs_subscription.get()
-                if not isinstance(skelly_tracker_configs_message, SkellyTrackerConfigsMessage):
-                    raise ValueError(f"Expected SkellyTrackerConfigsMessage got {type(skelly_tracker_configs_message)}")
-                logger.debug(f"Received new skelly tracker s for camera {camera_id}: {skelly_tracker_configs_message}")
-
-                # TODO - This method of updating trackers is sloppy and won't scale as we add more trackers, should make more sophisticated
-                tracker_configs = deepcopy(skelly_tracker_configs_message.tracker_configs)
-                # Create or update the tracker for this camera
-                delete_these = []
-                for existing_tracker in trackers:
-                    for tracker_index, tracker_config in enumerate(tracker_configs):
-                        if isinstance(existing_tracker.config, tracker_config):
-                            existing_tracker.update_config(tracker_config)
-                            delete_these.append(tracker_index)
-                # Remove trackers that were updated
-                for index in delete_these:
-                    del tracker_configs[index]
-
-                for tracker_config in tracker_configs:
-                    from skellytracker.trackers.charuco_tracker import CharucoTracker, CharucoTrackerConfig
-                    from skellytracker.trackers.mediapipe_tracker import MediapipeTracker, MediapipeTrackerConfig
-
-                    if isinstance(tracker_config, CharucoTrackerConfig):
-                        trackers.append(CharucoTracker.create(config=tracker_config))
-                    elif isinstance(tracker_config, MediapipeTrackerConfig):
-                        trackers.append(MediapipeTracker.create(config=tracker_config))
-                    else:
-                        raise ValueError(f"Unknown tracker config type: {type(tracker_config)}")
-
-                logger.debug(
-                    f"Camera {camera_id}, created/updates trackers: {', '.join([tracker.__class__.__name__ for tracker in trackers])}")
-
-            # Check for new frame to process
-            if not process_frame_number_subscription.empty():
-                process_frame_number_message = process_frame_number_subscription.get()
-                if not isinstance(process_frame_number_message, ProcessFrameNumberMessage):
-                    raise ValueError(
-                        f"Expected ProcessFrameNumberMessage for process frame number, got {type(process_frame_number_message)}")
-
-                logger.debug(
-                    f"Camera {camera_id} received request to process frame number {process_frame_number_message.frame_number}")
-
-                # Process the frame
-                frame_rec_array = camera_shm.get_data_by_index(index=process_frame_number_message.frame_number,
-                                                               frame_rec_array=frame_rec_array)
-                for tracker in trackers:
-                    observation = tracker.process_image(frame_number=frame_rec_array.frame_metadata.frame_number,
-                                                        image=frame_rec_array.image, )
-                    if observation is not None:
-                        # Publish the observation to the IPC
-                        ipc.pubsub.topics[TopicTypes.CAMERA_NODE_OUTPUT].publish(
-                            CameraNodeOutputMessage(frame_metadata=frame_rec_array.metadata,
-                                                    tracker_name=tracker.__class__.__name__,
-                                                    observation=observation))
+        observation_rings: dict[tuple[CameraIdString, TrackerTypeString], ObservationRingBuffer] = {}
+        latency_histograms = ipc.latency_histograms
+        latency_rows = {camera_id: latency_histograms.row_for(camera_id) for camera_id in camera_ids}
+        frame_rec_arrays: dict[CameraIdString, np.recarray | None] = {camera_id: None for camera_id in camera_ids}
+        processed_frame_numbers: set[int] = set()
+        control_block = ipc.control_block
+        control_block.set_state(node_index=node_index, state=NodeState.RUNNING)
+        try:
+            while ipc.node_should_continue(node_index=node_index):
+                control_block.heartbeat(node_index=node_index)
+                # Sleep until a subscribed topic gets a message (timeout so we still notice shutdown flags)
+                wakeup.wait(timeout=NODE_WAKEUP_TIMEOUT_SECONDS)
+
+                # Check trackers config updates
+                while not skelly_tracker_configs_subscription.empty():
+                    skelly_tracker_configs_message = skelly_tracker_configs_subscription.get()
+                    if not isinstance(skelly_tracker_configs_message, SkellyTrackerConfigsMessage):
+                        raise ValueError(f"Expected SkellyTrackerConfigsMessage got {type(skelly_tracker_configs_message)}")
+                    logger.debug(f"Received new skelly tracker s for cameras {camera_ids}: {skelly_tracker_configs_message}")
+                    update_trackers(trackers=trackers,
+                                    tracker_configs=skelly_tracker_configs_message.tracker_configs)
+                    logger.debug(
+                        f"Cameras {camera_ids}, created/updates trackers: {', '.join([tracker.__class__.__name__ for tracker in trackers])}")
+
+                # Check for new frames to process - the (conflated) request carries every outstanding frame, so we only need the newest one
+                while not process_frame_number_subscription.empty():
+                    process_frame_number_message = process_frame_number_subscription.get()
+                    if not isinstance(process_frame_number_message, ProcessFrameNumberMessage):
+                        raise ValueError(
+                            f"Expected ProcessFrameNumberMessage for process frame number, got {type(process_frame_number_message)}")
+                    requested_frames = process_frame_number_message.requested_frames
+                    # Forget the frames the aggregation node isn't waiting on anymore
+                    processed_frame_numbers.intersection_update(requested_frames.keys())
+
+                    logger.debug(
+                        f"Cameras {camera_ids} received request to process frame numbers {sorted(requested_frames.keys())}")
+
+                    for requested_frame_number, requested_at_ns in sorted(requested_frames.items()):
+                        if requested_frame_number in processed_frame_numbers:
+                            continue
+                        processed_frame_numbers.add(requested_frame_number)
+                        # Process the frame from each camera (just the one, unless this is a batched node)
+                        for camera_id in camera_ids:
+                            latency_row = latency_rows[camera_id]
+                            retrieve_start_ns = time.perf_counter_ns()
+                            latency_histograms.record(row=latency_row,
+                                                      stage=PipelineTraceStage.REQUEST_QUEUE,
+                                                      duration_ns=retrieve_start_ns - requested_at_ns)
+                            frame_rec_array = camera_shms[camera_id].get_data_by_index(
+                                index=requested_frame_number,
+                                frame_rec_array=frame_rec_arrays[camera_id])
+                            frame_rec_arrays[camera_id] = frame_rec_array
+                            time_to_retrieve_frame_ns = time.perf_counter_ns() - retrieve_start_ns
+                            latency_histograms.record(row=latency_row,
+                                                      stage=PipelineTraceStage.FRAME_RETRIEVAL,
+                                                      duration_ns=time_to_retrieve_frame_ns)
+                            frame_number = int(frame_rec_array.frame_metadata.frame_number)
+                            if frame_number != requested_frame_number:
+                                # skellycam's ring buffer lapped us - the requested frame was overwritten by a newer one
+                                logger.warning(f"Camera {camera_id} lost frame {requested_frame_number} - its ring "
+                                               f"buffer already holds frame {frame_number}")
+                                ipc.pubsub.topics[TopicTypes.CAMERA_NODE_OUTPUT].publish(
+                                    CameraNodeOutputMessage(camera_id=camera_id,
+                                                            tracker_type="",
+                                                            frame_number=requested_frame_number,
+                                                            slot_index=LOST_FRAME_SLOT_INDEX))
+                                continue
+                            published_output_count = 0
+                            for tracker in trackers:
+                                process_start_ns = time.perf_counter_ns()
+                                observation = tracker.process_image(frame_number=frame_number,
+                                                                    image=frame_rec_array.image, )
+                                if observation is None:
+                                    continue
+                                points, point_names = observation_to_points_array(observation)
+                                time_to_process_frame_ns = time.perf_counter_ns() - process_start_ns
+                                latency_histograms.record(row=latency_row,
+                                                          stage=PipelineTraceStage.TRACKER_INFERENCE,
+                                                          duration_ns=time_to_process_frame_ns)
+
+                                # Write the observation to this camera+tracker's ring buffer, (re)creating it if the tracker's shape changed
+                                new_ring_dto = None
+                                ring_key = (camera_id, observation.tracker_type)
+                                observation_ring = observation_rings.get(ring_key)
+                                if observation_ring is None or not observation_ring.fits(points):
+                                    if observation_ring is not None:
+                                        observation_ring.close()
+                                    observation_ring = ObservationRingBuffer.create(point_names=point_names,
+                                                                                    point_dimensions=points.shape[1])
+                                    observation_rings[ring_key] = observation_ring
+                                    new_ring_dto = observation_ring.to_dto()
+                                slot_index = observation_ring.write(frame_number=frame_number,
+                                                                    points=points,
+                                                                    time_to_retrieve_frame_ns=time_to_retrieve_frame_ns,
+                                                                    time_to_process_frame_ns=time_to_process_frame_ns)
+
+                                # Publish the slot index to the IPC
+                                ipc.pubsub.topics[TopicTypes.CAMERA_NODE_OUTPUT].publish(
+                                    CameraNodeOutputMessage(camera_id=camera_id,
+                                                            tracker_type=observation.tracker_type,
+                                                            frame_number=frame_number,
+                                                            slot_index=slot_index,
+                                                            observation_ring_dto=new_ring_dto))
+                                published_output_count += 1
+                            if not trackers or published_output_count < len(trackers):
+                                # Let the aggregation node complete the frame without the outputs we don't have
+                                ipc.pubsub.topics[TopicTypes.CAMERA_NODE_OUTPUT].publish(
+                                    CameraNodeOutputMessage(camera_id=camera_id,
+                                                            tracker_type="",
+                                                            frame_number=requested_frame_number,
+                                                            slot_index=NO_OBSERVATION_SLOT_INDEX))
+                        control_block.set_last_frame_number(node_index=node_index, frame_number=requested_frame_number)
+            control_block.set_state(node_index=node_index, state=NodeState.STOPPING)
+        except Exception as e:
+            logger.error(f"Camera node for cameras {camera_ids} failed: {type(e).__name__} - {e}")
+            control_block.set_error(node_index=node_index, error_code=NodeErrorCode.UNHANDLED_EXCEPTION)
+            raise
+        finally:
+            for observation_ring in observation_rings.values():
+                observation_ring.close()
+            ipc.pubsub.topics[TopicTypes.CAMERA_NODE_OUTPUT].close_publisher_arena()
+        control_block.set_state(node_index=node_index, state=NodeState.STOPPED)
 
     def start(self):
-        logger.debug(f"Starting {self.__class__.__name__} for camera {self.camera_id}")
+        logger.debug(f"Starting {self.__class__.__name__} for cameras {self.camera_ids}")
         self.worker.start()
 
     def stop(self):
-        logger.debug(f"Stopping {self.__class__.__name__} for camera {self.camera_id}")
-        self.shutdown_self_flag.value = True
+        logger.debug(f"Stopping {self.__class__.__name__} for cameras {self.camera_ids}")
+        self.control_block.request_shutdown(node_index=self.node_index)
+        self.wakeup.notify()
         self.worker.join()
 
 
+def update_trackers(trackers: list[BaseTracker], tracker_configs: list[BaseTrackerConfig]) -> None:
+    """
+    Update the config of existing trackers (in place), and create trackers for any new config types
+    """
+    # TODO - This method of updating trackers is sloppy and won't scale as we add more trackers, should make more sophisticated
+    tracker_configs = deepcopy(tracker_configs)
+    # Update existing trackers whose config type matches an incoming config
+    updated_config_indices = set()
+    for existing_tracker in trackers:
+        for tracker_index, tracker_config in enumerate(tracker_configs):
+            if isinstance(existing_tracker.config, type(tracker_config)):
+                existing_tracker.update_config(tracker_config)
+                updated_config_indices.add(tracker_index)
+    tracker_configs = [tracker_config for tracker_index, tracker_config in enumerate(tracker_configs)
+                       if tracker_index not in updated_config_indices]
+
+    for tracker_config in tracker_configs:
+        from skellytracker.trackers.charuco_tracker import CharucoTracker, CharucoTrackerConfig
+        from skellytracker.trackers.mediapipe_tracker import MediapipeTracker, MediapipeTrackerConfig
+
+        if isinstance(tracker_config, CharucoTrackerConfig):
+            trackers.append(CharucoTracker.create(config=tracker_config))
+        elif isinstance(tracker_config, MediapipeTrackerConfig):
+            trackers.append(MediapipeTracker.create(config=tracker_config))
+        else:
+            raise ValueError(f"Unknown tracker config type: {type(tracker_config)}")
+
+
 @dataclass
 class AggregationNode(ABC):
     camera_group_id: CameraGroupIdString
-    shutdown_self_flag: multiprocessing.Value
+    read_type: ReadTypes
+    frame_counters: FrameCounters
+    node_index: int
+    control_block: PipelineControlBlock
+    wakeup: NodeWakeup
     worker: WorkerType
 
+    @staticmethod
+    def node_name() -> str:
+        return "aggregation_node"
+
     @classmethod
     def create(cls,
                camera_group_id: CameraGroupIdString,
                camera_ids: list[CameraIdString],
                latest_multiframe_number_shm: SharedMemoryNumber,
                ipc: PipelineIPC,
-               worker_strategy: WorkerStrategy):
-        shutdown_self_flag = multiprocessing.Value('b', False)
+               worker_strategy: WorkerStrategy,
+               read_type: ReadTypes = ReadTypes.LATEST,
+               max_frames_in_flight: int = DEFAULT_MAX_FRAMES_IN_FLIGHT,
+               stale_frame_timeout_seconds: float = DEFAULT_STALE_FRAME_TIMEOUT_SECONDS):
+        node_index = ipc.control_block.node_index(cls.node_name())
+        wakeup = NodeWakeup()
+        frame_counters = FrameCounters()
         return cls(camera_group_id=camera_group_id,
-                   shutdown_self_flag=shutdown_self_flag,
+                   read_type=read_type,
+                   frame_counters=frame_counters,
+                   node_index=node_index,
+                   control_block=ipc.control_block,
+                   wakeup=wakeup,
                    worker=worker_strategy.value(target=cls._run,
                                                 name=f"CameraGroup-{camera_group_id}-AggregationNode",
                                                 kwargs=dict(camera_group_id=camera_group_id,
                                                             camera_ids=camera_ids,
                                                             ipc=ipc,
-                                                            shutdown_self_flag=shutdown_self_flag,
+                                                            node_index=node_index,
+                                                            wakeup=wakeup,
                                                             camera_node_subscription=ipc.pubsub.get_subscription(
-                                                                TopicTypes.CAMERA_NODE_OUTPUT),
+                                                                TopicTypes.CAMERA_NODE_OUTPUT,
+                                                                wakeup=wakeup),
                                                             skellytracker_configs_subscription=ipc.pubsub.get_subscription(
                                                                 TopicTypes.SKELLY_TRACKER_CONFIGS),
                                                             latest_multiframe_number_shm_dto=latest_multiframe_number_shm.to_dto(),
+                                                            read_type=read_type,
+                                                            frame_counters=frame_counters,
+                                                            max_frames_in_flight=max_frames_in_flight,
+                                                            stale_frame_timeout_seconds=stale_frame_timeout_seconds,
                                                             ),
                                                 daemon=True
                                                 ),
@@ -221,62 +365,136 @@ class AggregationNode(ABC):
     def _run(camera_group_id: CameraGroupIdString,
              camera_ids: list[CameraIdString],
              ipc: PipelineIPC,
-             shutdown_self_flag: multiprocessing.Value,
-             camera_node_subscription: TopicSubscriptionQueue,
+             node_index: int,
+             wakeup: NodeWakeup,
+             camera_node_subscription: BroadcastSubscription,
              skellytracker_configs_subscription: TopicSubscriptionQueue,
-             latest_multiframe_number_shm_dto: SharedMemoryElementDTO
+             latest_multiframe_number_shm_dto: SharedMemoryElementDTO,
+             read_type: ReadTypes,
+             frame_counters: FrameCounters,
+             max_frames_in_flight: int = DEFAULT_MAX_FRAMES_IN_FLIGHT,
+             stale_frame_timeout_seconds: float = DEFAULT_STALE_FRAME_TIMEOUT_SECONDS,
              ):
         if multiprocessing.parent_process():
             # Configure logging if multiprocessing (i.e. if there is a parent process)
             from freemocap.system.logging_configuration.configure_logging import configure_logging
             from freemocap import LOG_LEVEL
             configure_logging(LOG_LEVEL, ws_queue=ipc.pubsub.topics[TopicTypes.LOGS].publication)
-        logger.debug(f"Starting aggregation process for camera group {camera_group_id}")
-        camera_node_outputs: dict[TrackerTypeString, dict[CameraIdString, CameraNodeOutputMessage | None] | None] = {}
+        logger.debug(f"Starting aggregation process for camera group {camera_group_id} "
+                     f"(read type: {read_type.value}, max frames in flight: {max_frames_in_flight})")
+        frame_scheduler = FrameScheduler(read_type=read_type, frame_counters=frame_counters)
+        # NEXT mode only drops frames a camera node is never going to report (e.g. because it died)
+        frame_buffer = FrameReorderBuffer(camera_ids=camera_ids,
+                                          max_frames_in_flight=max_frames_in_flight,
+                                          stale_timeout_seconds=stale_frame_timeout_seconds
+                                          if frame_scheduler.allows_dropping_frames
+                                          else max(stale_frame_timeout_seconds, NEXT_READ_STALE_FRAME_TIMEOUT_SECONDS))
         latest_multiframe_number_shm = SharedMemoryNumber.recreate(dto=latest_multiframe_number_shm_dto,
                                                                    read_only=True)
-        latest_requested_frame: int = -1
-        while ipc.should_continue and not shutdown_self_flag.value:
-            wait_1ms()
-            if latest_requested_frame < 0 or any(
-                    [tracker_results is None for tracker_results in camera_node_outputs.values()]):
-                ipc.pubsub.topics[TopicTypes.PROCESS_FRAME_NUMBER].publish(
-                    ProcessFrameNumberMessage(frame_number=latest_multiframe_number_shm.value))
-            # Check for Camera Node Output
-            if not camera_node_subscription.empty():
-                camera_node_output_message = camera_node_subscription.get()
-                if not isinstance(camera_node_output_message, CameraNodeOutputMessage):
-                    raise ValueError(
-                        f"Expected CameraNodeOutputMessage got {type(camera_node_output_message)}")
-
-                # Process the camera node output and aggregate it
-                tracker_type = camera_node_output_message.tracker_type
-                camera_id = camera_node_output_message.camera_id
-                if not tracker_type in camera_node_outputs.keys() or camera_node_outputs[tracker_type] is None:
-                    camera_node_outputs[tracker_type] = {camera_id: None for camera_id in camera_ids}
-                if not camera_id in camera_ids:
-                    raise ValueError(
-                        f"Camera ID {camera_id} not in camera IDs {camera_ids}")
-                camera_node_outputs[tracker_type][camera_id] = camera_node_output_message
-
-            # Check if ready to process a frame output
-            for tracker_type, tracker_results in camera_node_outputs.items():
-                if all([camera_node_output_message is not None for camera_node_output_message in
-                        tracker_results.values()]):
-                    # All cameras have observations for this tracker and the frame number is greater than or equal to the latest requested frame
-                    if not all([camera_node_output_message.frame_metadata.frame_number == latest_requested_frame for
-                                camera_node_output_message in tracker_results.values()]):
-                        logger.warning(
-                            f"Frame numbers from tracker results do not match - got {[camera_node_output_message.frame_metadata.frame_number for camera_node_output_message in tracker_results.values()]}")
-
-                    camera_node_outputs[tracker_type] = None
-                    aggregation_output: AggregationNodeOutputMessage = handle_aggregration_calculations(
-                        tracker_type=tracker_type,
-                        tracker_results=tracker_results
-                    )
-                    ipc.pubsub.topics[TopicTypes.AGGREGATION_NODE_OUTPUT].publish(aggregation_output)
-                    logger.debug(
-                        f"Published aggregation output for frame {latest_requested_frame} with points3d: {aggregation_output.tracked_points3d.keys()}")
+        observation_rings: dict[tuple[CameraIdString, TrackerTypeString], ObservationRingBuffer] = {}
+        point_triangulator = load_point_triangulator(camera_ids=camera_ids)
+        latency_histograms = ipc.latency_histograms
+        pipeline_latency_row = latency_histograms.row_for(camera_id=None)
+        control_block = ipc.control_block
+        control_block.set_state(node_index=node_index, state=NodeState.RUNNING)
+        try:
+            while ipc.node_should_continue(node_index=node_index):
+                control_block.heartbeat(node_index=node_index)
+                # Request frames (per the read type) until the in-flight window is full or we're caught up
+                new_frames_requested = False
+                while frame_buffer.has_capacity:
+                    frame_number = frame_scheduler.next_frame_to_request(
+                        latest_available_frame=latest_multiframe_number_shm.value)
+                    if frame_number is None:
+                        break
+                    frame_buffer.add_request(frame_number=frame_number)
+                    new_frames_requested = True
+                if new_frames_requested:
+                    # The topic only keeps the newest message, so send every frame we're still waiting on
+                    ipc.pubsub.topics[TopicTypes.PROCESS_FRAME_NUMBER].publish(
+                        ProcessFrameNumberMessage(requested_frames={
+                            pending_frame.frame_number: int(pending_frame.requested_at * 1e9)
+                            for pending_frame in frame_buffer.pending_frames.values()}))
+
+                # Block until a camera node publishes output - if we're waiting on new frames from the camera group,
+                # only sleep for the poll interval, since skellycam's shared memory can't wake us up
+                wakeup.wait(timeout=NEW_FRAME_POLL_INTERVAL_SECONDS if frame_buffer.has_capacity
+                            else NODE_WAKEUP_TIMEOUT_SECONDS)
+
+                # Check for Camera Node Output
+                while not camera_node_subscription.empty():
+                    camera_node_output_message = camera_node_subscription.get()
+                    if camera_node_output_message is None:
+                        # (dropped - the camera node exited before we read it)
+                        continue
+                    if not isinstance(camera_node_output_message, CameraNodeOutputMessage):
+                        raise ValueError(
+                            f"Expected CameraNodeOutputMessage got {type(camera_node_output_message)}")
+                    latency_histograms.record(row=latency_histograms.row_for(camera_node_output_message.camera_id),
+                                              stage=PipelineTraceStage.CAMERA_OUTPUT_QUEUE,
+                                              duration_ns=time.perf_counter_ns() - camera_node_output_message.published_at_ns)
+                    if camera_node_output_message.slot_index in (NO_OBSERVATION_SLOT_INDEX, LOST_FRAME_SLOT_INDEX):
+                        frame_buffer.finish_camera(frame_number=camera_node_output_message.frame_number,
+                                                   camera_id=camera_node_output_message.camera_id,
+                                                   lost=camera_node_output_message.slot_index == LOST_FRAME_SLOT_INDEX)
+                        continue
+                    ring_key = (camera_node_output_message.camera_id, camera_node_output_message.tracker_type)
+                    if camera_node_output_message.observation_ring_dto is not None:
+                        if ring_key in observation_rings:
+                            observation_rings[ring_key].close()
+                        observation_rings[ring_key] = ObservationRingBuffer.recreate(
+                            dto=camera_node_output_message.observation_ring_dto)
+                    frame_buffer.add_output(frame_number=camera_node_output_message.frame_number,
+                                            tracker_type=camera_node_output_message.tracker_type,
+                                            camera_id=camera_node_output_message.camera_id,
+                                            output=camera_node_output_message)
+
+                # Aggregate completed frames, in frame number order
+                ready_frames = frame_buffer.pop_ready()
+                lost_frame_count = sum(pending_frame.lost for pending_frame in ready_frames)
+                frame_counters.increment(FrameCounterTypes.AGGREGATED, len(ready_frames) - lost_frame_count)
+                frame_counters.increment(FrameCounterTypes.LOST, lost_frame_count)
+                frame_counters.set(FrameCounterTypes.DROPPED_STALE, frame_buffer.dropped_frame_count)
+                for pending_frame in ready_frames:
+                    for tracker_type, tracker_results in pending_frame.tracker_results.items():
+                        # Read the observations straight out of the camera nodes' shared memory (None for cameras that
+                        # finished the frame without this tracker's output)
+                        observations = {camera_id: observation_rings[(camera_id, tracker_type)].read(
+                            slot_index=message.slot_index,
+                            frame_number=message.frame_number) if message is not None else None
+                            for camera_id, message in tracker_results.items()}
+                        if any(observation is None for observation in observations.values()):
+                            continue
+                        aggregation_start_ns = time.perf_counter_ns()
+                        aggregation_output: AggregationNodeOutputMessage = handle_aggregration_calculations(
+                            camera_group_id=camera_group_id,
+                            tracker_type=tracker_type,
+                            observations=observations,
+                            point_names=observation_rings[(camera_ids[0], tracker_type)].dto.point_names,
+                            point_triangulator=point_triangulator,
+                        )
+                        ipc.pubsub.topics[TopicTypes.AGGREGATION_NODE_OUTPUT].publish(aggregation_output)
+                        published_ns = time.perf_counter_ns()
+                        latency_histograms.record(row=pipeline_latency_row,
+                                                  stage=PipelineTraceStage.AGGREGATION,
+                                                  duration_ns=published_ns - aggregation_start_ns)
+                        latency_histograms.record(row=pipeline_latency_row,
+                                                  stage=PipelineTraceStage.END_TO_END,
+                                                  duration_ns=published_ns - int(pending_frame.requested_at * 1e9))
+                        logger.debug(
+                            f"Published aggregation output for frame {pending_frame.frame_number} with points3d: {aggregation_output.tracked_points3d.keys()}")
+                    control_block.set_last_frame_number(node_index=node_index, frame_number=pending_frame.frame_number)
+            control_block.set_state(node_index=node_index, state=NodeState.STOPPING)
+        except Exception as e:
+            logger.error(f"Aggregation node for camera group {camera_group_id} failed: {type(e).__name__} - {e}")
+            control_block.set_error(node_index=node_index, error_code=NodeErrorCode.UNHANDLED_EXCEPTION)
+            raise
+        finally:
+            for observation_ring in observation_rings.values():
+                observation_ring.close()
+            camera_node_subscription.close()
+            ipc.pubsub.topics[TopicTypes.AGGREGATION_NODE_OUTPUT].close_publisher_arena()
+        control_block.set_state(node_index=node_index, state=NodeState.STOPPED)
 
     def start(self):
         logger.debug(f"Starting {self.__class__.__name__}")
@@ -284,26 +502,61 @@ class AggregationNode(ABC):
 
     def stop(self):
         logger.debug(f"Stopping {self.__class__.__name__}")
-        self.shutdown_self_flag.value = True
+        self.control_block.request_shutdown(node_index=self.node_index)
+        self.wakeup.notify()
         self.worker.join()
 
 
-def handle_aggregration_calculations(tracker_type: TrackerTypeString,
-                                     tracker_results: dict[
-                                         CameraIdString, CameraNodeOutputMessage]) -> AggregationNodeOutputMessage:
-    """ Calculate the aggregation output for a given tracker name and its results from camera nodes.
-    This function aggregates the 3D points from the tracker results and returns a BaseAggregationLayerOutputData object.
+def handle_aggregration_calculations(camera_group_id: CameraGroupIdString,
+                                     tracker_type: TrackerTypeString,
+                                     observations: dict[CameraIdString, np.void],
+                                     point_names: list[str],
+                                     point_triangulator: PointTriangulator | None = None) -> AggregationNodeOutputMessage:
+    """ Calculate the aggregation output for a given tracker name and its observation records from camera nodes.
+    `observations` are zero-copy views into the camera nodes' observation ring buffers (see `create_observation_dtype`),
+    and must be in the same camera order as the triangulator's calibration.
     """
-    frame_number_set = {result.frame_metadata.frame_number for result in tracker_results.values()}
+    frame_number_set = {int(observation["frame_number"]) for observation in observations.values()}
     if len(frame_number_set) != 1:
         logger.warning(f"Frame numbers from tracker results do not match - got {frame_number_set}")
     frame_number = frame_number_set.pop()
-    points3d = {}  # Do the aggregation logic here, e.g. averaging points from different cameras
-    return AggregationNodeOutputMessage(
+    points3d = {}
+    # (the calibration can be hot-reloaded under us, so grab it once, and only triangulate if it matches this camera group)
+    calibration = point_triangulator.calibration_store.snapshot if point_triangulator is not None else None
+    if calibration is not None and calibration.number_of_cameras == len(observations):
+        # (cameras, points, 2) - mediapipe observations carry an extra (relative depth) dimension we don't use here
+        points2d = np.stack([observation["points"][:, :2] for observation in observations.values()])
+        visibility = np.stack([observation["visibility"] for observation in observations.values()])
+        points3d_array = point_triangulator.triangulate_array(points2d=points2d,
+                                                              visibility=visibility,
+                                                              calibration=calibration)
+        points3d = {point_name: point3d for point_name, point3d in zip(point_names, points3d_array)
+                    if not np.isnan(point3d).any()}
+    # (skip validating every point array - this message is built once per frame, from arrays we just computed)
+    return create_message(
+        AggregationNodeOutputMessage,
         frame_number=frame_number,
+        camera_group_id=camera_group_id,
+        tracker_name=tracker_type,
         tracked_points3d=points3d)
 
 
+def load_point_triangulator(camera_ids: list[CameraIdString]) -> PointTriangulator:
+    """
+    Load a triangulator that follows the last successful calibration file. Until there's a calibration there that
+    matches this camera group, aggregation skips triangulating (and picks it up as soon as one is saved)
+    """
+    point_triangulator = PointTriangulator.create(calibration_toml_path=get_last_successful_calibration_toml_path())
+    calibration = point_triangulator.calibration_store.snapshot
+    if calibration is None:
+        logger.warning(f"No calibration found at {get_last_successful_calibration_toml_path()} - "
+                       f"aggregation will not triangulate 3d points until there is one")
+    elif calibration.number_of_cameras != len(camera_ids):
+        logger.warning(f"Last calibration has {calibration.number_of_cameras} cameras, but this camera group has "
+                       f"{len(camera_ids)} - aggregation will not triangulate 3d points until there's a matching one")
+    return point_triangulator
+
+
 class PipelineImageAnnotator(BaseModel, ABC):
     camera_node_annotators: dict[CameraIdString, BaseImageAnnotator]
 
@@ -324,33 +577,50 @@ from skellycam.core.camera_group.camera_group import CameraGroup
 @dataclass
 class ProcessingPipeline:
     id: PipelineIdString
-    camera_nodes: dict[CameraIdString, CameraNode]
+    camera_nodes: list[CameraNode]
     aggregation_node: AggregationNode
     ipc: PipelineIPC
 
     @property
     def alive(self) -> bool:
         return all([camera_node.worker.is_alive() for camera_node in
-                    self.camera_nodes.values()]) and self.aggregation_node.worker.is_alive()
+                    self.camera_nodes]) and self.aggregation_node.worker.is_alive()
 
     @classmethod
     def from_camera_group(cls,
                           camera_group: CameraGroup,
                           camera_node_strategy: WorkerStrategy = WorkerStrategy.PROCESS,
-                          aggregation_node_strategy: WorkerStrategy = WorkerStrategy.PROCESS, ):
+                          aggregation_node_strategy: WorkerStrategy = WorkerStrategy.PROCESS,
+                          read_type: ReadTypes = ReadTypes.LATEST,
+                          max_frames_in_flight: int = DEFAULT_MAX_FRAMES_IN_FLIGHT,
+                          batch_camera_nodes: bool = False, ):
+        camera_ids = list(camera_group.configs.keys())
+        camera_node_names = ([CameraNode.node_name(camera_ids)] if batch_camera_nodes
+                             else [CameraNode.node_name([camera_id]) for camera_id in camera_ids])
         ipc = PipelineIPC.create(global_kill_flag=camera_group.ipc.global_kill_flag,
+                                 camera_ids=camera_ids,
+                                 node_names=camera_node_names + [AggregationNode.node_name()],
                                  )
         camera_group_shm_dto = camera_group.shm.to_dto()
-        camera_nodes = {camera_id: CameraNode.create(camera_id=camera_id,
-                                                     camera_shm_dto=camera_group_shm_dto.camera_shm_dtos[camera_id],
-                                                     worker_strategy=camera_node_strategy,
-                                                     ipc=ipc)
-                        for camera_id, config in camera_group.configs.items()}
+        camera_shm_dtos = {camera_id: camera_group_shm_dto.camera_shm_dtos[camera_id]
+                           for camera_id in camera_ids}
+        if batch_camera_nodes:
+            # One node (and one copy of each tracker's model) for the whole camera group
+            camera_nodes = [CameraNode.create(camera_shm_dtos=camera_shm_dtos,
+                                              worker_strategy=camera_node_strategy,
+                                              ipc=ipc)]
+        else:
+            camera_nodes = [CameraNode.create(camera_shm_dtos={camera_id: camera_shm_dto},
+                                              worker_strategy=camera_node_strategy,
+                                              ipc=ipc)
+                            for camera_id, camera_shm_dto in camera_shm_dtos.items()]
         aggregation_process = AggregationNode.create(camera_group_id=camera_group.id,
-                                                     camera_ids=list(camera_nodes.keys()),
+                                                     camera_ids=list(camera_shm_dtos.keys()),
                                                      latest_multiframe_number_shm=camera_group.shm.latest_multiframe_number,
                                                      ipc=ipc,
                                                      worker_strategy=aggregation_node_strategy,
+                                                     read_type=read_type,
+                                                     max_frames_in_flight=max_frames_in_flight,
                                                      )
 
         return cls(camera_nodes=camera_nodes,
@@ -417,16 +687,18 @@ class ProcessingPipeline:
     #     return self.annotator.annotate_images(multiframe_payload, pipeline_output)
 
     def start(self):
-        logger.debug(f"Starting {self.__class__.__name__} with camera processes {list(self.camera_nodes.keys())}...")
+        logger.debug(f"Starting {self.__class__.__name__} with camera processes {[camera_node.camera_ids for camera_node in self.camera_nodes]}...")
         self.aggregation_node.start()
-        for camera_id, camera_node in self.camera_nodes.items():
+        for camera_node in self.camera_nodes:
             camera_node.start()
 
 
     def shutdown(self):
         logger.debug(f"Shutting down {self.__class__.__name__}...")
 
-        self.ipc.global_kill_flag.value = True
+        # Only this pipeline - the global kill flag is the whole app's (and skellycam's) to flip
+        self.ipc.control_block.kill_pipeline()
         self.aggregation_node.stop()
-        for camera_id, camera_process in self.camera_nodes.items():
-            camera_process.stop()
+        for camera_node in self.camera_nodes:
+            camera_node.stop()
+        self.ipc.close()
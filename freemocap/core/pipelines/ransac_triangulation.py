@@ -0,0 +1,156 @@
+"""
+Combinatorial RANSAC triangulation - for each point, try the combinations of cameras (and of each camera's candidate
+detections) in turn, and keep the 3d point with the lowest mean reprojection error, stopping at the first one under
+`threshold`.
+
+This is anipose's `CameraGroup.triangulate_possible`, batched: points are grouped by which cameras/candidates they
+have, every combination is evaluated for a whole group at once (one `triangulate_batched` solve and one
+`calculate_reprojection_errors` projection), and points drop out of their group as soon as they're under the threshold.
+Combinations are tried in the same order anipose's per-point `itertools.product` walk tried them, so both pick the same
+points.
+"""
+import itertools
+import logging
+import multiprocessing
+
+import cv2
+import numpy as np
+
+from freemocap.core.pipelines.batched_triangulation import triangulate_batched, MINIMUM_CAMERAS_FOR_TRIANGULATION
+from freemocap.core.pipelines.calibration_pipeline.reprojection_error import calculate_reprojection_errors, nan_mean
+from freemocap.core.pipelines.chunked_triangulation import TriangulationCameras
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RANSAC_THRESHOLD_PX: float = 0.5
+# Points whose best combination is still this far off (px) are left untriangulated
+MAXIMUM_REPROJECTION_ERROR_PX: float = 200.0
+
+
+def triangulate_possible(points2d: np.ndarray,
+                         cameras: TriangulationCameras,
+                         undistort: bool = True,
+                         minimum_cameras: int = MINIMUM_CAMERAS_FOR_TRIANGULATION,
+                         threshold: float = DEFAULT_RANSAC_THRESHOLD_PX,
+                         kill_event: multiprocessing.Event = None,
+                         ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray] | None:
+    """
+    Triangulate a (cameras, points, possibilities, 2) array of pixel coordinates - up to `possibilities` candidate
+    detections of each point per camera, NaN where there are fewer (possibilities = 1 is plain RANSAC over cameras).
+
+    A combination picks at most one candidate from each camera. Combinations using fewer than `minimum_cameras`
+    cameras are skipped, unless that's every camera that saw the point.
+
+    :param undistort: False if `points2d` are already undistorted normalized coordinates
+    :param kill_event: checked between batches - once it's set, this returns None
+    :return: (points, 3) best points (NaN where nothing beat `MAXIMUM_REPROJECTION_ERROR_PX`), the (cameras, points,
+        possibilities) mask of the candidates each point used, the (points,) mean reprojection errors of those points
+        (0 where untriangulated, as anipose reports them), and the (cameras, points, 2) image points they used
+    """
+    number_of_cameras, number_of_points, number_of_possibilities, point_dimensions = points2d.shape
+    if point_dimensions != 2:
+        raise ValueError(f"Expected points2d to be of shape (cameras, points, possibilities, 2), got {points2d.shape}")
+    if number_of_cameras != cameras.number_of_cameras:
+        raise ValueError(f"Got 2d data from {number_of_cameras} cameras, but {cameras.number_of_cameras} calibrations")
+
+    undistorted_points2d = _undistort(points2d=points2d, cameras=cameras) if undistort else points2d
+    projection_matrices = cameras.extrinsics_matrices
+
+    points3d = np.full((number_of_points, 3), np.nan)
+    picked = np.zeros((number_of_cameras, number_of_points, number_of_possibilities), dtype=bool)
+    errors = np.zeros(number_of_points)
+    picked_points2d = np.full((number_of_cameras, number_of_points, 2), np.nan)
+
+    # Group the points by which (camera, possibility) candidates they have - everything in a group has the same
+    # combinations to try
+    available = ~np.isnan(points2d[..., 0])  # (cameras, points, possibilities)
+    patterns, pattern_ids = np.unique(available.transpose(1, 0, 2).reshape(number_of_points, -1), axis=0,
+                                      return_inverse=True)
+    pattern_ids = pattern_ids.ravel()
+    for pattern_id, pattern in enumerate(patterns):
+        point_indices = np.flatnonzero(pattern_ids == pattern_id)
+        combinations = list(_combinations(pattern=pattern.reshape(number_of_cameras, number_of_possibilities),
+                                          minimum_cameras=minimum_cameras))
+        best_errors = np.full(len(point_indices), MAXIMUM_REPROJECTION_ERROR_PX)
+        best_combination_ids = np.full(len(point_indices), -1)
+        active = np.ones(len(point_indices), dtype=bool)
+
+        for combination_id, combination in enumerate(combinations):
+            if kill_event is not None and kill_event.is_set():
+                return None
+            active_indices = point_indices[active]
+            camera_indices, possibility_indices = (np.array(indices)[:, np.newaxis] for indices in zip(*combination))
+            visibility = np.zeros((number_of_cameras, len(active_indices)), dtype=bool)
+            visibility[camera_indices[:, 0]] = True
+            # (cameras, active points, 2), with the cameras this combination leaves out NaN
+            candidate_points2d = np.full((number_of_cameras, len(active_indices), 2), np.nan)
+            candidate_points2d[camera_indices[:, 0]] = points2d[camera_indices, active_indices, possibility_indices]
+            candidate_undistorted = np.full((number_of_cameras, len(active_indices), 2), np.nan)
+            candidate_undistorted[camera_indices[:, 0]] = undistorted_points2d[camera_indices, active_indices,
+                                                                               possibility_indices]
+
+            candidate_points3d = triangulate_batched(points2d=candidate_undistorted,
+                                                     projection_matrices=projection_matrices,
+                                                     visibility=visibility)
+            candidate_errors = nan_mean(np.linalg.norm(
+                calculate_reprojection_errors(image_points=candidate_points2d,
+                                              object_points=candidate_points3d,
+                                              rotation_vectors=cameras.rotation_vectors,
+                                              translation_vectors=cameras.translation_vectors,
+                                              camera_matrices=cameras.camera_matrices,
+                                              distortion_coefficients=cameras.distortion_coefficients),
+                axis=2), axis=0)
+
+            with np.errstate(invalid="ignore"):
+                improved = candidate_errors < best_errors[active]
+            improved_indices = np.flatnonzero(active)[improved]
+            best_errors[improved_indices] = candidate_errors[improved]
+            best_combination_ids[improved_indices] = combination_id
+            points3d[point_indices[improved_indices]] = candidate_points3d[improved]
+            # (a point stops at the first combination under the threshold)
+            with np.errstate(invalid="ignore"):
+                active[improved_indices[candidate_errors[improved] < threshold]] = False
+            if not active.any():
+                break
+
+        for combination_id, combination in enumerate(combinations):
+            used_by = best_combination_ids == combination_id
+            if not used_by.any():
+                continue
+            camera_indices, possibility_indices = (np.array(indices)[:, np.newaxis] for indices in zip(*combination))
+            picked[camera_indices, point_indices[used_by], possibility_indices] = True
+            picked_points2d[camera_indices, point_indices[used_by]] = points2d[camera_indices, point_indices[used_by],
+                                                                               possibility_indices]
+            errors[point_indices[used_by]] = best_errors[used_by]
+
+    logger.debug(f"RANSAC triangulated {(~np.isnan(points3d).any(axis=1)).sum()}/{number_of_points} points, "
+                 f"in {len(patterns)} camera/candidate patterns")
+    return points3d, picked, errors, picked_points2d
+
+
+def _combinations(pattern: np.ndarray, minimum_cameras: int):
+    """
+    The (camera, possibility) combinations for a (cameras, possibilities) availability pattern, in anipose's order:
+    `itertools.product` over the cameras with any candidates, each offering its candidates and then "skip this camera"
+    """
+    options = [[(camera_index, possibility_index) for possibility_index in np.flatnonzero(camera_pattern)] + [None]
+               for camera_index, camera_pattern in enumerate(pattern) if camera_pattern.any()]
+    for combination in itertools.product(*options):
+        combination = tuple(choice for choice in combination if choice is not None)
+        # (fewer than two cameras can't be triangulated at all, so anipose never kept those either)
+        if len(combination) < MINIMUM_CAMERAS_FOR_TRIANGULATION:
+            continue
+        if len(combination) < minimum_cameras and len(combination) != len(options):
+            continue
+        yield combination
+
+
+def _undistort(points2d: np.ndarray, cameras: TriangulationCameras) -> np.ndarray:
+    """ (cameras, points, possibilities, 2) pixel coordinates -> undistorted normalized coordinates """
+    undistorted_points2d = np.empty_like(points2d, dtype=np.float64)
+    for camera_index in range(cameras.number_of_cameras):
+        undistorted_points2d[camera_index] = cv2.undistortPoints(
+            np.ascontiguousarray(points2d[camera_index], dtype=np.float64).reshape(-1, 1, 2),
+            cameras.camera_matrices[camera_index],
+            cameras.distortion_coefficients[camera_index]).reshape(points2d.shape[1:])
+    return undistorted_points2d
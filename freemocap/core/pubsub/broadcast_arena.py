@@ -0,0 +1,195 @@
+import logging
+import os
+import threading
+import uuid
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BROADCAST_ARENA_SLOTS: int = 64
+DEFAULT_BROADCAST_SLOT_BYTES: int = 64 * 1024
+MAX_BROADCAST_SUBSCRIBERS: int = 16
+ARENA_HEADER_LENGTH: int = 2  # (number of slots, slot size in bytes), int64 each
+SLOT_HEADER_LENGTH: int = 2  # (sequence number, payload length), int64 each
+
+
+@dataclass(frozen=True)
+class BroadcastHandle:
+    """
+    What actually goes through each subscriber's queue - a pointer to a message serialized in a `BroadcastArena`
+    """
+    arena_name: str
+    slot_index: int
+    sequence: int
+
+
+@dataclass
+class BroadcastArena:
+    """
+    Shared memory arena that a publisher serializes each broadcast message into exactly once.
+    Subscribers receive a `BroadcastHandle` pointing at the slot, instead of their own pickled copy of the message.
+
+    Every slot has one pending-ack flag per subscriber, which works as the slot's reference count: the publisher sets
+    all of them when it writes the slot, each subscriber clears its own flag once it has read the message, and the slot
+    is free again once every flag is clear. Each flag has one writer at a time, so no locks are needed.
+
+    Supports ONE publisher (the creating thread) - see `get_publisher_arena`.
+    """
+    shm: shared_memory.SharedMemory
+    number_of_slots: int
+    slot_bytes: int
+    slot_headers: np.ndarray  # (slots, 2) int64 - sequence number, payload length
+    pending_acks: np.ndarray  # (slots, MAX_BROADCAST_SUBSCRIBERS) uint8
+    payloads: np.ndarray  # (slots, slot_bytes) uint8
+    owner: bool
+    next_slot_index: int = 0
+    next_sequence: int = 1
+
+    @classmethod
+    def create(cls,
+               number_of_slots: int = DEFAULT_BROADCAST_ARENA_SLOTS,
+               slot_bytes: int = DEFAULT_BROADCAST_SLOT_BYTES):
+        int64_size = np.dtype(np.int64).itemsize
+        shm = shared_memory.SharedMemory(name=f"fmc_bca_{uuid.uuid4().hex[:12]}",
+                                         create=True,
+                                         size=ARENA_HEADER_LENGTH * int64_size +
+                                              number_of_slots * (SLOT_HEADER_LENGTH * int64_size +
+                                                                 MAX_BROADCAST_SUBSCRIBERS +
+                                                                 slot_bytes))
+        arena_header = np.ndarray((ARENA_HEADER_LENGTH,), dtype=np.int64, buffer=shm.buf)
+        arena_header[:] = (number_of_slots, slot_bytes)
+        arena = cls._attach(shm=shm, owner=True)
+        arena.slot_headers[:] = 0
+        arena.pending_acks[:] = 0
+        return arena
+
+    @classmethod
+    def recreate(cls, arena_name: str):
+        return cls._attach(shm=shared_memory.SharedMemory(name=arena_name), owner=False)
+
+    @classmethod
+    def _attach(cls, shm: shared_memory.SharedMemory, owner: bool):
+        number_of_slots, slot_bytes = (int(value) for value in
+                                       np.ndarray((ARENA_HEADER_LENGTH,), dtype=np.int64, buffer=shm.buf))
+        offset = ARENA_HEADER_LENGTH * np.dtype(np.int64).itemsize
+        slot_headers = np.ndarray((number_of_slots, SLOT_HEADER_LENGTH), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += slot_headers.nbytes
+        pending_acks = np.ndarray((number_of_slots, MAX_BROADCAST_SUBSCRIBERS), dtype=np.uint8, buffer=shm.buf,
+                                  offset=offset)
+        offset += pending_acks.nbytes
+        payloads = np.ndarray((number_of_slots, slot_bytes), dtype=np.uint8, buffer=shm.buf, offset=offset)
+        return cls(shm=shm,
+                   number_of_slots=number_of_slots,
+                   slot_bytes=slot_bytes,
+                   slot_headers=slot_headers,
+                   pending_acks=pending_acks,
+                   payloads=payloads,
+                   owner=owner)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def slots_in_use(self) -> int:
+        return int(self.pending_acks.any(axis=1).sum())
+
+    def write(self, data: bytes, number_of_subscribers: int) -> BroadcastHandle | None:
+        """
+        Copy `data` into a free slot, with an ack pending from each of the first `number_of_subscribers` subscribers.
+        Returns None if `data` doesn't fit in a slot or every slot is still waiting on acks - the caller should fall back
+        to sending the message itself.
+        """
+        if number_of_subscribers > MAX_BROADCAST_SUBSCRIBERS:
+            raise ValueError(f"Broadcast arenas support up to {MAX_BROADCAST_SUBSCRIBERS} subscribers, "
+                             f"got {number_of_subscribers}")
+        if len(data) > self.slot_bytes:
+            return None
+        free_slots = np.flatnonzero(~self.pending_acks.any(axis=1))
+        if free_slots.size == 0:
+            return None
+        # Round robin, so a slow reader's slot is the last one we'd reuse
+        slot_index = int(free_slots[np.searchsorted(free_slots, self.next_slot_index) % free_slots.size])
+        self.next_slot_index = (slot_index + 1) % self.number_of_slots
+
+        sequence = self.next_sequence
+        self.next_sequence += 1
+        self.payloads[slot_index, :len(data)] = np.frombuffer(data, dtype=np.uint8)
+        self.slot_headers[slot_index] = (sequence, len(data))
+        self.pending_acks[slot_index, :number_of_subscribers] = 1
+        return BroadcastHandle(arena_name=self.name, slot_index=slot_index, sequence=sequence)
+
+    def read(self, handle: BroadcastHandle, subscriber_index: int) -> bytes:
+        """
+        Copy out the message `handle` points at, and release this subscriber's reference to its slot
+        """
+        sequence, length = (int(value) for value in self.slot_headers[handle.slot_index])
+        if sequence != handle.sequence:
+            raise ValueError(f"Broadcast slot {handle.slot_index} in {self.name} was overwritten before subscriber "
+                             f"{subscriber_index} read it (expected sequence {handle.sequence}, found {sequence})")
+        data = self.payloads[handle.slot_index, :length].tobytes()
+        self.pending_acks[handle.slot_index, subscriber_index] = 0
+        return data
+
+    def close(self) -> None:
+        self.slot_headers = None
+        self.pending_acks = None
+        self.payloads = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+@dataclass
+class BroadcastArenaReader:
+    """
+    Subscriber side - attaches to publishers' arenas (lazily, by name) as their handles come in.
+    Close it when the subscribing worker exits.
+    """
+    arenas: dict[str, BroadcastArena] = field(default_factory=dict)
+
+    def read(self, handle: BroadcastHandle, subscriber_index: int) -> bytes | None:
+        """
+        Returns None if the handle's arena is gone - its publisher exited (and unlinked it) before we first attached
+        """
+        arena = self.arenas.get(handle.arena_name)
+        if arena is None:
+            try:
+                arena = BroadcastArena.recreate(arena_name=handle.arena_name)
+            except FileNotFoundError:
+                logger.debug(f"Dropping broadcast message {handle.sequence} - arena {handle.arena_name} is gone")
+                return None
+            self.arenas[handle.arena_name] = arena
+        return arena.read(handle=handle, subscriber_index=subscriber_index)
+
+    def close(self) -> None:
+        for arena in self.arenas.values():
+            arena.close()
+        self.arenas.clear()
+
+
+# Publisher arenas, one per (topic, process, thread) so every arena has exactly one writer
+_PUBLISHER_ARENAS: dict[tuple[str, int, int], BroadcastArena] = {}
+
+
+def get_publisher_arena(topic_id: str) -> BroadcastArena:
+    key = (topic_id, os.getpid(), threading.get_ident())
+    arena = _PUBLISHER_ARENAS.get(key)
+    if arena is None:
+        arena = BroadcastArena.create()
+        _PUBLISHER_ARENAS[key] = arena
+        logger.trace(f"Created broadcast arena {arena.name} for topic {topic_id} (pid {key[1]}, thread {key[2]})")
+    return arena
+
+
+def close_publisher_arenas(topic_id: str, this_thread_only: bool = False) -> None:
+    """
+    Close (and unlink) the arenas this process (or just this thread) created for `topic_id`
+    """
+    for key in [key for key in _PUBLISHER_ARENAS if key[0] == topic_id and key[1] == os.getpid()]:
+        if this_thread_only and key[2] != threading.get_ident():
+            continue
+        _PUBLISHER_ARENAS.pop(key).close()
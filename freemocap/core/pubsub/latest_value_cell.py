@@ -0,0 +1,115 @@
+import time
+import uuid
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+from pydantic import BaseModel
+
+DEFAULT_LATEST_VALUE_CELL_CAPACITY_BYTES: int = 64 * 1024
+HEADER_LENGTH: int = 2  # (sequence number, payload length), int64 each
+# How long a reader keeps retrying before it gives up on the writer (e.g. one that died mid-write) - writes take microseconds
+LATEST_VALUE_READ_TIMEOUT_SECONDS: float = 1.0
+
+
+class LatestValueCellDTO(BaseModel):
+    shm_name: str
+    capacity_bytes: int
+
+
+@dataclass
+class LatestValueCell:
+    """
+    Single-slot shared memory cell holding the newest value published to a topic, guarded by a sequence lock.
+
+    The writer bumps the sequence number to odd, writes the payload, then bumps it to even again. Readers copy the
+    payload and retry if the sequence number was odd or changed underneath them, so they never block the writer and
+    never see a torn value. A reader that falls behind just skips to the newest value - nothing queues up.
+    Sequence number 0 means nothing has been written yet.
+
+    Supports ONE writer at a time. Pickles as its DTO, so it can ride along to thread and process workers alike.
+    """
+    shm: shared_memory.SharedMemory
+    capacity_bytes: int
+    header: np.ndarray  # (sequence number, payload length) int64
+    payload: np.ndarray  # (capacity_bytes,) uint8
+    owner: bool
+
+    @classmethod
+    def create(cls, capacity_bytes: int = DEFAULT_LATEST_VALUE_CELL_CAPACITY_BYTES):
+        shm = shared_memory.SharedMemory(name=f"fmc_lvc_{uuid.uuid4().hex[:12]}",
+                                         create=True,
+                                         size=HEADER_LENGTH * np.dtype(np.int64).itemsize + capacity_bytes)
+        cell = cls._attach(shm=shm, capacity_bytes=capacity_bytes, owner=True)
+        cell.header[:] = 0
+        return cell
+
+    @classmethod
+    def recreate(cls, dto: LatestValueCellDTO):
+        return cls._attach(shm=shared_memory.SharedMemory(name=dto.shm_name),
+                           capacity_bytes=dto.capacity_bytes,
+                           owner=False)
+
+    @classmethod
+    def _attach(cls, shm: shared_memory.SharedMemory, capacity_bytes: int, owner: bool):
+        header = np.ndarray((HEADER_LENGTH,), dtype=np.int64, buffer=shm.buf)
+        payload = np.ndarray((capacity_bytes,), dtype=np.uint8, buffer=shm.buf, offset=header.nbytes)
+        return cls(shm=shm, capacity_bytes=capacity_bytes, header=header, payload=payload, owner=owner)
+
+    def to_dto(self) -> LatestValueCellDTO:
+        return LatestValueCellDTO(shm_name=self.shm.name, capacity_bytes=self.capacity_bytes)
+
+    def __getstate__(self):
+        return self.to_dto()
+
+    def __setstate__(self, dto: LatestValueCellDTO):
+        attached = self._attach(shm=shared_memory.SharedMemory(name=dto.shm_name),
+                                capacity_bytes=dto.capacity_bytes,
+                                owner=False)
+        self.__dict__.update(attached.__dict__)
+
+    @property
+    def sequence(self) -> int:
+        return int(self.header[0])
+
+    def write(self, data: bytes) -> int:
+        """
+        Overwrite the cell with `data`, returns the new sequence number
+        """
+        if len(data) > self.capacity_bytes:
+            raise ValueError(f"Value is {len(data)} bytes, but this cell only holds {self.capacity_bytes} bytes")
+        sequence = int(self.header[0])
+        self.header[0] = sequence + 1
+        self.payload[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+        self.header[1] = len(data)
+        self.header[0] = sequence + 2
+        return sequence + 2
+
+    def read(self, timeout: float = LATEST_VALUE_READ_TIMEOUT_SECONDS) -> tuple[int, bytes] | None:
+        """
+        (sequence number, data) of the newest value, or None if nothing has been written yet.
+        Raises TimeoutError if there's no consistent value to read within `timeout` seconds (i.e. the writer stalled
+        or died mid-write).
+        """
+        deadline = None
+        while True:
+            sequence = int(self.header[0])
+            if sequence == 0:
+                return None
+            if not sequence % 2:
+                data = self.payload[:int(self.header[1])].tobytes()
+                if int(self.header[0]) == sequence:
+                    return sequence, data
+            # (mid-write, or the value changed while we copied it)
+            if deadline is None:
+                deadline = time.perf_counter() + timeout
+            elif time.perf_counter() > deadline:
+                raise TimeoutError(f"Latest value cell {self.shm.name} has been mid-write (sequence number "
+                                   f"{int(self.header[0])}) for over {timeout}s - did its writer die?")
+
+    def close(self) -> None:
+        self.header = None
+        self.payload = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
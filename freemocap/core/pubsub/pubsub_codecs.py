@@ -0,0 +1,223 @@
+"""
+Compact binary wire format for the pipeline's topic messages.
+
+Each message type gets a `BinaryMessageCodec` - a fixed header (format tag + schema id) followed by its fields, each
+packed by a `FieldCodec` (fixed-size ints, length-prefixed strings, packed numpy arrays). The codec's schema is checked
+against the pydantic model once, when the topic is created (by round-tripping a sample message), and decoded messages are built with `model_construct`,
+so no message is validated on the hot path.
+
+Set FREEMOCAP_PUBSUB_DEBUG_MESSAGES=1 to go back to validated pydantic models that are pickled on every hop.
+"""
+import logging
+import os
+import pickle
+import struct
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Type
+
+import numpy as np
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_DEBUG_MESSAGES: bool = os.getenv("FREEMOCAP_PUBSUB_DEBUG_MESSAGES", "").lower() in ("1", "true")
+
+PICKLE_FORMAT_TAG: int = 0
+BINARY_FORMAT_TAG: int = 1
+_HEADER = struct.Struct("<BB")  # format tag, schema id
+_INT64 = struct.Struct("<q")
+_UINT32 = struct.Struct("<I")
+
+
+class FieldCodec(ABC):
+    """
+    Packs one message field into bytes, and unpacks it from a buffer starting at `offset`
+    """
+
+    @abstractmethod
+    def pack(self, value: Any) -> bytes:
+        pass
+
+    @abstractmethod
+    def unpack(self, buffer: memoryview, offset: int) -> tuple[Any, int]:
+        """ Returns (value, offset just past the value) """
+        pass
+
+    @abstractmethod
+    def sample_value(self) -> Any:
+        """ A value of the type this codec packs, for checking the codec against the model field it's used for """
+        pass
+
+
+class Int64FieldCodec(FieldCodec):
+    def pack(self, value: int) -> bytes:
+        return _INT64.pack(value)
+
+    def unpack(self, buffer: memoryview, offset: int) -> tuple[int, int]:
+        return _INT64.unpack_from(buffer, offset)[0], offset + _INT64.size
+
+    def sample_value(self) -> int:
+        return 0
+
+
+class StringFieldCodec(FieldCodec):
+    def pack(self, value: str) -> bytes:
+        encoded = value.encode("utf-8")
+        return _UINT32.pack(len(encoded)) + encoded
+
+    def unpack(self, buffer: memoryview, offset: int) -> tuple[str, int]:
+        length = _UINT32.unpack_from(buffer, offset)[0]
+        offset += _UINT32.size
+        return bytes(buffer[offset:offset + length]).decode("utf-8"), offset + length
+
+    def sample_value(self) -> str:
+        return "sample"
+
+
+class Int64DictFieldCodec(FieldCodec):
+    """ dict[int, int], packed as a count, then all the keys, then all the values """
+
+    def pack(self, value: dict[int, int]) -> bytes:
+        return (_UINT32.pack(len(value)) +
+                np.fromiter(value.keys(), dtype="<i8", count=len(value)).tobytes() +
+                np.fromiter(value.values(), dtype="<i8", count=len(value)).tobytes())
+
+    def unpack(self, buffer: memoryview, offset: int) -> tuple[dict[int, int], int]:
+        count = _UINT32.unpack_from(buffer, offset)[0]
+        offset += _UINT32.size
+        keys = np.frombuffer(buffer, dtype="<i8", count=count, offset=offset)
+        values = np.frombuffer(buffer, dtype="<i8", count=count, offset=offset + keys.nbytes)
+        return dict(zip(keys.tolist(), values.tolist())), offset + keys.nbytes + values.nbytes
+
+    def sample_value(self) -> dict[int, int]:
+        return {0: 0}
+
+
+class NamedPointsFieldCodec(FieldCodec):
+    """
+    dict[str, array of `dimensions` floats], packed as the names (NUL separated) then one float64 (points, dimensions)
+    array. Unpacked points are rows of a single read-only array.
+    """
+
+    def __init__(self, dimensions: int = 3):
+        self.dimensions = dimensions
+
+    def pack(self, value: dict[str, np.ndarray]) -> bytes:
+        names = "\0".join(value.keys()).encode("utf-8")
+        points = (np.asarray(list(value.values()), dtype="<f8").reshape(-1, self.dimensions)
+                  if value else np.empty((0, self.dimensions), dtype="<f8"))
+        return _UINT32.pack(len(value)) + _UINT32.pack(len(names)) + names + points.tobytes()
+
+    def unpack(self, buffer: memoryview, offset: int) -> tuple[dict[str, np.ndarray], int]:
+        count, names_length = struct.unpack_from("<II", buffer, offset)
+        offset += 2 * _UINT32.size
+        names = bytes(buffer[offset:offset + names_length]).decode("utf-8").split("\0") if count else []
+        offset += names_length
+        points = np.frombuffer(buffer, dtype="<f8", count=count * self.dimensions, offset=offset)
+        points = points.reshape(count, self.dimensions)
+        return dict(zip(names, points)), offset + points.nbytes
+
+    def sample_value(self) -> dict[str, np.ndarray]:
+        return {"sample": np.zeros(self.dimensions)}
+
+
+class PickledFieldCodec(FieldCodec):
+    """ For rarely-set fields that aren't worth a packed layout (None is packed as zero bytes) """
+
+    def pack(self, value: Any) -> bytes:
+        if value is None:
+            return _UINT32.pack(0)
+        pickled = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        return _UINT32.pack(len(pickled)) + pickled
+
+    def unpack(self, buffer: memoryview, offset: int) -> tuple[Any, int]:
+        length = _UINT32.unpack_from(buffer, offset)[0]
+        offset += _UINT32.size
+        if length == 0:
+            return None, offset
+        return pickle.loads(buffer[offset:offset + length]), offset + length
+
+    def sample_value(self) -> None:
+        return None
+
+
+@dataclass
+class BinaryMessageCodec:
+    """
+    Schema-driven codec for one message type - `fields` maps the model's field names to how each one is packed
+    """
+    message_type: Type[BaseModel]
+    schema_id: int
+    fields: dict[str, FieldCodec]
+
+    def validate_schema(self) -> None:
+        """
+        Check the schema against the pydantic model - call once, when the topic is created.
+        Besides the field names, this round-trips a sample message through the codec and validates the decoded message,
+        so a field packed by the wrong kind of `FieldCodec` fails here instead of as a garbled message on the hot path.
+        """
+        model_fields = self.message_type.model_fields
+        unknown_fields = set(self.fields) - set(model_fields)
+        if unknown_fields:
+            raise ValueError(f"Codec for {self.message_type.__name__} packs fields the model doesn't have: "
+                             f"{sorted(unknown_fields)}")
+        missing_required_fields = {name for name, model_field in model_fields.items()
+                                   if model_field.is_required() and name not in self.fields}
+        if missing_required_fields:
+            raise ValueError(f"Codec for {self.message_type.__name__} doesn't pack required fields: "
+                             f"{sorted(missing_required_fields)}")
+        unpacked_fields = set(model_fields) - set(self.fields)
+        if unpacked_fields:
+            logger.debug(f"Codec for {self.message_type.__name__} doesn't pack {sorted(unpacked_fields)} - "
+                         f"decoded messages get their default values")
+        sample_message = self.message_type.model_construct(**{field_name: field_codec.sample_value()
+                                                              for field_name, field_codec in self.fields.items()})
+        decoded_message = self.decode(self.encode(sample_message))
+        try:
+            self.message_type.model_validate({field_name: getattr(decoded_message, field_name)
+                                              for field_name in self.fields})
+        except ValidationError as e:
+            raise ValueError(f"Codec for {self.message_type.__name__} packs fields with codecs that don't match the "
+                             f"model's field types - {e}") from e
+
+    def encode(self, message: BaseModel) -> bytes:
+        return _HEADER.pack(BINARY_FORMAT_TAG, self.schema_id) + b"".join(
+            field_codec.pack(getattr(message, field_name)) for field_name, field_codec in self.fields.items())
+
+    def decode(self, data: bytes) -> BaseModel:
+        buffer = memoryview(data)
+        format_tag, schema_id = _HEADER.unpack_from(buffer, 0)
+        if format_tag != BINARY_FORMAT_TAG or schema_id != self.schema_id:
+            raise ValueError(f"Expected a {self.message_type.__name__} (schema {self.schema_id}), "
+                             f"got format {format_tag} schema {schema_id}")
+        offset = _HEADER.size
+        values = {}
+        for field_name, field_codec in self.fields.items():
+            values[field_name], offset = field_codec.unpack(buffer, offset)
+        return self.message_type.model_construct(**values)
+
+
+def encode_message(message: BaseModel, codec: BinaryMessageCodec | None) -> bytes:
+    if codec is None or PUBSUB_DEBUG_MESSAGES:
+        return _HEADER.pack(PICKLE_FORMAT_TAG, 0) + pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    return codec.encode(message)
+
+
+def decode_message(data: bytes, codec: BinaryMessageCodec | None) -> BaseModel:
+    if data[0] == PICKLE_FORMAT_TAG:
+        return pickle.loads(memoryview(data)[_HEADER.size:])
+    if codec is None:
+        raise ValueError("Got a binary encoded message, but this topic has no codec")
+    return codec.decode(data)
+
+
+def create_message(message_type: Type[BaseModel], **fields) -> BaseModel:
+    """
+    Build a message on the hot path - skips validation unless FREEMOCAP_PUBSUB_DEBUG_MESSAGES is set.
+    NOTE - only worth it for messages with array fields, pydantic validates plain scalar fields faster than
+    `model_construct` builds them.
+    """
+    if PUBSUB_DEBUG_MESSAGES:
+        return message_type(**fields)
+    return message_type.model_construct(**fields)
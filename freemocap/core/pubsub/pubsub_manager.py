@@ -7,7 +7,8 @@ from skellycam.core.ipc.pubsub.pubsub_abcs import PubSubTopicABC
 from skellycam.core.types.type_overloads import TopicSubscriptionQueue
 
 from freemocap.core.pubsub.pubsub_topics import LogsTopic, ProcessFrameNumberTopic, SkellyTrackerConfigsTopic, \
-    CameraNodeOutputTopic, AggregationNodeOutputTopic
+    CameraNodeOutputTopic, AggregationNodeOutputTopic, NotifyingPubSubTopic
+from freemocap.core.pubsub.pubsub_wakeup import NodeWakeup
 from freemocap.core.types.type_overloads import PipelineIdString
 
 logger = logging.getLogger(__name__)
@@ -33,9 +34,10 @@ class PubSubTopicManager(BaseModel):
         arbitrary_types_allowed=True,
     )
 
-    def get_subscription(self, topic_type: TopicTypes) -> TopicSubscriptionQueue:
+    def get_subscription(self, topic_type: TopicTypes, wakeup: NodeWakeup | None = None) -> TopicSubscriptionQueue:
         """
         Get a subscription queue for a specific topic type.
+        If a `wakeup` is provided, it will be notified every time a message is published to this topic.
         Raises an error if the topic type is not recognized.
         """
         if parent_process() is not None:
@@ -44,10 +46,24 @@ class PubSubTopicManager(BaseModel):
 
         if topic_type not in self.topics:
             raise ValueError(f"Unknown topic type: {topic_type}")
-        sub= self.topics[topic_type].get_subscription()
+        topic = self.topics[topic_type]
+        if wakeup is not None:
+            if not isinstance(topic, NotifyingPubSubTopic):
+                raise ValueError(f"Topic {topic_type.name} does not support wakeups")
+            sub = topic.get_subscription(wakeup=wakeup)
+        else:
+            sub = topic.get_subscription()
         logger.trace(f"Subscribed to topic {topic_type.name} with {len(self.topics[topic_type].subscriptions)} subscriptions")
         return sub
 
+    def get_stats(self) -> dict[str, dict]:
+        """
+        `TopicStats` summaries for every instrumented topic, keyed by topic name
+        """
+        return {topic_type.name: topic.stats.summarize()
+                for topic_type, topic in self.topics.items()
+                if isinstance(topic, NotifyingPubSubTopic)}
+
     def close(self) -> None:
         """
         Close all topics in the manager.
@@ -78,3 +94,12 @@ def create_pipeline_pubsub_manager(pipeline_id: PipelineIdString) -> PubSubTopic
     return PIPELINE_PUB_SUB_MANAGERS[pipeline_id]
 
 
+def close_pipeline_pubsub_manager(pipeline_id: PipelineIdString) -> None:
+    """
+    Close a pipeline's PubSubManager (unlinking its topics' shared memory) and forget it - once its nodes have exited
+    """
+    pubsub_manager = PIPELINE_PUB_SUB_MANAGERS.pop(pipeline_id, None)
+    if pubsub_manager is not None:
+        pubsub_manager.close()
+
+
@@ -0,0 +1,136 @@
+import multiprocessing
+import os
+import time
+from dataclasses import dataclass
+
+# Set to log a pubsub health summary for every pipeline every N seconds
+PUBSUB_STATS_LOG_INTERVAL_SECONDS: float | None = (float(os.environ["FREEMOCAP_PUBSUB_STATS_LOG_INTERVAL_SECONDS"])
+                                                   if os.getenv("FREEMOCAP_PUBSUB_STATS_LOG_INTERVAL_SECONDS")
+                                                   else None)
+MAX_TOPIC_SUBSCRIBERS: int = 16
+PUBLISH_TIME_RING_LENGTH: int = 1024
+
+# Layout of `TopicStats.counters`
+_PUBLISHED: int = 0
+_SUBSCRIBERS: int = 1
+_CONSUMED: int = 2
+_MAX_DEPTH: int = _CONSUMED + MAX_TOPIC_SUBSCRIBERS
+_DROPPED: int = _MAX_DEPTH + MAX_TOPIC_SUBSCRIBERS
+_NUMBER_OF_COUNTERS: int = _DROPPED + MAX_TOPIC_SUBSCRIBERS
+
+
+@dataclass
+class TopicStats:
+    """
+    Health counters for one topic, in shared memory so the main process can report on every node's subscriptions.
+
+    Publishers count publishes (and timestamp them in a ring, for the publish rate and the age of unread messages),
+    subscribers count the messages they consume, and a subscriber's depth is the difference. Subscribers of conflating
+    topics count the values they never saw (because a newer one overwrote them) as drops, and subscribers of broadcast
+    topics count the messages they couldn't read (because the publisher's arena was gone).
+    Topics can have several publishers, so updates take the counters' lock - one uncontended acquire per message.
+    """
+    counters: multiprocessing.Array
+    publish_times_ns: multiprocessing.Array
+
+    @classmethod
+    def create(cls):
+        return cls(counters=multiprocessing.Array('q', _NUMBER_OF_COUNTERS, lock=True),
+                   publish_times_ns=multiprocessing.Array('q', PUBLISH_TIME_RING_LENGTH, lock=False))
+
+    def add_subscriber(self) -> int:
+        """ Register a subscriber (in the main process, before the workers start), returns its index """
+        with self.counters.get_lock():
+            counters = self.counters.get_obj()
+            subscriber_index = counters[_SUBSCRIBERS]
+            if subscriber_index >= MAX_TOPIC_SUBSCRIBERS:
+                raise ValueError(f"Topic stats support up to {MAX_TOPIC_SUBSCRIBERS} subscribers")
+            counters[_SUBSCRIBERS] = subscriber_index + 1
+            # (a new subscriber hasn't missed anything published before it subscribed)
+            counters[_CONSUMED + subscriber_index] = counters[_PUBLISHED]
+        return subscriber_index
+
+    def record_publish(self) -> None:
+        with self.counters.get_lock():
+            counters = self.counters.get_obj()
+            published = counters[_PUBLISHED]
+            self.publish_times_ns[published % PUBLISH_TIME_RING_LENGTH] = time.perf_counter_ns()
+            published += 1
+            counters[_PUBLISHED] = published
+            for subscriber_index in range(counters[_SUBSCRIBERS]):
+                depth = published - counters[_CONSUMED + subscriber_index]
+                if depth > counters[_MAX_DEPTH + subscriber_index]:
+                    counters[_MAX_DEPTH + subscriber_index] = depth
+
+    def record_consume(self, subscriber_index: int, consumed_through: int | None = None) -> None:
+        """
+        Count one consumed message, or (for conflating topics) jump to `consumed_through` - the number of messages
+        published as of the value that was read - counting everything skipped along the way as dropped
+        """
+        with self.counters.get_lock():
+            counters = self.counters.get_obj()
+            consumed = counters[_CONSUMED + subscriber_index]
+            if consumed_through is None:
+                consumed_through = consumed + 1
+            if consumed_through > consumed + 1:
+                counters[_DROPPED + subscriber_index] += consumed_through - consumed - 1
+            counters[_CONSUMED + subscriber_index] = max(consumed, consumed_through)
+
+    def unconsumed(self, subscriber_index: int) -> int:
+        """ Messages published since the subscriber subscribed that it hasn't consumed yet """
+        with self.counters.get_lock():
+            counters = self.counters.get_obj()
+            return counters[_PUBLISHED] - counters[_CONSUMED + subscriber_index]
+
+    def record_drop(self, subscriber_index: int) -> None:
+        """ Count a message the subscriber received, but couldn't read """
+        with self.counters.get_lock():
+            self.counters.get_obj()[_DROPPED + subscriber_index] += 1
+
+    def summarize(self) -> dict:
+        """
+        {published, publish_rate_hz, subscribers: [{depth, max_depth, dropped, oldest_unread_age_ms}, ...]}
+        """
+        now_ns = time.perf_counter_ns()
+        with self.counters.get_lock():
+            counters = list(self.counters.get_obj())
+            publish_times_ns = list(self.publish_times_ns)
+        published = counters[_PUBLISHED]
+
+        publish_rate_hz = 0.0
+        timestamps_in_ring = min(published, PUBLISH_TIME_RING_LENGTH)
+        if timestamps_in_ring > 1:
+            newest_ns = publish_times_ns[(published - 1) % PUBLISH_TIME_RING_LENGTH]
+            oldest_ns = publish_times_ns[(published - timestamps_in_ring) % PUBLISH_TIME_RING_LENGTH]
+            if newest_ns > oldest_ns:
+                publish_rate_hz = (timestamps_in_ring - 1) / ((newest_ns - oldest_ns) / 1e9)
+
+        subscribers = []
+        for subscriber_index in range(counters[_SUBSCRIBERS]):
+            depth = published - counters[_CONSUMED + subscriber_index]
+            oldest_unread_age_ms = 0.0
+            if depth > 0:
+                # (if the subscriber is more than a ring behind, this is the age of the oldest timestamp we still have)
+                oldest_unread = max(published - depth, published - PUBLISH_TIME_RING_LENGTH)
+                oldest_unread_age_ms = (now_ns - publish_times_ns[oldest_unread % PUBLISH_TIME_RING_LENGTH]) / 1e6
+            subscribers.append({"depth": depth,
+                                "max_depth": counters[_MAX_DEPTH + subscriber_index],
+                                "dropped": counters[_DROPPED + subscriber_index],
+                                "oldest_unread_age_ms": oldest_unread_age_ms})
+        return {"published": published,
+                "publish_rate_hz": publish_rate_hz,
+                "subscribers": subscribers}
+
+
+def format_pubsub_stats_summary(stats_by_topic: dict[str, dict]) -> str:
+    """
+    One line per topic, for the periodic log summary
+    """
+    lines = []
+    for topic_name, stats in stats_by_topic.items():
+        subscribers = " | ".join(f"sub{subscriber_index}: depth {subscriber['depth']} (max {subscriber['max_depth']}), "
+                                 f"dropped {subscriber['dropped']}, oldest {subscriber['oldest_unread_age_ms']:.1f}ms"
+                                 for subscriber_index, subscriber in enumerate(stats["subscribers"]))
+        lines.append(f"{topic_name}: {stats['published']} published ({stats['publish_rate_hz']:.1f} Hz)"
+                     f"{' | ' + subscribers if subscribers else ''}")
+    return "\n".join(lines)
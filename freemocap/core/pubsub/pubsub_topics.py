@@ -1,13 +1,24 @@
+import queue
+import time
+import uuid
+from dataclasses import dataclass, field
 from typing import Type
 
-import numpy as np
-from pydantic import Field
+from pydantic import Field, ConfigDict
 from skellycam.core.ipc.pubsub.pubsub_abcs import PubSubTopicABC, TopicMessageABC
-from skellycam.core.types.type_overloads import TopicPublicationQueue, CameraGroupIdString, FrameNumberInt
-from skellytracker.trackers.base_tracker.base_tracker_abcs import BaseTrackerConfig, BaseObservation, \
-    TrackedPointIdString
+from skellycam.core.types.type_overloads import TopicPublicationQueue, CameraGroupIdString, FrameNumberInt, \
+    TopicSubscriptionQueue, CameraIdString
+from skellytracker.trackers.base_tracker.base_tracker_abcs import BaseTrackerConfig, TrackedPointIdString
 from skellytracker.trackers.base_tracker.base_tracker_abcs import TrackerTypeString
 
+from freemocap.core.pipelines.observation_ring_buffer import ObservationRingBufferDTO
+from freemocap.core.pubsub.broadcast_arena import BroadcastHandle, BroadcastArenaReader, get_publisher_arena, \
+    close_publisher_arenas, MAX_BROADCAST_SUBSCRIBERS
+from freemocap.core.pubsub.latest_value_cell import LatestValueCell
+from freemocap.core.pubsub.pubsub_codecs import BinaryMessageCodec, Int64DictFieldCodec, StringFieldCodec, \
+    Int64FieldCodec, PickledFieldCodec, NamedPointsFieldCodec, encode_message, decode_message
+from freemocap.core.pubsub.pubsub_stats import TopicStats
+from freemocap.core.pubsub.pubsub_wakeup import NodeWakeup
 from freemocap.core.types.type_overloads import TrackedPoint3d
 from freemocap.system.logging_configuration.handlers.websocket_log_queue_handler import LogRecordModel, \
     get_websocket_log_queue
@@ -15,10 +26,15 @@ from freemocap.system.logging_configuration.handlers.websocket_log_queue_handler
 
 class ProcessFrameNumberMessage(TopicMessageABC):
     """
-    Message containing the frame number of the current process.
+    Message containing every frame number the camera nodes should (still) process.
     This is used to synchronize frame processing across multiple processes.
+
+    It's published on a conflating topic, so each message carries the aggregation node's whole set of outstanding
+    requests - a camera node that only sees the newest message still knows about every frame it hasn't processed yet.
     """
-    frame_number: int = Field(ge=0, description="Imperative to process this frame number")
+    requested_frames: dict[FrameNumberInt, int] = Field(
+        description="Imperative to process these frame numbers - frame number -> `time.perf_counter_ns()` when it was "
+                    "requested (for latency tracing), for every requested frame still waiting on camera node output")
 
 
 class SkellyTrackerConfigsMessage(TopicMessageABC):
@@ -31,34 +47,34 @@ class SkellyTrackerConfigsMessage(TopicMessageABC):
         description="List of SkellyTracker configurations to be applied."
     )
 
+# `CameraNodeOutputMessage.slot_index` values that don't point at an observation - they tell the aggregation node that
+# the camera won't report anything more for the frame, so it can complete the frame without waiting for it to go stale
+NO_OBSERVATION_SLOT_INDEX: int = -1  # some of the camera's trackers found nothing (or it has no trackers yet)
+LOST_FRAME_SLOT_INDEX: int = -2  # skellycam's ring buffer overwrote the frame before the camera node could read it
+
+
 class CameraNodeOutputMessage(TopicMessageABC):
     """
-    Message containing the output data from a camera node.
-    This is used to pass processed camera data to the next stage in the pipeline.
-    """
-    frame_metadata: np.recarray = Field(
-        description="Metadata of the frame processed by the camera node.",)
-    tracker_name: TrackerTypeString = Field(
-        description="Name of the tracker used to process the observation.")
-    observation: BaseObservation = Field(
-        description="Observation object produced by a Skellytracker Tracker object.",
-    )
-
-    @property
-    def camera_id(self) -> str:
-        """
-        Returns the camera ID associated with the frame metadata.
-        This is used to identify which camera produced the data.
-        """
-        return self.frame_metadata.camera_config.camera_id[0]
+    Message pointing at a camera node's output in that camera's observation ring buffer (shared memory).
+    Only the slot index goes over the pubsub - the aggregation node reads the observation itself from shared memory.
 
-    @property
-    def tracker_type(self)  -> TrackerTypeString:
-        """
-        Returns the type of tracker used to process the observation.
-        This is used to identify the tracker that produced the data.
-        """
-        return self.observation.tracker_type
+    A camera that has no (more) output for a frame sends one message with `NO_OBSERVATION_SLOT_INDEX` or
+    `LOST_FRAME_SLOT_INDEX` instead (`tracker_type` is ignored).
+    """
+    camera_id: CameraIdString = Field(
+        description="ID of the camera that produced the observation.")
+    tracker_type: TrackerTypeString = Field(
+        description="Type of the tracker that produced the observation.")
+    frame_number: FrameNumberInt = Field(
+        description="Frame number of the processed frame, used to check that the ring slot hasn't been overwritten.")
+    slot_index: int = Field(ge=LOST_FRAME_SLOT_INDEX,
+                            description="Index of the observation record in the camera's observation ring buffer, "
+                                        "or NO_OBSERVATION_SLOT_INDEX/LOST_FRAME_SLOT_INDEX.")
+    observation_ring_dto: ObservationRingBufferDTO | None = Field(
+        default=None,
+        description="Sent (only) when the camera node creates a new ring buffer for this tracker, so the reader can attach to it.")
+    published_at_ns: int = Field(default_factory=time.perf_counter_ns,
+                                 description="`time.perf_counter_ns()` when the message was published, for latency tracing")
 
 
 class AggregationNodeOutputMessage(TopicMessageABC):
@@ -74,28 +90,269 @@ class AggregationNodeOutputMessage(TopicMessageABC):
         description="Dictionary containing 3D data for tracked points, where keys are tracked point IDs and values are 3D coordinates.")
 
 
-class CameraNodeOutputTopic(PubSubTopicABC):
+PROCESS_FRAME_NUMBER_CODEC = BinaryMessageCodec(message_type=ProcessFrameNumberMessage,
+                                                schema_id=1,
+                                                fields={"requested_frames": Int64DictFieldCodec()})
+CAMERA_NODE_OUTPUT_CODEC = BinaryMessageCodec(message_type=CameraNodeOutputMessage,
+                                              schema_id=2,
+                                              fields={"camera_id": StringFieldCodec(),
+                                                      "tracker_type": StringFieldCodec(),
+                                                      "frame_number": Int64FieldCodec(),
+                                                      "slot_index": Int64FieldCodec(),
+                                                      "observation_ring_dto": PickledFieldCodec(),
+                                                      "published_at_ns": Int64FieldCodec()})
+AGGREGATION_NODE_OUTPUT_CODEC = BinaryMessageCodec(message_type=AggregationNodeOutputMessage,
+                                                   schema_id=3,
+                                                   fields={"frame_number": Int64FieldCodec(),
+                                                           "camera_group_id": StringFieldCodec(),
+                                                           "tracker_name": StringFieldCodec(),
+                                                           "tracked_points3d": NamedPointsFieldCodec(dimensions=3)})
+
+
+# How long a queued subscription waits for a message that's been published but is still in the queue's feeder thread
+IN_FLIGHT_MESSAGE_TIMEOUT_SECONDS: float = 0.005
+
+
+def _subscription_queue_empty(subscription: "CountedSubscription | BroadcastSubscription") -> bool:
+    """
+    `queue.empty()` for a subscription's queue - except a `multiprocessing.Queue` hands `put` items to a feeder thread,
+    so a node woken by the publish can find its queue still empty. Publishers count the message in the topic's stats
+    (in shared memory) before they `put` it, so if the stats say there's something we haven't consumed, wait briefly for
+    it to arrive (and hold on to it for the next `get`), instead of sleeping until the next wakeup.
+    """
+    if subscription.in_flight or not subscription.queue.empty():
+        return False
+    if subscription.stats.unconsumed(subscriber_index=subscription.subscriber_index) <= 0:
+        return True
+    try:
+        subscription.in_flight.append(subscription.queue.get(timeout=IN_FLIGHT_MESSAGE_TIMEOUT_SECONDS))
+    except queue.Empty:
+        return True
+    return False
+
+
+def _subscription_queue_get(subscription: "CountedSubscription | BroadcastSubscription"):
+    if subscription.in_flight:
+        return subscription.in_flight.pop()
+    return subscription.queue.get()
+
+
+@dataclass
+class LatestValueSubscription:
+    """
+    Subscription to a `ConflatingPubSubTopic` - quacks like the subscription queues (`empty`/`get`) so nodes can drain
+    it the same way, but `get` always returns the newest message and every older one is skipped.
+    """
+    cell: LatestValueCell
+    stats: TopicStats
+    subscriber_index: int
+    codec: BinaryMessageCodec | None = None
+    last_read_sequence: int = 0
+
+    def empty(self) -> bool:
+        return self.cell.sequence <= self.last_read_sequence
+
+    def get(self) -> TopicMessageABC:
+        latest_value = self.cell.read()
+        if latest_value is None:
+            raise queue.Empty("Nothing has been published to this topic yet")
+        self.last_read_sequence, data = latest_value
+        # (every publish bumps the cell's sequence number by 2)
+        self.stats.record_consume(subscriber_index=self.subscriber_index,
+                                  consumed_through=self.last_read_sequence // 2)
+        return decode_message(data=data, codec=self.codec)
+
+
+@dataclass
+class CountedSubscription:
+    """
+    Subscription queue that counts what its subscriber consumes, for the topic's stats
+    """
+    queue: TopicSubscriptionQueue
+    stats: TopicStats
+    subscriber_index: int
+    in_flight: list = field(default_factory=list)  # (a message `empty` had to wait for, returned by the next `get`)
+
+    def empty(self) -> bool:
+        return _subscription_queue_empty(self)
+
+    def get(self) -> TopicMessageABC:
+        message = _subscription_queue_get(self)
+        self.stats.record_consume(subscriber_index=self.subscriber_index)
+        return message
+
+
+@dataclass
+class BroadcastSubscription:
+    """
+    Subscription to a `BroadcastPubSubTopic` - quacks like the subscription queues (`empty`/`get`), but the queue
+    carries `BroadcastHandle`s, and `get` reads the message the handle points at out of the publisher's arena.
+    Close it when the subscribing worker exits, to detach from the arenas.
+    """
+    queue: TopicSubscriptionQueue
+    stats: TopicStats
+    subscriber_index: int
+    codec: BinaryMessageCodec | None = None
+    reader: BroadcastArenaReader = field(default_factory=BroadcastArenaReader)
+    in_flight: list = field(default_factory=list)  # (a handle `empty` had to wait for, returned by the next `get`)
+
+    def empty(self) -> bool:
+        return _subscription_queue_empty(self)
+
+    def get(self) -> TopicMessageABC | None:
+        """
+        Returns None if the message was dropped - its publisher exited before we read it (e.g. during shutdown)
+        """
+        item = _subscription_queue_get(self)
+        self.stats.record_consume(subscriber_index=self.subscriber_index)
+        if isinstance(item, BroadcastHandle):
+            data = self.reader.read(handle=item, subscriber_index=self.subscriber_index)
+            if data is None:
+                self.stats.record_drop(subscriber_index=self.subscriber_index)
+                return None
+            return decode_message(data=data, codec=self.codec)
+        # (the publisher sent the message itself because it didn't fit in its arena)
+        return item
+
+    def close(self) -> None:
+        self.reader.close()
+
+
+class NotifyingPubSubTopic(PubSubTopicABC):
+    """
+    Topic that wakes up its subscribers' nodes whenever a message is published, and keeps `TopicStats` on how its
+    subscribers are keeping up.
+    Wakeups must be registered in the main process (alongside the subscription) before the workers are started.
+    """
+    wakeups: list[NodeWakeup] = Field(default_factory=list)
+    stats: TopicStats = Field(default_factory=TopicStats.create)
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def get_subscription(self, wakeup: NodeWakeup | None = None) -> CountedSubscription:
+        subscription = super().get_subscription()
+        if wakeup is not None:
+            self.wakeups.append(wakeup)
+        return CountedSubscription(queue=subscription,
+                                   stats=self.stats,
+                                   subscriber_index=self.stats.add_subscriber())
+
+    def publish(self, message: TopicMessageABC):
+        self.stats.record_publish()
+        super().publish(message)
+        for wakeup in self.wakeups:
+            wakeup.notify()
+
+
+class ConflatingPubSubTopic(NotifyingPubSubTopic):
+    """
+    Topic for state-like messages, where only the newest value matters.
+    Publishing overwrites a single shared memory cell instead of appending to every subscriber's queue, so a slow
+    subscriber can't build up a backlog (and never processes stale values). Supports one publisher at a time.
+    """
+    cell: LatestValueCell = Field(default_factory=LatestValueCell.create)
+    codec: BinaryMessageCodec | None = None
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def model_post_init(self, __context):
+        super().model_post_init(__context)
+        if self.codec is not None:
+            self.codec.validate_schema()
+
+    def get_subscription(self, wakeup: NodeWakeup | None = None) -> LatestValueSubscription:
+        if wakeup is not None:
+            self.wakeups.append(wakeup)
+        return LatestValueSubscription(cell=self.cell,
+                                       stats=self.stats,
+                                       subscriber_index=self.stats.add_subscriber(),
+                                       codec=self.codec)
+
+    def publish(self, message: TopicMessageABC):
+        if not isinstance(message, self.message_type):
+            raise TypeError(f"Expected message of type {self.message_type.__name__}, got {type(message).__name__}")
+        self.stats.record_publish()
+        self.cell.write(encode_message(message=message, codec=self.codec))
+        for wakeup in self.wakeups:
+            wakeup.notify()
+
+    def close(self):
+        super().close()
+        self.cell.close()
+
+
+class BroadcastPubSubTopic(NotifyingPubSubTopic):
+    """
+    Topic for messages with several subscribers - each message is serialized once into the publisher's shared memory
+    arena, and every subscriber queue just gets a small handle to it (instead of its own pickled copy of the message).
+    Messages that don't fit in the arena (too big, or every slot still unread) are sent the regular way.
+    """
+    topic_id: str = Field(default_factory=lambda: uuid.uuid4().hex[:8])
+    codec: BinaryMessageCodec | None = None
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def model_post_init(self, __context):
+        super().model_post_init(__context)
+        if self.codec is not None:
+            self.codec.validate_schema()
+
+    def get_subscription(self, wakeup: NodeWakeup | None = None) -> BroadcastSubscription:
+        if len(self.subscriptions) >= MAX_BROADCAST_SUBSCRIBERS:
+            raise ValueError(f"Broadcast topics support up to {MAX_BROADCAST_SUBSCRIBERS} subscribers")
+        counted_subscription = super().get_subscription(wakeup=wakeup)
+        return BroadcastSubscription(queue=counted_subscription.queue,
+                                     stats=self.stats,
+                                     subscriber_index=counted_subscription.subscriber_index,
+                                     codec=self.codec)
+
+    def publish(self, message: TopicMessageABC):
+        if not isinstance(message, self.message_type):
+            raise TypeError(f"Expected message of type {self.message_type.__name__}, got {type(message).__name__}")
+        if not self.subscriptions:
+            return
+        self.stats.record_publish()
+        handle = get_publisher_arena(topic_id=self.topic_id).write(
+            data=encode_message(message=message, codec=self.codec),
+            number_of_subscribers=len(self.subscriptions))
+        for subscription_queue in self.subscriptions:
+            subscription_queue.put(handle if handle is not None else message)
+        for wakeup in self.wakeups:
+            wakeup.notify()
+
+    def close_publisher_arena(self):
+        """
+        Release the arena the calling thread publishes through - call when a publishing worker exits
+        """
+        close_publisher_arenas(topic_id=self.topic_id, this_thread_only=True)
+
+    def close(self):
+        close_publisher_arenas(topic_id=self.topic_id)
+        super().close()
+
+
+class CameraNodeOutputTopic(BroadcastPubSubTopic):
     """
     Topic for publishing the output data from a camera node.
     This is used to pass processed camera data to the next stage in the pipeline.
     """
     message_type: Type[CameraNodeOutputMessage] = CameraNodeOutputMessage
+    codec: BinaryMessageCodec | None = CAMERA_NODE_OUTPUT_CODEC
 
-class AggregationNodeOutputTopic(PubSubTopicABC):
+class AggregationNodeOutputTopic(BroadcastPubSubTopic):
     """
     Topic for publishing the output data from an aggregation node.
     This is used to pass aggregated data to the next stage in the pipeline.
     """
     message_type: Type[AggregationNodeOutputMessage] = AggregationNodeOutputMessage
-class ProcessFrameNumberTopic(PubSubTopicABC):
+    codec: BinaryMessageCodec | None = AGGREGATION_NODE_OUTPUT_CODEC
+class ProcessFrameNumberTopic(ConflatingPubSubTopic):
     """
     Topic for publishing the frame number of the current process.
     This is used to synchronize frame processing across multiple processes.
     """
     message_type: Type[ProcessFrameNumberMessage] = ProcessFrameNumberMessage
+    codec: BinaryMessageCodec | None = PROCESS_FRAME_NUMBER_CODEC
 
 
-class SkellyTrackerConfigsTopic(PubSubTopicABC):
+class SkellyTrackerConfigsTopic(ConflatingPubSubTopic):
     """
     Topic for publishing SkellyTracker configurations.
     This is used to update the SkellyTracker configurations across processes.
@@ -0,0 +1,32 @@
+import multiprocessing
+from dataclasses import dataclass, field
+
+# How long a node blocks on its wakeup before re-checking its shutdown flags
+NODE_WAKEUP_TIMEOUT_SECONDS: float = 0.1
+
+
+@dataclass
+class NodeWakeup:
+    """
+    Wakeup primitive for pipeline nodes.
+
+    A node blocks on `wait` instead of spinning on `wait_1ms` + `queue.empty()`. Topics that the node subscribes to
+    call `notify` whenever a message is published, so the node wakes up as soon as there is something to do.
+    Backed by a `multiprocessing.Event`, so it works for both thread and process workers.
+    """
+    event: multiprocessing.Event = field(default_factory=multiprocessing.Event)
+
+    def notify(self) -> None:
+        self.event.set()
+
+    def wait(self, timeout: float | None = NODE_WAKEUP_TIMEOUT_SECONDS) -> bool:
+        """
+        Block until notified (or until `timeout` seconds pass), then re-arm the wakeup.
+        Returns True if we were notified, False if we timed out.
+
+        NOTE - the event is cleared *before* the caller drains its subscriptions, so anything published while the
+        caller is draining will set the event again and we won't miss it on the next `wait`.
+        """
+        notified = self.event.wait(timeout=timeout)
+        self.event.clear()
+        return notified
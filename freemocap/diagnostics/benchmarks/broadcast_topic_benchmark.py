@@ -0,0 +1,124 @@
+"""
+Publish cost vs subscriber count: per-subscriber pickling (regular topics) against serialize-once broadcast arenas
+(`BroadcastPubSubTopic`).
+
+Regular topics put the message on every subscriber's `multiprocessing.Queue`, and each queue pickles its own copy.
+Broadcast topics pickle the message once into a shared memory `BroadcastArena` and only put a small `BroadcastHandle`
+on each queue. The subscribers here mirror `BroadcastSubscription.get`.
+
+Measures, for each subscriber count:
+    - publisher CPU per message (includes the queues' feeder threads, which is where the pickling happens)
+    - delivery latency: publish -> the slowest subscriber has the message unpickled
+
+Runs headless:
+    python freemocap/diagnostics/benchmarks/broadcast_topic_benchmark.py --subscriber-counts 1 2 4 8 --points 543
+"""
+import argparse
+import multiprocessing
+import multiprocessing.resource_tracker
+import pickle
+import time
+
+import numpy as np
+
+from freemocap.core.pubsub.broadcast_arena import BroadcastArenaReader, BroadcastHandle, get_publisher_arena, \
+    close_publisher_arenas
+
+BENCHMARK_TOPIC_ID: str = "broadcast-benchmark"
+
+
+def create_message(number_of_points: int) -> dict:
+    # Shaped like an `AggregationNodeOutputMessage` - a dict of named 3d points
+    random_state = np.random.default_rng(seed=0)
+    return {"frame_number": 0,
+            "published_ns": 0,
+            "tracked_points3d": {f"point_{point_index}": tuple(random_state.random(3))
+                                 for point_index in range(number_of_points)}}
+
+
+def _subscriber(subscription_queue: multiprocessing.Queue,
+                subscriber_index: int,
+                results_queue: multiprocessing.Queue,
+                number_of_messages: int):
+    reader = BroadcastArenaReader()
+    latencies_ns = []
+    for _ in range(number_of_messages):
+        item = subscription_queue.get()
+        if isinstance(item, BroadcastHandle):
+            item = pickle.loads(reader.read(handle=item, subscriber_index=subscriber_index))
+        latencies_ns.append(time.perf_counter_ns() - item["published_ns"])
+    reader.close()
+    results_queue.put(latencies_ns)
+
+
+def run_publish_benchmark(broadcast: bool,
+                          number_of_subscribers: int,
+                          message: dict,
+                          number_of_messages: int,
+                          message_interval_seconds: float):
+    subscription_queues = [multiprocessing.Queue() for _ in range(number_of_subscribers)]
+    results_queue = multiprocessing.Queue()
+    subscribers = [multiprocessing.Process(target=_subscriber,
+                                           args=(subscription_queue, subscriber_index, results_queue,
+                                                 number_of_messages),
+                                           daemon=True)
+                   for subscriber_index, subscription_queue in enumerate(subscription_queues)]
+    for subscriber in subscribers:
+        subscriber.start()
+    time.sleep(0.5)
+
+    cpu_start = time.process_time()
+    for frame_number in range(number_of_messages):
+        # (new dict each time - queues pickle lazily in their feeder threads, so don't mutate what's been put)
+        message = {**message, "frame_number": frame_number, "published_ns": time.perf_counter_ns()}
+        if broadcast:
+            # Mirrors `BroadcastPubSubTopic.publish`
+            handle = get_publisher_arena(topic_id=BENCHMARK_TOPIC_ID).write(
+                data=pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL),
+                number_of_subscribers=number_of_subscribers)
+            for subscription_queue in subscription_queues:
+                subscription_queue.put(handle if handle is not None else message)
+        else:
+            for subscription_queue in subscription_queues:
+                subscription_queue.put(message)
+        time.sleep(message_interval_seconds)
+
+    latencies_ns = [results_queue.get() for _ in subscribers]
+    cpu_seconds = time.process_time() - cpu_start
+    for subscriber in subscribers:
+        subscriber.join()
+    close_publisher_arenas(topic_id=BENCHMARK_TOPIC_ID)
+
+    # Delivery latency = when the slowest subscriber got each message
+    slowest_latencies_ms = np.max(np.asarray(latencies_ns), axis=0) / 1e6
+    return cpu_seconds / number_of_messages * 1e6, slowest_latencies_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscriber-counts", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--points", type=int, default=543, help="tracked points per message (543 = mediapipe holistic)")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--message-interval", type=float, default=1 / 120, help="seconds between messages")
+    args = parser.parse_args()
+
+    # Start the resource tracker before forking the subscribers, so they share ours instead of each starting one that
+    # unlinks the arenas they attached to when they exit
+    multiprocessing.resource_tracker.ensure_running()
+    message = create_message(number_of_points=args.points)
+    print(f"message size: {len(pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)) / 1e3:.1f} kB")
+    print(f"{'subscribers':>11} {'topic':<10} {'CPU us/msg':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for number_of_subscribers in args.subscriber_counts:
+        for name, broadcast in [("per-queue", False), ("broadcast", True)]:
+            cpu_us_per_message, latencies_ms = run_publish_benchmark(broadcast=broadcast,
+                                                                     number_of_subscribers=number_of_subscribers,
+                                                                     message=message,
+                                                                     number_of_messages=args.messages,
+                                                                     message_interval_seconds=args.message_interval)
+            p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+            print(f"{number_of_subscribers:>11} {name:<10} {cpu_us_per_message:>10.1f} {p50:>8.3f} {p95:>8.3f} "
+                  f"{p99:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Bundle adjustment solve time vs camera count and view count, on a synthetic charuco calibration.
+
+Cameras sit on a ring looking at the origin, a charuco board is waved around in front of them, and each camera sees the
+board's corners (with pixel noise) whenever the board faces it. The solve starts from extrinsics perturbed by a few
+degrees/centimeters, like the pairwise estimates `MultiCameraCalibrator` hands to `SparseBundleOptimizer`.
+
+Reports, for each (cameras, views) combination:
+    - problem size (parameters x residuals) and the time to build the Jacobian sparsity
+    - solve time and function evaluations
+    - RMS reprojection error before/after, and the camera position error after (vs ground truth)
+
+Runs headless:
+    python freemocap/diagnostics/benchmarks/bundle_adjustment_benchmark.py --camera-counts 2 4 8 --view-counts 25 50 100
+"""
+import argparse
+import time
+
+import numpy as np
+
+from freemocap.core.pipelines.calibration_pipeline.bundle_adjustment import BundleAdjustmentProblem, anchor_to_camera
+from freemocap.core.pipelines.calibration_pipeline.se3_operations import rotation_vectors_to_matrices, \
+    rotation_matrices_to_vectors
+
+FOCAL_LENGTH_PX: float = 1000.0
+CAMERA_RING_RADIUS_MM: float = 3000.0
+BOARD_SQUARE_SIZE_MM: float = 58.0
+BOARD_SQUARES: tuple[int, int] = (5, 7)
+
+
+def create_board_object_points() -> np.ndarray:
+    # Inner corners of a charuco board, in board coordinates (the board is the z=0 plane)
+    corners_x, corners_y = np.meshgrid(np.arange(1, BOARD_SQUARES[0]), np.arange(1, BOARD_SQUARES[1]))
+    return np.stack([corners_x.ravel(), corners_y.ravel(), np.zeros(corners_x.size)], axis=1) * BOARD_SQUARE_SIZE_MM
+
+
+def create_ring_of_cameras(number_of_cameras: int) -> np.ndarray:
+    """ (cameras, 3, 4) [R|t] extrinsics, every camera looking at the origin from a ring around it """
+    extrinsics = []
+    for angle in np.linspace(-np.pi / 3, np.pi / 3, number_of_cameras):
+        position = CAMERA_RING_RADIUS_MM * np.array([np.sin(angle), 0.0, -np.cos(angle)])
+        forward = -position / np.linalg.norm(position)
+        right = np.cross([0.0, 1.0, 0.0], forward)
+        down = np.cross(forward, right)
+        rotation = np.stack([right, down, forward])  # rows: camera x, y, z axes in world coordinates
+        extrinsics.append(np.hstack([rotation, (-rotation @ position)[:, np.newaxis]]))
+    return np.asarray(extrinsics)
+
+
+def create_synthetic_problem(number_of_cameras: int,
+                             number_of_views: int,
+                             pixel_noise: float,
+                             random_state: np.random.Generator) -> tuple[BundleAdjustmentProblem, np.ndarray]:
+    """ Returns the problem, and the ground truth (cameras, 3, 4) extrinsics """
+    camera_extrinsics = create_ring_of_cameras(number_of_cameras)
+    board_object_points = create_board_object_points()
+    number_of_corners = len(board_object_points)
+
+    # Random board poses - tilted up to ~60 degrees, within half a meter of the origin
+    board_rotations = rotation_vectors_to_matrices(random_state.normal(scale=0.6, size=(number_of_views, 3)))
+    board_translations = random_state.uniform(-500, 500, size=(number_of_views, 3))
+    points3d = (np.einsum("vij,nj->vni", board_rotations, board_object_points) +
+                board_translations[:, np.newaxis, :]).reshape(-1, 3)
+    board_ids = np.repeat(np.arange(number_of_views), number_of_corners)
+
+    points_in_cameras = (np.einsum("cij,nj->cni", camera_extrinsics[:, :, :3], points3d) +
+                         camera_extrinsics[:, np.newaxis, :, 3])
+    points2d = points_in_cameras[..., :2] / points_in_cameras[..., 2:3]
+    points2d += random_state.normal(scale=pixel_noise / FOCAL_LENGTH_PX, size=points2d.shape)
+    # Cameras only see a board that faces them, and miss the odd corner
+    board_normals = board_rotations[:, :, 2]
+    camera_positions = -np.einsum("cji,cj->ci", camera_extrinsics[:, :, :3], camera_extrinsics[:, :, 3])
+    view_directions = board_translations[np.newaxis] - camera_positions[:, np.newaxis]
+    facing = np.abs(np.einsum("cvi,vi->cv", view_directions, board_normals)) > 0.3 * np.linalg.norm(view_directions,
+                                                                                                       axis=2)
+    visible = np.repeat(facing, number_of_corners, axis=1) & (random_state.random(points2d.shape[:2]) > 0.1)
+    points2d[~visible] = np.nan
+
+    # Keep the points at least two cameras saw
+    triangulable = visible.sum(axis=0) >= 2
+    problem = BundleAdjustmentProblem(undistorted_points2d=points2d[:, triangulable],
+                                      focal_lengths=np.full(number_of_cameras, FOCAL_LENGTH_PX),
+                                      board_ids=np.unique(board_ids[triangulable], return_inverse=True)[1],
+                                      board_object_points=board_object_points[np.tile(np.arange(number_of_corners),
+                                                                                      number_of_views)][triangulable])
+    return problem, camera_extrinsics
+
+
+def perturb_extrinsics(camera_extrinsics: np.ndarray,
+                       rotation_noise_degrees: float,
+                       translation_noise_mm: float,
+                       random_state: np.random.Generator) -> np.ndarray:
+    perturbed = camera_extrinsics.copy()
+    rotation_noise = rotation_vectors_to_matrices(
+        random_state.normal(scale=np.radians(rotation_noise_degrees), size=(len(camera_extrinsics), 3)))
+    perturbed[:, :, :3] = rotation_noise @ camera_extrinsics[:, :, :3]
+    perturbed[:, :, 3] += random_state.normal(scale=translation_noise_mm, size=(len(camera_extrinsics), 3))
+    # (keep camera 0 as the world origin, like the pairwise estimates do)
+    perturbed[0] = camera_extrinsics[0]
+    return perturbed
+
+
+def camera_position_errors_mm(estimated_extrinsics: np.ndarray, true_extrinsics: np.ndarray) -> np.ndarray:
+    """ Both sets of extrinsics are compared with camera 0 as the world origin """
+    def camera_positions(extrinsics: np.ndarray) -> np.ndarray:
+        return -np.einsum("cji,cj->ci", extrinsics[:, :, :3], extrinsics[:, :, 3])
+
+    true_extrinsics = anchor_to_camera(camera_rotation_vectors=rotation_matrices_to_vectors(true_extrinsics[:, :, :3]),
+                                       camera_translation_vectors=true_extrinsics[:, :, 3],
+                                       camera_index=0)
+    return np.linalg.norm(camera_positions(estimated_extrinsics) - camera_positions(true_extrinsics), axis=1)
+
+
+def rms_reprojection_error(problem: BundleAdjustmentProblem, parameters: np.ndarray) -> float:
+    return float(np.sqrt(np.mean(problem.residuals(parameters)[:problem.observed.sum()] ** 2)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--camera-counts", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--view-counts", type=int, nargs="+", default=[25, 50, 100])
+    parser.add_argument("--pixel-noise", type=float, default=0.5, help="std dev of the corner detection noise (px)")
+    parser.add_argument("--rotation-noise", type=float, default=2.0, help="initial extrinsics error (degrees)")
+    parser.add_argument("--translation-noise", type=float, default=50.0, help="initial extrinsics error (mm)")
+    args = parser.parse_args()
+
+    print(f"{'cameras':>7} {'views':>5} {'params':>7} {'residuals':>9} {'sparsity s':>10} {'solve s':>8} "
+          f"{'nfev':>5} {'rms px before':>13} {'rms px after':>12} {'max cam err mm':>14}")
+    for number_of_cameras in args.camera_counts:
+        for number_of_views in args.view_counts:
+            random_state = np.random.default_rng(seed=0)
+            problem, true_extrinsics = create_synthetic_problem(number_of_cameras=number_of_cameras,
+                                                                number_of_views=number_of_views,
+                                                                pixel_noise=args.pixel_noise,
+                                                                random_state=random_state)
+            initial_parameters = problem.initial_parameters(
+                camera_extrinsics=perturb_extrinsics(true_extrinsics,
+                                                     rotation_noise_degrees=args.rotation_noise,
+                                                     translation_noise_mm=args.translation_noise,
+                                                     random_state=random_state))
+            sparsity_start = time.perf_counter()
+            jacobian_sparsity = problem.jacobian_sparsity()
+            sparsity_seconds = time.perf_counter() - sparsity_start
+
+            solve_start = time.perf_counter()
+            result = problem.solve(initial_parameters=initial_parameters, x_scale="jac", loss="linear")
+            solve_seconds = time.perf_counter() - solve_start
+
+            camera_rotation_vectors, camera_translation_vectors, *_ = problem.unpack(result.x)
+            solved_extrinsics = anchor_to_camera(camera_rotation_vectors=camera_rotation_vectors,
+                                                 camera_translation_vectors=camera_translation_vectors,
+                                                 camera_index=0)
+            print(f"{number_of_cameras:>7} {number_of_views:>5} {jacobian_sparsity.shape[1]:>7} "
+                  f"{jacobian_sparsity.shape[0]:>9} {sparsity_seconds:>10.3f} {solve_seconds:>8.2f} {result.nfev:>5} "
+                  f"{rms_reprojection_error(problem, initial_parameters):>13.2f} "
+                  f"{rms_reprojection_error(problem, result.x):>12.2f} "
+                  f"{camera_position_errors_mm(solved_extrinsics, true_extrinsics).max():>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Jacobian sparsity build time and memory - the vectorized COO -> csr builders vs the dok_matrix loops they replaced.
+
+Two problem families:
+    - triangulation refinement (anipose's `optim_points`): a recording of N minutes at the given fps, every joint seen by
+      every camera except for random dropouts, with the usual limb-length constraints. Hour-long recordings are the
+      interesting case - the legacy builder is only timed up to `--legacy-max-minutes` since it takes far too long
+      beyond that.
+    - calibration bundle adjustment: cameras x charuco views, 24 corners per board.
+
+Reports the build time, the pattern's shape and non-zero count, and the csr matrix's memory footprint. Where the
+legacy builder runs too, the two patterns are checked for equality.
+
+Runs headless:
+    python freemocap/diagnostics/benchmarks/jacobian_sparsity_benchmark.py --minutes 1 10 60 --fps 30
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy.sparse import dok_matrix
+
+from freemocap.core.pipelines.calibration_pipeline.calculate_sparse_jacobian import calculate_jacobian_sparsity, \
+    calculate_triangulation_jacobian_sparsity
+
+NUMBER_OF_JOINTS: int = 33  # mediapipe body
+LIMB_CONSTRAINTS: list[tuple[int, int]] = [(11, 13), (13, 15), (12, 14), (14, 16), (23, 25), (25, 27), (24, 26),
+                                           (26, 28)]
+WEAK_CONSTRAINTS: list[tuple[int, int]] = [(11, 12), (23, 24), (11, 23), (12, 24)]
+CHARUCO_CORNERS: int = 24
+
+
+def legacy_triangulation_sparsity(p2ds: np.ndarray,
+                                  constraints: list[tuple[int, int]],
+                                  constraints_weak: list[tuple[int, int]],
+                                  n_deriv_smooth: int = 1) -> dok_matrix:
+    """ The dok_matrix loops from `CameraGroup._jac_sparsity_triangulation`, before it moved to the COO builder """
+    n_cams, n_frames, n_joints, _ = p2ds.shape
+    p2ds_flat = p2ds.reshape((n_cams, -1, 2))
+    point_indices = np.zeros(p2ds_flat.shape, dtype="int32")
+    for i in range(p2ds_flat.shape[1]):
+        point_indices[:, i] = i
+    point_indices_3d = np.arange(n_frames * n_joints).reshape((n_frames, n_joints))
+    good = ~np.isnan(p2ds_flat)
+    n_errors_reproj = np.sum(good)
+    n_errors_smooth = (n_frames - n_deriv_smooth) * n_joints * 3
+    n_errors = n_errors_reproj + n_errors_smooth + (len(constraints) + len(constraints_weak)) * n_frames
+    n_3d = n_frames * n_joints * 3
+    A_sparse = dok_matrix((n_errors, n_3d + len(constraints) + len(constraints_weak)), dtype="int16")
+
+    point_indices_good = point_indices[good]
+    ix_reproj = np.arange(n_errors_reproj)
+    for k in range(3):
+        A_sparse[ix_reproj, point_indices_good * 3 + k] = 1
+    frames = np.arange(n_frames - n_deriv_smooth)
+    for j in range(n_joints):
+        for n in range(n_deriv_smooth + 1):
+            pa = point_indices_3d[frames, j]
+            pb = point_indices_3d[frames + n, j]
+            for k in range(3):
+                A_sparse[n_errors_reproj + pa * 3 + k, pb * 3 + k] = 1
+    frames = np.arange(n_frames)
+    start = n_errors_reproj + n_errors_smooth
+    for length_params_start, constraint_pairs in [(n_3d, constraints), (n_3d + len(constraints), constraints_weak)]:
+        for cix, (a, b) in enumerate(constraint_pairs):
+            A_sparse[start + cix * n_frames + frames, length_params_start + cix] = 1
+            for k in range(3):
+                A_sparse[start + cix * n_frames + frames, point_indices_3d[frames, a] * 3 + k] = 1
+                A_sparse[start + cix * n_frames + frames, point_indices_3d[frames, b] * 3 + k] = 1
+        start += len(constraint_pairs) * n_frames
+    return A_sparse
+
+
+def create_points2d(number_of_cameras: int, number_of_points: tuple[int, ...], dropout: float,
+                    random_state: np.random.Generator) -> np.ndarray:
+    # Only the NaN pattern matters for the sparsity, so skip generating real coordinates
+    points2d = np.zeros((number_of_cameras, *number_of_points, 2))
+    points2d[random_state.random(points2d.shape[:-1]) < dropout] = np.nan
+    return points2d
+
+
+def csr_megabytes(matrix) -> float:
+    return (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 10, 60], help="triangulation recording lengths")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--cameras", type=int, default=4)
+    parser.add_argument("--dropout", type=float, default=0.1, help="fraction of missing 2d observations")
+    parser.add_argument("--legacy-max-minutes", type=float, default=0.5,
+                        help="only time the dok_matrix builder up to this recording length")
+    parser.add_argument("--calibration-camera-counts", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--calibration-view-counts", type=int, nargs="+", default=[100, 500, 2000])
+    args = parser.parse_args()
+    random_state = np.random.default_rng(seed=0)
+
+    print(f"Triangulation refinement ({args.cameras} cameras, {NUMBER_OF_JOINTS} joints, {args.fps:g} fps)")
+    print(f"{'minutes':>7} {'frames':>7} {'rows':>11} {'cols':>9} {'nnz':>11} {'csr MB':>8} {'build s':>8} "
+          f"{'legacy s':>9}")
+    for minutes in sorted(set(args.minutes) | {args.legacy_max_minutes}):
+        number_of_frames = int(minutes * 60 * args.fps)
+        points2d = create_points2d(args.cameras, (number_of_frames, NUMBER_OF_JOINTS), args.dropout, random_state)
+        build_start = time.perf_counter()
+        sparsity = calculate_triangulation_jacobian_sparsity(points2d=points2d,
+                                                             constraints=LIMB_CONSTRAINTS,
+                                                             constraints_weak=WEAK_CONSTRAINTS)
+        build_seconds = time.perf_counter() - build_start
+        legacy_column = "-"
+        if minutes <= args.legacy_max_minutes:
+            legacy_start = time.perf_counter()
+            legacy_sparsity = legacy_triangulation_sparsity(points2d, LIMB_CONSTRAINTS, WEAK_CONSTRAINTS)
+            legacy_column = f"{time.perf_counter() - legacy_start:.2f}"
+            if (legacy_sparsity.tocsr().astype(bool) != sparsity).nnz:
+                raise AssertionError(f"Sparsity patterns differ for a {minutes} minute recording")
+        print(f"{minutes:>7g} {number_of_frames:>7} {sparsity.shape[0]:>11} {sparsity.shape[1]:>9} {sparsity.nnz:>11} "
+              f"{csr_megabytes(sparsity):>8.1f} {build_seconds:>8.2f} {legacy_column:>9}")
+        del points2d, sparsity
+
+    print(f"\nCalibration bundle adjustment ({CHARUCO_CORNERS} corners per view)")
+    print(f"{'cameras':>7} {'views':>6} {'rows':>9} {'cols':>8} {'nnz':>10} {'csr MB':>8} {'build s':>8}")
+    for number_of_cameras in args.calibration_camera_counts:
+        for number_of_views in args.calibration_view_counts:
+            points2d = create_points2d(number_of_cameras, (number_of_views * CHARUCO_CORNERS,), 0.5, random_state)
+            build_start = time.perf_counter()
+            sparsity = calculate_jacobian_sparsity(pixel_points2d=points2d,
+                                                   ids=np.repeat(np.arange(number_of_views), CHARUCO_CORNERS),
+                                                   num_camera_params=6)
+            build_seconds = time.perf_counter() - build_start
+            print(f"{number_of_cameras:>7} {number_of_views:>6} {sparsity.shape[0]:>9} {sparsity.shape[1]:>8} "
+                  f"{sparsity.nnz:>10} {csr_megabytes(sparsity):>8.1f} {build_seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
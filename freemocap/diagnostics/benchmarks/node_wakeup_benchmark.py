@@ -0,0 +1,103 @@
+"""
+Compare the old `wait_1ms()` + `queue.empty()` polling loop against `NodeWakeup` event-driven pipeline nodes.
+
+Measures, for each strategy:
+    - idle CPU: CPU time burned by a node process that receives no messages
+    - per-hop latency: time from `publish` in the parent process to the node pulling the message off its queue
+
+Runs headless, no cameras needed:
+    python freemocap/diagnostics/benchmarks/node_wakeup_benchmark.py --idle-seconds 5 --messages 500
+"""
+import argparse
+import multiprocessing
+import time
+
+import numpy as np
+
+from freemocap.core.pubsub.pubsub_wakeup import NodeWakeup, NODE_WAKEUP_TIMEOUT_SECONDS
+
+
+def _polling_node(subscription: multiprocessing.Queue,
+                  results_queue: multiprocessing.Queue,
+                  shutdown_flag: multiprocessing.Value,
+                  wakeup: NodeWakeup):
+    # Mirrors the pre-wakeup pipeline node loop (`wait_1ms()` then check `subscription.empty()`)
+    cpu_start = time.process_time()
+    latencies_ns = []
+    while not shutdown_flag.value:
+        time.sleep(0.001)
+        if not subscription.empty():
+            published_ns = subscription.get()
+            latencies_ns.append(time.perf_counter_ns() - published_ns)
+    results_queue.put((time.process_time() - cpu_start, latencies_ns))
+
+
+def _wakeup_node(subscription: multiprocessing.Queue,
+                 results_queue: multiprocessing.Queue,
+                 shutdown_flag: multiprocessing.Value,
+                 wakeup: NodeWakeup):
+    cpu_start = time.process_time()
+    latencies_ns = []
+    while not shutdown_flag.value:
+        wakeup.wait(timeout=NODE_WAKEUP_TIMEOUT_SECONDS)
+        while not subscription.empty():
+            published_ns = subscription.get()
+            latencies_ns.append(time.perf_counter_ns() - published_ns)
+    results_queue.put((time.process_time() - cpu_start, latencies_ns))
+
+
+def run_node_benchmark(node_target, idle_seconds: float, number_of_messages: int, message_interval_seconds: float):
+    subscription = multiprocessing.Queue()
+    results_queue = multiprocessing.Queue()
+    wakeup = NodeWakeup()
+
+    # Idle run - no messages at all
+    shutdown_flag = multiprocessing.Value('b', False)
+    node = multiprocessing.Process(target=node_target, args=(subscription, results_queue, shutdown_flag, wakeup),
+                                   daemon=True)
+    node.start()
+    time.sleep(idle_seconds)
+    shutdown_flag.value = True
+    wakeup.notify()
+    idle_cpu_seconds, _ = results_queue.get()
+    node.join()
+
+    # Latency run - publish messages at a fixed rate (like frames coming in from the cameras)
+    shutdown_flag = multiprocessing.Value('b', False)
+    node = multiprocessing.Process(target=node_target, args=(subscription, results_queue, shutdown_flag, wakeup),
+                                   daemon=True)
+    node.start()
+    time.sleep(0.5)  # let the node settle into its loop
+    for _ in range(number_of_messages):
+        subscription.put(time.perf_counter_ns())
+        wakeup.notify()
+        time.sleep(message_interval_seconds)
+    time.sleep(0.5)
+    shutdown_flag.value = True
+    wakeup.notify()
+    _, latencies_ns = results_queue.get()
+    node.join()
+
+    return idle_cpu_seconds / idle_seconds, np.asarray(latencies_ns) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--idle-seconds", type=float, default=5.0)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--message-interval", type=float, default=1 / 30, help="seconds between messages")
+    args = parser.parse_args()
+
+    print(f"{'strategy':<10} {'idle CPU %':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, node_target in [("polling", _polling_node), ("wakeup", _wakeup_node)]:
+        idle_cpu_fraction, latencies_ms = run_node_benchmark(node_target=node_target,
+                                                             idle_seconds=args.idle_seconds,
+                                                             number_of_messages=args.messages,
+                                                             message_interval_seconds=args.message_interval)
+        p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+        print(f"{name:<10} {idle_cpu_fraction * 100:>10.2f} {p50:>8.3f} {p95:>8.3f} {p99:>8.3f} "
+              f"{latencies_ms.max():>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
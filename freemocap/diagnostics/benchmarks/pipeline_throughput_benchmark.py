@@ -0,0 +1,589 @@
+"""
+Throughput benchmark for the realtime processing pipeline, driven by a synthetic camera group instead of physical cameras.
+
+`ProcessingPipeline` is wired to skellycam (its camera group, frame ring buffers and pubsub topics), so this runs the
+pipeline's own stages on stand-ins for those:
+    - a camera group process writes frames (generated, or looped from a video file) into a shared memory frame ring per
+      camera at a fixed fps and resolution, then bumps the latest multiframe number - like skellycam's camera group
+    - camera nodes (one per camera, or one batched node for every camera) pick up the aggregation node's frame requests
+      from a `LatestValueCell`, copy the frame out of its ring, run a stand-in tracker (it resizes the image like a
+      tracker's preprocessing, then reports a synthetic skeleton projected into that camera), write the observation to an
+      `ObservationRingBuffer`, and publish its slot through a broadcast arena - like `CameraNode`
+    - the aggregation node schedules frames with `FrameScheduler`/`FrameReorderBuffer` (LATEST read type), and
+      triangulates each completed frame with `CalibrationSnapshot.undistort_points` + `triangulate_batched` - like
+      `AggregationNode` and `PointTriangulator`
+Nodes sleep on `NodeWakeup`s and record into `PipelineLatencyHistograms`, the same as the real ones.
+
+For each worker strategy (threads or processes) and camera count, reports:
+    - sustained fps: frames aggregated per second, against the camera group's fps
+    - per-stage latency percentiles, from the pipeline's latency histograms (the slowest camera, for per-camera stages)
+    - CPU % and RSS (which includes the shared memory a process has touched) per process - thread workers all run in
+      the benchmark's own process, so they're reported together
+
+Runs headless, no cameras needed:
+    python freemocap/diagnostics/benchmarks/pipeline_throughput_benchmark.py --camera-counts 1 2 4 8 16 --seconds 5
+"""
+import argparse
+import multiprocessing
+import multiprocessing.resource_tracker
+import pickle
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import cv2
+import numpy as np
+import psutil
+import toml
+
+from freemocap.core.pipelines.batched_triangulation import triangulate_batched, MINIMUM_CAMERAS_FOR_TRIANGULATION
+from freemocap.core.pipelines.calibration_store import CalibrationSnapshot
+from freemocap.core.pipelines.frame_reorder_buffer import FrameReorderBuffer, DEFAULT_MAX_FRAMES_IN_FLIGHT
+from freemocap.core.pipelines.frame_scheduler import FrameScheduler, FrameCounters, FrameCounterTypes, ReadTypes
+from freemocap.core.pipelines.observation_ring_buffer import ObservationRingBuffer
+from freemocap.core.pipelines.pipeline_latency_histograms import PipelineLatencyHistograms, PipelineTraceStage
+from freemocap.core.pubsub.broadcast_arena import BroadcastArenaReader, BroadcastHandle, get_publisher_arena, \
+    close_publisher_arenas
+from freemocap.core.pubsub.latest_value_cell import LatestValueCell
+from freemocap.core.pubsub.pubsub_codecs import Int64DictFieldCodec
+from freemocap.core.pubsub.pubsub_stats import TopicStats
+from freemocap.core.pubsub.pubsub_wakeup import NodeWakeup, NODE_WAKEUP_TIMEOUT_SECONDS
+
+WORKER_STRATEGIES = {"thread": threading.Thread, "process": multiprocessing.Process}
+CAMERA_NODE_OUTPUT_TOPIC_ID: str = "pipeline-benchmark-camera-node-output"
+TRACKER_TYPE: str = "synthetic"
+REQUESTED_FRAMES_CODEC = Int64DictFieldCodec()
+# (as in `processing_pipeline` and `pubsub_topics`, which can't be imported without skellycam)
+NEW_FRAME_POLL_INTERVAL_SECONDS: float = 0.001
+IN_FLIGHT_MESSAGE_TIMEOUT_SECONDS: float = 0.005
+LOST_FRAME_SLOT_INDEX: int = -2
+
+CAMERA_RING_RADIUS_M: float = 3.0
+TRACKER_INPUT_SIZE: tuple[int, int] = (256, 256)
+
+
+@dataclass
+class SyntheticCameraGroup:
+    """
+    Stands in for skellycam's camera group - one shared memory frame ring per camera, and the latest multiframe number.
+    Pickles as its shared memory name and shape, so it can ride along to thread and process workers alike.
+    """
+    shm: shared_memory.SharedMemory
+    number_of_cameras: int
+    ring_length: int
+    frame_shape: tuple[int, int, int]
+    latest_frame_number: np.ndarray  # (1,) int64
+    frame_numbers: np.ndarray  # (cameras, ring_length) int64, -1 while a slot is being written
+    images: np.ndarray  # (cameras, ring_length, height, width, 3) uint8
+    owner: bool
+
+    @classmethod
+    def create(cls, number_of_cameras: int, ring_length: int, frame_shape: tuple[int, int, int]):
+        header_bytes = (1 + number_of_cameras * ring_length) * np.dtype(np.int64).itemsize
+        shm = shared_memory.SharedMemory(name=f"fmc_bench_{uuid.uuid4().hex[:12]}",
+                                         create=True,
+                                         size=header_bytes + number_of_cameras * ring_length * int(np.prod(frame_shape)))
+        camera_group = cls._attach(shm=shm, number_of_cameras=number_of_cameras, ring_length=ring_length,
+                                   frame_shape=frame_shape, owner=True)
+        camera_group.latest_frame_number[:] = -1
+        camera_group.frame_numbers[:] = -1
+        return camera_group
+
+    @classmethod
+    def _attach(cls, shm: shared_memory.SharedMemory, number_of_cameras: int, ring_length: int,
+                frame_shape: tuple[int, int, int], owner: bool):
+        header = np.ndarray((1 + number_of_cameras * ring_length,), dtype=np.int64, buffer=shm.buf)
+        return cls(shm=shm,
+                   number_of_cameras=number_of_cameras,
+                   ring_length=ring_length,
+                   frame_shape=tuple(frame_shape),
+                   latest_frame_number=header[:1],
+                   frame_numbers=header[1:].reshape(number_of_cameras, ring_length),
+                   images=np.ndarray((number_of_cameras, ring_length, *frame_shape), dtype=np.uint8, buffer=shm.buf,
+                                     offset=header.nbytes),
+                   owner=owner)
+
+    def __getstate__(self):
+        return self.shm.name, self.number_of_cameras, self.ring_length, self.frame_shape
+
+    def __setstate__(self, state):
+        shm_name, number_of_cameras, ring_length, frame_shape = state
+        attached = self._attach(shm=shared_memory.SharedMemory(name=shm_name), number_of_cameras=number_of_cameras,
+                                ring_length=ring_length, frame_shape=frame_shape, owner=False)
+        self.__dict__.update(attached.__dict__)
+
+    def close(self) -> None:
+        self.latest_frame_number = self.frame_numbers = self.images = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def generate_source_frames(number_of_frames: int, width: int, height: int) -> np.ndarray:
+    # Noise over a gradient that moves from frame to frame
+    random_state = np.random.default_rng(seed=0)
+    gradient = np.linspace(0, 191, width).astype(np.uint8)
+    return np.stack([random_state.integers(0, 64, size=(height, width, 3), dtype=np.uint8) +
+                     np.roll(gradient, frame_index * width // number_of_frames)[np.newaxis, :, np.newaxis]
+                     for frame_index in range(number_of_frames)])
+
+
+def load_source_frames(video_path: str, number_of_frames: int, width: int, height: int) -> np.ndarray:
+    video_capture = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < number_of_frames:
+        success, frame = video_capture.read()
+        if not success:
+            break
+        frames.append(cv2.resize(frame, (width, height)))
+    video_capture.release()
+    if not frames:
+        raise ValueError(f"Couldn't read any frames from {video_path}")
+    return np.stack(frames)
+
+
+def create_camera_calibration(number_of_cameras: int, width: int, height: int) -> dict:
+    """ Cameras on a ring around the origin, all looking at it - in the calibration toml's layout """
+    calibration = {}
+    for camera_index, angle in enumerate(np.linspace(0, 2 * np.pi, number_of_cameras, endpoint=False)):
+        position = CAMERA_RING_RADIUS_M * np.array([np.sin(angle), 0.0, -np.cos(angle)])
+        forward = -position / np.linalg.norm(position)
+        right = np.cross([0.0, 1.0, 0.0], forward)
+        rotation = np.stack([right, np.cross(forward, right), forward])
+        calibration[f"cam_{camera_index}"] = {"name": f"cam_{camera_index}",
+                                              "size": [width, height],
+                                              "matrix": [[float(width), 0.0, width / 2],
+                                                         [0.0, float(width), height / 2],
+                                                         [0.0, 0.0, 1.0]],
+                                              "distortions": [0.0] * 5,
+                                              "rotation": cv2.Rodrigues(rotation)[0].ravel().tolist(),
+                                              "translation": (-rotation @ position).tolist()}
+    return calibration
+
+
+def _camera_group_worker(camera_group: SyntheticCameraGroup,
+                         source_frames: np.ndarray,
+                         fps: float,
+                         shutdown_flag: multiprocessing.Value):
+    frame_number = 0
+    next_frame_time = time.perf_counter()
+    while not shutdown_flag.value:
+        slot_index = frame_number % camera_group.ring_length
+        for camera_index in range(camera_group.number_of_cameras):
+            camera_group.frame_numbers[camera_index, slot_index] = -1
+            camera_group.images[camera_index, slot_index] = source_frames[(frame_number + camera_index) %
+                                                                          len(source_frames)]
+            camera_group.frame_numbers[camera_index, slot_index] = frame_number
+        camera_group.latest_frame_number[0] = frame_number
+        frame_number += 1
+        next_frame_time += 1 / fps
+        time.sleep(max(next_frame_time - time.perf_counter(), 0.0))
+
+
+def _track(image: np.ndarray,
+           frame_number: int,
+           pixel_projection_matrix: np.ndarray,
+           skeleton: np.ndarray,
+           inference_seconds: float) -> np.ndarray:
+    # Stand-in tracker - scales the image down like a tracker's preprocessing does, waits out the (configurable)
+    # inference time, and reports the synthetic skeleton (swaying a little every frame) projected into this camera
+    cv2.resize(image, TRACKER_INPUT_SIZE)
+    if inference_seconds > 0:
+        time.sleep(inference_seconds)
+    points3d = skeleton + 0.05 * np.sin(frame_number / 10 + np.arange(len(skeleton)))[:, np.newaxis]
+    homogeneous_points2d = points3d @ pixel_projection_matrix[:, :3].T + pixel_projection_matrix[:, 3]
+    return homogeneous_points2d[:, :2] / homogeneous_points2d[:, 2:]
+
+
+def _publish_camera_node_output(output: tuple,
+                                output_queue: multiprocessing.Queue,
+                                output_stats: TopicStats,
+                                aggregation_wakeup: NodeWakeup):
+    # Like `BroadcastPubSubTopic.publish` - serialized once into this publisher's arena, only the handle goes on the queue
+    output_stats.record_publish()
+    data = pickle.dumps(output, protocol=pickle.HIGHEST_PROTOCOL)
+    handle = get_publisher_arena(topic_id=CAMERA_NODE_OUTPUT_TOPIC_ID).write(data=data, number_of_subscribers=1)
+    output_queue.put(handle if handle is not None else data)
+    aggregation_wakeup.notify()
+
+
+def _camera_node(camera_indices: list[int],
+                 camera_group: SyntheticCameraGroup,
+                 request_cell: LatestValueCell,
+                 wakeup: NodeWakeup,
+                 output_queue: multiprocessing.Queue,
+                 output_stats: TopicStats,
+                 aggregation_wakeup: NodeWakeup,
+                 latency_histograms: PipelineLatencyHistograms,
+                 pixel_projection_matrices: np.ndarray,
+                 skeleton: np.ndarray,
+                 inference_seconds: float,
+                 shutdown_flag: multiprocessing.Value):
+    latency_rows = {camera_index: latency_histograms.row_for(str(camera_index)) for camera_index in camera_indices}
+    frames = {camera_index: np.empty(camera_group.frame_shape, dtype=np.uint8) for camera_index in camera_indices}
+    observation_rings: dict[int, ObservationRingBuffer] = {}
+    processed_frame_numbers: set[int] = set()
+    last_read_sequence = 0
+    try:
+        while not shutdown_flag.value:
+            wakeup.wait(timeout=NODE_WAKEUP_TIMEOUT_SECONDS)
+            if request_cell.sequence <= last_read_sequence:
+                continue
+            last_read_sequence, data = request_cell.read()
+            requested_frames, _ = REQUESTED_FRAMES_CODEC.unpack(memoryview(data), 0)
+            processed_frame_numbers.intersection_update(requested_frames.keys())
+            for requested_frame_number, requested_at_ns in sorted(requested_frames.items()):
+                if requested_frame_number in processed_frame_numbers:
+                    continue
+                processed_frame_numbers.add(requested_frame_number)
+                for camera_index in camera_indices:
+                    latency_row = latency_rows[camera_index]
+                    retrieve_start_ns = time.perf_counter_ns()
+                    latency_histograms.record(row=latency_row,
+                                              stage=PipelineTraceStage.REQUEST_QUEUE,
+                                              duration_ns=retrieve_start_ns - requested_at_ns)
+                    slot_index = requested_frame_number % camera_group.ring_length
+                    np.copyto(frames[camera_index], camera_group.images[camera_index, slot_index])
+                    # (checked after the copy - a frame that was overwritten while we copied it is lost too)
+                    frame_number = int(camera_group.frame_numbers[camera_index, slot_index])
+                    time_to_retrieve_frame_ns = time.perf_counter_ns() - retrieve_start_ns
+                    latency_histograms.record(row=latency_row,
+                                              stage=PipelineTraceStage.FRAME_RETRIEVAL,
+                                              duration_ns=time_to_retrieve_frame_ns)
+                    if frame_number != requested_frame_number:
+                        _publish_camera_node_output(output=(camera_index, requested_frame_number, LOST_FRAME_SLOT_INDEX,
+                                                            None, time.perf_counter_ns()),
+                                                    output_queue=output_queue,
+                                                    output_stats=output_stats,
+                                                    aggregation_wakeup=aggregation_wakeup)
+                        continue
+                    process_start_ns = time.perf_counter_ns()
+                    points = _track(image=frames[camera_index],
+                                    frame_number=frame_number,
+                                    pixel_projection_matrix=pixel_projection_matrices[camera_index],
+                                    skeleton=skeleton,
+                                    inference_seconds=inference_seconds)
+                    time_to_process_frame_ns = time.perf_counter_ns() - process_start_ns
+                    latency_histograms.record(row=latency_row,
+                                              stage=PipelineTraceStage.TRACKER_INFERENCE,
+                                              duration_ns=time_to_process_frame_ns)
+                    new_ring_dto = None
+                    if camera_index not in observation_rings:
+                        observation_rings[camera_index] = ObservationRingBuffer.create(
+                            point_names=[f"point_{point_index}" for point_index in range(len(points))],
+                            point_dimensions=2)
+                        new_ring_dto = observation_rings[camera_index].to_dto()
+                    observation_slot_index = observation_rings[camera_index].write(
+                        frame_number=frame_number,
+                        points=points,
+                        time_to_retrieve_frame_ns=time_to_retrieve_frame_ns,
+                        time_to_process_frame_ns=time_to_process_frame_ns)
+                    _publish_camera_node_output(output=(camera_index, frame_number, observation_slot_index,
+                                                        new_ring_dto, time.perf_counter_ns()),
+                                                output_queue=output_queue,
+                                                output_stats=output_stats,
+                                                aggregation_wakeup=aggregation_wakeup)
+    finally:
+        for observation_ring in observation_rings.values():
+            observation_ring.close()
+        close_publisher_arenas(topic_id=CAMERA_NODE_OUTPUT_TOPIC_ID, this_thread_only=True)
+
+
+def _aggregation_node(camera_group: SyntheticCameraGroup,
+                      calibration_toml_path: str,
+                      request_cell: LatestValueCell,
+                      camera_node_wakeups: list[NodeWakeup],
+                      wakeup: NodeWakeup,
+                      output_queue: multiprocessing.Queue,
+                      output_stats: TopicStats,
+                      latency_histograms: PipelineLatencyHistograms,
+                      frame_counters: FrameCounters,
+                      max_frames_in_flight: int,
+                      shutdown_flag: multiprocessing.Value):
+    camera_ids = [str(camera_index) for camera_index in range(camera_group.number_of_cameras)]
+    frame_scheduler = FrameScheduler(read_type=ReadTypes.LATEST, frame_counters=frame_counters)
+    frame_buffer = FrameReorderBuffer(camera_ids=camera_ids, max_frames_in_flight=max_frames_in_flight)
+    calibration = CalibrationSnapshot.from_toml(calibration_toml_path)
+    reader = BroadcastArenaReader()
+    observation_rings: dict[str, ObservationRingBuffer] = {}
+    pipeline_latency_row = latency_histograms.row_for(camera_id=None)
+    try:
+        while not shutdown_flag.value:
+            new_frames_requested = False
+            while frame_buffer.has_capacity:
+                frame_number = frame_scheduler.next_frame_to_request(
+                    latest_available_frame=int(camera_group.latest_frame_number[0]))
+                if frame_number is None:
+                    break
+                frame_buffer.add_request(frame_number=frame_number)
+                new_frames_requested = True
+            if new_frames_requested:
+                request_cell.write(REQUESTED_FRAMES_CODEC.pack({
+                    pending_frame.frame_number: int(pending_frame.requested_at * 1e9)
+                    for pending_frame in frame_buffer.pending_frames.values()}))
+                for camera_node_wakeup in camera_node_wakeups:
+                    camera_node_wakeup.notify()
+
+            wakeup.wait(timeout=NEW_FRAME_POLL_INTERVAL_SECONDS if frame_buffer.has_capacity
+                        else NODE_WAKEUP_TIMEOUT_SECONDS)
+
+            # Drain like a `BroadcastSubscription` - outputs are counted before they're queued, so wait out any that
+            # are still in the queue's feeder thread
+            while output_stats.unconsumed(subscriber_index=0) > 0:
+                try:
+                    item = output_queue.get(timeout=IN_FLIGHT_MESSAGE_TIMEOUT_SECONDS)
+                except queue.Empty:
+                    break
+                output_stats.record_consume(subscriber_index=0)
+                data = reader.read(handle=item, subscriber_index=0) if isinstance(item, BroadcastHandle) else item
+                if data is None:
+                    continue
+                camera_index, frame_number, slot_index, observation_ring_dto, published_at_ns = pickle.loads(data)
+                camera_id = str(camera_index)
+                latency_histograms.record(row=latency_histograms.row_for(camera_id),
+                                          stage=PipelineTraceStage.CAMERA_OUTPUT_QUEUE,
+                                          duration_ns=time.perf_counter_ns() - published_at_ns)
+                if slot_index == LOST_FRAME_SLOT_INDEX:
+                    frame_buffer.finish_camera(frame_number=frame_number, camera_id=camera_id, lost=True)
+                    continue
+                if observation_ring_dto is not None:
+                    observation_rings[camera_id] = ObservationRingBuffer.recreate(dto=observation_ring_dto)
+                frame_buffer.add_output(frame_number=frame_number,
+                                        tracker_type=TRACKER_TYPE,
+                                        camera_id=camera_id,
+                                        output=slot_index)
+
+            ready_frames = frame_buffer.pop_ready()
+            lost_frame_count = sum(pending_frame.lost for pending_frame in ready_frames)
+            frame_counters.increment(FrameCounterTypes.AGGREGATED, len(ready_frames) - lost_frame_count)
+            frame_counters.increment(FrameCounterTypes.LOST, lost_frame_count)
+            frame_counters.set(FrameCounterTypes.DROPPED_STALE, frame_buffer.dropped_frame_count)
+            for pending_frame in ready_frames:
+                slot_indices = pending_frame.tracker_results.get(TRACKER_TYPE, {})
+                if pending_frame.lost or any(slot_index is None for slot_index in slot_indices.values()):
+                    continue
+                observations = [observation_rings[camera_id].read(slot_index=slot_index,
+                                                                  frame_number=pending_frame.frame_number)
+                                for camera_id, slot_index in slot_indices.items()]
+                if any(observation is None for observation in observations):
+                    continue
+                aggregation_start_ns = time.perf_counter_ns()
+                points2d = np.stack([observation["points"] for observation in observations])
+                triangulate_batched(points2d=calibration.undistort_points(points2d),
+                                    projection_matrices=calibration.projection_matrices,
+                                    visibility=np.stack([observation["visibility"] for observation in observations]),
+                                    minimum_cameras=MINIMUM_CAMERAS_FOR_TRIANGULATION)
+                aggregated_ns = time.perf_counter_ns()
+                latency_histograms.record(row=pipeline_latency_row,
+                                          stage=PipelineTraceStage.AGGREGATION,
+                                          duration_ns=aggregated_ns - aggregation_start_ns)
+                latency_histograms.record(row=pipeline_latency_row,
+                                          stage=PipelineTraceStage.END_TO_END,
+                                          duration_ns=aggregated_ns - int(pending_frame.requested_at * 1e9))
+    finally:
+        for observation_ring in observation_rings.values():
+            observation_ring.close()
+        reader.close()
+
+
+def _cpu_seconds(process: psutil.Process) -> float:
+    cpu_times = process.cpu_times()
+    return cpu_times.user + cpu_times.system
+
+
+def run_pipeline_benchmark(worker_strategy: str,
+                           number_of_cameras: int,
+                           source_frames: np.ndarray,
+                           fps: float,
+                           seconds: float,
+                           warmup_seconds: float,
+                           batch_camera_nodes: bool,
+                           max_frames_in_flight: int,
+                           number_of_points: int,
+                           inference_seconds: float,
+                           ring_length: int) -> dict:
+    height, width = source_frames.shape[1:3]
+    camera_group = SyntheticCameraGroup.create(number_of_cameras=number_of_cameras,
+                                               ring_length=ring_length,
+                                               frame_shape=source_frames.shape[1:])
+    calibration = create_camera_calibration(number_of_cameras=number_of_cameras, width=width, height=height)
+    calibration_snapshot_directory = tempfile.TemporaryDirectory()
+    calibration_toml_path = str(Path(calibration_snapshot_directory.name) / "benchmark_calibration.toml")
+    Path(calibration_toml_path).write_text(toml.dumps(calibration))
+    calibration_snapshot = CalibrationSnapshot.from_toml(calibration_toml_path)
+    pixel_projection_matrices = calibration_snapshot.camera_matrices @ calibration_snapshot.projection_matrices
+    skeleton = np.random.default_rng(seed=1).uniform(-0.5, 0.5, size=(number_of_points, 3))
+
+    request_cell = LatestValueCell.create()
+    latency_histograms = PipelineLatencyHistograms.create(
+        camera_ids=[str(camera_index) for camera_index in range(number_of_cameras)])
+    frame_counters = FrameCounters()
+    output_queue = multiprocessing.Queue()
+    output_stats = TopicStats.create()
+    output_stats.add_subscriber()
+    shutdown_flag = multiprocessing.Value('b', False)
+    aggregation_wakeup = NodeWakeup()
+    camera_node_camera_indices = ([list(range(number_of_cameras))] if batch_camera_nodes
+                                  else [[camera_index] for camera_index in range(number_of_cameras)])
+    camera_node_wakeups = [NodeWakeup() for _ in camera_node_camera_indices]
+
+    worker_type = WORKER_STRATEGIES[worker_strategy]
+    camera_group_process = multiprocessing.Process(target=_camera_group_worker,
+                                                   args=(camera_group, source_frames, fps, shutdown_flag),
+                                                   daemon=True)
+    workers = [worker_type(target=_camera_node,
+                           kwargs=dict(camera_indices=camera_indices,
+                                       camera_group=camera_group,
+                                       request_cell=request_cell,
+                                       wakeup=camera_node_wakeup,
+                                       output_queue=output_queue,
+                                       output_stats=output_stats,
+                                       aggregation_wakeup=aggregation_wakeup,
+                                       latency_histograms=latency_histograms,
+                                       pixel_projection_matrices=pixel_projection_matrices,
+                                       skeleton=skeleton,
+                                       inference_seconds=inference_seconds,
+                                       shutdown_flag=shutdown_flag),
+                           name=f"camera node {'-'.join(str(camera_index) for camera_index in camera_indices)}",
+                           daemon=True)
+               for camera_indices, camera_node_wakeup in zip(camera_node_camera_indices, camera_node_wakeups)]
+    workers.append(worker_type(target=_aggregation_node,
+                               kwargs=dict(camera_group=camera_group,
+                                           calibration_toml_path=calibration_toml_path,
+                                           request_cell=request_cell,
+                                           camera_node_wakeups=camera_node_wakeups,
+                                           wakeup=aggregation_wakeup,
+                                           output_queue=output_queue,
+                                           output_stats=output_stats,
+                                           latency_histograms=latency_histograms,
+                                           frame_counters=frame_counters,
+                                           max_frames_in_flight=max_frames_in_flight,
+                                           shutdown_flag=shutdown_flag),
+                               name="aggregation node",
+                               daemon=True))
+    camera_group_process.start()
+    for worker in workers:
+        worker.start()
+
+    measured_processes = {"camera group": psutil.Process(camera_group_process.pid)}
+    if worker_strategy == "process":
+        measured_processes.update({worker.name: psutil.Process(worker.pid) for worker in workers})
+    else:
+        measured_processes["pipeline threads"] = psutil.Process()
+
+    time.sleep(warmup_seconds)
+    latency_histograms.reset()
+    counters_start = frame_counters.to_dict()
+    camera_frames_start = int(camera_group.latest_frame_number[0])
+    cpu_seconds_start = {name: _cpu_seconds(process) for name, process in measured_processes.items()}
+    measure_start = time.perf_counter()
+    time.sleep(seconds)
+    measured_seconds = time.perf_counter() - measure_start
+    cpu_seconds_end = {name: _cpu_seconds(process) for name, process in measured_processes.items()}
+    counters_end = frame_counters.to_dict()
+    camera_frames_end = int(camera_group.latest_frame_number[0])
+    rss_mb = {name: process.memory_info().rss / 1e6 for name, process in measured_processes.items()}
+    latency_summary = latency_histograms.summarize()
+
+    shutdown_flag.value = True
+    for wakeup in [aggregation_wakeup, *camera_node_wakeups]:
+        wakeup.notify()
+    for worker in [*workers, camera_group_process]:
+        worker.join()
+    request_cell.close()
+    latency_histograms.close()
+    camera_group.close()
+    calibration_snapshot_directory.cleanup()
+
+    frame_counts = {name: counters_end[name] - counters_start[name] for name in counters_end}
+    return {"camera_fps": (camera_frames_end - camera_frames_start) / measured_seconds,
+            "pipeline_fps": frame_counts["aggregated"] / measured_seconds,
+            "frame_counts": frame_counts,
+            "latency_summary": latency_summary,
+            "cpu_percent": {name: (cpu_seconds_end[name] - cpu_seconds_start[name]) / measured_seconds * 100
+                            for name in measured_processes},
+            "rss_mb": rss_mb}
+
+
+def _worst_camera_latencies(stage_summary: dict[str, dict[str, float]]) -> tuple[float, float, float]:
+    return tuple(max(row_summary[quantile] for row_summary in stage_summary.values())
+                 for quantile in ("p50_ms", "p95_ms", "p99_ms"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--camera-counts", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--strategies", nargs="+", choices=list(WORKER_STRATEGIES), default=list(WORKER_STRATEGIES))
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--video", type=str, default=None, help="loop frames from this video instead of generating them")
+    parser.add_argument("--source-frames", type=int, default=8, help="how many distinct frames to loop")
+    parser.add_argument("--seconds", type=float, default=5.0, help="measured seconds per run")
+    parser.add_argument("--warmup-seconds", type=float, default=2.0)
+    parser.add_argument("--batch-camera-nodes", action="store_true", help="one camera node for every camera")
+    parser.add_argument("--max-frames-in-flight", type=int, default=DEFAULT_MAX_FRAMES_IN_FLIGHT)
+    parser.add_argument("--points", type=int, default=33, help="tracked points per camera")
+    parser.add_argument("--inference-ms", type=float, default=0.0, help="simulated tracker inference time per image")
+    parser.add_argument("--ring-length", type=int, default=30, help="frames in each camera's frame ring")
+    args = parser.parse_args()
+
+    # Start the resource tracker before forking the workers, so they share ours instead of each starting one that
+    # unlinks the shared memory they attached to when they exit
+    multiprocessing.resource_tracker.ensure_running()
+    source_frames = (load_source_frames(video_path=args.video, number_of_frames=args.source_frames,
+                                        width=args.width, height=args.height)
+                     if args.video is not None
+                     else generate_source_frames(number_of_frames=args.source_frames, width=args.width,
+                                                 height=args.height))
+    print(f"{args.width}x{args.height} @ {args.fps:g} fps, {args.points} points, "
+          f"{args.inference_ms:g} ms simulated inference, "
+          f"{'batched' if args.batch_camera_nodes else 'one node per camera'}, "
+          f"{args.max_frames_in_flight} frame(s) in flight")
+    print(f"{'strategy':<9} {'cameras':>7} {'camera fps':>10} {'pipeline fps':>12} {'skipped':>7} {'lost':>5} "
+          f"{'stale':>5} {'e2e p50':>8} {'e2e p95':>8} {'e2e p99':>8} {'CPU %':>7} {'RSS MB':>8}")
+    results = []
+    for worker_strategy in args.strategies:
+        for number_of_cameras in args.camera_counts:
+            result = run_pipeline_benchmark(worker_strategy=worker_strategy,
+                                            number_of_cameras=number_of_cameras,
+                                            source_frames=source_frames,
+                                            fps=args.fps,
+                                            seconds=args.seconds,
+                                            warmup_seconds=args.warmup_seconds,
+                                            batch_camera_nodes=args.batch_camera_nodes,
+                                            max_frames_in_flight=args.max_frames_in_flight,
+                                            number_of_points=args.points,
+                                            inference_seconds=args.inference_ms / 1e3,
+                                            ring_length=args.ring_length)
+            results.append((worker_strategy, number_of_cameras, result))
+            end_to_end = result["latency_summary"].get("end_to_end", {})
+            p50, p95, p99 = _worst_camera_latencies(end_to_end) if end_to_end else (np.nan,) * 3
+            frame_counts = result["frame_counts"]
+            print(f"{worker_strategy:<9} {number_of_cameras:>7} {result['camera_fps']:>10.1f} "
+                  f"{result['pipeline_fps']:>12.1f} {frame_counts['skipped']:>7} {frame_counts['lost']:>5} "
+                  f"{frame_counts['dropped_stale']:>5} {p50:>8.2f} {p95:>8.2f} {p99:>8.2f} "
+                  f"{sum(result['cpu_percent'].values()):>7.1f} {sum(result['rss_mb'].values()):>8.1f}")
+
+    print("\nper-stage latency, ms (slowest camera for per-camera stages)")
+    print(f"{'strategy':<9} {'cameras':>7} {'stage':<20} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for worker_strategy, number_of_cameras, result in results:
+        for stage_name, stage_summary in result["latency_summary"].items():
+            p50, p95, p99 = _worst_camera_latencies(stage_summary)
+            print(f"{worker_strategy:<9} {number_of_cameras:>7} {stage_name:<20} {p50:>8.3f} {p95:>8.3f} {p99:>8.3f}")
+
+    print("\nper-process CPU and RSS")
+    print(f"{'strategy':<9} {'cameras':>7} {'process':<22} {'CPU %':>7} {'RSS MB':>8}")
+    for worker_strategy, number_of_cameras, result in results:
+        for process_name, cpu_percent in result["cpu_percent"].items():
+            print(f"{worker_strategy:<9} {number_of_cameras:>7} {process_name:<22} {cpu_percent:>7.1f} "
+                  f"{result['rss_mb'][process_name]:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Offline triangulation throughput - the batched kernel (`triangulate_with_reprojection_errors`) vs the per-point DLT loop
+the anipose `triangulate` methods used to run.
+
+A synthetic MediaPipe holistic recording (33 body + 468 face + 2 x 21 hand points per frame) seen by a ring of cameras:
+whole body parts drop out of a camera's view for stretches of frames (hands most often, the face whenever the camera is
+behind the subject), and single points drop out at random, so the kernel sees the mix of visibility patterns a real
+recording gives it. Frames are triangulated in chunks, the way a recording is streamed off disk.
+
+Reports, for each solver:
+    - wall time for the whole recording (the per-point loop is timed on `--legacy-points` points and extrapolated)
+    - points per second
+    - 99th percentile error vs ground truth (the worst points are the ones only seen by two cameras facing each other,
+      which is ill-conditioned for any solver), and the median per-camera reprojection error
+
+Runs headless (a 1 hour, 6 camera recording by default - use `--minutes 1` for a quick look):
+    python freemocap/diagnostics/benchmarks/triangulation_benchmark.py --minutes 60 --cameras 6
+"""
+import argparse
+import time
+
+import numpy as np
+
+from freemocap.core.pipelines.batched_triangulation import triangulate_with_reprojection_errors
+
+BODY_PART_POINTS: dict[str, int] = {"body": 33, "face": 468, "left_hand": 21, "right_hand": 21}
+BODY_PART_DROPOUT: dict[str, float] = {"body": 0.02, "face": 0.1, "left_hand": 0.3, "right_hand": 0.3}
+CAMERA_RING_RADIUS_M: float = 3.0
+PIXEL_NOISE_NORMALIZED: float = 1e-3  # ~1 px at a 1000 px focal length
+
+
+def create_ring_of_cameras(number_of_cameras: int) -> np.ndarray:
+    """ (cameras, 3, 4) [R|t] extrinsics, evenly spaced all the way around the subject, looking at the origin """
+    extrinsics = []
+    for angle in np.linspace(0, 2 * np.pi, number_of_cameras, endpoint=False):
+        position = CAMERA_RING_RADIUS_M * np.array([np.sin(angle), 0.0, -np.cos(angle)])
+        forward = -position / np.linalg.norm(position)
+        right = np.cross([0.0, 1.0, 0.0], forward)
+        down = np.cross(forward, right)
+        rotation = np.stack([right, down, forward])
+        extrinsics.append(np.hstack([rotation, (-rotation @ position)[:, np.newaxis]]))
+    return np.asarray(extrinsics)
+
+
+def create_chunk(camera_extrinsics: np.ndarray,
+                 number_of_frames: int,
+                 random_state: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (cameras, frames * points, 2) noisy undistorted observations (NaN where missed), and the (frames * points, 3) truth
+    """
+    number_of_cameras = len(camera_extrinsics)
+    number_of_points = sum(BODY_PART_POINTS.values())
+    points3d = random_state.uniform(-0.5, 0.5, size=(number_of_frames, number_of_points, 3)) * [0.5, 1.0, 0.3]
+    points_in_cameras = (np.einsum("cij,fnj->cfni", camera_extrinsics[:, :, :3], points3d) +
+                         camera_extrinsics[:, np.newaxis, np.newaxis, :, 3])
+    points2d = points_in_cameras[..., :2] / points_in_cameras[..., 2:3]
+    points2d += random_state.normal(scale=PIXEL_NOISE_NORMALIZED, size=points2d.shape)
+
+    visible = random_state.random((number_of_cameras, number_of_frames, number_of_points)) > 0.05
+    start = 0
+    for body_part, body_part_points in BODY_PART_POINTS.items():
+        part_visible = random_state.random((number_of_cameras, number_of_frames, 1)) > BODY_PART_DROPOUT[body_part]
+        if body_part == "face":
+            # cameras behind the subject (facing -z) never see the face
+            part_visible &= (camera_extrinsics[:, 2, 2] > -0.5)[:, np.newaxis, np.newaxis]
+        visible[..., start:start + body_part_points] &= part_visible
+        start += body_part_points
+    points2d[~visible] = np.nan
+    return points2d.reshape(number_of_cameras, -1, 2), points3d.reshape(-1, 3)
+
+
+def legacy_triangulate(points2d: np.ndarray, projection_matrices: np.ndarray) -> np.ndarray:
+    """ The per-point loop from the anipose `triangulate` methods (one SVD per point, over the cameras that saw it) """
+    points3d = np.full((points2d.shape[1], 3), np.nan)
+    for point_index in range(points2d.shape[1]):
+        point_xy = points2d[:, point_index, :]
+        seen = ~np.isnan(point_xy[:, 0])
+        if np.sum(seen) < 2:
+            continue
+        dlt_system = np.zeros((np.sum(seen) * 2, 4))
+        for row, (x, y), camera_matrix in zip(range(0, 2 * np.sum(seen), 2), point_xy[seen], projection_matrices[seen]):
+            dlt_system[row] = x * camera_matrix[2] - camera_matrix[0]
+            dlt_system[row + 1] = y * camera_matrix[2] - camera_matrix[1]
+        _, _, vh = np.linalg.svd(dlt_system, full_matrices=True)
+        points3d[point_index] = vh[-1, :3] / vh[-1, 3]
+    return points3d
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=60.0, help="recording length")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--cameras", type=int, default=6)
+    parser.add_argument("--chunk-frames", type=int, default=300, help="frames triangulated per kernel call")
+    parser.add_argument("--legacy-points", type=int, default=20_000,
+                        help="time the per-point loop on this many points and extrapolate")
+    args = parser.parse_args()
+    random_state = np.random.default_rng(seed=0)
+    camera_extrinsics = create_ring_of_cameras(args.cameras)
+    number_of_frames = int(args.minutes * 60 * args.fps)
+    number_of_points = number_of_frames * sum(BODY_PART_POINTS.values())
+
+    print(f"{args.minutes:g} minutes at {args.fps:g} fps, {args.cameras} cameras: "
+          f"{number_of_frames} frames, {number_of_points:,} points")
+    print(f"{'solver':>14} {'seconds':>9} {'points/s':>12} {'p99 err mm':>10} {'median reproj px':>16}")
+    for use_svd in (False, True):
+        elapsed_seconds = 0.0
+        errors_m = []
+        median_reprojection_errors = []
+        for chunk_start in range(0, number_of_frames, args.chunk_frames):
+            points2d, points3d_truth = create_chunk(camera_extrinsics=camera_extrinsics,
+                                                    number_of_frames=min(args.chunk_frames,
+                                                                         number_of_frames - chunk_start),
+                                                    random_state=random_state)
+            tic = time.perf_counter()
+            points3d, reprojection_errors = triangulate_with_reprojection_errors(points2d=points2d,
+                                                                                 projection_matrices=camera_extrinsics,
+                                                                                 use_svd=use_svd)
+            elapsed_seconds += time.perf_counter() - tic
+            errors_m.append(np.linalg.norm(points3d - points3d_truth, axis=1))
+            median_reprojection_errors.append(np.nanmedian(reprojection_errors))
+        print(f"{'kernel svd' if use_svd else 'kernel normal':>14} {elapsed_seconds:>9.2f} "
+              f"{number_of_points / elapsed_seconds:>12,.0f} "
+              f"{np.nanpercentile(np.concatenate(errors_m), 99) * 1000:>10.2f} "
+              f"{np.median(median_reprojection_errors) / PIXEL_NOISE_NORMALIZED:>16.2f}")
+
+    points2d, points3d_truth = create_chunk(camera_extrinsics=camera_extrinsics,
+                                            number_of_frames=-(-args.legacy_points // sum(BODY_PART_POINTS.values())),
+                                            random_state=random_state)
+    points2d, points3d_truth = points2d[:, :args.legacy_points], points3d_truth[:args.legacy_points]
+    tic = time.perf_counter()
+    points3d = legacy_triangulate(points2d=points2d, projection_matrices=camera_extrinsics)
+    points_per_second = len(points3d) / (time.perf_counter() - tic)
+    p99_error_m = np.nanpercentile(np.linalg.norm(points3d - points3d_truth, axis=1), 99)
+    print(f"{'per-point loop':>14} {number_of_points / points_per_second:>9.2f} {points_per_second:>12,.0f} "
+          f"{p99_error_m * 1000:>10.2f} {'-':>16}  (extrapolated)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 import logging
 import multiprocessing
+import threading
+import time
 from dataclasses import dataclass, field
 
 from skellycam.core.camera_group.camera_group import CameraGroup
@@ -7,7 +9,10 @@ from skellycam.core.types.type_overloads import CameraGroupIdString
 from skellycam.skellycam_app.skellycam_app import SkellycamApplication, create_skellycam_app
 
 from freemocap.core.types.type_overloads import PipelineIdString
+from freemocap.core.pipelines.frame_scheduler import ReadTypes
+from freemocap.core.pipelines.pipeline_latency_histograms import PipelineTraceStage
 from freemocap.core.pipelines.processing_pipeline import ProcessingPipeline
+from freemocap.core.pubsub.pubsub_stats import PUBSUB_STATS_LOG_INTERVAL_SECONDS, format_pubsub_stats_summary
 
 logger = logging.getLogger(__name__)
 
@@ -17,13 +22,61 @@ logger = logging.getLogger(__name__)
 class PipelineManager:
     global_kill_flag: multiprocessing.Value
     pipelines: dict[PipelineIdString, ProcessingPipeline] = field(default_factory=dict)
-
-    def create_pipeline(self, camera_group:CameraGroup ) -> ProcessingPipeline:
-        pipeline =  ProcessingPipeline.from_camera_group(camera_group=camera_group)
+    pubsub_stats_log_interval_seconds: float | None = PUBSUB_STATS_LOG_INTERVAL_SECONDS
+    pubsub_stats_log_thread: threading.Thread | None = None
+
+    def create_pipeline(self,
+                        camera_group:CameraGroup,
+                        read_type: ReadTypes = ReadTypes.LATEST,
+                        batch_camera_nodes: bool = False) -> ProcessingPipeline:
+        pipeline =  ProcessingPipeline.from_camera_group(camera_group=camera_group,
+                                                         read_type=read_type,
+                                                         batch_camera_nodes=batch_camera_nodes)
         self.pipelines[pipeline.id] = pipeline
-        logger.info(f"Created pipeline with ID: {pipeline.id} for camera group ID: {camera_group.id}")
+        logger.info(f"Created pipeline with ID: {pipeline.id} for camera group ID: {camera_group.id} "
+                    f"(read type: {read_type.value}, batched camera nodes: {batch_camera_nodes})")
+        if self.pubsub_stats_log_interval_seconds and self.pubsub_stats_log_thread is None:
+            self.pubsub_stats_log_thread = threading.Thread(target=self._log_pubsub_stats_loop,
+                                                            name="PubSubStatsLogger",
+                                                            daemon=True)
+            self.pubsub_stats_log_thread.start()
         return pipeline
 
+    def get_pubsub_stats(self) -> dict[PipelineIdString, dict[str, dict]]:
+        return {pipeline_id: pipeline.ipc.pubsub.get_stats()
+                for pipeline_id, pipeline in self.pipelines.items()}
+
+    def _log_pubsub_stats_loop(self):
+        next_log_time = time.perf_counter() + self.pubsub_stats_log_interval_seconds
+        while not self.global_kill_flag.value:
+            time.sleep(0.5)
+            if time.perf_counter() < next_log_time:
+                continue
+            next_log_time += self.pubsub_stats_log_interval_seconds
+            for pipeline_id, stats_by_topic in self.get_pubsub_stats().items():
+                logger.info(f"Pipeline {pipeline_id} pubsub stats:\n{format_pubsub_stats_summary(stats_by_topic)}")
+
+    def get_pipeline_status(self) -> dict[PipelineIdString, dict]:
+        return {pipeline_id: {**pipeline.ipc.control_block.summarize(),
+                              "workers_alive": pipeline.alive}
+                for pipeline_id, pipeline in self.pipelines.items()}
+
+    def get_latency_metrics(self) -> dict[PipelineIdString, dict]:
+        return {pipeline_id: pipeline.ipc.latency_histograms.summarize()
+                for pipeline_id, pipeline in self.pipelines.items()}
+
+    def get_frame_counters(self) -> dict[PipelineIdString, dict[str, int]]:
+        return {pipeline_id: pipeline.aggregation_node.frame_counters.to_dict()
+                for pipeline_id, pipeline in self.pipelines.items()}
+
+    def record_websocket_send(self, camera_group_id: CameraGroupIdString, duration_ns: int):
+        for pipeline in self.pipelines.values():
+            if pipeline.aggregation_node.camera_group_id == camera_group_id:
+                latency_histograms = pipeline.ipc.latency_histograms
+                latency_histograms.record(row=latency_histograms.row_for(camera_id=None),
+                                          stage=PipelineTraceStage.WEBSOCKET_SEND,
+                                          duration_ns=duration_ns)
+
     def close_all_pipelines(self):
         for pipeline in self.pipelines.values():
             pipeline.shutdown()
@@ -51,10 +104,15 @@ class FreemocapApplication:
     def should_continue(self) -> bool:
         return not self.global_kill_flag.value
 
-    def connect_pipeline(self, camera_group: CameraGroup) -> tuple[CameraGroupIdString, PipelineIdString]:
+    def connect_pipeline(self,
+                         camera_group: CameraGroup,
+                         read_type: ReadTypes = ReadTypes.LATEST,
+                         batch_camera_nodes: bool = False) -> tuple[CameraGroupIdString, PipelineIdString]:
         if len(self.skellycam_app.camera_group_manager.camera_groups) == 0:
             raise ValueError("No camera groups available to create a processing pipeline! Start a camera group first.")
-        pipeline = self.pipeline_manager.create_pipeline(camera_group=camera_group)
+        pipeline = self.pipeline_manager.create_pipeline(camera_group=camera_group,
+                                                         read_type=read_type,
+                                                         batch_camera_nodes=batch_camera_nodes)
         return camera_group.id, pipeline.id
 
     def disconnect_pipeline(self):
@@ -1,7 +1,6 @@
 # Most of this was copied (with permission) from the original `aniposelib` package (https://github.com/lambdaloop/aniposelib), and we're adapting it to our needs here. M
 # ore info on Anipoise: https://anipose.readthedocs.io/en/latest/
 
-import itertools
 import logging
 import multiprocessing
 from pathlib import Path
@@ -23,15 +22,19 @@ from scipy import signal
 from scipy.cluster.hierarchy import linkage, fcluster
 from scipy.cluster.vq import whiten
 from scipy.linalg import inv as inverse
-from scipy.sparse import dok_matrix
 from skellytracker.process_folder_of_videos import process_list_of_videos
 from skellytracker.trackers.charuco_tracker.charuco_model_info import CharucoModelInfo, CharucoTrackingParams
-from tqdm import trange
 from typing import List
 
 from skellytracker.trackers.charuco_tracker.charuco_model_info import CharucoModelInfo, CharucoTrackingParams
 from skellytracker.process_folder_of_videos import process_list_of_videos
 
+from freemocap.core.pipelines.batched_triangulation import triangulate_batched
+from freemocap.core.pipelines.chunked_triangulation import TriangulationCameras
+from freemocap.core.pipelines.ransac_triangulation import triangulate_possible as ransac_triangulate_possible
+from freemocap.core.pipelines.calibration_pipeline.calculate_sparse_jacobian import build_sparsity_pattern, \
+    calculate_jacobian_sparsity, calculate_triangulation_jacobian_sparsity
+
 numba_logger = logging.getLogger("numba")
 numba_logger.setLevel(logging.WARNING)
 
@@ -404,11 +407,8 @@ class Camera:
             size=None,
             rvec=np.zeros(3),
             tvec=np.zeros(3),
-<<<<<<< HEAD:freemocap/old/core_processes/capture_volume_calibration/anipose_camera_calibration/freemocap_anipose.py
-=======
             world_orientation=np.eye(3),
             world_position=np.zeros(3),
->>>>>>> f3362cc9874f38211c409a713329bc71bf11115d:freemocap/core_processes/capture_volume_calibration/anipose_camera_calibration/freemocap_anipose.py
             name=None,
             extra_dist=False,
     ):
@@ -755,26 +755,13 @@ class CameraGroup:
                 new_points[cnum] = cam.undistort_points(sub)
             points = new_points
 
-        n_cams, n_points, _ = points.shape
-
-        out = np.empty((n_points, 3))
-        out[:] = np.nan
-
-        cam_mats = np.array([cam.get_extrinsics_mat() for cam in self.cameras])
-
-        if progress:
-            iterator = trange(n_points, ncols=70)
-        else:
-            iterator = range(n_points)
+        if kill_event is not None and kill_event.is_set():
+            return None
 
-        for ip in iterator:
-            subp = points[:, ip, :]
-            good = ~np.isnan(subp[:, 0])
-            if np.sum(good) >= 2:
-                out[ip] = triangulate_simple(subp[good], cam_mats[good])
-
-            if kill_event is not None and kill_event.is_set():
-                return None
+        # ([R|t; 0 0 0 1] - the DLT only uses the projection rows)
+        cam_mats = np.array([cam.get_extrinsics_mat() for cam in self.cameras])[:, :3]
+        # (every point at once - `progress` is a no-op now there's no per-point loop to report on)
+        out = triangulate_batched(points2d=points, projection_matrices=cam_mats)
 
         if one_point:
             out = out[0]
@@ -805,74 +792,17 @@ class CameraGroup:
             len(self.cameras), points.shape
         )
 
-        n_cams, n_points, n_possible, _ = points.shape
-
-        cam_nums, point_nums, possible_nums = np.where(~np.isnan(points[:, :, :, 0]))
-
-        all_iters = defaultdict(dict)
-
-        for cam_num, point_num, possible_num in zip(cam_nums, point_nums, possible_nums):
-            if cam_num not in all_iters[point_num]:
-                all_iters[point_num][cam_num] = []
-            all_iters[point_num][cam_num].append((cam_num, possible_num))
-
-        for point_num in all_iters.keys():
-            for cam_num in all_iters[point_num].keys():
-                all_iters[point_num][cam_num].append(None)
-
-        out = np.full((n_points, 3), np.nan, dtype="float64")
-        picked_vals = np.zeros((n_cams, n_points, n_possible), dtype="bool")
-        errors = np.zeros(n_points, dtype="float64")
-        points_2d = np.full((n_cams, n_points, 2), np.nan, dtype="float64")
-
-        if progress:
-            iterator = trange(n_points, ncols=70)
-        else:
-            iterator = range(n_points)
-
-        for point_ix in iterator:
-            best_point = None
-            best_error = 200
-
-            n_cams_max = len(all_iters[point_ix])
-
-            for picked in itertools.product(*all_iters[point_ix].values()):
-                picked = [p for p in picked if p is not None]
-                if len(picked) < min_cams and len(picked) != n_cams_max:
-                    continue
-
-                if kill_event is not None and kill_event.is_set():
-                    return None
-
-                cnums = [p[0] for p in picked]
-                xnums = [p[1] for p in picked]
-
-                pts = points[cnums, point_ix, xnums]
-                cc = self.subset_cameras(cnums)
-
-                p3d = cc.triangulate(pts, undistort=undistort)
-                err = cc.reprojection_error(p3d, pts, mean=True)
-
-                if err < best_error:
-                    best_point = {
-                        "error": err,
-                        "point": p3d[:3],
-                        "points": pts,
-                        "picked": picked,
-                        "joint_ix": point_ix,
-                    }
-                    best_error = err
-                    if best_error < threshold:
-                        break
-
-            if best_point is not None:
-                out[point_ix] = best_point["point"]
-                picked = best_point["picked"]
-                cnums = [p[0] for p in picked]
-                xnums = [p[1] for p in picked]
-                picked_vals[cnums, point_ix, xnums] = True
-                errors[point_ix] = best_point["error"]
-                points_2d[cnums, point_ix] = best_point["points"]
+        # Every camera combination for every point, batched by which cameras each point has (`progress` is a no-op
+        # now there's no per-point loop to report on)
+        triangulated = ransac_triangulate_possible(points2d=points,
+                                                   cameras=TriangulationCameras.from_anipose_camera_group(self),
+                                                   undistort=undistort,
+                                                   minimum_cameras=min_cams,
+                                                   threshold=threshold,
+                                                   kill_event=kill_event)
+        if triangulated is None:
+            return None
+        out, picked_vals, errors, points_2d = triangulated
 
         # return out, picked_vals, points_2d, errors #original code from OG anipose
         return out  # simplify output so that `triangulate_ransac` can be used exactly the same way as `triangulate`
@@ -1157,81 +1087,12 @@ class CameraGroup:
         """Given an CxNx2 array of 2D points,
         where N is the number of points and C is the number of cameras,
         compute the sparsity structure of the jacobian for bundle adjustment"""
-
-        point_indices = np.zeros(p2ds.shape, dtype="int32")
-        cam_indices = np.zeros(p2ds.shape, dtype="int32")
-
-        for i in range(p2ds.shape[1]):
-            point_indices[:, i] = i
-
-        for j in range(p2ds.shape[0]):
-            cam_indices[j] = j
-
-        good = ~np.isnan(p2ds)
-
-        if extra is not None:
-            ids = extra["ids_map"]
-            n_boards = int(np.max(ids)) + 1
-            total_board_params = n_boards * (3 + 3)  # rvecs + tvecs
-        else:
-            n_boards = 0
-            total_board_params = 0
-
-        n_cams = p2ds.shape[0]
-        n_points = p2ds.shape[1]
-        total_params_reproj = n_cams * n_cam_params + n_points * 3
-        n_params = total_params_reproj + total_board_params
-
-        n_good_values = np.sum(good)
-        if extra is not None:
-            n_errors = n_good_values + n_points * 3
-        else:
-            n_errors = n_good_values
-
-        A_sparse = dok_matrix((n_errors, n_params), dtype="int16")
-
-        cam_indices_good = cam_indices[good]
-        point_indices_good = point_indices[good]
-
-        # -- reprojection error --
-        ix = np.arange(n_good_values)
-
-        ## update camera params based on point error
-        for i in range(n_cam_params):
-            A_sparse[ix, cam_indices_good * n_cam_params + i] = 1
-
-        ## update point position based on point error
-        for i in range(3):
-            A_sparse[ix, n_cams * n_cam_params + point_indices_good * 3 + i] = 1
-
-        # -- match for the object points--
-        if extra is not None:
-            point_ix = np.arange(n_points)
-
-            ## update all the camera parameters
-            # A_sparse[n_good_values:n_good_values+n_points*3,
-            #          0:n_cams*n_cam_params] = 1
-
-            ## update board rotation and translation based on error from expected
-            for i in range(3):
-                for j in range(3):
-                    A_sparse[
-                        n_good_values + point_ix * 3 + i,
-                        total_params_reproj + ids * 3 + j,
-                    ] = 1
-                    A_sparse[
-                        n_good_values + point_ix * 3 + i,
-                        total_params_reproj + n_boards * 3 + ids * 3 + j,
-                    ] = 1
-
-            ## update point position based on error from expected
-            for i in range(3):
-                A_sparse[
-                    n_good_values + point_ix * 3 + i,
-                    n_cams * n_cam_params + point_ix * 3 + i,
-                ] = 1
-
-        return A_sparse
+        return calculate_jacobian_sparsity(
+            pixel_points2d=p2ds,
+            ids=extra["ids_map"] if extra is not None else None,
+            num_camera_params=n_cam_params,
+            per_coordinate_residuals=True,
+        )
 
     def _initialize_params_bundle(self, p2ds, extra):
         """Given an CxNx2 array of 2D points,
@@ -1679,85 +1540,16 @@ class CameraGroup:
         return params_full
 
     def _jac_sparsity_triangulation(self, p2ds, constraints=[], constraints_weak=[], n_deriv_smooth=1):
-        n_cams, n_frames, n_joints, _ = p2ds.shape
-        n_constraints = len(constraints)
-        n_constraints_weak = len(constraints_weak)
-
-        p2ds_flat = p2ds.reshape((n_cams, -1, 2))
-
-        point_indices = np.zeros(p2ds_flat.shape, dtype="int32")
-        for i in range(p2ds_flat.shape[1]):
-            point_indices[:, i] = i
-
-        point_indices_3d = np.arange(n_frames * n_joints).reshape((n_frames, n_joints))
-
-        good = ~np.isnan(p2ds_flat)
-        n_errors_reproj = np.sum(good)
-        n_errors_smooth = (n_frames - n_deriv_smooth) * n_joints * 3
-        n_errors_lengths = n_constraints * n_frames
-        n_errors_lengths_weak = n_constraints_weak * n_frames
-
-        n_errors = n_errors_reproj + n_errors_smooth + n_errors_lengths + n_errors_lengths_weak
-
-        n_3d = n_frames * n_joints * 3
-        n_params = n_3d + n_constraints + n_constraints_weak
-
-        point_indices_good = point_indices[good]
-
-        A_sparse = dok_matrix((n_errors, n_params), dtype="int16")
-
-        # constraints for reprojection errors
-        ix_reproj = np.arange(n_errors_reproj)
-        for k in range(3):
-            A_sparse[ix_reproj, point_indices_good * 3 + k] = 1
-
-        # sparse constraints for smoothness in time
-        frames = np.arange(n_frames - n_deriv_smooth)
-        for j in range(n_joints):
-            for n in range(n_deriv_smooth + 1):
-                pa = point_indices_3d[frames, j]
-                pb = point_indices_3d[frames + n, j]
-                for k in range(3):
-                    A_sparse[n_errors_reproj + pa * 3 + k, pb * 3 + k] = 1
-
-        ## -- strong constraints --
-        # joint lengths should change with joint lengths errors
-        start = n_errors_reproj + n_errors_smooth
-        frames = np.arange(n_frames)
-        for cix, (a, b) in enumerate(constraints):
-            A_sparse[start + cix * n_frames + frames, n_3d + cix] = 1
-
-        # points should change accordingly to match joint lengths too
-        frames = np.arange(n_frames)
-        for cix, (a, b) in enumerate(constraints):
-            pa = point_indices_3d[frames, a]
-            pb = point_indices_3d[frames, b]
-            for k in range(3):
-                A_sparse[start + cix * n_frames + frames, pa * 3 + k] = 1
-                A_sparse[start + cix * n_frames + frames, pb * 3 + k] = 1
-
-        ## -- weak constraints --
-        # joint lengths should change with joint lengths errors
-        start = n_errors_reproj + n_errors_smooth + n_errors_lengths
-        frames = np.arange(n_frames)
-        for cix, (a, b) in enumerate(constraints_weak):
-            A_sparse[start + cix * n_frames + frames, n_3d + n_constraints + cix] = 1
-
-        # points should change accordingly to match joint lengths too
-        frames = np.arange(n_frames)
-        for cix, (a, b) in enumerate(constraints_weak):
-            pa = point_indices_3d[frames, a]
-            pb = point_indices_3d[frames, b]
-            for k in range(3):
-                A_sparse[start + cix * n_frames + frames, pa * 3 + k] = 1
-                A_sparse[start + cix * n_frames + frames, pb * 3 + k] = 1
-
-        return A_sparse
+        return calculate_triangulation_jacobian_sparsity(
+            points2d=p2ds,
+            constraints=constraints,
+            constraints_weak=constraints_weak,
+            n_deriv_smooth=n_deriv_smooth,
+        )
 
     def _jac_sparsity_triangulation_possible(self, p2ds_full, **kwargs):
         # initialize sparse jacobian using above function
         # extend to include alphas from parameters
-        ## TODO: this initialization is really slow for some reason
 
         n_cams, n_frames, n_joints, n_possible, _ = p2ds_full.shape
         good_full = ~np.isnan(p2ds_full[:, :, :, :, 0])
@@ -1767,44 +1559,34 @@ class CameraGroup:
         n_errors_alphas = np.sum(any_good)
 
         p2ds = p2ds_full[:, :, :, 0]
-        A_sparse = self._jac_sparsity_triangulation(p2ds, **kwargs)
+        A_sparse = self._jac_sparsity_triangulation(p2ds, **kwargs).tocoo()
 
         n_errors, n_params = A_sparse.shape
 
-        B_sparse = dok_matrix((n_errors + n_errors_alphas, n_params + n_alphas), dtype="int16")
-        for r, c in zip(*A_sparse.nonzero()):
-            B_sparse[r, c] = A_sparse[r, c]
-
+        # each alpha belongs to one 2d point (camera, frame, joint)
         point_indices_2d = np.arange(n_cams * n_frames * n_joints).reshape(n_cams, n_frames, n_joints)
-        point_indices_2d_rep = np.repeat(point_indices_2d[:, :, :, None], 2, axis=3)
-        point_indices_2d_good = point_indices_2d_rep[~np.isnan(p2ds)]
-        point_indices_good = point_indices_2d[any_good]
-
-        alpha_indices = np.zeros((n_cams, n_frames, n_joints, n_possible), dtype="int64")
-        for pnum in range(n_possible):
-            alpha_indices[:, :, :, pnum] = point_indices_2d
-
-        alpha_indices_good = alpha_indices[good_full]
+        alpha_indices_good = np.broadcast_to(point_indices_2d[:, :, :, None], good_full.shape)[good_full]
+        alpha_columns = n_params + np.arange(n_alphas)
 
         # alphas should change according to the reprojection error for each corresponding point
-        point_indices_2d_good_find = defaultdict(list)
-        for ix, p in enumerate(point_indices_2d_good):
-            point_indices_2d_good_find[p].append(ix)
-
-        for ix, alpha_index in enumerate(alpha_indices_good):
-            B_sparse[point_indices_2d_good_find[alpha_index], n_params + ix] = 1
+        reprojection_rows = np.full(p2ds.size, -1, dtype="int64")
+        reprojection_rows[~np.isnan(p2ds).ravel()] = np.arange(np.sum(~np.isnan(p2ds)))
+        alpha_reprojection_rows = reprojection_rows.reshape(-1, 2)[alpha_indices_good]
+        has_reprojection_error = alpha_reprojection_rows >= 0
 
         # alphas should change according to the alpha errors
-        point_indices_good_find = dict()
-        for ix, p in enumerate(point_indices_good):
-            point_indices_good_find[p] = ix
-
-        for ix, alpha_index in enumerate(alpha_indices_good):
-            if alpha_index in point_indices_good_find:
-                err_ix = n_errors + point_indices_good_find[alpha_index]
-                B_sparse[err_ix, n_params + ix] = 1
-
-        return B_sparse
+        alpha_error_rows = np.full(point_indices_2d.size, -1, dtype="int64")
+        alpha_error_rows[any_good.ravel()] = n_errors + np.arange(n_errors_alphas)
+
+        return build_sparsity_pattern(
+            shape=(n_errors + n_errors_alphas, n_params + n_alphas),
+            blocks=[
+                (A_sparse.row, A_sparse.col),
+                (alpha_reprojection_rows[has_reprojection_error],
+                 np.broadcast_to(alpha_columns[:, None], alpha_reprojection_rows.shape)[has_reprojection_error]),
+                (alpha_error_rows[alpha_indices_good], alpha_columns),
+            ],
+        )
 
     def copy(self):
         cameras = [cam.copy() for cam in self.cameras]
@@ -1905,16 +1687,6 @@ class CameraGroup:
 
         return error, merged, charuco_frames
 
-<<<<<<< HEAD:freemocap/old/core_processes/capture_volume_calibration/anipose_camera_calibration/freemocap_anipose.py
-    def get_rows_videos(self, videos: List[List[str]], board: "AniposeCharucoBoard", verbose=True):
-        num_corners = board.total_size
-        if board.total_size != 24: 
-            raise ValueError("AniposeCharucoBoard only supports 24 corners, got {}".format(board.total_size))
-        self._get_charuco_2d_data(videos)
-
-        if self.charuco_2d_data is None:
-            raise ValueError("Charuco 2D data has not been initialized. Call _get_charuco_2d_data() first, or check for errors in the video processing.")
-=======
     def get_rows_videos(self, videos: List[List[str]], board: "AniposeCharucoBoard", verbose: bool = True):
         num_corners = board.total_size
         self._get_charuco_2d_data(videos=videos, board=board)
@@ -1922,7 +1694,6 @@ class CameraGroup:
         if self.charuco_2d_data is None:
             raise ValueError(
                 "Charuco 2D data has not been initialized. Call _get_charuco_2d_data() first, or check for errors in the video processing.")
->>>>>>> f3362cc9874f38211c409a713329bc71bf11115d:freemocap/core_processes/capture_volume_calibration/anipose_camera_calibration/freemocap_anipose.py
 
         all_rows = []
 
@@ -1930,21 +1701,13 @@ class CameraGroup:
         for camera_number in range(num_cameras):
             camera_rows = []
             for frame in range(num_frames):
-<<<<<<< HEAD:freemocap/old/core_processes/capture_volume_calibration/anipose_camera_calibration/freemocap_anipose.py
-                # TODO: check each frame based on anipose's conditions
-=======
->>>>>>> f3362cc9874f38211c409a713329bc71bf11115d:freemocap/core_processes/capture_volume_calibration/anipose_camera_calibration/freemocap_anipose.py
                 filled = self.charuco_2d_data[camera_number, frame, :, :]
                 filled = filled.astype(np.float32)
                 filled = np.reshape(filled, (num_corners, 1, 2))  # Add empty column anipose expects
                 mask = (~np.isnan(filled[:, :, 0])) & (~np.isnan(filled[:, :, 1]))
                 non_empty_ids = np.where(mask)[0]
                 corners = filled[non_empty_ids, :, :]
-<<<<<<< HEAD:freemocap/old/core_processes/capture_volume_calibration/anipose_camera_calibration/freemocap_anipose.py
-                non_empty_ids = non_empty_ids.reshape(-1, 1) # Add empty column anipose expects
-=======
                 non_empty_ids = non_empty_ids.reshape(-1, 1)  # Add empty column anipose expects
->>>>>>> f3362cc9874f38211c409a713329bc71bf11115d:freemocap/core_processes/capture_volume_calibration/anipose_camera_calibration/freemocap_anipose.py
                 if corners.shape[0] != 0:
                     row = {
                         "framenum": (0, frame),
@@ -1958,18 +1721,10 @@ class CameraGroup:
             print(f"Charuco detection results:")
             for i, rows in enumerate(all_rows):
                 print(f"\tCamera {i} has {len(rows)} frames with detected corners.")
-<<<<<<< HEAD:freemocap/old/core_processes/capture_volume_calibration/anipose_camera_calibration/freemocap_anipose.py
-
-
-        return all_rows
-
-    def _get_charuco_2d_data(self, videos: List[List[str]]):
-=======
 
         return all_rows
 
     def _get_charuco_2d_data(self, videos: List[List[str]], board: "AniposeCharucoBoard"):
->>>>>>> f3362cc9874f38211c409a713329bc71bf11115d:freemocap/core_processes/capture_volume_calibration/anipose_camera_calibration/freemocap_anipose.py
         """
         Processes a list of a list of videos to extract Charuco 2D data.
         
@@ -1978,25 +1733,17 @@ class CameraGroup:
         video_paths = [Path(video[0]) for video in videos]
         charuco_2d_data = process_list_of_videos(
             model_info=CharucoModelInfo(),
-<<<<<<< HEAD:freemocap/old/core_processes/capture_volume_calibration/anipose_camera_calibration/freemocap_anipose.py
-            tracking_params=CharucoTrackingParams(),
-=======
             tracking_params=CharucoTrackingParams(
                 charuco_squares_x_in=board.squaresX,
                 charuco_squares_y_in=board.squaresY,
                 charuco_dict_id=ARUCO_DICTS[(board.marker_bits, board.dict_size)]
             ),
->>>>>>> f3362cc9874f38211c409a713329bc71bf11115d:freemocap/core_processes/capture_volume_calibration/anipose_camera_calibration/freemocap_anipose.py
             video_paths=video_paths,
             num_processes=min(len(videos), multiprocessing.cpu_count() - 1),
         )
 
         self.charuco_2d_data = charuco_2d_data
 
-<<<<<<< HEAD:freemocap/old/core_processes/capture_volume_calibration/anipose_camera_calibration/freemocap_anipose.py
-
-=======
->>>>>>> f3362cc9874f38211c409a713329bc71bf11115d:freemocap/core_processes/capture_volume_calibration/anipose_camera_calibration/freemocap_anipose.py
     def set_camera_sizes_videos(self, videos):
         for cix, (cam, cam_videos) in enumerate(zip(self.cameras, videos)):
             rows_cam = []
@@ -2006,15 +1753,6 @@ class CameraGroup:
                 cam.set_size(size)
 
     def calibrate_videos(
-<<<<<<< HEAD:freemocap/old/core_processes/capture_volume_calibration/anipose_camera_calibration/freemocap_anipose.py
-        self,
-        videos: List[List[str]],
-        board: "AniposeCharucoBoard",
-        init_intrinsics=True,
-        init_extrinsics=True,
-        verbose=True,
-        **kwargs,
-=======
             self,
             videos,
             board: "AniposeCharucoBoard",
@@ -2022,7 +1760,6 @@ class CameraGroup:
             init_extrinsics=True,
             verbose=True,
             **kwargs,
->>>>>>> f3362cc9874f38211c409a713329bc71bf11115d:freemocap/core_processes/capture_volume_calibration/anipose_camera_calibration/freemocap_anipose.py
     ):
         """Takes as input a list of list of video filenames, one list of each camera.
         Also takes a board which specifies what should be detected in the videos"""
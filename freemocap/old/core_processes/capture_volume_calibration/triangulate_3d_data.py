@@ -4,6 +4,7 @@ from pathlib import Path
 
 import numpy as np
 
+from freemocap.core.pipelines.chunked_triangulation import triangulate_recording, TriangulationCameras
 from freemocap.old.core_processes.capture_volume_calibration.anipose_camera_calibration.run_anipose_calibration_algorithm import \
     AniposeCameraGroup
 from freemocap.old.core_processes.capture_volume_calibration.save_3d_data_to_npy import (
@@ -14,18 +15,12 @@ logger = logging.getLogger(__name__)
 
 
 def triangulate_3d_data(
-<<<<<<< HEAD:freemocap/old/core_processes/capture_volume_calibration/triangulate_3d_data.py
     anipose_calibration_object: AniposeCameraGroup,
     image_2d_data: np.ndarray,
     use_triangulate_ransac: bool = False,
     kill_event: multiprocessing.Event = None,
-=======
-        anipose_calibration_object: CameraGroup,
-        image_2d_data: np.ndarray,
-        use_triangulate_ransac: bool = False,
-        kill_event: multiprocessing.Event = None,
->>>>>>> f3362cc9874f38211c409a713329bc71bf11115d:freemocap/core_processes/capture_volume_calibration/triangulate_3d_data.py
-) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    number_of_workers: int | None = None,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray] | None:
     number_of_cameras = image_2d_data.shape[0]
     number_of_frames = image_2d_data.shape[1]
     number_of_tracked_points = image_2d_data.shape[2]
@@ -49,12 +44,19 @@ def triangulate_3d_data(
         f"number_of_spatial_dimensions: {number_of_spatial_dimensions}"
     )
 
-    if use_triangulate_ransac:
-        logger.info("Using `triangulate_ransac` method")
-        data3d_flat = anipose_calibration_object.triangulate_ransac(data2d_flat, progress=True, kill_event=kill_event)
-    else:
-        logger.info("Using simple `triangulate` method ")
-        data3d_flat = anipose_calibration_object.triangulate(data2d_flat, progress=True, kill_event=kill_event)
+    if not use_triangulate_ransac:
+        logger.info("Using chunked `triangulate_recording` method")
+        # points, mean reprojection error and per-camera reprojection error in one pass over the recording, split
+        # across a process pool (None if `kill_event` was set part way through)
+        return triangulate_recording(
+            image_2d_data=image_2d_data,
+            cameras=TriangulationCameras.from_anipose_camera_group(anipose_calibration_object),
+            number_of_workers=number_of_workers,
+            kill_event=kill_event,
+        )
+
+    logger.info("Using `triangulate_ransac` method")
+    data3d_flat = anipose_calibration_object.triangulate_ransac(data2d_flat, progress=True, kill_event=kill_event)
 
     spatial_data3d_numFrames_numTrackedPoints_XYZ = data3d_flat.reshape(number_of_frames, number_of_tracked_points, 3)
 
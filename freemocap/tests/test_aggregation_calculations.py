@@ -0,0 +1,77 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import toml
+
+from freemocap.core.pipelines.observation_ring_buffer import create_observation_dtype
+from freemocap.core.pipelines.point_triangulator import PointTriangulator
+from freemocap.core.pipelines.processing_pipeline import handle_aggregration_calculations
+
+CAMERA_TRANSLATIONS = [[0.0, 0.0, 0.0], [-1.0, 0.0, 0.0], [0.0, -1.0, 0.0]]
+POINT3D = np.array([0.2, -0.1, 4.0])
+
+
+def _write_calibration(path: Path, number_of_cameras: int, mtime_ns: int):
+    calibration = {f"cam_{camera_index}": {"name": f"cam_{camera_index}",
+                                           "size": [1280, 720],
+                                           "matrix": [[1000.0, 0.0, 640.0], [0.0, 1000.0, 360.0], [0.0, 0.0, 1.0]],
+                                           "distortions": [0.0, 0.0, 0.0, 0.0, 0.0],
+                                           "rotation": [0.0, 0.0, 0.0],
+                                           "translation": CAMERA_TRANSLATIONS[camera_index]}
+                   for camera_index in range(number_of_cameras)}
+    path.write_text(toml.dumps(calibration))
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def _observations(number_of_cameras: int) -> dict[str, np.void]:
+    observations = np.zeros(number_of_cameras, dtype=create_observation_dtype(number_of_points=1, point_dimensions=2))
+    for camera_index, translation in enumerate(CAMERA_TRANSLATIONS[:number_of_cameras]):
+        point_in_camera = POINT3D + translation
+        observations[camera_index]["frame_number"] = 7
+        observations[camera_index]["points"] = 1000.0 * point_in_camera[:2] / point_in_camera[2] + [640.0, 360.0]
+        observations[camera_index]["visibility"] = True
+    return {str(camera_index): observations[camera_index] for camera_index in range(number_of_cameras)}
+
+
+def _aggregate(point_triangulator: PointTriangulator, number_of_cameras: int):
+    return handle_aggregration_calculations(camera_group_id="group",
+                                            tracker_type="fake",
+                                            observations=_observations(number_of_cameras),
+                                            point_names=["nose"],
+                                            point_triangulator=point_triangulator)
+
+
+def test_aggregation_triangulates_once_a_matching_calibration_appears(tmp_path: Path):
+    calibration_path = tmp_path / "calibration.toml"
+    point_triangulator = PointTriangulator.create(calibration_toml_path=str(calibration_path))
+    point_triangulator.calibration_store.check_interval_seconds = 0
+
+    # no calibration yet, then one for the wrong number of cameras - skip triangulating
+    assert _aggregate(point_triangulator, number_of_cameras=3).tracked_points3d == {}
+    _write_calibration(calibration_path, number_of_cameras=2, mtime_ns=1_000_000_000)
+    assert _aggregate(point_triangulator, number_of_cameras=3).tracked_points3d == {}
+
+    _write_calibration(calibration_path, number_of_cameras=3, mtime_ns=2_000_000_000)
+    aggregation_output = _aggregate(point_triangulator, number_of_cameras=3)
+    assert aggregation_output.frame_number == 7
+    np.testing.assert_allclose(aggregation_output.tracked_points3d["nose"], POINT3D, atol=1e-9)
+
+
+def test_aggregation_uses_one_calibration_for_the_whole_frame(tmp_path: Path):
+    calibration_path = tmp_path / "calibration.toml"
+    _write_calibration(calibration_path, number_of_cameras=3, mtime_ns=1_000_000_000)
+    point_triangulator = PointTriangulator.create(calibration_toml_path=str(calibration_path))
+    point_triangulator.calibration_store.check_interval_seconds = 0
+    # a recalibration with fewer cameras lands right after the frame's calibration is checked
+    original_reload_if_changed = point_triangulator.calibration_store.reload_if_changed
+
+    def reload_after_the_first_check():
+        point_triangulator.calibration_store.reload_if_changed = original_reload_if_changed
+        _write_calibration(calibration_path, number_of_cameras=2, mtime_ns=2_000_000_000)
+        return False
+
+    point_triangulator.calibration_store.reload_if_changed = reload_after_the_first_check
+
+    aggregation_output = _aggregate(point_triangulator, number_of_cameras=3)
+    np.testing.assert_allclose(aggregation_output.tracked_points3d["nose"], POINT3D, atol=1e-9)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from freemocap.core.pipelines.batched_triangulation import triangulate_batched, triangulate_with_reprojection_errors
+
+
+def _ring_of_cameras(number_of_cameras: int) -> np.ndarray:
+    projection_matrices = []
+    for camera_index in range(number_of_cameras):
+        angle = camera_index * 2 * np.pi / number_of_cameras
+        rotation = np.array([[np.cos(angle), 0, np.sin(angle)],
+                             [0, 1, 0],
+                             [-np.sin(angle), 0, np.cos(angle)]])
+        translation = np.array([[0.0], [0.0], [5.0]])
+        projection_matrices.append(np.hstack([rotation, translation]))
+    return np.array(projection_matrices)
+
+
+def _project(points3d: np.ndarray, projection_matrices: np.ndarray) -> np.ndarray:
+    homogeneous_points = np.hstack([points3d, np.ones((points3d.shape[0], 1))])
+    projected = np.einsum("cij,nj->cni", projection_matrices, homogeneous_points)
+    return projected[..., :2] / projected[..., 2:]
+
+
+@pytest.mark.parametrize("use_svd", [False, True])
+def test_triangulate_batched_recovers_points(use_svd: bool):
+    rng = np.random.default_rng(0)
+    projection_matrices = _ring_of_cameras(number_of_cameras=4)
+    points3d = rng.normal(size=(543, 3))
+    points2d = _project(points3d, projection_matrices)
+
+    visibility = rng.random((4, 543)) > 0.3
+    visibility[:, 0] = [True, False, False, False]  # only one camera sees point 0
+    points2d[1, 1] = np.nan  # NaNs count as not visible
+
+    triangulated = triangulate_batched(points2d=points2d,
+                                       projection_matrices=projection_matrices,
+                                       visibility=visibility,
+                                       use_svd=use_svd)
+
+    enough_views = (visibility & ~np.isnan(points2d).any(axis=2)).sum(axis=0) >= 2
+    assert triangulated.shape == (543, 3)
+    assert np.isnan(triangulated[0]).all()
+    assert np.isnan(triangulated[~enough_views]).all()
+    np.testing.assert_allclose(triangulated[enough_views], points3d[enough_views], atol=1e-9)
+
+
+def test_triangulate_batched_validates_shapes():
+    projection_matrices = _ring_of_cameras(number_of_cameras=3)
+    with pytest.raises(ValueError):
+        triangulate_batched(points2d=np.zeros((2, 10, 2)), projection_matrices=projection_matrices)
+    with pytest.raises(ValueError):
+        triangulate_batched(points2d=np.zeros((3, 10, 3)), projection_matrices=projection_matrices)
+    with pytest.raises(ValueError):
+        triangulate_batched(points2d=np.zeros((3, 10, 2)),
+                            projection_matrices=projection_matrices,
+                            visibility=np.ones((3, 9), dtype=bool))
+
+
+def test_triangulate_with_reprojection_errors():
+    rng = np.random.default_rng(1)
+    projection_matrices = _ring_of_cameras(number_of_cameras=3)
+    points3d = rng.normal(size=(100, 3))
+    points2d = _project(points3d, projection_matrices)
+    points2d[2, :50, 0] += 0.01  # camera 2 is off by 0.01 in x for the first half of the points
+    points2d[0, 0] = np.nan
+    points2d[1:, 1] = np.nan  # point 1 is only seen by camera 0
+
+    triangulated, reprojection_errors = triangulate_with_reprojection_errors(points2d=points2d,
+                                                                             projection_matrices=projection_matrices)
+
+    assert reprojection_errors.shape == (3, 100)
+    assert np.isnan(reprojection_errors[0, 0]) and np.isnan(reprojection_errors[:, 1]).all()
+    np.testing.assert_allclose(reprojection_errors[:, 50:], 0.0, atol=1e-9)
+    assert (reprojection_errors[:, 2:50] > 1e-4).all()
+    np.testing.assert_allclose(triangulated[50:], points3d[50:], atol=1e-9)
@@ -0,0 +1,71 @@
+import pytest
+
+from freemocap.core.pubsub.broadcast_arena import BroadcastArena, BroadcastArenaReader, BroadcastHandle
+
+
+def test_slots_are_reused_once_every_subscriber_has_acked():
+    arena = BroadcastArena.create(number_of_slots=2, slot_bytes=16)
+    reader = BroadcastArenaReader()
+    try:
+        first = arena.write(b"first", number_of_subscribers=2)
+        second = arena.write(b"second", number_of_subscribers=2)
+        assert {first.slot_index, second.slot_index} == {0, 1}
+        assert arena.slots_in_use == 2
+
+        # One subscriber's ack doesn't free the slot...
+        assert reader.read(handle=first, subscriber_index=0) == b"first"
+        assert arena.write(b"third", number_of_subscribers=2) is None
+        # ...the last one does
+        assert reader.read(handle=first, subscriber_index=1) == b"first"
+        assert arena.slots_in_use == 1
+
+        third = arena.write(b"third", number_of_subscribers=2)
+        assert third.slot_index == first.slot_index
+        assert third.sequence > second.sequence
+        assert reader.read(handle=second, subscriber_index=1) == b"second"
+        assert reader.read(handle=third, subscriber_index=0) == b"third"
+    finally:
+        reader.close()
+        arena.close()
+
+
+def test_read_detects_an_overwritten_slot():
+    arena = BroadcastArena.create(number_of_slots=1, slot_bytes=16)
+    reader = BroadcastArenaReader()
+    try:
+        stale_handle = arena.write(b"old", number_of_subscribers=1)
+        assert reader.read(handle=stale_handle, subscriber_index=0) == b"old"
+        arena.write(b"new", number_of_subscribers=1)
+        with pytest.raises(ValueError):
+            reader.read(handle=stale_handle, subscriber_index=0)
+    finally:
+        reader.close()
+        arena.close()
+
+
+def test_write_falls_back_when_full_or_too_large():
+    arena = BroadcastArena.create(number_of_slots=2, slot_bytes=8)
+    try:
+        assert arena.write(b"x" * 9, number_of_subscribers=1) is None
+        assert arena.slots_in_use == 0
+
+        assert arena.write(b"x" * 8, number_of_subscribers=1) is not None
+        assert arena.write(b"y", number_of_subscribers=1) is not None
+        assert arena.write(b"z", number_of_subscribers=1) is None
+
+        with pytest.raises(ValueError):
+            arena.write(b"z", number_of_subscribers=17)
+    finally:
+        arena.close()
+
+
+def test_missing_arena_is_a_dropped_message():
+    arena = BroadcastArena.create(number_of_slots=1, slot_bytes=8)
+    handle = arena.write(b"gone", number_of_subscribers=1)
+    # (the publisher exits and unlinks its arena before the subscriber attaches)
+    arena.close()
+    reader = BroadcastArenaReader()
+    assert reader.read(handle=handle, subscriber_index=0) is None
+    assert reader.read(handle=BroadcastHandle(arena_name="fmc_bca_missing", slot_index=0, sequence=1),
+                       subscriber_index=0) is None
+    assert reader.arenas == {}
@@ -0,0 +1,91 @@
+import numpy as np
+
+from freemocap.core.pipelines.calibration_pipeline.bundle_adjustment import BundleAdjustmentProblem, anchor_to_camera, \
+    CAMERA_PARAMETERS
+from freemocap.core.pipelines.calibration_pipeline.se3_operations import rotation_vectors_to_matrices, \
+    rotation_matrices_to_vectors
+
+FOCAL_LENGTH_PX = 1000.0
+CAMERA_RING_RADIUS_MM = 2000.0
+NUMBER_OF_CAMERAS = 3
+NUMBER_OF_VIEWS = 6
+
+
+def _board_object_points() -> np.ndarray:
+    corners_x, corners_y = np.meshgrid(np.arange(1, 5), np.arange(1, 6))
+    return np.stack([corners_x.ravel(), corners_y.ravel(), np.zeros(corners_x.size)], axis=1) * 50.0
+
+
+def _ring_of_cameras() -> np.ndarray:
+    """ (cameras, 3, 4) [R|t] extrinsics, every camera looking at the origin from in front of the board """
+    extrinsics = []
+    for angle in np.linspace(-np.pi / 6, np.pi / 6, NUMBER_OF_CAMERAS):
+        position = CAMERA_RING_RADIUS_MM * np.array([np.sin(angle), 0.0, -np.cos(angle)])
+        forward = -position / np.linalg.norm(position)
+        right = np.cross([0.0, 1.0, 0.0], forward)
+        rotation = np.stack([right, np.cross(forward, right), forward])
+        extrinsics.append(np.hstack([rotation, (-rotation @ position)[:, np.newaxis]]))
+    return np.asarray(extrinsics)
+
+
+def _synthetic_problem() -> tuple[BundleAdjustmentProblem, np.ndarray]:
+    """ A noise-free problem with every camera seeing every board, bar one missed corner, and its true extrinsics """
+    random_state = np.random.default_rng(0)
+    camera_extrinsics = _ring_of_cameras()
+    board_object_points = _board_object_points()
+    board_rotations = rotation_vectors_to_matrices(random_state.normal(scale=0.3, size=(NUMBER_OF_VIEWS, 3)))
+    board_translations = random_state.uniform(-300, 300, size=(NUMBER_OF_VIEWS, 3))
+    points3d = (np.einsum("vij,nj->vni", board_rotations, board_object_points) +
+                board_translations[:, np.newaxis, :]).reshape(-1, 3)
+    points_in_cameras = (np.einsum("cij,nj->cni", camera_extrinsics[:, :, :3], points3d) +
+                         camera_extrinsics[:, np.newaxis, :, 3])
+    undistorted_points2d = points_in_cameras[..., :2] / points_in_cameras[..., 2:3]
+    undistorted_points2d[1, 0] = np.nan
+    problem = BundleAdjustmentProblem(undistorted_points2d=undistorted_points2d,
+                                      focal_lengths=np.full(NUMBER_OF_CAMERAS, FOCAL_LENGTH_PX),
+                                      board_ids=np.repeat(np.arange(NUMBER_OF_VIEWS), len(board_object_points)),
+                                      board_object_points=np.tile(board_object_points, (NUMBER_OF_VIEWS, 1)))
+    return problem, camera_extrinsics
+
+
+def _perturb(camera_extrinsics: np.ndarray, random_state: np.random.Generator) -> np.ndarray:
+    """ A few degrees and centimeters off, like the pairwise estimates the solve starts from """
+    rotations = rotation_vectors_to_matrices(random_state.normal(scale=np.radians(2.0), size=(len(camera_extrinsics), 3)))
+    perturbed_extrinsics = camera_extrinsics.copy()
+    perturbed_extrinsics[:, :, :3] = rotations @ camera_extrinsics[:, :, :3]
+    perturbed_extrinsics[:, :, 3] += random_state.normal(scale=30.0, size=(len(camera_extrinsics), 3))
+    return perturbed_extrinsics
+
+
+def test_residuals_match_the_jacobian_sparsity_layout():
+    problem, camera_extrinsics = _synthetic_problem()
+    initial_parameters = problem.initial_parameters(camera_extrinsics=camera_extrinsics)
+    sparsity = problem.jacobian_sparsity()
+
+    number_of_parameters = (NUMBER_OF_CAMERAS * CAMERA_PARAMETERS + problem.number_of_points * 3 +
+                            problem.number_of_boards * 6)
+    assert len(initial_parameters) == number_of_parameters
+    assert sparsity.shape == (len(problem.residuals(initial_parameters)), number_of_parameters)
+    assert len(problem.residuals(initial_parameters)) == problem.observed.sum() + problem.number_of_points * 3
+
+    # the true extrinsics are an exact solution
+    np.testing.assert_allclose(problem.residuals(initial_parameters), 0.0, atol=1e-6)
+
+
+def test_solve_recovers_perturbed_extrinsics():
+    problem, camera_extrinsics = _synthetic_problem()
+    initial_parameters = problem.initial_parameters(
+        camera_extrinsics=_perturb(camera_extrinsics, random_state=np.random.default_rng(1)))
+    assert np.sqrt(np.mean(problem.residuals(initial_parameters) ** 2)) > 1.0
+
+    result = problem.solve(initial_parameters=initial_parameters, x_scale="jac", ftol=1e-10, xtol=1e-10)
+    camera_rotation_vectors, camera_translation_vectors, *_ = problem.unpack(result.x)
+
+    assert np.sqrt(np.mean(result.fun ** 2)) < 1e-3
+    # (the solve leaves the world frame free - compare in camera 0's frame)
+    solved_extrinsics = anchor_to_camera(camera_rotation_vectors, camera_translation_vectors, camera_index=0)
+    true_extrinsics = anchor_to_camera(rotation_matrices_to_vectors(camera_extrinsics[:, :, :3]),
+                                       camera_extrinsics[:, :, 3],
+                                       camera_index=0)
+    np.testing.assert_allclose(solved_extrinsics[:, :, :3], true_extrinsics[:, :, :3], atol=1e-4)
+    np.testing.assert_allclose(solved_extrinsics[:, :, 3], true_extrinsics[:, :, 3], atol=0.1)
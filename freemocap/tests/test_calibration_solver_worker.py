@@ -0,0 +1,101 @@
+import copy
+import threading
+import time
+from types import SimpleNamespace
+
+from freemocap.core.pipelines.calibration_pipeline.calibration_solver_worker import CalibrationSolverWorker, \
+    CalibrationEstimateTopic, CalibrationEstimateMessage, CalibrationSolveScheduler
+from freemocap.core.pipelines.calibration_pipeline.multi_camera_calibrator import MultiCameraCalibrationEstimate
+
+RESULT_TIMEOUT_SECONDS = 5.0
+
+
+class StubCalibrator:
+    """ Stands in for `MultiCameraCalibrator` - just the parts the solver worker touches """
+
+    def __init__(self, estimate: MultiCameraCalibrationEstimate | None, number_of_keyframes: int = 3):
+        self.estimate = estimate
+        self.shared_view_accumulator = SimpleNamespace(multi_camera_target_views=[object()] * number_of_keyframes)
+        self.multi_camera_calibration_estimate = None
+        self.sparse_bundle_optimizer = None
+
+    def model_copy(self, deep: bool, update: dict):
+        snapshot = copy.deepcopy(self) if deep else copy.copy(self)
+        for name, value in update.items():
+            setattr(snapshot, name, value)
+        return snapshot
+
+    def calibrate(self):
+        if self.estimate is None:
+            raise RuntimeError("not enough shared views")
+        self.multi_camera_calibration_estimate = self.estimate
+
+
+def _wait_for_result(subscription) -> CalibrationEstimateMessage:
+    deadline = time.perf_counter() + RESULT_TIMEOUT_SECONDS
+    while subscription.empty():
+        assert time.perf_counter() < deadline, "solver worker never published a result"
+        time.sleep(0.001)
+    return subscription.get()
+
+
+def test_solver_worker_publishes_successes_and_failures():
+    topic = CalibrationEstimateTopic()
+    subscription = topic.get_subscription()
+    shutdown_event = threading.Event()
+    solver_worker = CalibrationSolverWorker.create(calibration_estimate_topic=topic,
+                                                   shutdown_event=shutdown_event,
+                                                   use_thread=True)
+    estimate = MultiCameraCalibrationEstimate.model_construct(principal_camera_id="0",
+                                                              camera_transforms_by_camera_id={})
+    try:
+        solver_worker.start()
+        calibrator = StubCalibrator(estimate=estimate, number_of_keyframes=4)
+        solver_worker.submit(multi_camera_calibrator=calibrator, solve_number=1)
+        result = _wait_for_result(subscription)
+        assert result.solve_number == 1
+        assert result.number_of_keyframes == 4
+        assert result.solve_duration_seconds >= 0
+        assert result.multi_camera_calibration_estimate == estimate
+        # (the solve ran on a snapshot - the submitted calibrator keeps going untouched)
+        assert calibrator.multi_camera_calibration_estimate is None
+
+        # A failed solve still reports back, so the submitter can send the next one
+        solver_worker.submit(multi_camera_calibrator=StubCalibrator(estimate=None), solve_number=2)
+        result = _wait_for_result(subscription)
+        assert result.solve_number == 2
+        assert result.multi_camera_calibration_estimate is None
+        assert solver_worker.is_alive()
+    finally:
+        shutdown_event.set()
+        solver_worker.join(timeout=RESULT_TIMEOUT_SECONDS)
+        topic.close()
+    assert not solver_worker.is_alive()
+
+
+def test_solves_wait_for_the_previous_result():
+    scheduler = CalibrationSolveScheduler(resolve_information_gain=10.0)
+    assert scheduler.should_submit(total_information_gain=10.0)
+    assert scheduler.mark_submitted(total_information_gain=10.0) == 1
+    assert scheduler.solve_in_progress
+
+    # plenty of new information, but solve #1 hasn't come back yet
+    assert not scheduler.should_submit(total_information_gain=100.0)
+    scheduler.receive_result(CalibrationEstimateMessage(solve_number=1,
+                                                        number_of_keyframes=5,
+                                                        solve_duration_seconds=0.1))
+    assert not scheduler.solve_in_progress
+    assert scheduler.should_submit(total_information_gain=100.0)
+    assert scheduler.mark_submitted(total_information_gain=100.0) == 2
+
+
+def test_solves_wait_for_enough_new_information():
+    scheduler = CalibrationSolveScheduler(resolve_information_gain=10.0)
+    assert not scheduler.should_submit(total_information_gain=9.9)
+    scheduler.mark_submitted(total_information_gain=12.0)
+    scheduler.receive_result(CalibrationEstimateMessage(solve_number=1,
+                                                        number_of_keyframes=5,
+                                                        solve_duration_seconds=0.1))
+    # the threshold counts from the last submission, not from zero
+    assert not scheduler.should_submit(total_information_gain=21.9)
+    assert scheduler.should_submit(total_information_gain=22.0)
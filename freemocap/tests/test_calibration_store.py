@@ -0,0 +1,72 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import toml
+
+from freemocap.core.pipelines.calibration_store import CalibrationStore
+
+
+def _write_calibration(path: Path, translations: list[list[float]], mtime_ns: int):
+    calibration = {f"cam_{camera_index}": {"name": f"cam_{camera_index}",
+                                           "size": [1280, 720],
+                                           "matrix": [[1000.0, 0.0, 640.0], [0.0, 1000.0, 360.0], [0.0, 0.0, 1.0]],
+                                           "distortions": [0.0, 0.0, 0.0, 0.0, 0.0],
+                                           "rotation": [0.0, 0.0, 0.0],
+                                           "translation": translation}
+                   for camera_index, translation in enumerate(translations)}
+    calibration["metadata"] = {"charuco_square_size": 1.0}
+    path.write_text(toml.dumps(calibration))
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_calibration_store_precomputes_arrays(tmp_path: Path):
+    calibration_path = tmp_path / "calibration.toml"
+    _write_calibration(calibration_path, translations=[[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]], mtime_ns=1_000_000_000)
+
+    snapshot = CalibrationStore.create(calibration_toml_path=str(calibration_path)).snapshot
+    assert snapshot.number_of_cameras == 2
+    assert list(snapshot.camera_calibrations.keys()) == ["0", "1"]
+    assert snapshot.projection_matrices.shape == (2, 3, 4)
+    assert snapshot.projection_matrices.flags.c_contiguous
+    assert not snapshot.projection_matrices.flags.writeable
+    np.testing.assert_allclose(snapshot.projection_matrices[1], [[1, 0, 0, 1], [0, 1, 0, 0], [0, 0, 1, 0]])
+
+    undistorted = snapshot.undistort_points(np.array([[[640.0, 360.0]], [[1640.0, np.nan]]]))
+    np.testing.assert_allclose(undistorted[0], [[0.0, 0.0]], atol=1e-12)
+    assert np.isnan(undistorted[1]).all()
+
+
+def test_calibration_store_hot_reloads(tmp_path: Path):
+    calibration_path = tmp_path / "calibration.toml"
+    _write_calibration(calibration_path, translations=[[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]], mtime_ns=1_000_000_000)
+    store = CalibrationStore.create(calibration_toml_path=str(calibration_path), check_interval_seconds=0)
+    original_snapshot = store.snapshot
+
+    # Unchanged file -> same snapshot object
+    assert not store.reload_if_changed()
+    assert store.snapshot is original_snapshot
+
+    # Recalibration with a new camera -> new snapshot, old one untouched
+    _write_calibration(calibration_path,
+                       translations=[[0.0, 0.0, 0.0], [2.0, 0.0, 0.0], [0.0, 2.0, 0.0]],
+                       mtime_ns=2_000_000_000)
+    new_snapshot = store.snapshot
+    assert new_snapshot is not original_snapshot
+    assert new_snapshot.number_of_cameras == 3
+    assert original_snapshot.number_of_cameras == 2
+
+    # Half-written file -> keep the last good calibration
+    calibration_path.write_text("[cam_0\nmatrix = ")
+    os.utime(calibration_path, ns=(3_000_000_000, 3_000_000_000))
+    assert not store.reload_if_changed()
+    assert store.snapshot is new_snapshot
+
+
+def test_calibration_store_waits_for_a_calibration(tmp_path: Path):
+    calibration_path = tmp_path / "calibration.toml"
+    store = CalibrationStore.create(calibration_toml_path=str(calibration_path), check_interval_seconds=0)
+    assert store.snapshot is None
+
+    _write_calibration(calibration_path, translations=[[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]], mtime_ns=1_000_000_000)
+    assert store.snapshot.number_of_cameras == 2
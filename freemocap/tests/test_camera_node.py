@@ -0,0 +1,144 @@
+import multiprocessing
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from freemocap.core.pipelines import processing_pipeline
+from freemocap.core.pipelines.pipeline_control_block import PipelineControlBlock
+from freemocap.core.pipelines.pipeline_ipc import PipelineIPC
+from freemocap.core.pipelines.pipeline_latency_histograms import PipelineLatencyHistograms
+from freemocap.core.pipelines.processing_pipeline import CameraNode
+from freemocap.core.pubsub.pubsub_manager import TopicTypes
+from freemocap.core.pubsub.pubsub_topics import ProcessFrameNumberMessage, SkellyTrackerConfigsMessage, \
+    LOST_FRAME_SLOT_INDEX
+
+CAMERA_IDS = ["0", "1", "2"]
+POINT_NAMES = ["nose", "left_eye"]
+
+
+class FakeCameraRing:
+    """ Stands in for a camera's `FramePayloadSharedMemoryRingBuffer` - every index holds that frame number """
+
+    def __init__(self, frame_number_offset: int = 0):
+        self.frame_number_offset = frame_number_offset
+
+    def get_data_by_index(self, index: int, frame_rec_array=None):
+        return SimpleNamespace(frame_metadata=SimpleNamespace(frame_number=index + self.frame_number_offset),
+                               image=np.full((4, 4, 3), index, dtype=np.uint8))
+
+
+class FakeTracker:
+    def __init__(self):
+        self.processed_frames: list[int] = []
+
+    def process_image(self, frame_number: int, image: np.ndarray):
+        self.processed_frames.append(frame_number)
+        points = {point_name: np.array([frame_number, point_index, 0.0])
+                  for point_index, point_name in enumerate(POINT_NAMES)}
+        return SimpleNamespace(tracker_type="fake", all_points=lambda dimensions: points)
+
+
+class FakeSubscription:
+    def __init__(self, messages: list):
+        self.messages = list(messages)
+
+    def empty(self) -> bool:
+        return not self.messages
+
+    def get(self):
+        return self.messages.pop(0)
+
+
+class FakeCameraNodeOutputTopic:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, message):
+        self.published.append(message)
+
+    def close_publisher_arena(self):
+        pass
+
+
+class ShutdownOnSecondWakeup:
+    """ Lets the node run one loop iteration, then asks it to shut down """
+
+    def __init__(self, control_block: PipelineControlBlock, node_index: int):
+        self.control_block = control_block
+        self.node_index = node_index
+        self.wait_count = 0
+
+    def wait(self, timeout: float):
+        self.wait_count += 1
+        if self.wait_count > 1:
+            self.control_block.request_shutdown(node_index=self.node_index)
+
+
+@pytest.fixture
+def batched_node_harness(monkeypatch):
+    node_name = CameraNode.node_name(CAMERA_IDS)
+    tracker = FakeTracker()
+    camera_rings = {camera_id: FakeCameraRing() for camera_id in CAMERA_IDS}
+    monkeypatch.setattr(processing_pipeline.FramePayloadSharedMemoryRingBuffer, "recreate",
+                        lambda dto, read_only: camera_rings[dto])
+    monkeypatch.setattr(processing_pipeline, "update_trackers",
+                        lambda trackers, tracker_configs: trackers.append(tracker))
+    output_topic = FakeCameraNodeOutputTopic()
+    ipc = PipelineIPC(pubsub=SimpleNamespace(topics={TopicTypes.CAMERA_NODE_OUTPUT: output_topic}),
+                      pipeline_id="test",
+                      global_kill_flag=multiprocessing.Value('b', False),
+                      latency_histograms=PipelineLatencyHistograms.create(camera_ids=CAMERA_IDS),
+                      control_block=PipelineControlBlock.create(node_names=[node_name]))
+    yield SimpleNamespace(ipc=ipc, tracker=tracker, camera_rings=camera_rings, output_topic=output_topic,
+                          node_index=ipc.control_block.node_index(node_name))
+    ipc.latency_histograms.close()
+    ipc.control_block.close()
+
+
+def _run_batched_node(harness, requested_frames: dict[int, int]):
+    CameraNode._run(camera_shm_dtos={camera_id: camera_id for camera_id in CAMERA_IDS},
+                    ipc=harness.ipc,
+                    process_frame_number_subscription=FakeSubscription(
+                        [ProcessFrameNumberMessage(requested_frames=requested_frames)]),
+                    skelly_tracker_configs_subscription=FakeSubscription(
+                        [SkellyTrackerConfigsMessage(tracker_configs=[])]),
+                    node_index=harness.node_index,
+                    wakeup=ShutdownOnSecondWakeup(control_block=harness.ipc.control_block,
+                                                  node_index=harness.node_index))
+
+
+def test_batched_node_serves_every_camera_from_one_worker(batched_node_harness):
+    _run_batched_node(batched_node_harness, requested_frames={5: 0, 6: 0})
+
+    # One set of trackers ran every camera's copy of each requested frame, in frame order
+    assert batched_node_harness.tracker.processed_frames == [5, 5, 5, 6, 6, 6]
+    published = batched_node_harness.output_topic.published
+    assert [(message.frame_number, message.camera_id) for message in published] == [
+        (frame_number, camera_id) for frame_number in [5, 6] for camera_id in CAMERA_IDS]
+    assert all(message.tracker_type == "fake" and message.slot_index >= 0 for message in published)
+    # Each camera gets its own observation ring, announced with its first output
+    assert [message.camera_id for message in published if message.observation_ring_dto is not None] == CAMERA_IDS
+    assert all(message.observation_ring_dto.point_names == POINT_NAMES
+               for message in published if message.observation_ring_dto is not None)
+
+    # Every camera's latencies landed in its own histogram row
+    summary = batched_node_harness.ipc.latency_histograms.summarize()
+    assert summary
+    for stage_summary in summary.values():
+        assert [stage_summary[camera_id]["count"] for camera_id in CAMERA_IDS] == [2] * len(CAMERA_IDS)
+    node_summary = batched_node_harness.ipc.control_block.summarize()["nodes"][CameraNode.node_name(CAMERA_IDS)]
+    assert node_summary["last_frame_number"] == 6
+    assert node_summary["state"] == "stopped"
+
+
+def test_batched_node_reports_a_lapped_camera_as_lost(batched_node_harness):
+    # camera "1"'s ring has already moved on to newer frames
+    batched_node_harness.camera_rings["1"].frame_number_offset = 100
+    _run_batched_node(batched_node_harness, requested_frames={5: 0})
+
+    assert batched_node_harness.tracker.processed_frames == [5, 5]
+    published = {message.camera_id: message for message in batched_node_harness.output_topic.published}
+    assert published["1"].frame_number == 5
+    assert published["1"].slot_index == LOST_FRAME_SLOT_INDEX
+    assert published["0"].slot_index >= 0 and published["2"].slot_index >= 0
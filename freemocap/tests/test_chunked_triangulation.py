@@ -0,0 +1,69 @@
+import multiprocessing
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+
+from freemocap.core.pipelines.chunked_triangulation import triangulate_recording, TriangulationCameras
+
+CAMERA_MATRIX = np.array([[1000.0, 0.0, 640.0], [0.0, 1000.0, 360.0], [0.0, 0.0, 1.0]])
+
+
+def _synthetic_recording(number_of_frames: int = 100,
+                         number_of_points: int = 20) -> tuple[TriangulationCameras, np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(0)
+    cameras = TriangulationCameras(camera_matrices=np.array([CAMERA_MATRIX] * 3),
+                                   distortion_coefficients=[np.array([0.05, -0.02, 0.0, 0.0, 0.0]),
+                                                            np.zeros(4),
+                                                            np.array([0.01, 0.0, 0.001, 0.0, 0.0, 0.0, 0.0, 0.0])],
+                                   rotation_vectors=np.array([[0.0, angle, 0.0] for angle in (-0.6, 0.0, 0.6)]),
+                                   translation_vectors=np.array([[0.0, 0.0, 3.0]] * 3))
+    points3d = rng.uniform(-0.5, 0.5, size=(number_of_frames, number_of_points, 3))
+    points2d = np.stack([cv2.projectPoints(points3d.reshape(-1, 3),
+                                           cameras.rotation_vectors[camera_index],
+                                           cameras.translation_vectors[camera_index],
+                                           CAMERA_MATRIX,
+                                           cameras.distortion_coefficients[camera_index])[0].reshape(number_of_frames,
+                                                                                                   number_of_points, 2)
+                         for camera_index in range(3)])
+    points2d[rng.random(points2d.shape[:3]) < 0.2] = np.nan
+    return cameras, points2d, points3d
+
+
+def test_chunked_triangulation_matches_in_process_and_recovers_points():
+    cameras, points2d, points3d = _synthetic_recording()
+
+    in_process = triangulate_recording(image_2d_data=points2d, cameras=cameras, number_of_workers=1,
+                                       frames_per_chunk=16, progress=False)
+    pooled = triangulate_recording(image_2d_data=points2d, cameras=cameras, number_of_workers=2,
+                                   frames_per_chunk=16, progress=False)
+
+    for in_process_array, pooled_array in zip(in_process, pooled):
+        np.testing.assert_array_equal(in_process_array, pooled_array)
+    triangulated, mean_reprojection_error, camera_reprojection_error = pooled
+    seen_by = (~np.isnan(points2d).any(axis=3)).sum(axis=0)
+    np.testing.assert_allclose(triangulated[seen_by >= 2], points3d[seen_by >= 2], atol=1e-6)
+    assert np.isnan(triangulated[seen_by < 2]).all() and np.isnan(mean_reprojection_error[seen_by < 2]).all()
+    assert np.nanmax(mean_reprojection_error) < 1e-3
+    assert camera_reprojection_error.shape == points2d.shape[:3]
+    np.testing.assert_array_equal(np.isnan(camera_reprojection_error),
+                                  np.isnan(points2d).any(axis=3) | (seen_by < 2)[np.newaxis])
+
+
+def test_chunked_triangulation_stops_on_kill_event():
+    cameras, points2d, _ = _synthetic_recording()
+    kill_event = multiprocessing.Event()
+    kill_event.set()
+    for number_of_workers in (1, 2):
+        assert triangulate_recording(image_2d_data=points2d, cameras=cameras, number_of_workers=number_of_workers,
+                                     frames_per_chunk=16, kill_event=kill_event, progress=False) is None
+
+
+def test_imports_without_the_calibration_pipeline_nodes():
+    # (in a fresh interpreter - the calibration pipeline's nodes mustn't come along with the math kernels it uses)
+    result = subprocess.run([sys.executable, "-c",
+                             "import sys, freemocap.core.pipelines.chunked_triangulation; "
+                             "assert not any(name.endswith('_node') for name in sys.modules), sorted(sys.modules)"],
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,101 @@
+import pytest
+
+from freemocap.core.pipelines.frame_reorder_buffer import FrameReorderBuffer
+
+CAMERA_IDS = ["0", "1"]
+
+
+def _report(buffer: FrameReorderBuffer, frame_number: int, camera_id: str, tracker_type: str = "mediapipe"):
+    buffer.add_output(frame_number=frame_number, tracker_type=tracker_type, camera_id=camera_id,
+                      output=f"{tracker_type}-{camera_id}-{frame_number}")
+
+
+def test_frames_are_released_in_order():
+    buffer = FrameReorderBuffer(camera_ids=CAMERA_IDS, max_frames_in_flight=3)
+    for frame_number in [10, 11, 12]:
+        buffer.add_request(frame_number, requested_at=0.0)
+    assert not buffer.has_capacity
+
+    # frame 11 finishes first, but must wait for frame 10
+    _report(buffer, 11, "0")
+    _report(buffer, 11, "1")
+    assert buffer.pop_ready(now=0.1) == []
+
+    _report(buffer, 10, "1")
+    _report(buffer, 10, "0")
+    released = buffer.pop_ready(now=0.1)
+    assert [frame.frame_number for frame in released] == [10, 11]
+    assert released[0].tracker_results["mediapipe"] == {"0": "mediapipe-0-10", "1": "mediapipe-1-10"}
+    assert buffer.frames_in_flight == 1
+    assert buffer.has_capacity
+
+
+def test_frame_waits_for_every_tracker_type():
+    buffer = FrameReorderBuffer(camera_ids=CAMERA_IDS, max_frames_in_flight=2)
+    buffer.add_request(0, requested_at=0.0)
+    buffer.add_request(1, requested_at=0.0)
+    for camera_id in CAMERA_IDS:
+        _report(buffer, 0, camera_id, "mediapipe")
+        _report(buffer, 0, camera_id, "charuco")
+        _report(buffer, 1, camera_id, "mediapipe")
+
+    released = buffer.pop_ready(now=0.1)
+    assert [frame.frame_number for frame in released] == [0]
+    assert set(released[0].tracker_results.keys()) == {"mediapipe", "charuco"}
+
+
+def test_stale_frames_are_dropped():
+    buffer = FrameReorderBuffer(camera_ids=CAMERA_IDS, max_frames_in_flight=2, stale_timeout_seconds=1.0)
+    buffer.add_request(0, requested_at=0.0)
+    buffer.add_request(1, requested_at=0.5)
+    _report(buffer, 0, "0")  # camera "1" never reports frame 0
+    _report(buffer, 1, "0")
+    _report(buffer, 1, "1")
+
+    assert buffer.pop_ready(now=0.9) == []
+    released = buffer.pop_ready(now=1.1)
+    assert [frame.frame_number for frame in released] == [1]
+    assert buffer.dropped_frame_count == 1
+
+    # late arrivals for dropped frames are ignored
+    _report(buffer, 0, "1")
+    assert buffer.frames_in_flight == 0
+
+
+def test_request_validation():
+    with pytest.raises(ValueError):
+        FrameReorderBuffer(camera_ids=CAMERA_IDS, max_frames_in_flight=0)
+
+    buffer = FrameReorderBuffer(camera_ids=CAMERA_IDS, max_frames_in_flight=1)
+    buffer.add_request(5)
+    with pytest.raises(ValueError):
+        buffer.add_request(6)
+    with pytest.raises(ValueError):
+        _report(buffer, 5, "not-a-camera")
+
+
+def test_finished_cameras_complete_the_frame():
+    buffer = FrameReorderBuffer(camera_ids=CAMERA_IDS, max_frames_in_flight=3, stale_timeout_seconds=1.0)
+    for frame_number in [0, 1, 2]:
+        buffer.add_request(frame_number, requested_at=0.0)
+
+    # camera "1"'s tracker found nothing in frame 0
+    _report(buffer, 0, "0")
+    assert buffer.pop_ready(now=0.1) == []
+    buffer.finish_camera(frame_number=0, camera_id="1")
+
+    # camera "1" couldn't read frame 1 at all, camera "0" has no trackers yet
+    buffer.finish_camera(frame_number=1, camera_id="1", lost=True)
+    buffer.finish_camera(frame_number=1, camera_id="0")
+
+    released = buffer.pop_ready(now=0.1)
+    assert [frame.frame_number for frame in released] == [0, 1]
+    assert released[0].tracker_results["mediapipe"] == {"0": "mediapipe-0-0", "1": None}
+    assert not released[0].lost
+    assert released[1].lost
+    assert buffer.dropped_frame_count == 0
+
+    # a frame nobody reports for still goes stale
+    assert [frame.frame_number for frame in buffer.pop_ready(now=1.1)] == []
+    assert buffer.dropped_frame_count == 1
+    assert buffer.frames_in_flight == 0
@@ -0,0 +1,66 @@
+import pytest
+
+from freemocap.core.pipelines.frame_scheduler import FrameScheduler, FrameCounters, FrameCounterTypes, ReadTypes
+
+
+def _scheduler(read_type: ReadTypes) -> FrameScheduler:
+    return FrameScheduler(read_type=read_type, frame_counters=FrameCounters())
+
+
+def _counters(scheduler: FrameScheduler) -> dict[str, int]:
+    return scheduler.frame_counters.to_dict()
+
+
+@pytest.mark.parametrize("read_type", [ReadTypes.LATEST, ReadTypes.NEXT])
+def test_nothing_to_request_until_a_frame_is_available(read_type: ReadTypes):
+    scheduler = _scheduler(read_type)
+    assert scheduler.next_frame_to_request(latest_available_frame=-1) is None
+    assert scheduler.latest_requested_frame == -1
+    assert _counters(scheduler)["requested"] == 0
+
+
+@pytest.mark.parametrize("read_type", [ReadTypes.LATEST, ReadTypes.NEXT])
+def test_starts_from_the_newest_available_frame(read_type: ReadTypes):
+    scheduler = _scheduler(read_type)
+    assert scheduler.next_frame_to_request(latest_available_frame=41) == 41
+    # (frames published before the pipeline attached don't count as skipped)
+    assert _counters(scheduler)["skipped"] == 0
+    assert _counters(scheduler)["requested"] == 1
+    # caught up
+    assert scheduler.next_frame_to_request(latest_available_frame=41) is None
+
+
+def test_latest_jumps_to_the_newest_frame_and_counts_skips():
+    scheduler = _scheduler(ReadTypes.LATEST)
+    assert scheduler.allows_dropping_frames
+    assert scheduler.next_frame_to_request(latest_available_frame=10) == 10
+    assert scheduler.next_frame_to_request(latest_available_frame=11) == 11
+    assert _counters(scheduler)["skipped"] == 0
+
+    assert scheduler.next_frame_to_request(latest_available_frame=15) == 15
+    assert _counters(scheduler)["skipped"] == 3  # 12, 13, 14
+    assert scheduler.next_frame_to_request(latest_available_frame=15) is None
+    assert _counters(scheduler) == {"requested": 3, "aggregated": 0, "skipped": 3, "dropped_stale": 0, "lost": 0}
+
+
+def test_next_requests_every_frame_in_order():
+    scheduler = _scheduler(ReadTypes.NEXT)
+    assert not scheduler.allows_dropping_frames
+    assert scheduler.next_frame_to_request(latest_available_frame=10) == 10
+
+    # the camera group got ahead of us - the cursor walks through every frame instead of jumping
+    requested_frames = []
+    while (frame_number := scheduler.next_frame_to_request(latest_available_frame=14)) is not None:
+        requested_frames.append(frame_number)
+    assert requested_frames == [11, 12, 13, 14]
+    assert scheduler.latest_requested_frame == 14
+    assert _counters(scheduler)["requested"] == 5
+    assert _counters(scheduler)["skipped"] == 0
+
+
+def test_frame_counters():
+    frame_counters = FrameCounters()
+    frame_counters.increment(FrameCounterTypes.AGGREGATED)
+    frame_counters.increment(FrameCounterTypes.AGGREGATED, 2)
+    frame_counters.set(FrameCounterTypes.DROPPED_STALE, 7)
+    assert frame_counters.to_dict() == {"requested": 0, "aggregated": 3, "skipped": 0, "dropped_stale": 7, "lost": 0}
@@ -0,0 +1,127 @@
+import multiprocessing
+
+import numpy as np
+
+from freemocap.old.core_processes.capture_volume_calibration.anipose_camera_calibration.freemocap_anipose import \
+    Camera, CameraGroup, triangulate_simple
+
+CAMERA_MATRIX = np.array([[1000.0, 0.0, 640.0], [0.0, 1000.0, 360.0], [0.0, 0.0, 1.0]])
+CAMERA_ANGLES = (-0.6, 0.0, 0.6)
+
+
+def _camera_group(rotation_noise: float = 0.0, seed: int = 0) -> CameraGroup:
+    """ Three cameras on an arc 3 units from the origin, all looking at it """
+    rng = np.random.default_rng(seed)
+    return CameraGroup([Camera(matrix=CAMERA_MATRIX,
+                               dist=np.array([0.05, -0.02, 0.0, 0.0, 0.0]),
+                               size=(1280, 720),
+                               rvec=np.array([0.0, angle, 0.0]) + rng.normal(scale=rotation_noise, size=3),
+                               tvec=np.array([0.0, 0.0, 3.0]),
+                               name=str(camera_index))
+                        for camera_index, angle in enumerate(CAMERA_ANGLES)])
+
+
+def _points3d(number_of_points: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).uniform(-0.5, 0.5, size=(number_of_points, 3))
+
+
+
+def _triangulate_point_by_point(camera_group: CameraGroup, points2d: np.ndarray) -> np.ndarray:
+    """ The per-point SVD loop `CameraGroup.triangulate` used to run """
+    undistorted_points2d = np.array([camera.undistort_points(np.copy(camera_points2d)).reshape(-1, 2)
+                                     for camera, camera_points2d in zip(camera_group.cameras, points2d)])
+    camera_matrices = np.array([camera.get_extrinsics_mat() for camera in camera_group.cameras])
+    points3d = np.full((points2d.shape[1], 3), np.nan)
+    for point_index in range(points2d.shape[1]):
+        good = ~np.isnan(undistorted_points2d[:, point_index, 0])
+        if good.sum() >= 2:
+            points3d[point_index] = triangulate_simple(undistorted_points2d[good, point_index],
+                                                       camera_matrices[good])
+    return points3d
+
+
+def test_triangulate_matches_the_point_by_point_loop():
+    camera_group = _camera_group()
+    points3d = _points3d(200)
+    points2d = camera_group.project(points3d)
+    rng = np.random.default_rng(1)
+    points2d += rng.normal(scale=0.5, size=points2d.shape)
+    points2d[0, :50] = np.nan
+    points2d[1:, 40:60] = np.nan  # points 50-59 are only seen by one camera
+
+    triangulated_points3d = camera_group.triangulate(points2d)
+
+    # (the normal equations and the SVD minimize slightly different algebraic errors, so with noisy points they agree
+    # to well within the noise rather than exactly)
+    np.testing.assert_allclose(triangulated_points3d,
+                               _triangulate_point_by_point(camera_group, points2d),
+                               atol=1e-3)
+    assert np.isnan(triangulated_points3d[40:60]).all()
+    np.testing.assert_allclose(triangulated_points3d[60:], points3d[60:], atol=1e-2)
+    # (a single point, as a (cameras, 2) array)
+    np.testing.assert_allclose(camera_group.triangulate(points2d[:, 100]), triangulated_points3d[100])
+
+
+def test_bundle_adjust_uses_a_sparsity_pattern_that_fits_its_residuals():
+    camera_group = _camera_group()
+    points3d = _points3d(60)
+    points2d = camera_group.project(points3d)
+    points2d[0, :5] = np.nan
+    # 60 points on 3 boards
+    extra = {"ids": np.repeat(np.arange(3), 20), "objp": np.abs(points3d) + 0.1}
+    extra["ids_map"] = extra["ids"]
+
+    initial_parameters, number_of_camera_parameters = camera_group._initialize_params_bundle(points2d, extra)
+    sparsity = camera_group._jac_sparsity_bundle(points2d, number_of_camera_parameters, extra)
+    residuals = camera_group._error_fun_bundle(initial_parameters, points2d, number_of_camera_parameters, extra)
+    assert sparsity.shape == (len(residuals), len(initial_parameters))
+
+    # ...and the solve itself runs on it, pulling slightly-off cameras back onto the points they saw
+    perturbed_camera_group = _camera_group(rotation_noise=0.01, seed=1)
+    error_before = perturbed_camera_group.average_error(points2d)
+    error_after = perturbed_camera_group.bundle_adjust(points2d, verbose=False)
+    assert error_after < error_before
+
+
+def test_triangulate_optim_uses_a_sparsity_pattern_that_fits_its_residuals():
+    camera_group = _camera_group()
+    number_of_frames, number_of_joints = 10, 3
+    points3d = _points3d(number_of_frames * number_of_joints).reshape(number_of_frames, number_of_joints, 3)
+    points2d = camera_group.project(points3d.reshape(-1, 3)).reshape(len(CAMERA_ANGLES), number_of_frames,
+                                                                      number_of_joints, 2)
+    points2d[1, 0, 0] = np.nan
+
+    optimized_points3d = camera_group.triangulate_optim(points2d, constraints=[[0, 1]], constraints_weak=[[1, 2]],
+                                                        scale_smooth=0, scale_length=0, scale_length_weak=0,
+                                                        n_deriv_smooth=1, verbose=False)
+
+    assert optimized_points3d.shape == (number_of_frames, number_of_joints, 3)
+    np.testing.assert_allclose(optimized_points3d, points3d, atol=1e-3)
+
+
+def test_triangulate_possible_skips_outlier_cameras_and_candidates():
+    camera_group = _camera_group()
+    points3d = _points3d(90)
+    points2d = camera_group.project(points3d)
+    # two candidate detections per point - the second is missing, except on points 30-59 where camera 1's first
+    # candidate is a misdetection and its second is the real point
+    candidates = np.full((len(CAMERA_ANGLES), len(points3d), 2, 2), np.nan)
+    candidates[:, :, 0] = points2d
+    candidates[1, 30:60, 1] = points2d[1, 30:60]
+    candidates[1, 30:60, 0] += 30.0
+    # ...and camera 2 is off by 40px on points 0-29, where only the other two cameras agree
+    candidates[2, :30, 0] += 40.0
+
+    triangulated_points3d = camera_group.triangulate_possible(candidates)
+
+    np.testing.assert_allclose(triangulated_points3d, points3d, atol=1e-6)
+    # (plain RANSAC over cameras is the one-candidate case)
+    np.testing.assert_allclose(camera_group.triangulate_ransac(candidates[:, :30, 0]), points3d[:30], atol=1e-6)
+
+
+def test_triangulate_possible_stops_when_killed():
+    camera_group = _camera_group()
+    kill_event = multiprocessing.Event()
+    kill_event.set()
+    points2d = camera_group.project(_points3d(10))[:, :, np.newaxis]
+    assert camera_group.triangulate_possible(points2d, kill_event=kill_event) is None
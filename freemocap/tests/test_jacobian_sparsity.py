@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from freemocap.core.pipelines.calibration_pipeline.calculate_sparse_jacobian import calculate_jacobian_sparsity, \
+    calculate_triangulation_jacobian_sparsity
+
+
+def _nonzero_columns(sparsity, row: int) -> list[int]:
+    return sorted(sparsity[row].nonzero()[1].tolist())
+
+
+@pytest.mark.parametrize("per_coordinate_residuals", [False, True])
+def test_bundle_sparsity_links_observations_to_their_camera_and_point(per_coordinate_residuals: bool):
+    # 2 cameras, 3 points on 2 boards - camera 1 missed point 0
+    points2d = np.zeros((2, 3, 2))
+    points2d[1, 0] = np.nan
+    sparsity = calculate_jacobian_sparsity(pixel_points2d=points2d,
+                                           ids=np.array([7, 7, 9]),
+                                           num_camera_params=6,
+                                           per_coordinate_residuals=per_coordinate_residuals)
+
+    residuals_per_observation = 2 if per_coordinate_residuals else 1
+    number_of_observations = 5 * residuals_per_observation
+    assert sparsity.shape == (number_of_observations + 3 * 3, 2 * 6 + 3 * 3 + 2 * 6)
+    # camera-major: camera 0's points 0, 1, 2, then camera 1's points 1, 2
+    first_camera1_row = 3 * residuals_per_observation
+    assert _nonzero_columns(sparsity, first_camera1_row) == [6, 7, 8, 9, 10, 11, 15, 16, 17]
+    # point 2's x object point error depends on its x coordinate and board 1's rotation and translation
+    assert _nonzero_columns(sparsity, number_of_observations + 2 * 3) == [18, 24, 25, 26, 30, 31, 32]
+
+
+def test_bundle_sparsity_without_boards():
+    sparsity = calculate_jacobian_sparsity(pixel_points2d=np.zeros((2, 4, 2)), ids=None, num_camera_params=6)
+    assert sparsity.shape == (8, 2 * 6 + 4 * 3)
+    assert sparsity.nnz == 8 * 9
+
+
+def test_triangulation_sparsity_layout():
+    # 2 cameras, 3 frames, 2 joints - camera 0 missed joint 1 on frame 0
+    points2d = np.zeros((2, 3, 2, 2))
+    points2d[0, 0, 1] = np.nan
+    sparsity = calculate_triangulation_jacobian_sparsity(points2d=points2d,
+                                                         constraints=[(0, 1)],
+                                                         constraints_weak=[(1, 0)])
+
+    number_of_reprojection_errors = (2 * 3 * 2 - 1) * 2
+    number_of_smoothness_errors = 2 * 2 * 3
+    assert sparsity.shape == (number_of_reprojection_errors + number_of_smoothness_errors + 2 * 3, 3 * 2 * 3 + 2)
+    # camera 0's second residual row is frame 0 joint 0's y, the third is frame 1 joint 0's x (joint 1 was missed)
+    assert _nonzero_columns(sparsity, 1) == [0, 1, 2]
+    assert _nonzero_columns(sparsity, 2) == [6, 7, 8]
+    # frame 0 joint 1's x velocity depends on joint 1's x on frames 0 and 1
+    assert _nonzero_columns(sparsity, number_of_reprojection_errors + 3) == [3, 9]
+    # the weak constraint on frame 2 depends on its length parameter and both joints on frame 2
+    assert _nonzero_columns(sparsity, sparsity.shape[0] - 1) == [12, 13, 14, 15, 16, 17, 19]
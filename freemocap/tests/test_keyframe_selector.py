@@ -0,0 +1,62 @@
+import numpy as np
+
+from freemocap.core.pipelines.calibration_pipeline.keyframe_selector import KeyframeSelector, board_view_features, \
+    camera_pair_features
+
+IMAGE_SIZE = (1280, 720)
+
+
+def _board_object_points() -> np.ndarray:
+    corners_x, corners_y = np.meshgrid(np.arange(1, 5), np.arange(1, 7))
+    return np.stack([corners_x.ravel(), corners_y.ravel(), np.zeros(corners_x.size)], axis=1) * 50.0
+
+
+def test_repeated_views_stop_being_accepted():
+    selector = KeyframeSelector(max_keyframes=100)
+    features = {("coverage", "0", 0, 0): 1.0, ("coverage", "0", 0, 1): 1.0, ("pose", "0", 0, 0, 0): 4.0}
+
+    accepted = [selector.offer(key=frame_number, features=features).accepted for frame_number in range(20)]
+
+    assert accepted[:2] == [True, True]
+    assert not any(accepted[5:])
+    assert selector.total_information_gain == 6.0 + 6.0 / 4  # the first view, and the second at a quarter the value
+    assert not selector.offer(key=0, features={("coverage", "0", 5, 5): 1.0}).accepted  # already a keyframe
+
+
+def test_full_selector_replaces_its_least_informative_keyframe():
+    selector = KeyframeSelector(max_keyframes=3, min_information_gain=0.0)
+    for frame_number in range(3):
+        selector.offer(key=frame_number, features={("coverage", "0", 0, 0): 1.0})
+
+    # no better than what's kept
+    assert not selector.offer(key=3, features={("coverage", "0", 0, 0): 1.0}).accepted
+    decision = selector.offer(key=4, features={("pose", "0", 1, 1, 1): 4.0})
+
+    assert decision.accepted
+    assert decision.evicted_key in {0, 1, 2}
+    assert selector.number_of_keyframes == 3
+    assert selector.feature_counts == {("coverage", "0", 0, 0): 2, ("pose", "0", 1, 1, 1): 1}
+
+
+def test_board_view_features_bin_coverage_and_tilt():
+    object_points = _board_object_points()
+    # fronto-parallel board in the top left of the image
+    image_points = object_points[:, :2] + 20.0
+    image_points[0] = np.nan
+    features = board_view_features(camera_id="0", image_points=image_points, object_points=object_points,
+                                   image_size=IMAGE_SIZE)
+    assert ("coverage", "0", 0, 0) in features
+    assert all(key[0] == "coverage" and key[2] <= 2 and key[3] <= 1 for key in features if key[0] == "coverage")
+    assert [key[3] for key in features if key[0] == "pose"] == [0]  # no tilt
+
+    # the same board foreshortened to half its height - tilted by 60 degrees
+    tilted_image_points = object_points[:, :2] * [1.0, 0.5] + 20.0
+    tilted_features = board_view_features(camera_id="0", image_points=tilted_image_points,
+                                          object_points=object_points, image_size=IMAGE_SIZE)
+    assert [key[3] for key in tilted_features if key[0] == "pose"] == [2]
+
+
+def test_camera_pair_features():
+    assert set(camera_pair_features(["0", "1", "2"])) == {("camera_pair", "0", "1"),
+                                                          ("camera_pair", "0", "2"),
+                                                          ("camera_pair", "1", "2")}
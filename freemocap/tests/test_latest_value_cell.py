@@ -0,0 +1,42 @@
+import pickle
+
+import pytest
+
+from freemocap.core.pubsub.latest_value_cell import LatestValueCell
+
+
+def test_latest_value_cell_conflates():
+    cell = LatestValueCell.create(capacity_bytes=64)
+    try:
+        # A pickled copy (i.e. what a process worker gets) reads the same shared memory
+        reader = pickle.loads(pickle.dumps(cell))
+        assert reader.read() is None
+
+        cell.write(b"frame 1")
+        cell.write(b"frame 2")
+        sequence, data = reader.read()
+        assert data == b"frame 2"  # only the newest value, nothing queued up
+        assert reader.sequence == sequence
+
+        cell.write(b"3")
+        assert reader.read()[1] == b"3"
+        assert reader.sequence > sequence
+        reader.close()
+
+        with pytest.raises(ValueError):
+            cell.write(b"x" * 65)
+    finally:
+        cell.close()
+
+
+def test_latest_value_cell_gives_up_on_a_torn_write():
+    cell = LatestValueCell.create(capacity_bytes=64)
+    try:
+        cell.write(b"frame 1")
+        # a writer that died between bumping the sequence number to odd and finishing its write
+        cell.header[0] += 1
+
+        with pytest.raises(TimeoutError, match="mid-write"):
+            cell.read(timeout=0.01)
+    finally:
+        cell.close()
@@ -0,0 +1,77 @@
+import cv2
+import numpy as np
+import pytest
+
+from freemocap.core.pipelines.calibration_pipeline.multi_camera_calibrator import MultiCameraCalibrator
+from freemocap.core.pipelines.calibration_pipeline.single_camera_calibrator import SingleCameraCalibrator
+
+IMAGE_SIZE = (640, 480)
+FOCAL_LENGTHS_PX = {"0": 500.0, "1": 600.0, "2": 700.0}
+
+
+def _board_object_points() -> np.ndarray:
+    corners_x, corners_y = np.meshgrid(np.arange(1, 4), np.arange(1, 5))
+    return (np.stack([corners_x.ravel(), corners_y.ravel(), np.zeros(corners_x.size)], axis=1) * 30.0).astype(np.float32)
+
+
+def _single_camera_calibrator(camera_id: str, number_of_views: int) -> SingleCameraCalibrator:
+    """ A calibrator holding `number_of_views` synthetic views of the board, from random poses in front of the camera """
+    object_points = _board_object_points()
+    calibrator = SingleCameraCalibrator.create_initial(camera_id=camera_id,
+                                                       image_size=IMAGE_SIZE,
+                                                       all_aruco_marker_ids=[],
+                                                       all_aruco_corners_in_object_coordinates=[],
+                                                       all_charuco_corner_ids=list(range(len(object_points))),
+                                                       all_charuco_corners_in_object_coordinates=object_points)
+    camera_matrix = np.array([[FOCAL_LENGTHS_PX[camera_id], 0.0, IMAGE_SIZE[0] / 2],
+                              [0.0, FOCAL_LENGTHS_PX[camera_id], IMAGE_SIZE[1] / 2],
+                              [0.0, 0.0, 1.0]])
+    random_state = np.random.default_rng(int(camera_id))
+    for _ in range(number_of_views):
+        image_points, _ = cv2.projectPoints(object_points,
+                                            random_state.normal(scale=0.3, size=3),
+                                            np.array([-45.0, -60.0, 600.0]) + random_state.uniform(-50, 50, size=3),
+                                            camera_matrix,
+                                            np.zeros(5))
+        calibrator.object_points_views.append(object_points)
+        calibrator.image_points_views.append(image_points.reshape(-1, 2).astype(np.float32))
+    return calibrator
+
+
+def _multi_camera_calibrator(single_camera_calibrators: dict[str, SingleCameraCalibrator]) -> MultiCameraCalibrator:
+    return MultiCameraCalibrator.model_construct(principal_camera_id="0",
+                                                 single_camera_calibrators=single_camera_calibrators)
+
+
+def test_concurrent_intrinsics_match_a_serial_loop():
+    number_of_views = len(_board_object_points())
+    single_camera_calibrators = {camera_id: _single_camera_calibrator(camera_id, number_of_views=number_of_views)
+                                 for camera_id in FOCAL_LENGTHS_PX}
+    serial_calibrators = {camera_id: calibrator.model_copy(deep=True)
+                          for camera_id, calibrator in single_camera_calibrators.items()}
+    for calibrator in serial_calibrators.values():
+        calibrator.update_calibration_estimate()
+
+    _multi_camera_calibrator(single_camera_calibrators)._update_single_camera_calibration_estimates()
+
+    for camera_id, calibrator in single_camera_calibrators.items():
+        serial_calibrator = serial_calibrators[camera_id]
+        np.testing.assert_array_equal(calibrator.camera_matrix.matrix, serial_calibrator.camera_matrix.matrix)
+        np.testing.assert_array_equal(calibrator.distortion_coefficients.coefficients,
+                                      serial_calibrator.distortion_coefficients.coefficients)
+        assert calibrator.mean_reprojection_error == serial_calibrator.mean_reprojection_error
+        assert calibrator.has_calibration
+        # (each camera got its own solve - the synthetic focal lengths differ per camera)
+        assert calibrator.camera_matrix.matrix[0, 0] == pytest.approx(FOCAL_LENGTHS_PX[camera_id], rel=1e-3)
+
+
+def test_first_failed_camera_propagates():
+    number_of_views = len(_board_object_points())
+    single_camera_calibrators = {"0": _single_camera_calibrator("0", number_of_views=number_of_views),
+                                 "1": _single_camera_calibrator("1", number_of_views=3),
+                                 "2": _single_camera_calibrator("2", number_of_views=5)}
+
+    # both "1" and "2" fail - the error is camera "1"'s, whichever solve finished first
+    with pytest.raises(ValueError, match="#Current views: 3,"):
+        _multi_camera_calibrator(single_camera_calibrators)._update_single_camera_calibration_estimates()
+    assert single_camera_calibrators["0"].has_calibration
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from freemocap.core.pipelines.observation_ring_buffer import ObservationRingBuffer
+
+
+def test_observation_ring_buffer_round_trip():
+    writer = ObservationRingBuffer.create(point_names=["nose", "left_eye", "right_eye"],
+                                          point_dimensions=3,
+                                          ring_length=4)
+    reader = ObservationRingBuffer.recreate(dto=writer.to_dto())
+    try:
+        points = np.array([[1.0, 2.0, 3.0], [np.nan, np.nan, np.nan], [4.0, 5.0, 6.0]])
+        slot_index = writer.write(frame_number=7,
+                                  points=points,
+                                  time_to_retrieve_frame_ns=100,
+                                  time_to_process_frame_ns=200)
+
+        record = reader.read(slot_index=slot_index, frame_number=7)
+        np.testing.assert_array_equal(record["points"], points)
+        np.testing.assert_array_equal(record["visibility"], [True, False, True])
+        assert record["time_to_retrieve_frame_ns"] == 100
+        assert record["time_to_process_frame_ns"] == 200
+        assert reader.dto.point_names == ["nose", "left_eye", "right_eye"]
+
+        # Lap the ring - the old slot is overwritten, so reading it by its old frame number fails
+        for frame_number in range(8, 12):
+            writer.write(frame_number=frame_number, points=points)
+        assert reader.read(slot_index=slot_index, frame_number=7) is None
+        assert reader.read(slot_index=slot_index, frame_number=11)["frame_number"] == 11
+        del record
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_observation_ring_buffer_rejects_bad_writes():
+    writer = ObservationRingBuffer.create(point_names=["0", "1"], point_dimensions=2, ring_length=2)
+    reader = ObservationRingBuffer.recreate(dto=writer.to_dto())
+    try:
+        assert not writer.fits(np.zeros((3, 2)))
+        with pytest.raises(ValueError):
+            writer.write(frame_number=0, points=np.zeros((3, 2)))
+        with pytest.raises(ValueError):
+            reader.write(frame_number=0, points=np.zeros((2, 2)))
+    finally:
+        reader.close()
+        writer.close()
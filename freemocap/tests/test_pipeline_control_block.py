@@ -0,0 +1,41 @@
+import pickle
+
+from freemocap.core.pipelines.pipeline_control_block import PipelineControlBlock, NodeState, NodeErrorCode
+
+
+def test_pipeline_control_block_flags_and_status():
+    control_block = PipelineControlBlock.create(node_names=["camera_node-0", "aggregation_node"])
+    try:
+        # A pickled copy (i.e. what a process worker gets) sees the same shared memory
+        node_view = pickle.loads(pickle.dumps(control_block))
+        camera_node_index = node_view.node_index("camera_node-0")
+        aggregation_node_index = node_view.node_index("aggregation_node")
+
+        summary = control_block.summarize()
+        assert summary["nodes"]["camera_node-0"] == {"state": "created",
+                                                     "shutdown_requested": False,
+                                                     "heartbeat_age_ms": None,
+                                                     "last_frame_number": -1,
+                                                     "error": "none"}
+
+        node_view.set_state(node_index=camera_node_index, state=NodeState.RUNNING)
+        node_view.heartbeat(node_index=camera_node_index)
+        node_view.set_last_frame_number(node_index=camera_node_index, frame_number=42)
+        node_view.set_error(node_index=aggregation_node_index, error_code=NodeErrorCode.UNHANDLED_EXCEPTION)
+        summary = control_block.summarize()
+        assert summary["nodes"]["camera_node-0"]["state"] == "running"
+        assert summary["nodes"]["camera_node-0"]["heartbeat_age_ms"] >= 0
+        assert summary["nodes"]["camera_node-0"]["last_frame_number"] == 42
+        assert summary["nodes"]["aggregation_node"]["state"] == "failed"
+        assert summary["nodes"]["aggregation_node"]["error"] == "unhandled_exception"
+
+        # Shutting down one node leaves the others running, killing the pipeline stops them all
+        control_block.request_shutdown(node_index=camera_node_index)
+        assert not node_view.should_continue(node_index=camera_node_index)
+        assert node_view.should_continue(node_index=aggregation_node_index)
+        control_block.kill_pipeline()
+        assert not node_view.should_continue(node_index=aggregation_node_index)
+        assert node_view.summarize()["pipeline_killed"]
+        node_view.close()
+    finally:
+        control_block.close()
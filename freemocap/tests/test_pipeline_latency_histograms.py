@@ -0,0 +1,40 @@
+import pickle
+
+import pytest
+
+from freemocap.core.pipelines.pipeline_latency_histograms import PipelineLatencyHistograms, PipelineTraceStage, \
+    format_prometheus_metrics
+
+
+def test_latency_histograms_percentiles_and_sharing():
+    histograms = PipelineLatencyHistograms.create(camera_ids=["0", "1"])
+    try:
+        # A pickled copy (i.e. what a process worker gets) writes into the same shared memory
+        worker_histograms = pickle.loads(pickle.dumps(histograms))
+        for _ in range(90):
+            worker_histograms.record(row=worker_histograms.row_for("1"),
+                                     stage=PipelineTraceStage.TRACKER_INFERENCE,
+                                     duration_ns=10_000_000)
+        for _ in range(10):
+            worker_histograms.record(row=worker_histograms.row_for("1"),
+                                     stage=PipelineTraceStage.TRACKER_INFERENCE,
+                                     duration_ns=100_000_000)
+        histograms.record(row=histograms.row_for(None), stage=PipelineTraceStage.END_TO_END, duration_ns=50)
+        worker_histograms.close()
+
+        summary = histograms.summarize()
+        assert set(summary.keys()) == {"tracker_inference", "end_to_end"}
+        inference = summary["tracker_inference"]["1"]
+        assert "0" not in summary["tracker_inference"]
+        assert inference["count"] == 100
+        assert inference["mean_ms"] == pytest.approx(19.0)
+        # quantiles are accurate to within a bin (~19%)
+        assert inference["p50_ms"] == pytest.approx(10.0, rel=0.2)
+        assert inference["p95_ms"] == pytest.approx(100.0, rel=0.2)
+        assert summary["end_to_end"]["pipeline"]["count"] == 1
+
+        prometheus_text = format_prometheus_metrics({"abc123": summary})
+        assert ('freemocap_pipeline_stage_latency_seconds_count{pipeline_id="abc123",stage="tracker_inference",'
+                'camera_id="1"} 100') in prometheus_text
+    finally:
+        histograms.close()
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from pydantic import BaseModel, Field
+
+from freemocap.core.pubsub.pubsub_codecs import BinaryMessageCodec, Int64FieldCodec, StringFieldCodec, \
+    Int64DictFieldCodec, NamedPointsFieldCodec, PickledFieldCodec, FieldCodec, encode_message, decode_message, \
+    create_message
+
+
+class ExampleMessage(BaseModel):
+    frame_number: int
+    camera_group_id: str
+    requested_frames: dict[int, int] = Field(default_factory=dict)
+    points: dict[str, list[float]] = Field(default_factory=dict)
+    extra: dict | None = None
+
+
+EXAMPLE_CODEC = BinaryMessageCodec(message_type=ExampleMessage,
+                                   schema_id=7,
+                                   fields={"frame_number": Int64FieldCodec(),
+                                           "camera_group_id": StringFieldCodec(),
+                                           "requested_frames": Int64DictFieldCodec(),
+                                           "points": NamedPointsFieldCodec(dimensions=3),
+                                           "extra": PickledFieldCodec()})
+
+
+def test_binary_codec_round_trip():
+    EXAMPLE_CODEC.validate_schema()
+    message = create_message(ExampleMessage,
+                             frame_number=42,
+                             camera_group_id="gröup-1",
+                             requested_frames={41: 1_000, 42: 2_000},
+                             points={"nose": np.array([1.0, 2.0, 3.0]), "left_eye": np.array([4.0, 5.0, 6.0])})
+
+    decoded = decode_message(data=encode_message(message=message, codec=EXAMPLE_CODEC), codec=EXAMPLE_CODEC)
+    assert isinstance(decoded, ExampleMessage)
+    assert decoded.frame_number == 42
+    assert decoded.camera_group_id == "gröup-1"
+    assert decoded.requested_frames == {41: 1_000, 42: 2_000}
+    assert list(decoded.points.keys()) == ["nose", "left_eye"]
+    np.testing.assert_array_equal(decoded.points["left_eye"], [4.0, 5.0, 6.0])
+    assert decoded.extra is None
+
+    empty = decode_message(data=encode_message(message=ExampleMessage(frame_number=0, camera_group_id="",
+                                                                      extra={"a": 1}),
+                                               codec=EXAMPLE_CODEC),
+                           codec=EXAMPLE_CODEC)
+    assert empty.points == {} and empty.requested_frames == {} and empty.extra == {"a": 1}
+
+    # No codec -> pickled pydantic model
+    assert decode_message(data=encode_message(message=message, codec=None), codec=None).frame_number == 42
+
+
+def test_binary_codec_schema_validation():
+    with pytest.raises(ValueError):
+        BinaryMessageCodec(message_type=ExampleMessage,
+                           schema_id=8,
+                           fields={"frame_number": Int64FieldCodec()}).validate_schema()  # missing a required field
+    with pytest.raises(ValueError):
+        BinaryMessageCodec(message_type=ExampleMessage,
+                           schema_id=8,
+                           fields={**EXAMPLE_CODEC.fields, "not_a_field": Int64FieldCodec()}).validate_schema()
+    # every field the model has, but packed with the wrong codecs
+    with pytest.raises(ValueError, match="camera_group_id"):
+        BinaryMessageCodec(message_type=ExampleMessage,
+                           schema_id=8,
+                           fields={**EXAMPLE_CODEC.fields, "camera_group_id": Int64FieldCodec()}).validate_schema()
+    with pytest.raises(ValueError, match="frame_number"):
+        BinaryMessageCodec(message_type=ExampleMessage,
+                           schema_id=8,
+                           fields={**EXAMPLE_CODEC.fields, "frame_number": StringFieldCodec()}).validate_schema()
+    with pytest.raises(ValueError, match="requested_frames"):
+        BinaryMessageCodec(message_type=ExampleMessage,
+                           schema_id=8,
+                           fields={**EXAMPLE_CODEC.fields, "requested_frames": NamedPointsFieldCodec()}).validate_schema()
+
+
+def test_field_codecs_must_implement_pack_and_unpack():
+    class PackOnlyFieldCodec(FieldCodec):
+        def pack(self, value) -> bytes:
+            return b""
+
+    with pytest.raises(TypeError):
+        PackOnlyFieldCodec()
@@ -0,0 +1,42 @@
+from freemocap.core.pubsub.pubsub_stats import TopicStats
+
+
+def test_topic_stats_depth_and_drops():
+    stats = TopicStats.create()
+    queued_subscriber = stats.add_subscriber()
+    conflating_subscriber = stats.add_subscriber()
+
+    for _ in range(5):
+        stats.record_publish()
+    stats.record_consume(subscriber_index=queued_subscriber)
+    stats.record_consume(subscriber_index=queued_subscriber)
+    # A conflating subscriber reads the newest value and skips the 4 it never saw
+    stats.record_consume(subscriber_index=conflating_subscriber, consumed_through=5)
+
+    summary = stats.summarize()
+    assert summary["published"] == 5
+    assert summary["publish_rate_hz"] > 0
+    queued, conflating = summary["subscribers"]
+    assert queued["depth"] == 3
+    assert queued["max_depth"] == 5
+    assert queued["dropped"] == 0
+    assert queued["oldest_unread_age_ms"] >= 0
+    assert conflating["depth"] == 0
+    assert conflating["dropped"] == 4
+    assert conflating["oldest_unread_age_ms"] == 0
+
+
+def test_late_subscriber_starts_caught_up():
+    stats = TopicStats.create()
+    stats.record_publish()
+    subscriber_index = stats.add_subscriber()
+    assert stats.summarize()["subscribers"][subscriber_index]["depth"] == 0
+
+
+def test_broadcast_subscriber_counts_unreadable_messages_as_dropped():
+    stats = TopicStats.create()
+    subscriber = stats.add_subscriber()
+    stats.record_publish()
+    stats.record_consume(subscriber_index=subscriber)
+    stats.record_drop(subscriber_index=subscriber)
+    assert stats.summarize()["subscribers"][0] == {"depth": 0, "max_depth": 1, "dropped": 1, "oldest_unread_age_ms": 0.0}
@@ -0,0 +1,32 @@
+import multiprocessing
+import threading
+
+from freemocap.core.pubsub.pubsub_stats import TopicStats
+from freemocap.core.pubsub.pubsub_topics import CountedSubscription
+
+
+def _counted_subscription(subscription_queue) -> CountedSubscription:
+    stats = TopicStats.create()
+    return CountedSubscription(queue=subscription_queue, stats=stats, subscriber_index=stats.add_subscriber())
+
+
+def test_woken_subscriber_sees_a_message_still_in_the_feeder_thread():
+    subscription = _counted_subscription(multiprocessing.Queue())
+    # (publishers count the message before they put it - the put itself lands a moment later)
+    subscription.stats.record_publish()
+    threading.Timer(0.001, subscription.queue.put, args=("message",)).start()
+
+    assert not subscription.empty()
+    assert subscription.get() == "message"
+    assert subscription.empty()
+    assert subscription.stats.unconsumed(subscriber_index=subscription.subscriber_index) == 0
+
+
+def test_every_publish_is_visible_to_the_woken_subscriber():
+    subscription = _counted_subscription(multiprocessing.Queue())
+    for message_number in range(300):
+        subscription.stats.record_publish()
+        subscription.queue.put(message_number)
+        # (what a node sees right after `NodeWakeup.notify` - the feeder thread may not have flushed the put yet)
+        assert not subscription.empty()
+        assert subscription.get() == message_number
@@ -0,0 +1,52 @@
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+
+from freemocap.core.pipelines.chunked_triangulation import TriangulationCameras
+from freemocap.core.pipelines.ransac_triangulation import triangulate_possible
+
+CAMERA_MATRIX = np.array([[1000.0, 0.0, 640.0], [0.0, 1000.0, 360.0], [0.0, 0.0, 1.0]])
+
+
+def test_ransac_triangulation_drops_outlier_cameras_and_detections():
+    rng = np.random.default_rng(0)
+    cameras = TriangulationCameras(camera_matrices=np.array([CAMERA_MATRIX] * 4),
+                                   distortion_coefficients=[np.array([0.05, -0.02, 0.0, 0.0, 0.0])] * 4,
+                                   rotation_vectors=np.array([[0.0, angle, 0.0] for angle in (-0.9, -0.3, 0.3, 0.9)]),
+                                   translation_vectors=np.array([[0.0, 0.0, 3.0]] * 4))
+    points3d = rng.uniform(-0.5, 0.5, size=(200, 3))
+    points2d = np.stack([cv2.projectPoints(points3d,
+                                           cameras.rotation_vectors[camera_index],
+                                           cameras.translation_vectors[camera_index],
+                                           CAMERA_MATRIX,
+                                           cameras.distortion_coefficients[camera_index])[0].reshape(-1, 2)
+                         for camera_index in range(4)])
+    points2d[0, :100] += 50.0  # camera 0 is way off for the first half of the points
+    points2d[3, 150:] = np.nan  # camera 3 missed the last 50
+    points2d[1:, 199] = np.nan  # and only camera 0 saw the last one
+    # a second, wrong, candidate detection of every point in camera 1 - listed first, so it's tried first
+    possibilities = np.stack([points2d + [[[0.0, 0.0]], [[30.0, -30.0]], [[0.0, 0.0]], [[0.0, 0.0]]], points2d], axis=2)
+    possibilities[[0, 2, 3], :, 0] = np.nan
+    possibilities[[0, 2, 3], :, 1] = points2d[[0, 2, 3]]
+
+    triangulated, picked, errors, picked_points2d = triangulate_possible(points2d=possibilities,
+                                                                         cameras=cameras,
+                                                                         threshold=0.5)
+
+    np.testing.assert_allclose(triangulated[:199], points3d[:199], atol=1e-6)
+    assert np.isnan(triangulated[199]).all() and errors[199] == 0
+    assert not picked[0, :100].any() and picked[0, 100:199, 1].all()  # the outlying camera was left out
+    assert not picked[1, :, 0].any() and picked[1, :199, 1].all()  # and so was the wrong candidate
+    assert (errors[:199] < 0.5).all()
+    np.testing.assert_array_equal(np.isnan(picked_points2d).any(axis=2), ~picked.any(axis=2))
+
+
+def test_imports_without_the_calibration_pipeline_nodes():
+    # (in a fresh interpreter - the calibration pipeline's nodes mustn't come along with the math kernels it uses)
+    result = subprocess.run([sys.executable, "-c",
+                             "import sys, freemocap.core.pipelines.ransac_triangulation; "
+                             "assert not any(name.endswith('_node') for name in sys.modules), sorted(sys.modules)"],
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
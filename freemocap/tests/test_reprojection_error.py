@@ -0,0 +1,77 @@
+import cv2
+import numpy as np
+import pytest
+
+from freemocap.core.pipelines.calibration_pipeline.reprojection_error import project_points, \
+    calculate_reprojection_errors, nan_mean, pad_points
+
+CAMERA_MATRIX = np.array([[1000.0, 0.0, 640.0], [0.0, 1010.0, 360.0], [0.0, 0.0, 1.0]])
+
+
+def _poses(number_of_poses: int, random_state: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    rotation_vectors = random_state.normal(scale=0.3, size=(number_of_poses, 3))
+    translation_vectors = np.column_stack([random_state.normal(scale=50, size=(number_of_poses, 2)),
+                                           random_state.uniform(800, 1500, size=number_of_poses)])
+    return rotation_vectors, translation_vectors
+
+
+@pytest.mark.parametrize("number_of_distortion_coefficients", [4, 5, 8, 12, 14])
+def test_projection_matches_opencv(number_of_distortion_coefficients: int):
+    random_state = np.random.default_rng(number_of_distortion_coefficients)
+    object_points = random_state.normal(scale=100, size=(10, 35, 3))
+    rotation_vectors, translation_vectors = _poses(10, random_state)
+    distortion_coefficients = random_state.normal(scale=0.05, size=number_of_distortion_coefficients)
+
+    projected = project_points(object_points=object_points,
+                               rotation_vectors=rotation_vectors,
+                               translation_vectors=translation_vectors,
+                               camera_matrices=CAMERA_MATRIX,
+                               distortion_coefficients=distortion_coefficients)
+
+    expected = np.array([cv2.projectPoints(object_points[view], rotation_vectors[view], translation_vectors[view],
+                                           CAMERA_MATRIX, distortion_coefficients)[0].reshape(-1, 2)
+                         for view in range(10)])
+    assert np.allclose(projected, expected, atol=1e-8)
+
+
+def test_shared_points_with_per_camera_intrinsics():
+    random_state = np.random.default_rng(0)
+    object_points = random_state.normal(scale=100, size=(20, 3))
+    rotation_vectors, translation_vectors = _poses(3, random_state)
+    camera_matrices = np.array([CAMERA_MATRIX * [[scale], [scale], [1]] for scale in (0.9, 1.0, 1.1)])
+    distortion_coefficients = [np.array([0.1, -0.05, 0.0, 0.0]), np.array([0.0, 0.02, 0.001, 0.0, 0.01]), np.zeros(8)]
+
+    projected = project_points(object_points=object_points,
+                               rotation_vectors=rotation_vectors,
+                               translation_vectors=translation_vectors,
+                               camera_matrices=camera_matrices,
+                               distortion_coefficients=distortion_coefficients)
+
+    for camera in range(3):
+        expected = cv2.projectPoints(object_points, rotation_vectors[camera], translation_vectors[camera],
+                                     camera_matrices[camera], distortion_coefficients[camera])[0].reshape(-1, 2)
+        assert np.allclose(projected[camera], expected, atol=1e-8)
+
+
+def test_ragged_views_reduce_without_their_padding():
+    random_state = np.random.default_rng(1)
+    rotation_vectors, translation_vectors = _poses(2, random_state)
+    object_points = [random_state.normal(scale=100, size=(number_of_points, 3)) for number_of_points in (6, 4)]
+    image_points = [project_points(object_points=view_object_points,
+                                   rotation_vectors=rotation_vectors[view],
+                                   translation_vectors=translation_vectors[view],
+                                   camera_matrices=CAMERA_MATRIX,
+                                   distortion_coefficients=np.zeros(5))[0] + 1.0  # one pixel off in x and y
+                    for view, view_object_points in enumerate(object_points)]
+
+    errors = calculate_reprojection_errors(image_points=pad_points(image_points),
+                                           object_points=pad_points(object_points),
+                                           rotation_vectors=rotation_vectors,
+                                           translation_vectors=translation_vectors,
+                                           camera_matrices=CAMERA_MATRIX,
+                                           distortion_coefficients=np.zeros(5))
+
+    assert errors.shape == (2, 6, 2)
+    assert np.isnan(errors[1, 4:]).all()
+    assert np.allclose(nan_mean(errors, axis=(1, 2)), 1.0)
+    assert np.isnan(nan_mean(np.full((2, 2), np.nan), axis=0)).all()
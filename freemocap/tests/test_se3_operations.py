@@ -0,0 +1,58 @@
+import cv2
+import numpy as np
+from scipy.spatial.transform import Rotation
+
+from freemocap.core.pipelines.calibration_pipeline.se3_operations import rotation_vectors_to_matrices, \
+    rotation_matrices_to_vectors, rotation_matrices_to_quaternions, quaternions_to_rotation_matrices, \
+    rotation_vectors_to_quaternions, karcher_mean_rotation, transforms_from_rotation_vectors, invert_transforms, \
+    relative_transforms, mean_transform
+
+
+def _rotation_vectors(number_of_rotations: int = 200) -> np.ndarray:
+    rotation_vectors = np.random.default_rng(0).normal(size=(number_of_rotations, 3))
+    # identity, tiny, and (nearly) half turn rotations
+    rotation_vectors[:4] = [[0, 0, 0], [1e-10, 0, 0], [np.pi, 0, 0], [0, np.pi - 1e-9, 0]]
+    return rotation_vectors
+
+
+def test_rotation_conversions_match_opencv_and_scipy():
+    rotation_vectors = _rotation_vectors()
+    rotation_matrices = rotation_vectors_to_matrices(rotation_vectors)
+
+    assert np.allclose(rotation_matrices, Rotation.from_rotvec(rotation_vectors).as_matrix(), atol=1e-12)
+    assert np.allclose(rotation_matrices[10], cv2.Rodrigues(rotation_vectors[10])[0], atol=1e-12)
+    # round trips (as rotations - rotation vectors are only unique up to whole turns)
+    assert np.allclose(rotation_vectors_to_matrices(rotation_matrices_to_vectors(rotation_matrices)), rotation_matrices,
+                       atol=1e-12)
+    assert np.all(np.linalg.norm(rotation_matrices_to_vectors(rotation_matrices), axis=1) <= np.pi + 1e-12)
+    quaternions = rotation_matrices_to_quaternions(rotation_matrices)
+    assert np.allclose(quaternions_to_rotation_matrices(quaternions), rotation_matrices, atol=1e-12)
+    # (q and -q are the same rotation)
+    assert np.allclose(np.abs(np.sum(rotation_vectors_to_quaternions(rotation_vectors) * quaternions, axis=1)), 1.0)
+
+
+def test_karcher_mean_of_noisy_rotations():
+    true_rotation = rotation_vectors_to_matrices(np.array([0.3, -0.2, 1.0]))[0]
+    noise = rotation_vectors_to_matrices(np.random.default_rng(1).normal(scale=0.05, size=(500, 3)))
+
+    mean_rotation = karcher_mean_rotation(true_rotation @ noise)
+
+    # the mean's offsets to the rotations average to zero
+    assert np.linalg.norm(rotation_matrices_to_vectors(mean_rotation.T @ true_rotation @ noise).mean(axis=0)) < 1e-8
+    assert np.linalg.norm(rotation_matrices_to_vectors(mean_rotation.T @ true_rotation)) < 0.01
+
+
+def test_relative_transforms_from_shared_board_poses():
+    random_state = np.random.default_rng(2)
+    base_camera, other_camera = transforms_from_rotation_vectors(random_state.normal(scale=0.5, size=(2, 3)),
+                                                                 random_state.normal(scale=1000, size=(2, 3)))
+    board_poses = transforms_from_rotation_vectors(random_state.normal(scale=0.5, size=(20, 3)),
+                                                   random_state.normal(scale=300, size=(20, 3)))
+
+    base_to_other = relative_transforms(base_transforms=base_camera @ board_poses,
+                                        other_transforms=other_camera @ board_poses)
+
+    expected = other_camera @ np.linalg.inv(base_camera)
+    assert np.allclose(base_to_other, expected, atol=1e-8)
+    assert np.allclose(mean_transform(base_to_other), expected, atol=1e-8)
+    assert np.allclose(invert_transforms(board_poses), np.linalg.inv(board_poses), atol=1e-10)
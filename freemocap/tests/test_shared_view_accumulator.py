@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from freemocap.core.pipelines.calibration_pipeline.keyframe_selector import KeyframeSelector
+from freemocap.core.pipelines.calibration_pipeline.shared_view_accumulator import SharedViewAccumulator, CameraPair, \
+    INITIAL_SHARED_VIEW_FRAME_CAPACITY
+
+CAMERA_IDS = ["0", "1", "2"]
+IMAGE_SIZE = (1280, 720)
+
+
+def _board_object_points() -> np.ndarray:
+    corners_x, corners_y = np.meshgrid(np.arange(1, 5), np.arange(1, 7))
+    return np.stack([corners_x.ravel(), corners_y.ravel(), np.zeros(corners_x.size)], axis=1) * 20.0
+
+
+def _camera_node_output(offset: float, can_see_target: bool = True):
+    """ Stands in for a `CalibrationCameraNodeOutputData` - a fronto-parallel board `offset` px from the top left """
+    object_points = _board_object_points()
+    return SimpleNamespace(can_see_target=can_see_target,
+                           target_pixel_points=(object_points[:, :2] + offset).astype(np.float32),
+                           charuco_observation=SimpleNamespace(all_charuco_corners_in_object_coordinates=object_points,
+                                                               image_size=IMAGE_SIZE))
+
+
+def _outputs(visible_camera_ids: list[str], offset: float = 0.0) -> dict:
+    return {camera_id: _camera_node_output(offset=offset + camera_index,
+                                           can_see_target=camera_id in visible_camera_ids)
+            for camera_index, camera_id in enumerate(CAMERA_IDS)}
+
+
+def _accumulator(max_keyframes: int) -> SharedViewAccumulator:
+    return SharedViewAccumulator.create(camera_ids=CAMERA_IDS,
+                                        keyframe_selector=KeyframeSelector(max_keyframes=max_keyframes,
+                                                                           min_information_gain=0.0))
+
+
+def _pair_count(accumulator: SharedViewAccumulator, base_camera_id: str, other_camera_id: str) -> int:
+    return accumulator.get_camera_pair_view_count(CameraPair.from_ids(base_camera_id, other_camera_id))
+
+
+def test_growing_the_store_repoints_the_views():
+    accumulator = _accumulator(max_keyframes=2 * INITIAL_SHARED_VIEW_FRAME_CAPACITY)
+    for multi_frame_number in range(INITIAL_SHARED_VIEW_FRAME_CAPACITY + 1):
+        accumulator.receive_camera_node_output(multi_frame_number=multi_frame_number,
+                                               camera_node_output_by_camera=_outputs(["0", "1"]))
+
+    assert accumulator.number_of_frames == INITIAL_SHARED_VIEW_FRAME_CAPACITY + 1
+    assert len(accumulator.frame_numbers) == len(accumulator.image_points) == 2 * INITIAL_SHARED_VIEW_FRAME_CAPACITY
+    assert _pair_count(accumulator, "0", "1") == INITIAL_SHARED_VIEW_FRAME_CAPACITY + 1
+    # every view, old and new, is a view into the grown store rather than a copy of the old one
+    for multi_frame_number, target_view in accumulator.multi_camera_target_views.items():
+        assert np.shares_memory(target_view.image_points, accumulator.image_points)
+        assert target_view.multi_frame_number == multi_frame_number
+        assert target_view.camera_ids == ["0", "1"]
+    accumulator.image_points[accumulator.frame_index_by_number[0], 0, 0] = -1.0
+    assert accumulator.multi_camera_target_views[0].image_points[0, 0, 0] == -1.0
+
+
+def test_evicted_frame_gives_up_its_slot_and_pair_counts():
+    accumulator = _accumulator(max_keyframes=2)
+    accumulator.receive_camera_node_output(multi_frame_number=10, camera_node_output_by_camera=_outputs(["0", "1"]))
+    accumulator.receive_camera_node_output(multi_frame_number=11, camera_node_output_by_camera=_outputs(["0", "1"]))
+    evicted_frame_index = accumulator.frame_index_by_number[10]
+    assert _pair_count(accumulator, "0", "1") == 2
+
+    # a new camera pair in a new part of the image beats the repeated view
+    accumulator.receive_camera_node_output(multi_frame_number=12,
+                                           camera_node_output_by_camera=_outputs(["1", "2"], offset=500.0))
+
+    assert sorted(accumulator.multi_camera_target_views) == [11, 12]
+    assert sorted(accumulator.charuco_observations_by_frame) == [11, 12]
+    assert accumulator.number_of_frames == 2
+    assert accumulator.frame_index_by_number[12] == evicted_frame_index
+    assert accumulator.frame_numbers[evicted_frame_index] == 12
+    # (the evicted frame's camera 0 corners don't leak into the frame that took its slot)
+    assert np.isnan(accumulator.image_points[evicted_frame_index, 0]).all()
+    assert not np.isnan(accumulator.image_points[evicted_frame_index, 1:]).any()
+    assert _pair_count(accumulator, "0", "1") == 1
+    assert _pair_count(accumulator, "1", "2") == 1
+    assert _pair_count(accumulator, "0", "2") == 0
+    assert np.diag(accumulator.pair_view_counts).tolist() == [1, 2, 1]
+
+
+def test_repeated_and_single_camera_frames_are_rejected():
+    accumulator = _accumulator(max_keyframes=10)
+    accumulator.receive_camera_node_output(multi_frame_number=0, camera_node_output_by_camera=_outputs(["0", "1"]))
+    stored_image_points = accumulator.image_points.copy()
+
+    accumulator.receive_camera_node_output(multi_frame_number=0,
+                                           camera_node_output_by_camera=_outputs(CAMERA_IDS, offset=500.0))
+    accumulator.receive_camera_node_output(multi_frame_number=1, camera_node_output_by_camera=_outputs(["2"]))
+
+    assert accumulator.number_of_frames == 1
+    assert list(accumulator.multi_camera_target_views) == [0]
+    assert accumulator.multi_camera_target_views[0].camera_ids == ["0", "1"]
+    np.testing.assert_array_equal(accumulator.image_points, stored_image_points)
+    assert _pair_count(accumulator, "0", "1") == 1
+    assert accumulator.keyframe_selector.number_of_keyframes == 1
+
+
+def test_shared_view_count_per_camera():
+    accumulator = _accumulator(max_keyframes=10)
+    assert accumulator.get_shared_view_count_per_camera() == {"0": 0, "1": 0, "2": 0}
+
+    accumulator.receive_camera_node_output(multi_frame_number=0, camera_node_output_by_camera=_outputs(["0", "1"]))
+    accumulator.receive_camera_node_output(multi_frame_number=1,
+                                           camera_node_output_by_camera=_outputs(CAMERA_IDS, offset=500.0))
+
+    # camera 0 shared frame 0 with camera 1, and frame 1 with cameras 1 and 2
+    assert accumulator.get_shared_view_count_per_camera() == {"0": 3, "1": 3, "2": 2}
+    assert accumulator.all_cameras_have_min_shared_views(min_shared_views=2)
+    assert not accumulator.all_cameras_have_min_shared_views(min_shared_views=3)